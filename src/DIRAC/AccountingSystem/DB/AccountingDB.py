@@ -6,6 +6,7 @@ from __future__ import print_function
 
 __RCSID__ = "$Id$"
 
+import collections
 import datetime
 import time
 import threading
@@ -36,6 +37,8 @@ class AccountingDB(DB):
         self.dbCatalog = {}
         self.dbBucketsLength = {}
         self.__keysCache = {}
+        # Merge the records of a bundle falling in the same buckets before writing them
+        self.__preAggregateRecords = self.getCSOption("PreAggregateRecords", True)
         maxParallelInsertions = self.getCSOption("ParallelRecordInsertions", 10)
         self.__threadPool = ThreadPool(1, maxParallelInsertions)
         self.__threadPool.daemonize()
@@ -587,18 +590,27 @@ class AccountingDB(DB):
         return S_OK(retVal["lastRowId"])
 
     def insertRecordBundleThroughQueue(self, recordsToQueue):
+        """
+        Insert a bundle of records in the intables, with one multi-row insert per type
+        """
         if self.__readOnly:
             return S_ERROR("ReadOnly mode enabled. No modification allowed")
-        recordsToProcess = []
-        now = Time.toEpoch()
+        rowsByType = collections.OrderedDict()
         for record in recordsToQueue:
             typeName, startTime, endTime, valuesList = record
-            result = self.__insertInQueueTable(typeName, startTime, endTime, valuesList)
+            if typeName not in self.dbCatalog:
+                return S_ERROR("Type %s has not been defined in the db" % typeName)
+            numExp = len(self.dbCatalog[typeName]["typeFields"])
+            if len(valuesList) + 2 != numExp:
+                numRcv = len(valuesList) + 2
+                return S_ERROR("Fields mismatch for record %s. %s fields and %s expected" % (typeName, numRcv, numExp))
+            rowsByType.setdefault(typeName, []).append([0, "UTC_TIMESTAMP()"] + list(valuesList) + [startTime, endTime])
+
+        for typeName, rows in rowsByType.items():
+            sqlFields = ["taken", "takenSince"] + self.dbCatalog[typeName]["typeFields"]
+            result = self.insertFieldsBulk(_getTableName("in", typeName), sqlFields, rows)
             if not result["OK"]:
                 return result
-            iD = result["Value"]
-            recordsToProcess.append((iD, typeName, startTime, endTime, valuesList, now))
-
         return S_OK()
 
     def insertRecordThroughQueue(self, typeName, startTime, endTime, valuesList):
@@ -624,6 +636,8 @@ class AccountingDB(DB):
         Do the real insert and delete from the in buffer table
         """
         self.log.verbose("Received bundle to process", "of %s elements" % len(recordTuples))
+        if self.__preAggregateRecords:
+            recordTuples = self.__insertAggregatedFromINTable(recordTuples)
         for record in recordTuples:
             iD, typeName, startTime, endTime, valuesList, insertionEpoch = record
             result = self.insertRecordDirectly(typeName, startTime, endTime, valuesList)
@@ -636,6 +650,40 @@ class AccountingDB(DB):
                 self.log.error("Can't delete row from the IN table", result["Message"])
             gMonitor.addMark("insertiontime", Time.toEpoch() - insertionEpoch)
 
+    def __insertAggregatedFromINTable(self, recordTuples):
+        """
+        Insert the records of a bundle type by type with insertRecordsDirectly, and delete them
+        from the in buffer table once the buckets are committed. The rows are only deleted after
+        the commit, so a failure leaves them in the in table to be retried (at least once insertion)
+
+        :return: list of the record tuples that could not be inserted in bulk
+        """
+        recordsByType = collections.OrderedDict()
+        for record in recordTuples:
+            recordsByType.setdefault(record[1], []).append(record)
+        notInserted = []
+        for typeName, records in recordsByType.items():
+            result = self.insertRecordsDirectly(typeName, [record[2:5] for record in records])
+            if not result["OK"]:
+                # Insert them one by one, so that a single bad record does not block the others
+                self.log.warn("Can't insert the bundle in bulk", "for %s: %s" % (typeName, result["Message"]))
+                notInserted.extend(records)
+                continue
+            self.log.verbose(
+                "Aggregated records in buckets",
+                "%s records of %s in %s buckets" % (len(records), typeName, result["Value"]),
+            )
+            result = self._update(
+                "DELETE FROM `%s` WHERE id IN (%s)"
+                % (_getTableName("in", typeName), ", ".join(str(record[0]) for record in records))
+            )
+            if not result["OK"]:
+                self.log.error("Can't delete rows from the IN table", result["Message"])
+            now = Time.toEpoch()
+            for record in records:
+                gMonitor.addMark("insertiontime", now - record[5])
+        return notInserted
+
     def insertRecordDirectly(self, typeName, startTime, endTime, valuesList):
         """
         Add an entry to the type contents
@@ -660,7 +708,8 @@ class AccountingDB(DB):
         insertList = list(valuesList)
         insertList.append(startTime)
         insertList.append(endTime)
-        retVal = self._getConnection()
+        # The connection is pooled: it is handed back, not closed, once the record is inserted
+        retVal = self._getConnection(sticky=False)
         if not retVal["OK"]:
             return retVal
         connObj = retVal["Value"]
@@ -672,16 +721,98 @@ class AccountingDB(DB):
                 return retVal
             # HACK: One more record to split in the buckets to be able to count total entries
             valuesList.append(1)
-            retVal = self.__startTransaction(connObj)
+            retVal = self.transactionStart()
             if not retVal["OK"]:
                 return retVal
             retVal = self.__splitInBuckets(typeName, startTime, endTime, valuesList, connObj=connObj)
             if not retVal["OK"]:
-                self.__rollbackTransaction(connObj)
+                self.transactionRollback()
+                return retVal
+            return self.transactionCommit()
+        finally:
+            self._releaseConnection()
+
+    def insertRecordsDirectly(self, typeName, recordsList):
+        """
+        Add a list of entries to the type contents. The contributions of the entries falling in
+        the same bucket with the same key values are summed in memory, and the buckets are written
+        with multi-row inserts, in the same transaction as the entries
+
+        :param str typeName: type of the entries
+        :param list recordsList: list of (startTime, endTime, valuesList) tuples
+
+        :return: S_OK( number of buckets written )
+        """
+        if self.__readOnly:
+            return S_ERROR("ReadOnly mode enabled. No modification allowed")
+        if typeName not in self.dbCatalog:
+            return S_ERROR("Type %s has not been defined in the db" % typeName)
+        if not recordsList:
+            return S_OK(0)
+        gMonitor.addMark("registeradded", len(recordsList))
+        gMonitor.addMark("registeradded:%s" % typeName, len(recordsList))
+        self.log.info("Adding records", "%s for type %s" % (len(recordsList), typeName))
+        keyNames = self.dbCatalog[typeName]["keys"]
+        numKeys = len(keyNames)
+        numFields = len(self.dbCatalog[typeName]["typeFields"]) - 2
+        nowEpoch = int(Time.toEpoch(Time.dateTime()))
+        insertRows = []
+        # ( startTime, bucketLength, key ids ) -> [ entries, values... ]
+        buckets = collections.OrderedDict()
+        for startTime, endTime, valuesList in recordsList:
+            if len(valuesList) != numFields:
+                return S_ERROR(
+                    "Fields mismatch for record %s. %s fields and %s expected" % (typeName, len(valuesList), numFields)
+                )
+            keyIds = []
+            for keyName, keyValue in zip(keyNames, valuesList):
+                retVal = self.__addKeyValue(typeName, keyName, keyValue)
+                if not retVal["OK"]:
+                    return retVal
+                keyIds.append(retVal["Value"])
+            values = valuesList[numKeys:]
+            insertRows.append(keyIds + list(values) + [startTime, endTime])
+            keyIds = tuple(keyIds)
+            for bStartTime, bProportion, bLength in self.calculateBuckets(typeName, startTime, endTime, nowEpoch):
+                bucketKey = (bStartTime, bLength, keyIds)
+                bucketValues = buckets.get(bucketKey)
+                if bucketValues is None:
+                    bucketValues = buckets[bucketKey] = [0] * (len(values) + 1)
+                bucketValues[0] += bProportion
+                for valPos, value in enumerate(values, 1):
+                    bucketValues[valPos] += value * bProportion
+
+        valuesGroups = []
+        for (bStartTime, bLength, keyIds), bucketValues in buckets.items():
+            sqlValues = [bStartTime, bLength, bucketValues[0]]
+            sqlValues.extend(keyIds)
+            sqlValues.extend(bucketValues[1:])
+            valuesGroups.append("( %s )" % ",".join(str(val) for val in sqlValues))
+
+        # The transaction of the pool keeps the connection with the thread until it ends,
+        # and a connection lost in the middle of it is not silently replaced
+        retVal = self._getConnection(sticky=False)
+        if not retVal["OK"]:
+            return retVal
+        connObj = retVal["Value"]
+        try:
+            retVal = self.transactionStart()
+            if not retVal["OK"]:
+                return retVal
+            retVal = self.insertFieldsBulk(
+                _getTableName("type", typeName), self.dbCatalog[typeName]["typeFields"], insertRows, conn=connObj
+            )
+            if retVal["OK"]:
+                retVal = self.__upsertBuckets(typeName, valuesGroups, connObj=connObj)
+            if not retVal["OK"]:
+                self.transactionRollback()
                 return retVal
-            return self.__commitTransaction(connObj)
+            retVal = self.transactionCommit()
+            if not retVal["OK"]:
+                return retVal
+            return S_OK(len(valuesGroups))
         finally:
-            connObj.close()
+            self._releaseConnection()
 
     def deleteRecord(self, typeName, startTime, endTime, valuesList):
         """
@@ -864,16 +995,6 @@ class AccountingDB(DB):
 
     def __writeBuckets(self, typeName, buckets, keyValues, valuesList, connObj=False):
         """Insert or update a bucket"""
-        #     tableName = _getTableName( "bucket", typeName )
-        # INSERT PART OF THE QUERY
-        sqlFields = ["`startTime`", "`bucketLength`", "`entriesInBucket`"]
-        for keyPos in range(len(self.dbCatalog[typeName]["keys"])):
-            sqlFields.append("`%s`" % self.dbCatalog[typeName]["keys"][keyPos])
-        sqlUpData = ["`entriesInBucket`=`entriesInBucket`+VALUES(`entriesInBucket`)"]
-        for valPos in range(len(self.dbCatalog[typeName]["values"])):
-            valueField = "`%s`" % self.dbCatalog[typeName]["values"][valPos]
-            sqlFields.append(valueField)
-            sqlUpData.append("%s=%s+VALUES(%s)" % (valueField, valueField, valueField))
         valuesGroups = []
         for bucketInfo in buckets:
             bStartTime = bucketInfo[0]
@@ -886,23 +1007,43 @@ class AccountingDB(DB):
                 #         value = valuesList[ valPos ]
                 sqlValues.append("(%s*%s)" % (valuesList[valPos], bProportion))
             valuesGroups.append("( %s )" % ",".join(str(val) for val in sqlValues))
+        return self.__upsertBuckets(typeName, valuesGroups, connObj=connObj)
+
+    def __upsertBuckets(self, typeName, valuesGroups, maxRows=1000, connObj=False):
+        """
+        Add the values to the buckets, creating them if needed. Each values group is a
+        "( startTime, bucketLength, entriesInBucket, keys..., values... )" string
+        """
+        #     tableName = _getTableName( "bucket", typeName )
+        # INSERT PART OF THE QUERY
+        sqlFields = ["`startTime`", "`bucketLength`", "`entriesInBucket`"]
+        for keyPos in range(len(self.dbCatalog[typeName]["keys"])):
+            sqlFields.append("`%s`" % self.dbCatalog[typeName]["keys"][keyPos])
+        sqlUpData = ["`entriesInBucket`=`entriesInBucket`+VALUES(`entriesInBucket`)"]
+        for valPos in range(len(self.dbCatalog[typeName]["values"])):
+            valueField = "`%s`" % self.dbCatalog[typeName]["values"][valPos]
+            sqlFields.append(valueField)
+            sqlUpData.append("%s=%s+VALUES(%s)" % (valueField, valueField, valueField))
 
-        cmd = "INSERT INTO `%s` ( %s ) " % (_getTableName("bucket", typeName), ", ".join(sqlFields))
-        cmd += "VALUES %s " % ", ".join(valuesGroups)
-        cmd += "ON DUPLICATE KEY UPDATE %s" % ", ".join(sqlUpData)
+        result = S_OK(0)
+        for index in range(0, len(valuesGroups), maxRows):
+            cmd = "INSERT INTO `%s` ( %s ) " % (_getTableName("bucket", typeName), ", ".join(sqlFields))
+            cmd += "VALUES %s " % ", ".join(valuesGroups[index : index + maxRows])
+            cmd += "ON DUPLICATE KEY UPDATE %s" % ", ".join(sqlUpData)
 
-        for _i in range(max(1, self.__deadLockRetries)):
-            result = self._update(cmd, conn=connObj)
+            for _i in range(max(1, self.__deadLockRetries)):
+                result = self._update(cmd, conn=connObj)
+                if not result["OK"]:
+                    # If failed because of dead lock try restarting
+                    if result["Message"].find("try restarting transaction"):
+                        continue
+                    return result
+                # If OK, break loopo
+                if result["OK"]:
+                    break
             if not result["OK"]:
-                # If failed because of dead lock try restarting
-                if result["Message"].find("try restarting transaction"):
-                    continue
-                return result
-            # If OK, break loopo
-            if result["OK"]:
-                return result
-
-        return S_ERROR("Cannot update bucket: %s" % result["Message"])
+                return S_ERROR("Cannot update bucket: %s" % result["Message"])
+        return result
 
     def __checkFieldsExistsInType(self, typeName, fields, tableType):
         """
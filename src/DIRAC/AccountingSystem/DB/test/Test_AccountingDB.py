@@ -421,6 +421,70 @@ ORDER BY startTime"
         self.assertEqual(retVal, expectedQuery)
 
 
+class InsertRecords(TestCase):
+    """testing the aggregated insertion of records"""
+
+    def test_insertRecordsDirectly(self):
+        """The records falling in the same buckets are written as a single bucket row"""
+        module = self.testClass()
+        module.dbCatalog = {
+            "Test_Pilot": {
+                "keys": ["User", "Site"],
+                "values": ["Jobs"],
+                "typeFields": ["User", "Site", "Jobs", "startTime", "endTime"],
+            }
+        }
+        module.dbBucketsLength["Test_Pilot"] = [(31104000, 3600)]
+        keyIds = {"alice": 1, "bob": 2, "SiteA": 3}
+        module._AccountingDB__addKeyValue = MagicMock(
+            side_effect=lambda _t, _k, value: {"OK": True, "Value": keyIds[value]}
+        )
+        connObj = MagicMock()
+        module._getConnection = MagicMock(return_value={"OK": True, "Value": connObj})
+        module._releaseConnection = MagicMock()
+        for method in ("transactionStart", "transactionCommit", "transactionRollback"):
+            setattr(module, method, MagicMock(return_value={"OK": True, "Value": ()}))
+        module.insertFieldsBulk = MagicMock(return_value={"OK": True, "Value": 4})
+        statements = []
+        module._update = MagicMock(side_effect=lambda cmd, conn: statements.append(cmd) or {"OK": True, "Value": 1})
+
+        now = int(moduleTested.Time.toEpoch())
+        start = now - now % 3600 - 7200
+        records = [
+            (start, start, ["alice", "SiteA", 1]),
+            (start + 10, start + 10, ["alice", "SiteA", 2]),
+            (start + 20, start + 20, ["bob", "SiteA", 4]),
+            # Half in the first bucket, half in the next one
+            (start + 1800, start + 5400, ["alice", "SiteA", 8]),
+        ]
+        retVal = module.insertRecordsDirectly("Test_Pilot", records)
+        self.assertTrue(retVal["OK"], retVal)
+        self.assertEqual(retVal["Value"], 3)
+
+        # The raw records are inserted in one go
+        self.assertEqual(len(module.insertFieldsBulk.call_args[0][2]), 4)
+        self.assertEqual(module.insertFieldsBulk.call_args[0][2][0], [1, 3, 1, start, start])
+        # and the buckets with a single upsert
+        self.assertEqual(len(statements), 1)
+        self.assertIn(
+            "VALUES ( %s,3600,2.5,1,3,7.0 ), ( %s,3600,1,2,3,4 ), ( %s,3600,0.5,1,3,4.0 )"
+            % (start, start, start + 3600),
+            statements[0],
+        )
+        self.assertIn("ON DUPLICATE KEY UPDATE", statements[0])
+        self.assertEqual(module.transactionStart.call_count, 1)
+        self.assertEqual(module.transactionCommit.call_count, 1)
+        self.assertFalse(module.transactionRollback.called)
+        # The pooled connection is handed back, not closed
+        module._getConnection.assert_called_with(sticky=False)
+        self.assertEqual(module._releaseConnection.call_count, 1)
+        self.assertFalse(connObj.close.called)
+
+        # Records with a wrong number of fields are refused
+        retVal = module.insertRecordsDirectly("Test_Pilot", [(start, start, ["alice", 1])])
+        self.assertFalse(retVal["OK"])
+
+
 #############################################################################
 # Test Suite run
 #############################################################################
@@ -429,4 +493,5 @@ ORDER BY startTime"
 if __name__ == "__main__":
     suite = unittest.defaultTestLoader.loadTestsFromTestCase(TestCase)
     suite.addTest(unittest.defaultTestLoader.loadTestsFromTestCase(MakeQuery))
+    suite.addTest(unittest.defaultTestLoader.loadTestsFromTestCase(InsertRecords))
     testResult = unittest.TextTestRunner(verbosity=2).run(suite)
@@ -43,7 +43,11 @@ class DataStoreHandler(RequestHandler):
             result = cls.__acDB.markAllPendingRecordsAsNotTaken()  # pylint: disable=no-member
             if not result["OK"]:
                 return result
-            gThreadScheduler.addPeriodicTask(60, cls.__acDB.loadPendingRecords)  # pylint: disable=no-member
+            # The records queued during this period are aggregated in buckets before being written
+            loadPendingPeriod = getServiceOption(svcInfoDict, "LoadPendingRecordsPeriod", 60)
+            gThreadScheduler.addPeriodicTask(
+                loadPendingPeriod, cls.__acDB.loadPendingRecords  # pylint: disable=no-member
+            )
         return S_OK()
 
     types_registerType = [str, list, list, list]
@@ -4,6 +4,8 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 
+import numpy as np
+
 from DIRAC.Core.Utilities import Time
 
 
@@ -70,6 +72,80 @@ class DBUtils(object):
         nowEpoch = Time.toEpoch()
         return self._acDB.calculateBucketLengthForTime(self._setup, typeName, nowEpoch, momentEpoch)
 
+    @staticmethod
+    def _splitInGranularity(granularity, groups, starts, lengths, values):
+        """
+        Split the buckets in buckets of granularity length and sum them by group
+
+          - groups: array with the group index of each bucket
+          - starts, lengths: arrays with the start epoch and the length of each bucket
+          - values: 2D array of the numerical fields of each bucket, one row per bucket
+
+        A bucket of granularity length is kept as it is, the others are shared between the
+        buckets of granularity length they overlap, in proportion of the time overlapping.
+
+        :return: ( group indexes, bucket epochs, sums ) arrays, the last column of the sums
+                 being the sum of the proportions
+        """
+        ends = starts + lengths
+        unsplit = lengths == granularity
+        firstEpochs = np.where(unsplit, starts, starts - starts % granularity)
+        spans = np.where(unsplit | (lengths == 0), 1, -(-(ends - firstEpochs) // granularity))
+        # One row per piece of bucket
+        rows = np.repeat(np.arange(len(starts)), spans)
+        pieces = np.arange(len(rows)) - np.repeat(np.cumsum(spans) - spans, spans)
+        epochs = firstEpochs[rows] + pieces * granularity
+        overlaps = np.minimum(epochs + granularity, ends[rows]) - np.maximum(epochs, starts[rows])
+        proportions = np.where(unsplit[rows] | (lengths[rows] == 0), 1.0, overlaps / np.maximum(lengths[rows], 1))
+
+        # Sum the pieces with the same ( group, epoch ), using a single integer key per piece
+        minEpoch = epochs.min() if len(epochs) else 0
+        epochRange = epochs.max() - minEpoch + 1 if len(epochs) else 1
+        pieceKeys, pieceInverse = np.unique(groups[rows] * epochRange + (epochs - minEpoch), return_inverse=True)
+        sums = np.empty((len(pieceKeys), values.shape[1] + 1))
+        for column in range(values.shape[1]):
+            sums[:, column] = np.bincount(pieceInverse, values[rows, column] * proportions, len(pieceKeys))
+        sums[:, -1] = np.bincount(pieceInverse, proportions, len(pieceKeys))
+        return pieceKeys // epochRange, pieceKeys % epochRange + minEpoch, sums
+
+    def _groupToGranularity(self, granularity, dataList, average=False):
+        """
+        Group the rows by their first field and sum, or average, their values in buckets of
+        granularity length. Same as _groupByField( 0, dataList ) followed by _sumToGranularity
+        (or _averageToGranularity) for each group, but with all the groups done at once.
+        dataList must be a list of lists where each list contains
+          - field 0: grouping field
+          - field 1: datetime
+          - field 2: bucketLength
+          - fields 3-n: numericalFields
+
+        :return: { groupingField : { bucketEpoch : [ values ] } }
+        """
+        groupDict = {}
+        if not dataList:
+            return groupDict
+        groupIndexes = {}
+        groupList = []
+        for row in dataList:
+            if row[0] not in groupIndexes:
+                groupIndexes[row[0]] = len(groupList)
+                groupList.append(row[0])
+                groupDict[row[0]] = {}
+        columns = list(zip(*dataList))
+        groups = np.fromiter((groupIndexes[group] for group in columns[0]), dtype=np.int64, count=len(dataList))
+        starts = np.array(columns[1], dtype=np.int64)
+        lengths = np.array(columns[2], dtype=np.int64)
+        # None values are converted to NaN, and counted as 0
+        values = np.nan_to_num(np.array(columns[3:], dtype=float).T.reshape(len(dataList), -1))
+        groups, epochs, sums = self._splitInGranularity(granularity, groups, starts, lengths, values)
+        if average:
+            sums = sums[:, :-1] / sums[:, -1:]
+        else:
+            sums = sums[:, :-1]
+        for group, epoch, bucketValues in zip(groups.tolist(), epochs.tolist(), sums.tolist()):
+            groupDict[groupList[group]][epoch] = bucketValues
+        return groupDict
+
     def _spanToGranularity(self, granularity, bucketsData):
         """
         bucketsData must be a list of lists where each list contains
@@ -77,44 +153,16 @@ class DBUtils(object):
           - field 1: bucketLength
           - fields 2-n: numericalFields
         """
-        normData = {}
-
-        def addToNormData(bucketDate, data, proportion=1.0):
-            if bucketDate in normData:
-                for iP in range(len(data)):
-                    val = data[iP]
-                    if val is None:
-                        val = 0
-                    normData[bucketDate][iP] += float(val) * proportion
-                normData[bucketDate][-1] += proportion
-            else:
-                normData[bucketDate] = []
-                for fD in data:
-                    if fD is None:
-                        fD = 0
-                    normData[bucketDate].append(float(fD) * proportion)
-                normData[bucketDate].append(proportion)
-
-        for bucketData in bucketsData:
-            bucketDate = bucketData[0]
-            originalBucketLength = bucketData[1]
-            bucketValues = bucketData[2:]
-            if originalBucketLength == granularity:
-                addToNormData(bucketDate, bucketValues)
-            else:
-                startEpoch = bucketDate
-                endEpoch = bucketDate + originalBucketLength
-                newBucketEpoch = startEpoch - startEpoch % granularity
-                if startEpoch == endEpoch:
-                    addToNormData(newBucketEpoch, bucketValues)
-                else:
-                    while newBucketEpoch < endEpoch:
-                        start = max(newBucketEpoch, startEpoch)
-                        end = min(newBucketEpoch + granularity, endEpoch)
-                        proportion = float(end - start) / originalBucketLength
-                        addToNormData(newBucketEpoch, bucketValues, proportion)
-                        newBucketEpoch += granularity
-        return normData
+        if not bucketsData:
+            return {}
+        columns = list(zip(*bucketsData))
+        starts = np.array(columns[0], dtype=np.int64)
+        lengths = np.array(columns[1], dtype=np.int64)
+        values = np.nan_to_num(np.array(columns[2:], dtype=float).T.reshape(len(bucketsData), -1))
+        _groups, epochs, sums = self._splitInGranularity(
+            granularity, np.zeros(len(bucketsData), dtype=np.int64), starts, lengths, values
+        )
+        return dict(zip(epochs.tolist(), sums.tolist()))
 
     def _sumToGranularity(self, granularity, bucketsData):
         """
@@ -223,13 +271,11 @@ class DBUtils(object):
           - dataDict = { 'key' : { time1 : value,  time2 : value... }, 'key2'.. }
         """
         startBucketEpoch = startEpoch - startEpoch % granularity
+        timeEpochs = list(range(startBucketEpoch, endEpoch, granularity))
         for key in dataDict:
             currentDict = dataDict[key]
-            lastValue = 0
-            for timeEpoch in range(startBucketEpoch, endEpoch, granularity):
-                if timeEpoch in currentDict:
-                    lastValue += currentDict[timeEpoch]
-                currentDict[timeEpoch] = lastValue
+            accumulated = np.cumsum([currentDict.get(timeEpoch, 0) for timeEpoch in timeEpochs]).tolist()
+            currentDict.update(zip(timeEpochs, accumulated))
         return dataDict
 
     def stripDataField(self, dataDict, fieldId):
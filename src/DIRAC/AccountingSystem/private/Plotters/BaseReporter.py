@@ -203,17 +203,15 @@ class BaseReporter(DBUtils):
         )
         if not retVal["OK"]:
             return retVal
-        dataDict = self._groupByField(0, retVal["Value"])
         coarsestGranularity = self._getBucketLengthForTime(self._typeName, startTime)
-        # Transform!
-        for keyField in dataDict:
-            if metadataDict[self._PARAM_CHECK_FOR_NONE]:
-                dataDict[keyField] = self._convertNoneToZero(dataDict[keyField])
-            if metadataDict[self._PARAM_CONVERT_TO_GRANULARITY] == "average":
-                dataDict[keyField] = self._averageToGranularity(coarsestGranularity, dataDict[keyField])
-            if metadataDict[self._PARAM_CONVERT_TO_GRANULARITY] == "sum":
-                dataDict[keyField] = self._sumToGranularity(coarsestGranularity, dataDict[keyField])
-            if self._PARAM_CONSOLIDATION_FUNCTION in metadataDict:
+        # Transform! The None values are counted as 0 when converting to the granularity
+        dataDict = self._groupToGranularity(
+            coarsestGranularity,
+            retVal["Value"],
+            average=metadataDict[self._PARAM_CONVERT_TO_GRANULARITY] == "average",
+        )
+        if self._PARAM_CONSOLIDATION_FUNCTION in metadataDict:
+            for keyField in dataDict:
                 dataDict[keyField] = self._executeConsolidation(
                     metadataDict[self._PARAM_CONSOLIDATION_FUNCTION], dataDict[keyField]
                 )
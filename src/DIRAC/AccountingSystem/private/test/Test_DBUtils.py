@@ -0,0 +1,87 @@
+""" Test of the conversion of the buckets to the granularity of the plots
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import random
+from decimal import Decimal
+
+import pytest
+
+from DIRAC.AccountingSystem.private.DBUtils import DBUtils
+
+
+def spanToGranularity(granularity, bucketsData):
+    """Reference implementation, one bucket at a time"""
+    normData = {}
+    for bucketData in bucketsData:
+        bucketDate, bucketLength = bucketData[:2]
+        values = [float(value or 0) for value in bucketData[2:]]
+        if bucketLength == granularity or bucketLength == 0:
+            pieces = [(bucketDate if bucketLength else bucketDate - bucketDate % granularity, 1.0)]
+        else:
+            pieces = []
+            epoch = bucketDate - bucketDate % granularity
+            while epoch < bucketDate + bucketLength:
+                overlap = min(epoch + granularity, bucketDate + bucketLength) - max(epoch, bucketDate)
+                pieces.append((epoch, float(overlap) / bucketLength))
+                epoch += granularity
+        for epoch, proportion in pieces:
+            sums = normData.setdefault(epoch, [0.0] * (len(values) + 1))
+            for pos, value in enumerate(values):
+                sums[pos] += value * proportion
+            sums[-1] += proportion
+    return normData
+
+
+@pytest.fixture
+def dbUtils():
+    return DBUtils(None, "Test")
+
+
+def test_spanToGranularity(dbUtils):
+    # A bucket of a day shared in 6 hours buckets, another one of the granularity, a none value
+    bucketsData = [[86400, 86400, 4, Decimal("8")], [86400 + 21600, 21600, 1, None]]
+    normData = dbUtils._spanToGranularity(21600, bucketsData)
+    assert normData == {
+        86400: [1.0, 2.0, 0.25],
+        86400 + 21600: [2.0, 2.0, 1.25],
+        86400 + 43200: [1.0, 2.0, 0.25],
+        86400 + 64800: [1.0, 2.0, 0.25],
+    }
+    assert dbUtils._sumToGranularity(21600, bucketsData)[86400 + 21600] == [2.0, 2.0]
+    assert dbUtils._averageToGranularity(21600, bucketsData)[86400 + 21600] == [1.6, 1.6]
+    assert dbUtils._spanToGranularity(21600, []) == {}
+
+
+@pytest.mark.parametrize("average", [False, True])
+def test_groupToGranularity(dbUtils, average):
+    random.seed(average)
+    granularity = 3600
+    dataList = []
+    for _ in range(500):
+        bucketLength = random.choice([900, 3600, 86400, 0])
+        startTime = 1600000000 + random.randint(0, 100) * max(bucketLength, 900)
+        startTime -= startTime % max(bucketLength, 900)
+        dataList.append(
+            (random.choice(["SiteA", "SiteB", "SiteC"]), startTime, bucketLength, random.random(), random.randint(0, 9))
+        )
+    groupDict = dbUtils._groupToGranularity(granularity, dataList, average=average)
+    assert list(groupDict) == list(dict.fromkeys(row[0] for row in dataList))
+
+    for site, siteData in dbUtils._groupByField(0, list(dataList)).items():
+        expected = spanToGranularity(granularity, siteData)
+        assert sorted(groupDict[site]) == sorted(expected)
+        for epoch, sums in expected.items():
+            if average:
+                sums = [value / sums[-1] for value in sums]
+            assert groupDict[site][epoch] == pytest.approx(sums[:-1])
+
+
+def test_accumulate(dbUtils):
+    dataDict = {"SiteA": {0: 1.0, 20: 2.0}, "SiteB": {10: 5.0}}
+    assert dbUtils._accumulate(10, 0, 40, dataDict) == {
+        "SiteA": {0: 1.0, 10: 1.0, 20: 3.0, 30: 3.0},
+        "SiteB": {0: 0, 10: 5.0, 20: 5.0, 30: 5.0},
+    }
@@ -391,8 +391,8 @@ def getDBParameters(fullname):
            Not used as the method will fail if it cannot be found
            defaultQueueSize is the QueueSize to return if the option is not found in the CS
 
-    :return: S_OK(dict)/S_ERROR() - dictionary with the keys: 'host', 'port', 'user', 'password',
-                                    'db' and 'queueSize'
+    :return: S_OK(dict)/S_ERROR() - dictionary with the keys: 'Host', 'Port', 'User', 'Password',
+                                    'DBName' and optionally 'MaxConnections'
     """
 
     cs_path = getDatabaseSection(fullname)
@@ -449,6 +449,13 @@ def getDBParameters(fullname):
     dbName = result["Value"]
     parameters["DBName"] = dbName
 
+    # Size of the connection pool, optional
+    maxConnections = gConfig.getValue(cs_path + "/MaxConnections", 0)
+    if not maxConnections:
+        maxConnections = gConfig.getValue("/Systems/Databases/MaxConnections", 0)
+    if maxConnections:
+        parameters["MaxConnections"] = maxConnections
+
     return S_OK(parameters)
 
 
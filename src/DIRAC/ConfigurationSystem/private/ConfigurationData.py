@@ -39,6 +39,9 @@ class ConfigurationData(object):
         self.localCFG = CFG()
         self.remoteCFG = CFG()
         self.mergedCFG = CFG()
+        # Immutable view of the merged configuration used for the lock free lookups:
+        # (mergedCFG, remoteCFG, { "/flat/option/path" : value }, remote version)
+        self.__snapshot = (None, None, {}, None)
         self.remoteServerList = []
         if loadDefaultCFG:
             defaultCFGFile = os.path.join(DIRAC.rootPath, "etc", "dirac.cfg")
@@ -67,6 +70,39 @@ class ConfigurationData(object):
             self.remoteServerList.extend(List.fromChar(remoteServers, ","))
         self.remoteServerList = List.uniqueElements(self.remoteServerList)
         self.__compressedConfigurationData = None
+        self.__buildSnapshot()
+
+    def __buildSnapshot(self):
+        """Publish the merged configuration as a flat path -> value dictionary.
+
+        The snapshot is never modified once built, but replaced as a whole, so it can be read without locking
+        """
+        mergedCFG = self.mergedCFG
+        remoteCFG = self.remoteCFG
+        options = {}
+        self.__flattenCFG(mergedCFG, "", options)
+        version = self.__walkToOption("%s/Version" % self.configurationPath, remoteCFG)
+        self.__snapshot = (mergedCFG, remoteCFG, options, version)
+        return self.__snapshot
+
+    def __flattenCFG(self, cfg, path, options):
+        for option in cfg.listOptions():
+            options["%s/%s" % (path, option)] = cfg[option]
+        for section in cfg.listSections():
+            self.__flattenCFG(cfg[section], "%s/%s" % (path, section), options)
+
+    @staticmethod
+    def __walkToOption(path, cfg):
+        """Get the value of an option by going through the sections of a CFG"""
+        try:
+            levelList = [level.strip() for level in path.split("/") if level.strip() != ""]
+            for section in levelList[:-1]:
+                cfg = cfg[section]
+            if levelList[-1] in cfg.listOptions():
+                return cfg[levelList[-1]]
+        except Exception:
+            pass
+        return None
 
     def loadFile(self, fileName):
         try:
@@ -155,20 +191,24 @@ class ConfigurationData(object):
         return self.dangerZoneEnd(None)
 
     def extractOptionFromCFG(self, path, cfg=False, disableDangerZones=False):
-        if not cfg:
-            cfg = self.mergedCFG
+        mergedCFG = self.mergedCFG
+        if not cfg or cfg is mergedCFG:
+            # Lock free lookup in the snapshot of the merged configuration
+            snapshot = self.__snapshot
+            if snapshot[0] is not mergedCFG:
+                snapshot = self.__buildSnapshot()
+            options = snapshot[2]
+            value = options.get(path)
+            if value is None:
+                value = options.get("/" + "/".join(level.strip() for level in path.split("/") if level.strip()))
+            return value
         if not disableDangerZones:
             self.dangerZoneStart()
         try:
-            levelList = [level.strip() for level in path.split("/") if level.strip() != ""]
-            for section in levelList[:-1]:
-                cfg = cfg[section]
-            if levelList[-1] in cfg.listOptions():
-                return self.dangerZoneEnd(cfg[levelList[-1]])
-        except Exception:
-            pass
-        if not disableDangerZones:
-            self.dangerZoneEnd()
+            return self.__walkToOption(path, cfg)
+        finally:
+            if not disableDangerZones:
+                self.dangerZoneEnd()
 
     def setOptionInCFG(self, path, value, cfg=False, disableDangerZones=False):
         if not cfg:
@@ -214,6 +254,9 @@ class ConfigurationData(object):
 
     def getVersion(self, cfg=False):
         if not cfg:
+            snapshot = self.__snapshot
+            if snapshot[1] is self.remoteCFG:
+                return snapshot[3] or "0"
             cfg = self.remoteCFG
         value = self.extractOptionFromCFG("%s/Version" % self.configurationPath, cfg)
         if value:
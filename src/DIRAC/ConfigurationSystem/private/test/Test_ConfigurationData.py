@@ -0,0 +1,77 @@
+""" Unit tests for the lookups in the snapshot of the ConfigurationData
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import pytest
+
+from diraccfg import CFG
+
+from DIRAC.ConfigurationSystem.private.ConfigurationData import ConfigurationData
+
+remoteCFGData = """
+DIRAC
+{
+  Setup = Production
+  Configuration
+  {
+    Version = 2022-01-01 10:00:00
+  }
+}
+Systems
+{
+  WorkloadManagement
+  {
+    Production
+    {
+      Services
+      {
+        Matcher
+        {
+          Port = 9170
+        }
+      }
+    }
+  }
+}
+"""
+
+
+@pytest.fixture
+def confData():
+    data = ConfigurationData(loadDefaultCFG=False)
+    data.loadRemoteCFGFromMem(remoteCFGData)
+    return data
+
+
+def test_extractOption(confData):
+    assert confData.extractOptionFromCFG("/DIRAC/Setup") == "Production"
+    assert confData.extractOptionFromCFG("DIRAC/Setup") == "Production"
+    assert confData.extractOptionFromCFG("/Systems//WorkloadManagement/Production/Services/Matcher/Port/") == "9170"
+    assert confData.extractOptionFromCFG("/Systems/WorkloadManagement") is None
+    assert confData.extractOptionFromCFG("/DIRAC/Unknown") is None
+    assert confData.extractOptionFromCFG("") is None
+    # Lookups in another CFG go through its sections
+    assert confData.extractOptionFromCFG("/DIRAC/Setup", confData.localCFG) is None
+    assert confData.extractOptionFromCFG("/DIRAC/Setup", confData.remoteCFG) == "Production"
+
+
+def test_updates(confData):
+    confData.setOptionInCFG("/DIRAC/Setup", "Certification")
+    assert confData.extractOptionFromCFG("/DIRAC/Setup") == "Certification"
+    confData.deleteLocalOption("/DIRAC/Setup")
+    assert confData.extractOptionFromCFG("/DIRAC/Setup") == "Production"
+
+    # The merged configuration replaced without sync
+    newCFG = CFG()
+    newCFG.loadFromBuffer("DIRAC\n{\n  Setup = Devel\n}\n")
+    confData.mergedCFG = newCFG
+    assert confData.extractOptionFromCFG("/DIRAC/Setup") == "Devel"
+
+
+def test_version(confData):
+    assert confData.getVersion() == "2022-01-01 10:00:00"
+    confData.setVersion("2022-02-02 10:00:00")
+    assert confData.getVersion() == "2022-02-02 10:00:00"
+    assert ConfigurationData(loadDefaultCFG=False).getVersion() == "0"
@@ -71,6 +71,8 @@ AGENTS = [
                 "ReplicaCacheValidity",
                 "NoUnusedDelay",
                 "maxThreadsInPool",
+                "ReplicaThreads",
+                "PluginThreads",
             ]
         },
     ),
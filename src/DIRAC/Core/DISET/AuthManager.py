@@ -7,6 +7,7 @@ from __future__ import print_function
 from DIRAC.ConfigurationSystem.Client.Config import gConfig
 from DIRAC.ConfigurationSystem.Client.Helpers import Registry
 from DIRAC.Core.Security import Properties
+from DIRAC.Core.Security.CredentialsCache import gCredentialsCache
 from DIRAC.Core.Utilities import List
 from DIRAC.FrameworkSystem.Client.Logger import gLogger
 
@@ -21,6 +22,8 @@ class AuthManager(object):
     KW_EXTRA_CREDENTIALS = "extraCredentials"
     KW_PROPERTIES = "properties"
     KW_USERNAME = "username"
+    # Lifetime of the Registry resolutions in the credentials cache, in seconds
+    REGISTRY_CACHE_LIFETIME = 60
 
     def __init__(self, authSection):
         """
@@ -103,7 +106,7 @@ class AuthManager(object):
                     credDict[self.KW_GROUP] = result["Value"]
             if credDict[self.KW_GROUP] == self.KW_HOSTS_GROUP:
                 # For host
-                if not self.getHostNickName(credDict):
+                if not self.__resolveInRegistry(credDict, "host", self.getHostNickName)[0]:
                     self.__authLogger.warn("Host is invalid")
                     if not allowAll:
                         return False
@@ -112,8 +115,7 @@ class AuthManager(object):
                     credDict[self.KW_GROUP] = "visitor"
             else:
                 # For users
-                username = self.getUsername(credDict)
-                suspended = self.isUserSuspended(credDict)
+                username, suspended = self.__resolveInRegistry(credDict, "user", self.getUsername, self.isUserSuspended)
                 if not username:
                     self.__authLogger.warn("User is invalid or does not belong to the group it's saying")
                 if suspended:
@@ -148,6 +150,27 @@ class AuthManager(object):
             return False
         return True
 
+    def __resolveInRegistry(self, credDict, kind, *checks):
+        """
+        Run the checks on the DN and group of the credentials, filling the username and the properties.
+        The results are cached for the DN and group, for REGISTRY_CACHE_LIFETIME seconds.
+
+        :param dict credDict: credentials, with DN and group
+        :param str kind: kind of identity checked (user, host)
+        :param checks: functions taking a credentials dictionary and returning a boolean
+        :return: list of the results of the checks
+        """
+        cacheKey = "%s:%s:%s" % (kind, credDict[self.KW_DN], credDict[self.KW_GROUP])
+        resolved = gCredentialsCache.get(cacheKey)
+        if resolved is None:
+            resolved = {self.KW_DN: credDict[self.KW_DN], self.KW_GROUP: credDict[self.KW_GROUP]}
+            resolved["checks"] = [check(resolved) for check in checks]
+            gCredentialsCache.add(cacheKey, resolved, secondsLeft=self.REGISTRY_CACHE_LIFETIME)
+        for key in (self.KW_USERNAME, self.KW_PROPERTIES):
+            if key in resolved:
+                credDict[key] = resolved[key]
+        return resolved["checks"]
+
     def getHostNickName(self, credDict):
         """
         Discover the host nickname associated to the DN.
@@ -16,6 +16,7 @@ from DIRAC.Core.Utilities import Time
 from DIRAC.ConfigurationSystem.Client.Config import gConfig
 from DIRAC.FrameworkSystem.Client.Logger import gLogger
 from DIRAC.Core.Security.Properties import CS_ADMINISTRATOR
+from DIRAC.Core.Security.CredentialsCache import gCredentialsCache
 
 
 def getServiceOption(serviceInfo, optionName, defaultValue):
@@ -513,6 +514,7 @@ class RequestHandler(object):
             "children system time": stTimes[3],
             "elapsed real time": stTimes[4],
         }
+        dInfo["credentials cache"] = gCredentialsCache.getCounters()
 
         return S_OK(dInfo)
 
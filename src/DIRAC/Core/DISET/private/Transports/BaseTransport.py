@@ -23,14 +23,13 @@ from __future__ import print_function
 
 import time
 import six
-from io import BytesIO
 from hashlib import md5
 
 import selectors
 
 from DIRAC.Core.Utilities.ReturnValues import S_ERROR, S_OK
 from DIRAC.FrameworkSystem.Client.Logger import gLogger
-from DIRAC.Core.Utilities import MixedEncode
+from DIRAC.Core.Utilities import DEncode, MixedEncode
 
 
 class BaseTransport(object):
@@ -232,29 +231,24 @@ class BaseTransport(object):
                 data = pkgData[:pkgSize]
                 self.byteStream = pkgData[pkgSize:]
             else:
-                # If we still need to read stuff
-                pkgMem = BytesIO()
-                pkgMem.write(pkgData)
+                # If we still need to read stuff, assemble the message in a buffer
+                # allocated once for the whole package
+                decoder = DEncode.IncrementalDecoder(pkgSize)
+                decoder.feed(pkgData)
                 # Receive while there's still data to be received
-                while readSize < pkgSize:
-                    retVal = self._read(pkgSize - readSize, skipReadyCheck=True)
+                while not decoder.isComplete():
+                    retVal = self._read(decoder.missing(), skipReadyCheck=True)
                     if not retVal["OK"]:
                         return retVal
                     if not retVal["Value"]:
                         return S_ERROR("Peer closed connection")
-                    rcvData = retVal["Value"]
-                    readSize += len(rcvData)
-                    pkgMem.write(rcvData)
+                    readSize += len(retVal["Value"])
+                    leftOver = decoder.feed(retVal["Value"])
                     if maxBufferSize and readSize > maxBufferSize:
                         return S_ERROR("Read limit exceeded (%s chars)" % maxBufferSize)
                 # Data is here! take it out from the bytestream, dencode and return
-                if readSize == pkgSize:
-                    data = pkgMem.getvalue()
-                    self.byteStream = b""
-                else:  # readSize > pkgSize:
-                    pkgMem.seek(0, 0)
-                    data = pkgMem.read(pkgSize)
-                    self.byteStream = pkgMem.read()
+                data = decoder.getData()
+                self.byteStream = leftOver
             try:
                 data = MixedEncode.decode(data)[0]
             except Exception as e:
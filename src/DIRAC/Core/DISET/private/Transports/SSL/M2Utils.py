@@ -12,6 +12,7 @@ from M2Crypto import SSL, m2, X509
 
 from DIRAC.Core.DISET import DEFAULT_SSL_CIPHERS, DEFAULT_SSL_METHODS
 from DIRAC.Core.Security import Locations
+from DIRAC.Core.Security.CredentialsCache import gCredentialsCache, getChainKey
 from DIRAC.Core.Security.m2crypto.X509Chain import X509Chain
 
 # Verify depth of peer certs
@@ -177,8 +178,16 @@ def getM2PeerInfo(conn):
        isLimitedProxy - Boolean, True if chain ends with limited proxy
        group - String, DIRAC group for this peer, if known
 
+    The details are cached for the peers connecting again with the same chain.
+
     Returns a dict of details.
     """
+    peerCert = conn.get_peer_cert()
+    chainKey = getChainKey([peerCert.as_der()] + [cert.as_der() for cert in conn.get_peer_cert_chain() or []])
+    peer = gCredentialsCache.get(chainKey)
+    if peer is not None:
+        return peer
+
     chain = X509Chain.generateX509ChainFromSSLConnection(conn)
     creds = chain.getCredentials(withRegistryInfo=False)
     if not creds["OK"]:
@@ -201,4 +210,5 @@ def getM2PeerInfo(conn):
         raise RuntimeError("Failed to get SSL peer isProxy (%s)." % isLimited["Message"])
     peer["isLimitedProxy"] = isLimited["Value"]
 
+    gCredentialsCache.add(chainKey, peer, secondsLeft=peer["secondsLeft"])
     return peer
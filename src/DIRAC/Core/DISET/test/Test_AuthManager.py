@@ -9,6 +9,7 @@ import unittest
 from diraccfg import CFG
 from DIRAC import gConfig
 from DIRAC.Core.DISET.AuthManager import AuthManager
+from DIRAC.Core.Security.CredentialsCache import gCredentialsCache
 
 __RCSID__ = "$Id$"
 
@@ -114,6 +115,7 @@ class AuthManagerTest(unittest.TestCase):
     """Base class for the Modules test cases"""
 
     def setUp(self):
+        gCredentialsCache.clear()
         self.authMgr = AuthManager("/Systems/Service/Authorization")
         cfg = CFG()
         cfg.loadFromBuffer(testSystemsCFG)
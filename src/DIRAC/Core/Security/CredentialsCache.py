@@ -0,0 +1,121 @@
+""" Cache of the credentials extracted from the certificate chains of the connecting peers
+
+    Extracting the credentials of a chain (DN, proxyness, DIRAC group...) means parsing the
+    extensions of all its certificates, and resolving them in the Registry means walking the
+    configuration. Clients, pilots in particular, connect again and again with the same proxy,
+    so both are cached here, for the DISET and the Tornado services, and the AuthManager.
+
+    The entries of a chain are indexed by the digest of its certificates
+    (see :py:func:`getChainKey`), and they never outlive the chain.
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import collections
+import hashlib
+import threading
+import time
+
+
+def getChainKey(certificates):
+    """Get the key of a chain in the cache
+
+    :param certificates: list of the certificates of the chain, as DER or PEM bytes
+                         (or the whole chain as a PEM string)
+
+    :return: str digest
+    """
+    if isinstance(certificates, (bytes, str)):
+        certificates = [certificates]
+    sha1 = hashlib.sha1()
+    for certificate in certificates:
+        sha1.update(certificate if isinstance(certificate, bytes) else certificate.encode())
+    return sha1.hexdigest()
+
+
+def _copyCredentials(credDict):
+    """Copy a credentials dict and its lists. The other values (strings, chain objects...) are shared"""
+    return {key: list(value) if isinstance(value, list) else value for key, value in credDict.items()}
+
+
+class CredentialsCache(object):
+    """Thread safe LRU cache of credentials dictionaries, with a bounded number of entries.
+    The entries expire after a given lifetime, or at the end of validity of the chain they come from.
+    """
+
+    def __init__(self, maxEntries=10000, lifetime=600):
+        """
+        :param int maxEntries: maximum number of entries. 0 disables the cache
+        :param int lifetime: maximum lifetime of the entries, in seconds
+        """
+        self.maxEntries = maxEntries
+        self.lifetime = lifetime
+        self.hits = 0
+        self.misses = 0
+        self.__entries = collections.OrderedDict()
+        self.__lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.__entries)
+
+    def get(self, key):
+        """Get a copy of the cached credentials. The secondsLeft field, if any,
+        is updated to the time left before the end of validity of the chain
+
+        :return: the credentials dict, or None if it is not cached
+        """
+        if self.maxEntries <= 0:
+            return None
+        now = time.time()
+        with self.__lock:
+            entry = self.__entries.get(key)
+            if entry is None or entry[1] <= now:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.__entries.move_to_end(key)
+        credDict, _expiry, notAfter = entry
+        credDict = _copyCredentials(credDict)
+        if notAfter is not None and "secondsLeft" in credDict:
+            credDict["secondsLeft"] = max(0, int(notAfter - now))
+        return credDict
+
+    def add(self, key, credDict, secondsLeft=None):
+        """Cache the credentials, evicting the least recently used entries if needed
+
+        :param str key: key of the entry
+        :param dict credDict: credentials, stored as a copy
+        :param int secondsLeft: validity left of the chain the credentials come from, if any
+        """
+        if self.maxEntries <= 0:
+            return
+        now = time.time()
+        notAfter = None if secondsLeft is None else now + secondsLeft
+        expiry = now + self.lifetime if notAfter is None else min(now + self.lifetime, notAfter)
+        if expiry <= now:
+            return
+        credDict = _copyCredentials(credDict)
+        with self.__lock:
+            self.__entries.pop(key, None)
+            self.__entries[key] = (credDict, expiry, notAfter)
+            while len(self.__entries) > self.maxEntries:
+                self.__entries.popitem(last=False)
+
+    def clear(self):
+        """Remove all the entries"""
+        with self.__lock:
+            self.__entries.clear()
+
+    def getCounters(self):
+        """Get the usage counters of the cache"""
+        total = self.hits + self.misses
+        return {
+            "Hits": self.hits,
+            "Misses": self.misses,
+            "HitRate": float(self.hits) / total if total else 0.0,
+            "Entries": len(self.__entries),
+        }
+
+
+gCredentialsCache = CredentialsCache()
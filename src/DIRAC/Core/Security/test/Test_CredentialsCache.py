@@ -0,0 +1,56 @@
+""" Test of the cache of the credentials of the connecting peers
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import time
+
+from DIRAC.Core.Security.CredentialsCache import CredentialsCache, getChainKey
+
+
+def test_getChainKey():
+    assert getChainKey([b"cert1", b"cert2"]) == getChainKey([b"cert1", b"cert2"])
+    assert getChainKey([b"cert1", b"cert2"]) != getChainKey([b"cert2", b"cert1"])
+    assert getChainKey("-----BEGIN CERTIFICATE-----") == getChainKey([b"-----BEGIN CERTIFICATE-----"])
+
+
+def test_credentialsCache():
+    cache = CredentialsCache(maxEntries=2)
+    assert cache.get("chain1") is None
+    cache.add("chain1", {"DN": "/CN=user1", "secondsLeft": 3600, "groupProperties": ["NormalUser"]}, secondsLeft=3600)
+    cache.add("chain2", {"DN": "/CN=user2"})
+
+    credDict = cache.get("chain1")
+    assert credDict["DN"] == "/CN=user1"
+    assert 3590 < credDict["secondsLeft"] <= 3600
+    # The cached entry is not modified through the returned dict
+    credDict["groupProperties"].append("TrustedHost")
+    credDict["extraCredentials"] = "hosts"
+    credDict = cache.get("chain1")
+    assert credDict["groupProperties"] == ["NormalUser"]
+    assert "extraCredentials" not in credDict
+
+    # The least recently used entry is evicted
+    cache.add("chain3", {"DN": "/CN=user3"})
+    assert cache.get("chain2") is None
+    assert len(cache) == 2
+    assert cache.getCounters() == {"Hits": 2, "Misses": 2, "HitRate": 0.5, "Entries": 2}
+
+
+def test_expiry():
+    cache = CredentialsCache(lifetime=3600)
+    # Expired chains are not cached
+    cache.add("expired", {"DN": "/CN=user"}, secondsLeft=0)
+    assert len(cache) == 0
+    # The entries do not outlive the chain
+    cache.add("chain", {"DN": "/CN=user"}, secondsLeft=0.1)
+    assert cache.get("chain") is not None
+    time.sleep(0.2)
+    assert cache.get("chain") is None
+
+    # Disabled cache
+    cache = CredentialsCache(maxEntries=0)
+    cache.add("chain", {"DN": "/CN=user"})
+    assert cache.get("chain") is None
+    assert cache.getCounters()["Misses"] == 0
@@ -7,6 +7,10 @@
     KeepAlive lapse is also removed because managed by request,
     see https://requests.readthedocs.io/en/latest/user/advanced/#keep-alive
 
+    The requests are sent through persistent sessions, shared by all the clients of the process
+    (see :py:class:`SessionPool`), so that the connections, and their TLS handshake, are reused
+    from one call to the next.
+
     If necessary this class can be modified to define number of retry in requests, documentation does not give
     lot of informations but you can see this simple solution from StackOverflow.
     After some tests request seems to retry 3 times by default.
@@ -31,12 +35,16 @@ from __future__ import print_function
 __RCSID__ = "$Id$"
 
 from io import open
+import collections
 import errno
 import os
 import requests
 import six
 import tempfile
+import threading
+import time
 from http import HTTPStatus
+from six.moves.urllib.parse import urlparse
 
 
 from DIRAC import S_OK, S_ERROR, gLogger
@@ -54,6 +62,134 @@ from DIRAC.Core.Utilities.JEncode import decode, encode
 from DIRAC.Resources.IdProvider.IdProviderFactory import IdProviderFactory
 from DIRAC.FrameworkSystem.private.authorization.utils.Tokens import getLocalTokenDict, writeTokenDictToTokenFile
 
+
+class SessionPool(object):
+    """Thread safe pool of persistent requests sessions, keyed by the server and the credentials used.
+
+    Each session keeps alive its connections to the server, so that the TLS handshake is only done
+    when a new connection is needed. The number of sessions is bounded, the least recently used one
+    being closed when a new one is needed, and the sessions not used for a while are closed.
+    If the certificate or proxy file of a session changes, the session is rebuilt,
+    for the new credentials to be presented to the server.
+
+    A session obtained with :py:meth:`getSession` must be handed back with :py:meth:`releaseSession`
+    once the request is over: a session dropped from the pool while requests are still using it
+    is only closed at the end of the last of them.
+    """
+
+    def __init__(self, maxSessions=32, idleTimeout=300, maxConnections=10):
+        """
+        :param int maxSessions: maximum number of sessions. 0 disables the pool.
+        :param int idleTimeout: the sessions not used for that many seconds are closed
+        :param int maxConnections: maximum number of connections kept alive by each session
+        """
+        self.maxSessions = maxSessions
+        self.idleTimeout = idleTimeout
+        self.maxConnections = maxConnections
+        # key -> (session, credentials stamp, last use time)
+        self.__sessions = collections.OrderedDict()
+        # session -> number of requests using it
+        self.__inUse = {}
+        # sessions dropped from the pool, to be closed when their last request is over
+        self.__dropped = set()
+        self.__lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.__sessions)
+
+    @staticmethod
+    def __getCredentialsStamp(cert):
+        """Modification times of the files of the credentials, to notice their renewal"""
+        if not cert:
+            return None
+        stamp = []
+        for path in [cert] if isinstance(cert, six.string_types) else cert:
+            try:
+                stamp.append(os.stat(path).st_mtime)
+            except OSError:
+                stamp.append(None)
+        return tuple(stamp)
+
+    def getSession(self, url, cert=None, verify=True):
+        """Get the session to use for a request, to be handed back with :py:meth:`releaseSession`
+
+        :param str url: URL of the request
+        :param cert: certificate (and key) files of the request, as given to requests
+        :param verify: CA location or False, as given to requests
+
+        :return: a requests.Session, or None if the pool is disabled
+        """
+        if self.maxSessions <= 0:
+            return None
+        parsedURL = urlparse(url)
+        key = (parsedURL.scheme, parsedURL.netloc, cert if not isinstance(cert, list) else tuple(cert), verify)
+        stamp = self.__getCredentialsStamp(cert)
+        now = time.time()
+        toClose = []
+        with self.__lock:
+            for oldKey, (session, _stamp, lastUse) in list(self.__sessions.items()):
+                if lastUse + self.idleTimeout < now:
+                    toClose.append(self.__sessions.pop(oldKey)[0])
+            entry = self.__sessions.pop(key, None)
+            if entry and entry[1] != stamp:
+                toClose.append(entry[0])
+                entry = None
+            session = entry[0] if entry else self.__newSession()
+            self.__sessions[key] = (session, stamp, now)
+            while len(self.__sessions) > self.maxSessions:
+                toClose.append(self.__sessions.popitem(last=False)[1][0])
+            self.__inUse[session] = self.__inUse.get(session, 0) + 1
+            toClose = self.__drop(toClose)
+        for oldSession in toClose:
+            oldSession.close()
+        return session
+
+    def releaseSession(self, session):
+        """Hand back a session obtained with :py:meth:`getSession`, closing it if it was dropped from the pool
+
+        :param session: the session, None being ignored
+        """
+        if session is None:
+            return
+        with self.__lock:
+            users = self.__inUse.pop(session, 1) - 1
+            if users > 0:
+                self.__inUse[session] = users
+                return
+            if session not in self.__dropped:
+                return
+            self.__dropped.discard(session)
+        session.close()
+
+    def __drop(self, sessions):
+        """Keep the sessions removed from the pool while they are used. To be called with the lock held.
+
+        :return: the sessions which can be closed
+        """
+        toClose = []
+        for session in sessions:
+            if session in self.__inUse:
+                self.__dropped.add(session)
+            else:
+                toClose.append(session)
+        return toClose
+
+    def __newSession(self):
+        session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=self.maxConnections)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+
+    def clear(self):
+        """Close all the sessions, or when their last request is over for the ones being used"""
+        with self.__lock:
+            sessions = self.__drop([entry[0] for entry in self.__sessions.values()])
+            self.__sessions.clear()
+        for session in sessions:
+            session.close()
+
+
 # TODO CHRIS: refactor all the messy `discover` methods
 # I do not do it now because I want first to decide
 # whether we go with code copy of fatorization
@@ -65,6 +201,8 @@ class TornadoBaseClient(object):
     """
 
     __threadConfig = ThreadConfig()
+    # Sessions shared by all the clients of the process
+    sessionPool = SessionPool()
     VAL_EXTRA_CREDENTIALS_HOST = "hosts"
 
     KW_USE_ACCESS_TOKEN = "useAccessToken"
@@ -524,114 +662,129 @@ class TornadoBaseClient(object):
 
             verify = self.__ca_location
 
-        # getting certificate
-        # Do we use the server certificate ?
-        if self.kwargs[self.KW_USE_CERTIFICATES]:
-            auth = {"cert": Locations.getHostCertificateAndKeyLocation()}
-
-        # Use access token?
-        elif self.__useAccessToken:
-            # Read token from token environ variable or from token file
-            result = getLocalTokenDict()
-            if not result["OK"]:
-                return result
-            token = result["Value"]
-
-            # Check if access token expired
-            if token.is_expired():
-                if not token.get("refresh_token"):
-                    return S_ERROR("Access token expired.")
-
-                # Try to refresh token
-                self.__idp.scope = None
-                result = self.__idp.refreshToken(token["refresh_token"])
-                if result["OK"]:
-                    token = result["Value"]
-                    result = writeTokenDictToTokenFile(token)
+        tmpCert = None
+        session = None
+        try:
+            # getting certificate
+            # Do we use the server certificate ?
+            if self.kwargs[self.KW_USE_CERTIFICATES]:
+                auth = {"cert": Locations.getHostCertificateAndKeyLocation()}
+
+            # Use access token?
+            elif self.__useAccessToken:
+                # Read token from token environ variable or from token file
+                result = getLocalTokenDict()
                 if not result["OK"]:
                     return result
-                gLogger.notice("Token is saved in %s." % result["Value"])
-
-            auth = {"headers": {"Authorization": "Bearer %s" % token["access_token"]}}
-        elif self.kwargs.get(self.KW_PROXY_STRING):
-            tmpHandle, cert = tempfile.mkstemp()
-            fp = os.fdopen(tmpHandle, "wb")
-            fp.write(self.kwargs[self.KW_PROXY_STRING])
-            fp.close()
-
-        # CHRIS 04.02.21
-        # TODO: add proxyLocation check ?
-        else:
-            auth = {"cert": Locations.getProxyLocation()}
-            if not auth["cert"]:
-                gLogger.error("No proxy found")
-                return S_ERROR("No proxy found")
-
-        # We have a try/except for all the exceptions
-        # whose default behavior is to try again,
-        # maybe to different server
-        try:
-            # And we have a second block to handle specific exceptions
-            # which makes it not worth retrying
+                token = result["Value"]
+
+                # Check if access token expired
+                if token.is_expired():
+                    if not token.get("refresh_token"):
+                        return S_ERROR("Access token expired.")
+
+                    # Try to refresh token
+                    self.__idp.scope = None
+                    result = self.__idp.refreshToken(token["refresh_token"])
+                    if result["OK"]:
+                        token = result["Value"]
+                        result = writeTokenDictToTokenFile(token)
+                    if not result["OK"]:
+                        return result
+                    gLogger.notice("Token is saved in %s." % result["Value"])
+
+                auth = {"headers": {"Authorization": "Bearer %s" % token["access_token"]}}
+            elif self.kwargs.get(self.KW_PROXY_STRING):
+                tmpHandle, tmpCert = tempfile.mkstemp()
+                fp = os.fdopen(tmpHandle, "wb")
+                fp.write(self.kwargs[self.KW_PROXY_STRING])
+                fp.close()
+                auth = {"cert": tmpCert}
+
+            # CHRIS 04.02.21
+            # TODO: add proxyLocation check ?
+            else:
+                auth = {"cert": Locations.getProxyLocation()}
+                if not auth["cert"]:
+                    gLogger.error("No proxy found")
+                    return S_ERROR("No proxy found")
+
+            # The connections are reused from one call to the next through the session,
+            # except for the proxy strings, which are written in a different temporary file at each call
+            if not tmpCert:
+                session = self.sessionPool.getSession(url, cert=auth.get("cert"), verify=verify)
+            post = session.post if session else requests.post
+
+            # We have a try/except for all the exceptions
+            # whose default behavior is to try again,
+            # maybe to different server
             try:
-                rawText = None
-
-                # Default case, just return the result
-                if not outputFile:
-                    call = requests.post(url, data=kwargs, timeout=self.timeout, verify=verify, **auth)
-                    # raising the exception for status here
-                    # means essentialy that we are losing here the information of what is returned by the server
-                    # as error message, since it is not passed to the exception
-                    # However, we can store the text and return it raw as an error,
-                    # since there is no guarantee that it is any JEncoded text
-                    # Note that we would get an exception only if there is an exception on the server side which
-                    # is not handled.
-                    # Any standard S_ERROR will be transfered as an S_ERROR with a correct code.
-                    rawText = call.text
-                    call.raise_for_status()
-                    return decode(rawText)[0]
-                else:
-                    # Instruct the server not to encode the response
-                    kwargs["rawContent"] = True
-
+                # And we have a second block to handle specific exceptions
+                # which makes it not worth retrying
+                try:
                     rawText = None
-                    # Stream download
-                    # https://requests.readthedocs.io/en/latest/user/advanced/#body-content-workflow
-                    with requests.post(url, data=kwargs, timeout=self.timeout, verify=verify, stream=True, **auth) as r:
-                        rawText = r.text
-                        r.raise_for_status()
-
-                        with open(outputFile, "wb") as f:
-                            for chunk in r.iter_content(4096):
-                                # if chunk:  # filter out keep-alive new chuncks
-                                f.write(chunk)
-
-                        return S_OK()
-
-            # Some HTTPError are not worth retrying
-            except requests.exceptions.HTTPError as e:
-                status_code = e.response.status_code
-                if status_code == HTTPStatus.NOT_IMPLEMENTED:
-                    return S_ERROR(errno.ENOSYS, "%s is not implemented" % kwargs.get("method"))
-                elif status_code in (HTTPStatus.FORBIDDEN, HTTPStatus.UNAUTHORIZED):
-                    return S_ERROR(errno.EACCES, "No access to %s" % url)
-                elif status_code == HTTPStatus.NOT_FOUND:
-                    rawText = "%s is not found" % url
-
-                # if it is something else, retry
-                raise
-
-        # Whatever exception we have here, we deem worth retrying
-        except Exception as e:
-            # CHRIS TODO review this part: retry logic is fishy
-            # self.__bannedUrls is emptied in findServiceURLs
-            if url not in self.__bannedUrls:
-                self.__bannedUrls += [url]
-            if retry < self.__nbOfUrls - 1:
-                self._request(retry=retry + 1, outputFile=outputFile, **kwargs)
-
-            errStr = "%s: %s" % (str(e), rawText)
-            return S_ERROR(errStr)
+
+                    # Default case, just return the result
+                    if not outputFile:
+                        call = post(url, data=kwargs, timeout=self.timeout, verify=verify, **auth)
+                        # raising the exception for status here
+                        # means essentialy that we are losing here the information of what is returned by the server
+                        # as error message, since it is not passed to the exception
+                        # However, we can store the text and return it raw as an error,
+                        # since there is no guarantee that it is any JEncoded text
+                        # Note that we would get an exception only if there is an exception on the server side which
+                        # is not handled.
+                        # Any standard S_ERROR will be transfered as an S_ERROR with a correct code.
+                        rawText = call.text
+                        call.raise_for_status()
+                        return decode(rawText)[0]
+                    else:
+                        # Instruct the server not to encode the response
+                        kwargs["rawContent"] = True
+
+                        rawText = None
+                        # Stream download
+                        # https://requests.readthedocs.io/en/latest/user/advanced/#body-content-workflow
+                        with post(url, data=kwargs, timeout=self.timeout, verify=verify, stream=True, **auth) as r:
+                            rawText = r.text
+                            r.raise_for_status()
+
+                            with open(outputFile, "wb") as f:
+                                for chunk in r.iter_content(4096):
+                                    # if chunk:  # filter out keep-alive new chuncks
+                                    f.write(chunk)
+
+                            return S_OK()
+
+                # Some HTTPError are not worth retrying
+                except requests.exceptions.HTTPError as e:
+                    status_code = e.response.status_code
+                    if status_code == HTTPStatus.NOT_IMPLEMENTED:
+                        return S_ERROR(errno.ENOSYS, "%s is not implemented" % kwargs.get("method"))
+                    elif status_code in (HTTPStatus.FORBIDDEN, HTTPStatus.UNAUTHORIZED):
+                        return S_ERROR(errno.EACCES, "No access to %s" % url)
+                    elif status_code == HTTPStatus.NOT_FOUND:
+                        rawText = "%s is not found" % url
+
+                    # if it is something else, retry
+                    raise
+
+            # Whatever exception we have here, we deem worth retrying
+            except Exception as e:
+                # CHRIS TODO review this part: retry logic is fishy
+                # self.__bannedUrls is emptied in findServiceURLs
+                if url not in self.__bannedUrls:
+                    self.__bannedUrls += [url]
+                if retry < self.__nbOfUrls - 1:
+                    return self._request(retry=retry + 1, outputFile=outputFile, **kwargs)
+
+                errStr = "%s: %s" % (str(e), rawText)
+                return S_ERROR(errStr)
+
+        finally:
+            self.sessionPool.releaseSession(session)
+            if tmpCert:
+                os.unlink(tmpCert)
 
 
 # --- TODO ----
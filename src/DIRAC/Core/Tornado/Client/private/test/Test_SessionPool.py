@@ -0,0 +1,68 @@
+""" Unit tests for the pool of persistent sessions of the TornadoBaseClient
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+
+from DIRAC.Core.Tornado.Client.private.TornadoBaseClient import SessionPool
+
+
+def test_getSession(tmp_path):
+    proxy = tmp_path / "proxy"
+    proxy.write_text(u"proxy")
+    pool = SessionPool(maxSessions=2)
+
+    session = pool.getSession("https://server1:8443/Framework/Service", cert=str(proxy), verify="/ca")
+    # Same server and credentials, whatever the service
+    assert pool.getSession("https://server1:8443/Framework/Other", cert=str(proxy), verify="/ca") is session
+    assert pool.getSession("https://server1:8443/Framework/Service", cert=str(proxy), verify=False) is not session
+    assert len(pool) == 2
+
+    # The least recently used session is dropped
+    pool.getSession("https://server2:8443/Framework/Service", cert=str(proxy), verify="/ca")
+    assert len(pool) == 2
+    assert pool.getSession("https://server1:8443/Framework/Service", cert=str(proxy), verify="/ca") is not session
+    session = pool.getSession("https://server1:8443/Framework/Service", cert=str(proxy), verify="/ca")
+
+    # Renewed proxy
+    os.utime(str(proxy), (0, 0))
+    assert pool.getSession("https://server1:8443/Framework/Service", cert=str(proxy), verify="/ca") is not session
+
+    # Idle sessions
+    pool.idleTimeout = -1
+    pool.getSession("https://server1:8443/Framework/Service", cert=str(proxy), verify="/ca")
+    assert len(pool) == 1
+
+    pool.clear()
+    assert len(pool) == 0
+    assert SessionPool(maxSessions=0).getSession("https://server1:8443/Framework/Service") is None
+
+
+def test_releaseSession():
+    pool = SessionPool(maxSessions=1)
+    closed = []
+
+    session = pool.getSession("https://server1:8443/Framework/Service")
+    session.close = lambda: closed.append(session)
+    # Evicted while a request is using it: closed at the end of the request
+    other = pool.getSession("https://server2:8443/Framework/Service")
+    assert not closed
+    pool.releaseSession(session)
+    assert closed == [session]
+
+    # Used by two requests, dropped by clear
+    assert pool.getSession("https://server2:8443/Framework/Service") is other
+    other.close = lambda: closed.append(other)
+    pool.clear()
+    pool.releaseSession(other)
+    assert closed == [session]
+    pool.releaseSession(other)
+    assert closed == [session, other]
+
+    # A session released while in the pool stays open
+    session = pool.getSession("https://server1:8443/Framework/Service")
+    pool.releaseSession(session)
+    pool.releaseSession(None)
+    assert len(pool) == 1
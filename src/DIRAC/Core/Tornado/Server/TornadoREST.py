@@ -10,7 +10,6 @@ from __future__ import print_function
 __RCSID__ = "$Id$"
 
 from tornado import gen
-from tornado.ioloop import IOLoop
 
 from DIRAC import gLogger, S_OK
 from DIRAC.ConfigurationSystem.Client import PathFinder
@@ -120,7 +119,7 @@ class TornadoREST(BaseRequestHandler):  # pylint: disable=abstract-method
         """Method to handle incoming ``GET`` requests.
         Note that all the arguments are already prepared in the :py:meth:`.prepare` method.
         """
-        retVal = yield IOLoop.current().run_in_executor(*self._prepareExecutor(args))
+        retVal = yield self._executeMethod(args)
         self._finishFuture(retVal)
 
     @gen.coroutine
@@ -128,7 +127,7 @@ class TornadoREST(BaseRequestHandler):  # pylint: disable=abstract-method
         """Method to handle incoming ``POST`` requests.
         Note that all the arguments are already prepared in the :py:meth:`.prepare` method.
         """
-        retVal = yield IOLoop.current().run_in_executor(*self._prepareExecutor(args))
+        retVal = yield self._executeMethod(args)
         self._finishFuture(retVal)
 
     auth_echo = ["all"]
@@ -15,12 +15,12 @@ import os
 from datetime import datetime
 
 from tornado import gen
-from tornado.ioloop import IOLoop
 
 import DIRAC
 
 from DIRAC import gLogger, S_OK
 from DIRAC.Core.Utilities.JEncode import decode, encode
+from DIRAC.Core.Security.CredentialsCache import gCredentialsCache
 from DIRAC.Core.Tornado.Server.private.BaseRequestHandler import BaseRequestHandler
 from DIRAC.ConfigurationSystem.Client import PathFinder
 
@@ -200,14 +200,14 @@ class TornadoService(BaseRequestHandler):  # pylint: disable=abstract-method
               u'validDN': False,
               u'validGroup': False}}
         """
-        # Execute the method in an executor (basically a separate thread)
+        # Execute the method in the executor of the handler (basically a separate thread)
         # Because of that, we cannot calls certain methods like `self.write`
         # in _executeMethod. This is because these methods are not threadsafe
         # https://www.tornadoweb.org/en/branch5.1/web.html#thread-safety-notes
         # However, we can still rely on instance attributes to store what should
         # be sent back (reminder: there is an instance
         # of this class created for each request)
-        retVal = yield IOLoop.current().run_in_executor(*self._prepareExecutor(args))
+        retVal = yield self._executeMethod(args)
 
         # retVal is :py:class:`tornado.concurrent.Future`
         self._finishFuture(retVal)
@@ -251,6 +251,14 @@ class TornadoService(BaseRequestHandler):  # pylint: disable=abstract-method
             "elapsed real time": stTimes[4],
         }
 
+        # Histograms of the response times per method, and of the requests waiting for a thread
+        dInfo["response times"] = {"buckets": self.RESPONSE_TIME_BUCKETS, "methods": self._stats["responseTimes"]}
+        dInfo["waiting requests"] = {
+            "buckets": self.WAITING_REQUESTS_BUCKETS,
+            "counts": self._stats["waitingRequests"],
+        }
+        dInfo["credentials cache"] = gCredentialsCache.getCounters()
+
         return S_OK(dInfo)
 
     auth_echo = ["all"]
@@ -8,9 +8,11 @@ from __future__ import print_function
 __RCSID__ = "$Id$"
 
 import time
+import bisect
 import inspect
 import threading
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 
 from http import HTTPStatus
 from urllib.parse import unquote
@@ -20,6 +22,7 @@ import jwt
 import tornado
 from tornado.web import RequestHandler, HTTPError
 from tornado.concurrent import Future
+from tornado.ioloop import IOLoop
 
 import DIRAC
 
@@ -29,6 +32,7 @@ from DIRAC.Core.DISET.AuthManager import AuthManager
 from DIRAC.Core.Utilities.JEncode import decode, encode
 from DIRAC.Core.Utilities.ReturnValues import isReturnStructure
 from DIRAC.Core.Security.X509Chain import X509Chain  # pylint: disable=import-error
+from DIRAC.Core.Security.CredentialsCache import gCredentialsCache, getChainKey
 from DIRAC.FrameworkSystem.Client.MonitoringClient import MonitoringClient
 from DIRAC.Resources.IdProvider.Utilities import getProvidersForInstance
 
@@ -152,10 +156,17 @@ class BaseRequestHandler(RequestHandler):
           # https://www.tornadoweb.org/en/branch5.1/web.html#thread-safety-notes
           # However, we can still rely on instance attributes to store what should
           # be sent back (reminder: there is an instance of this class created for each request)
-          retVal = yield IOLoop.current().run_in_executor(*self._prepareExecutor(args))
+          retVal = yield self._executeMethod(args)
           # retVal is :py:class:`tornado.concurrent.Future`
           self._finishFuture(retVal)
 
+    The methods are executed in the executor of the handler, a pool of ``MaxThreads`` threads
+    (from the CS section of the service), or in the default executor of the IOLoop if not set.
+    When ``MaxWaitingPetitions`` requests are already waiting for a thread, the new requests are answered
+    with ``503 Service Unavailable`` and a ``Retry-After`` header, so that a busy service does not starve
+    the other services of the same server. The methods defined with ``async def`` are not
+    executed in a thread but awaited in the IOLoop, they must then not do any blocking call.
+
     For compatibility with the existing :py:class:`DIRAC.Core.DISET.TransferClient.TransferClient`,
     the handler can define a method ``export_streamToClient``. This is the method that will be called
     whenever ``TransferClient.receiveFile`` is called. It is the equivalent of the DISET
@@ -192,6 +203,30 @@ class BaseRequestHandler(RequestHandler):
     # Which grant type to use
     USE_AUTHZ_GRANTS = ["SSL", "JWT"]
 
+    # Executor of the methods, the default executor of the IOLoop if None
+    _executor = None
+    # Number of threads of the executor, if 0 the default executor of the IOLoop is used
+    _maxThreads = 0
+    # Maximum number of requests waiting for a thread, no limit if 0
+    _maxWaitingRequests = 0
+    # Number of requests being executed or waiting for a thread
+    _pendingRequests = 0
+    # Number of requests waiting for a thread of the executor
+    _waitingRequests = 0
+    # Lock of the numbers of waiting requests, updated by the IOLoop and by the threads of the executors
+    _waitingRequestsLock = threading.Lock()
+    # Seconds after which the clients are told to retry when the queue is full
+    RETRY_AFTER = 5
+
+    # Upper bounds of the buckets of the histograms of the response times (ms) and of the waiting requests
+    RESPONSE_TIME_BUCKETS = (10, 50, 100, 500, 1000, 5000, 10000)
+    WAITING_REQUESTS_BUCKETS = (0, 1, 5, 10, 50, 100)
+
+    # Result of the method, and whether the request is counted in the pending and waiting requests
+    result = None
+    __slotAcquired = False
+    __waitingThread = False
+
     @classmethod
     def _initMonitoring(cls, serviceName, fullUrl):
         """
@@ -218,15 +253,72 @@ class BaseRequestHandler(RequestHandler):
         cls._monitor.setComponentLocation(fullUrl)
 
         cls._monitor.registerActivity("Queries", "Queries served", "Framework", "queries", MonitoringClient.OP_RATE)
+        cls._monitor.registerActivity(
+            "PendingQueries", "Pending queries", "Framework", "queries", MonitoringClient.OP_MEAN
+        )
+        cls._monitor.registerActivity(
+            "ResponseTime", "Response time", "Framework", "milliseconds", MonitoringClient.OP_MEAN
+        )
 
         cls._monitor.setComponentExtraParam("DIRACVersion", DIRAC.version)
         cls._monitor.setComponentExtraParam("platform", DIRAC.getPlatform())
         cls._monitor.setComponentExtraParam("startTime", datetime.utcnow())
 
-        cls._stats = {"requests": 0, "monitorLastStatsUpdate": time.time()}
+        cls._stats = {
+            "requests": 0,
+            "monitorLastStatsUpdate": time.time(),
+            # Histogram of the response times, per method
+            "responseTimes": {},
+            # Histogram of the number of requests waiting for a thread, when a request arrives
+            "waitingRequests": [0] * (len(cls.WAITING_REQUESTS_BUCKETS) + 1),
+        }
 
         return S_OK()
 
+    @classmethod
+    def _initExecutor(cls):
+        """
+        Create the executor of the handler, from the ``MaxThreads`` and ``MaxWaitingPetitions``
+        options of the service. This has to be called only by :py:meth:`.__initializeService`
+        """
+        cls._pendingRequests = 0
+        cls._waitingRequests = 0
+        # The handlers without CS section keep the defaults
+        if cls._serviceInfoDict.get("csPaths"):
+            cls._maxThreads = max(0, int(cls.srv_getCSOption("MaxThreads", 0)))
+            cls._maxWaitingRequests = max(0, int(cls.srv_getCSOption("MaxWaitingPetitions", 0)))
+        if cls._maxThreads:
+            cls._executor = ThreadPoolExecutor(cls._maxThreads, thread_name_prefix=cls._serviceName)
+        sLog.info(
+            "Executor of %s" % cls._serviceName,
+            "%s threads, %s waiting requests" % (cls._maxThreads or "default", cls._maxWaitingRequests or "unlimited"),
+        )
+
+    @staticmethod
+    def _addToHistogram(histogram, buckets, value):
+        """Count a value in the bucket of the histogram it falls in, the last one being for the overflows
+
+        :param list histogram: counts of the buckets
+        :param tuple buckets: upper bounds of the buckets
+        :param value: value to count
+        """
+        histogram[bisect.bisect_left(buckets, value)] += 1
+
+    @classmethod
+    def _getWaitingRequests(cls):
+        """Number of requests waiting for a thread"""
+        return cls._waitingRequests
+
+    def __setWaitingThread(self, waiting):
+        """Count the request in the requests waiting for a thread of the executor, or stop counting it
+
+        :param bool waiting: whether the request waits for a thread
+        """
+        with self._waitingRequestsLock:
+            if self.__waitingThread != waiting:
+                self.__waitingThread = waiting
+                self.__class__._waitingRequests += 1 if waiting else -1
+
     @classmethod
     def _getServiceName(cls, request):
         """Search service name in request.
@@ -312,6 +404,8 @@ class BaseRequestHandler(RequestHandler):
 
             cls._serviceInfoDict = serviceInfo
 
+            cls._initExecutor()
+
             cls.__monitorLastStatsUpdate = time.time()
 
             # Some pre-initialization
@@ -456,6 +550,30 @@ class BaseRequestHandler(RequestHandler):
 
         self._prepare()
 
+        self._acquireSlot()
+
+    def _acquireSlot(self):
+        """Count the request in the requests of the handler, or answer ``503 Service Unavailable``
+        if too many requests are already waiting for a thread.
+        This is called in the IOLoop, so no lock is needed.
+        """
+        cls = self.__class__
+        waitingRequests = cls._getWaitingRequests()
+        self._addToHistogram(cls._stats["waitingRequests"], self.WAITING_REQUESTS_BUCKETS, waitingRequests)
+        self._monitor.addMark("PendingQueries", waitingRequests)
+        if cls._maxWaitingRequests and waitingRequests >= cls._maxWaitingRequests:
+            sLog.warn(
+                "Too many waiting requests, rejecting",
+                "%s %s: %s" % (self.srv_getFormattedRemoteCredentials(), self.mehtodName, waitingRequests),
+            )
+            self.set_status(HTTPStatus.SERVICE_UNAVAILABLE)
+            self.set_header("Retry-After", str(self.RETRY_AFTER))
+            # Finishing the request here prevents the HTTP method from being called
+            self.finish(encode(S_ERROR("Service busy, retry later")))
+            return
+        cls._pendingRequests += 1
+        self.__slotAcquired = True
+
     def _prepare(self):
         """
         Prepare the request. It reads certificates and check authorizations.
@@ -511,6 +629,7 @@ class BaseRequestHandler(RequestHandler):
             "Incoming request %s /%s: %s"
             % (self.srv_getFormattedRemoteCredentials(), self._serviceName, self.mehtodName)
         )
+        self.__setWaitingThread(False)
         # Execute
         try:
             self.initializeRequest()
@@ -519,6 +638,28 @@ class BaseRequestHandler(RequestHandler):
             sLog.exception("Exception serving request", "%s:%s" % (str(e), repr(e)))
             raise e if isinstance(e, HTTPError) else HTTPError(HTTPStatus.INTERNAL_SERVER_ERROR, str(e))
 
+    async def __executeCoroutine(self, targetMethod, args, kwargs):
+        """
+        Same as :py:meth:`.__executeMethod` for the methods defined with ``async def``,
+        which are awaited in the IOLoop instead of being executed in a thread
+
+        :param str targetMethod: name of the method to call
+        :param list args: target method arguments
+        :param dict kwargs: target method arguments
+
+        :return: result of the method
+        """
+        sLog.notice(
+            "Incoming request %s /%s: %s"
+            % (self.srv_getFormattedRemoteCredentials(), self._serviceName, self.mehtodName)
+        )
+        try:
+            self.initializeRequest()
+            return await targetMethod(*args, **kwargs)
+        except Exception as e:  # pylint: disable=broad-except
+            sLog.exception("Exception serving request", "%s:%s" % (str(e), repr(e)))
+            raise e if isinstance(e, HTTPError) else HTTPError(HTTPStatus.INTERNAL_SERVER_ERROR, str(e))
+
     def _prepareExecutor(self, args):
         """Preparation of necessary arguments for the `__executeMethod` method
 
@@ -527,7 +668,22 @@ class BaseRequestHandler(RequestHandler):
         :return: executor, target method with arguments
         """
         args, kwargs = self._getMethodArgs(args)
-        return None, partial(self.__executeMethod, self.methodObj, args, kwargs)
+        return self._executor, partial(self.__executeMethod, self.methodObj, args, kwargs)
+
+    def _executeMethod(self, args):
+        """Execute the method in the executor of the handler,
+        or in the IOLoop for the methods defined with ``async def``
+
+        :param list args: arguments passed to the `post`, `get`, etc. tornado methods
+
+        :return: awaitable
+        """
+        if inspect.iscoroutinefunction(self.methodObj):
+            args, kwargs = self._getMethodArgs(args)
+            return self.__executeCoroutine(self.methodObj, args, kwargs)
+        executor, targetMethod = self._prepareExecutor(args)
+        self.__setWaitingThread(True)
+        return IOLoop.current().run_in_executor(executor, targetMethod)
 
     def _finishFuture(self, retVal):
         """Handler Future result
@@ -588,6 +744,17 @@ class BaseRequestHandler(RequestHandler):
         elapsedTime = 1000.0 * self.request.request_time()
         credentials = self.srv_getFormattedRemoteCredentials()
 
+        # The method may not have been executed
+        self.__setWaitingThread(False)
+        if self.__slotAcquired:
+            self.__class__._pendingRequests -= 1
+            self.__slotAcquired = False
+            histogram = self._stats["responseTimes"].setdefault(
+                self.mehtodName, [0] * (len(self.RESPONSE_TIME_BUCKETS) + 1)
+            )
+            self._addToHistogram(histogram, self.RESPONSE_TIME_BUCKETS, elapsedTime)
+            self._monitor.addMark("ResponseTime", elapsedTime)
+
         argsString = f"OK {self._status_code}"
         # Finish with DIRAC result
         if isReturnStructure(self.result):
@@ -647,16 +814,21 @@ class BaseRequestHandler(RequestHandler):
         else:
             return S_ERROR(DErrno.ECERTFIND, "Valid certificate not found.")
 
-        # Load full certificate chain
-        peerChain = X509Chain()
-        peerChain.loadChainFromString(chainAsText)
-
-        # Retrieve the credentials
-        res = peerChain.getCredentials(withRegistryInfo=False)
-        if not res["OK"]:
-            return res
-
-        credDict = res["Value"]
+        # The credentials of the chains already seen are cached
+        chainKey = getChainKey(chainAsText)
+        credDict = gCredentialsCache.get(chainKey)
+        if credDict is None:
+            # Load full certificate chain
+            peerChain = X509Chain()
+            peerChain.loadChainFromString(chainAsText)
+
+            # Retrieve the credentials
+            res = peerChain.getCredentials(withRegistryInfo=False)
+            if not res["OK"]:
+                return res
+
+            credDict = res["Value"]
+            gCredentialsCache.add(chainKey, credDict, secondsLeft=credDict["secondsLeft"])
 
         # We check if client sends extra credentials...
         if "extraCredentials" in self.request.arguments:
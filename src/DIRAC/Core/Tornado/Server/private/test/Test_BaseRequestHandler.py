@@ -0,0 +1,135 @@
+""" Unit tests of the accounting of the requests of the BaseRequestHandler: waiting requests and 503 answers
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from mock import MagicMock
+
+from DIRAC import S_OK
+from DIRAC.Core.Tornado.Server.private.BaseRequestHandler import BaseRequestHandler
+
+started = threading.Semaphore(0)
+release = threading.Event()
+
+
+class Handler(BaseRequestHandler):
+    _serviceName = "Framework/Test"
+    _maxWaitingRequests = 2
+
+    def _getMethodArgs(self, args):
+        return args, {}
+
+    def export_block(self):
+        started.release()
+        release.wait(10)
+        return S_OK()
+
+
+def makeHandler():
+    """A handler of a request, without application nor connection"""
+    handler = Handler.__new__(Handler)
+    handler.mehtodName = "block"
+    handler.methodObj = handler.export_block
+    handler.credDict = {}
+    handler.request = MagicMock(remote_ip="127.0.0.1")
+    handler.request.request_time.return_value = 0.2
+    handler._status_code = 200
+    handler._reason = "OK"
+    handler.initializeRequest = MagicMock()
+    handler.set_status = MagicMock()
+    handler.set_header = MagicMock()
+    handler.finish = MagicMock()
+    return handler
+
+
+def setupHandler(executor):
+    Handler._executor = executor
+    Handler._monitor = MagicMock()
+    Handler._stats = {"responseTimes": {}, "waitingRequests": [0] * (len(Handler.WAITING_REQUESTS_BUCKETS) + 1)}
+    Handler._pendingRequests = 0
+    Handler._waitingRequests = 0
+    release.clear()
+
+
+def test_acquireSlot():
+    setupHandler(None)
+    Handler._waitingRequests = 2
+
+    # Too many requests waiting for a thread
+    handler = makeHandler()
+    handler._acquireSlot()
+    handler.set_status.assert_called_once_with(503)
+    handler.set_header.assert_called_once_with("Retry-After", str(Handler.RETRY_AFTER))
+    handler.finish.assert_called_once()
+    assert Handler._pendingRequests == 0
+    handler.on_finish()
+    assert Handler._pendingRequests == 0
+    assert Handler._waitingRequests == 2
+    assert not Handler._stats["responseTimes"]
+
+    Handler._waitingRequests = 1
+    handler = makeHandler()
+    handler._acquireSlot()
+    handler.set_status.assert_not_called()
+    handler.finish.assert_not_called()
+    assert Handler._pendingRequests == 1
+    handler.on_finish()
+    handler.on_finish()
+    assert Handler._pendingRequests == 0
+    assert sum(Handler._stats["responseTimes"]["block"]) == 1
+    assert Handler._stats["waitingRequests"][1:3] == [1, 1]
+
+
+def runRequests(numRequests, numRunning):
+    """Execute requests blocking until released, and check the waiting requests once numRunning are running
+
+    :return: handlers of the requests, and of a last request, sent while the others wait
+    """
+
+    async def run():
+        handlers = [makeHandler() for _ in range(numRequests)]
+        for handler in handlers:
+            handler._acquireSlot()
+        futures = [handler._executeMethod([]) for handler in handlers]
+        for _ in range(numRunning):
+            assert await asyncio.get_running_loop().run_in_executor(None, started.acquire, True, 10)
+        assert Handler._getWaitingRequests() == numRequests - numRunning
+        assert Handler._pendingRequests == numRequests
+
+        lastHandler = makeHandler()
+        lastHandler._acquireSlot()
+        release.set()
+        for handler, future in zip(handlers, futures):
+            assert (await future)["OK"]
+            handler.on_finish()
+        lastHandler.on_finish()
+        for _ in range(numRequests - numRunning):
+            started.acquire()
+        return handlers, lastHandler
+
+    return asyncio.run(run())
+
+
+def test_waitingRequests():
+    # Only the requests waiting for one of the threads are counted
+    setupHandler(ThreadPoolExecutor(1))
+    handlers, lastHandler = runRequests(3, 1)
+    for handler in handlers:
+        handler.set_status.assert_not_called()
+    lastHandler.set_status.assert_called_once_with(503)
+    assert Handler._getWaitingRequests() == 0
+    assert Handler._pendingRequests == 0
+
+
+def test_waitingRequestsDefaultExecutor():
+    # The requests running in the default executor are not waiting
+    setupHandler(None)
+    handlers, lastHandler = runRequests(3, 3)
+    lastHandler.set_status.assert_not_called()
+    assert Handler._getWaitingRequests() == 0
+    assert Handler._pendingRequests == 0
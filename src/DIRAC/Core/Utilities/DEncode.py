@@ -227,14 +227,29 @@ _dateTimeType = type(_dateTimeObject)
 _dateType = type(_dateTimeObject.date())
 _timeType = type(_dateTimeObject.time())
 
+# The encoding functions append to a bytearray that grows in place,
+# instead of collecting small strings to be joined at the end.
+# The decoding functions are indexed by the byte value of the type marker.
 g_dEncodeFunctions = {}
 g_dDecodeFunctions = {}
 
+# Byte values of the markers the decoders compare against
+_endMarker = _ord("e")
+_stringMarker = _ord("s")
+_intMarker = _ord("i")
+_dateTimeMarker = _ord("a")
+_dateMarker = _ord("d")
+_timeMarker = _ord("t")
+
+# Strings bigger than this are decoded straight from a memoryview over the
+# received buffer, instead of going through an intermediate bytes slice
+ZERO_COPY_THRESHOLD = 4096
+
 
 def encodeInt(iValue, eList):
     """Encoding ints"""
 
-    eList.extend((b"i", str(iValue).encode(), b"e"))
+    eList += b"i%de" % iValue
 
 
 def decodeInt(data, i):
@@ -254,7 +269,7 @@ def encodeLong(iValue, eList):
     """Encoding longs"""
 
     # corrected by KGG   eList.extend( ( "l", str( iValue ), "e" ) )
-    eList.extend((b"I", str(iValue).encode(), b"e"))
+    eList += b"I%de" % iValue
 
 
 def decodeLong(data, i):
@@ -272,7 +287,7 @@ g_dDecodeFunctions[_ord("I")] = decodeLong
 def encodeFloat(iValue, eList):
     """Encoding floats"""
 
-    eList.extend((b"f", str(iValue).encode(), b"e"))
+    eList += ("f%se" % iValue).encode()
 
 
 def decodeFloat(data, i):
@@ -297,9 +312,9 @@ def encodeBool(bValue, eList):
     """Encoding booleans"""
 
     if bValue:
-        eList.append(b"b1")
+        eList += b"b1"
     else:
-        eList.append(b"b0")
+        eList += b"b0"
 
 
 def decodeBool(data, i):
@@ -319,19 +334,20 @@ def encodeString(sValue, eList):
     """Encoding strings"""
     if not isinstance(sValue, bytes):
         sValue = sValue.encode()
-    eList.extend((b"s", str(len(sValue)).encode(), b":", sValue))
+    eList += b"s%d:" % len(sValue)
+    eList += sValue
 
 
 def decodeString(data, i):
     """Decoding strings"""
     i += 1
     colon = data.index(b":", i)
-    value = int(data[i:colon].decode())
+    value = int(data[i:colon])
     colon += 1
     end = colon + value
-    retVal = data[colon:end]
-    retVal = retVal.decode(errors="surrogateescape")
-    return (retVal, end)
+    if value > ZERO_COPY_THRESHOLD:
+        return (str(memoryview(data)[colon:end], "utf-8", "surrogateescape"), end)
+    return (data[colon:end].decode(errors="surrogateescape"), end)
 
 
 g_dEncodeFunctions[types.StringType] = encodeString
@@ -342,7 +358,8 @@ g_dDecodeFunctions[_ord("s")] = decodeString
 def encodeUnicode(sValue, eList):
     """Encoding unicode strings"""
     valueStr = sValue.encode("utf-8")
-    eList.extend((b"u", str(len(valueStr)).encode(), b":", valueStr))
+    eList += b"u%d:" % len(valueStr)
+    eList += valueStr
 
 
 def decodeUnicode(data, i):
@@ -373,17 +390,17 @@ def encodeDateTime(oValue, eList):
             oValue.microsecond,
             oValue.tzinfo,
         )
-        eList.append(b"za")
+        eList += b"za"
         # corrected by KGG encode( tDateTime, eList )
         g_dEncodeFunctions[type(tDateTime)](tDateTime, eList)
     elif isinstance(oValue, _dateType):
         tData = (oValue.year, oValue.month, oValue.day)
-        eList.append(b"zd")
+        eList += b"zd"
         # corrected by KGG encode( tData, eList )
         g_dEncodeFunctions[type(tData)](tData, eList)
     elif isinstance(oValue, _timeType):
         tTime = (oValue.hour, oValue.minute, oValue.second, oValue.microsecond, oValue.tzinfo)
-        eList.append(b"zt")
+        eList += b"zt"
         # corrected by KGG encode( tTime, eList )
         g_dEncodeFunctions[type(tTime)](tTime, eList)
     else:
@@ -397,11 +414,11 @@ def decodeDateTime(data, i):
     dataType = data[i]
     # corrected by KGG tupleObject, i = decode( data, i + 1 )
     tupleObject, i = g_dDecodeFunctions[data[i + 1]](data, i + 1)
-    if dataType == _ord("a"):
+    if dataType == _dateTimeMarker:
         dtObject = datetime.datetime(*tupleObject)
-    elif dataType == _ord("d"):
+    elif dataType == _dateMarker:
         dtObject = datetime.date(*tupleObject)
-    elif dataType == _ord("t"):
+    elif dataType == _timeMarker:
         dtObject = datetime.time(*tupleObject)
     else:
         raise Exception("Unexpected type %s while decoding a datetime object" % dataType)
@@ -417,7 +434,7 @@ g_dDecodeFunctions[_ord("z")] = decodeDateTime
 def encodeNone(_oValue, eList):
     """Encoding None"""
 
-    eList.append(b"n")
+    eList += b"n"
 
 
 def decodeNone(_data, i):
@@ -430,23 +447,59 @@ g_dEncodeFunctions[types.NoneType] = encodeNone
 g_dDecodeFunctions[_ord("n")] = decodeNone
 
 
+def _encodeItems(iterable, eList):
+    """Encode a sequence of objects one after the other.
+    Strings and ints, by far the most common items, are encoded inline
+    to save a function call per item.
+    """
+    encodeFunctions = g_dEncodeFunctions
+    for uObject in iterable:
+        oType = type(uObject)
+        if oType is str:
+            uObject = uObject.encode()
+            eList += b"s%d:" % len(uObject)
+            eList += uObject
+        elif oType is int:
+            eList += b"i%de" % uObject
+        else:
+            encodeFunctions[oType](uObject, eList)
+
+
 def encodeList(lValue, eList):
     """Encoding list"""
 
-    eList.append(b"l")
-    for uObject in lValue:
-        g_dEncodeFunctions[type(uObject)](uObject, eList)
-    eList.append(b"e")
+    eList += b"l"
+    _encodeItems(lValue, eList)
+    eList += b"e"
 
 
 def decodeList(data, i):
     """Decoding list"""
 
     oL = []
+    append = oL.append
+    index = data.index
+    decodeFunctions = g_dDecodeFunctions
     i += 1
-    while data[i] != _ord("e"):
-        ob, i = g_dDecodeFunctions[data[i]](data, i)
-        oL.append(ob)
+    typeId = data[i]
+    while typeId != _endMarker:
+        # Short strings and ints are decoded inline, saving a function call per item
+        if typeId == _stringMarker:
+            colon = index(b":", i + 1)
+            end = colon + 1 + int(data[i + 1 : colon])
+            if end - colon > ZERO_COPY_THRESHOLD:
+                ob, i = decodeString(data, i)
+            else:
+                ob = data[colon + 1 : end].decode(errors="surrogateescape")
+                i = end
+        elif typeId == _intMarker:
+            end = index(b"e", i + 1)
+            ob = int(data[i + 1 : end])
+            i = end + 1
+        else:
+            ob, i = decodeFunctions[typeId](data, i)
+        append(ob)
+        typeId = data[i]
     return (oL, i + 1)
 
 
@@ -460,10 +513,9 @@ def encodeTuple(lValue, eList):
     if DIRAC_DEBUG_DENCODE_CALLSTACK:
         printDebugCallstack("Encoding tuples")
 
-    eList.append(b"t")
-    for uObject in lValue:
-        g_dEncodeFunctions[type(uObject)](uObject, eList)
-    eList.append(b"e")
+    eList += b"t"
+    _encodeItems(lValue, eList)
+    eList += b"e"
 
 
 def decodeTuple(data, i):
@@ -488,27 +540,60 @@ def encodeDict(dValue, eList):
         if any([isinstance(x, six.integer_types + (float,)) for x in dValue]):
             printDebugCallstack("Encoding dict with numeric keys")
 
-    eList.append(b"d")
-    for key in dValue:
-        g_dEncodeFunctions[type(key)](key, eList)
-        g_dEncodeFunctions[type(dValue[key])](dValue[key], eList)
-    eList.append(b"e")
+    eList += b"d"
+    encodeFunctions = g_dEncodeFunctions
+    for key, value in dValue.items():
+        # Keys are most of the time strings: encode them inline
+        if type(key) is str:
+            key = key.encode()
+            eList += b"s%d:" % len(key)
+            eList += key
+        else:
+            encodeFunctions[type(key)](key, eList)
+        encodeFunctions[type(value)](value, eList)
+    eList += b"e"
 
 
 def decodeDict(data, i):
     """Decoding dictionary"""
 
     oD = {}
+    index = data.index
+    decodeFunctions = g_dDecodeFunctions
     i += 1
-    while data[i] != _ord("e"):
+    while data[i] != _endMarker:
 
         if DIRAC_DEBUG_DENCODE_CALLSTACK:
             # If we have numbers as keys
             if data[i] in (_ord("i"), _ord("I"), _ord("f")):
                 printDebugCallstack("Decoding dict with numeric keys")
 
-        k, i = g_dDecodeFunctions[data[i]](data, i)
-        oD[k], i = g_dDecodeFunctions[data[i]](data, i)
+        # Keys are most of the time short strings, and values strings or ints: decode them inline
+        if data[i] == _stringMarker:
+            colon = index(b":", i + 1)
+            end = colon + 1 + int(data[i + 1 : colon])
+            if end - colon > ZERO_COPY_THRESHOLD:
+                k, i = decodeString(data, i)
+            else:
+                k = data[colon + 1 : end].decode(errors="surrogateescape")
+                i = end
+        else:
+            k, i = decodeFunctions[data[i]](data, i)
+        typeId = data[i]
+        if typeId == _stringMarker:
+            colon = index(b":", i + 1)
+            end = colon + 1 + int(data[i + 1 : colon])
+            if end - colon > ZERO_COPY_THRESHOLD:
+                oD[k], i = decodeString(data, i)
+            else:
+                oD[k] = data[colon + 1 : end].decode(errors="surrogateescape")
+                i = end
+        elif typeId == _intMarker:
+            end = index(b"e", i + 1)
+            oD[k] = int(data[i + 1 : end])
+            i = end + 1
+        else:
+            oD[k], i = decodeFunctions[typeId](data, i)
     return (oD, i + 1)
 
 
@@ -519,22 +604,86 @@ g_dDecodeFunctions[_ord("d")] = decodeDict
 # Encode function
 def encode(uObject):
     """Generic encoding function"""
-    eList = []
+    eList = bytearray()
     # print("ENCODE FUNCTION : %s" % g_dEncodeFunctions[ type( uObject ) ])
     g_dEncodeFunctions[type(uObject)](uObject, eList)
-    return b"".join(eList)
+    return bytes(eList)
 
 
 def decode(data):
-    """Generic decoding function"""
+    """Generic decoding function
+
+    :param data: encoded data, as bytes or bytearray
+
+    :return: the decoded object, encoded object length
+    """
     if not data:
         return data
     # print("DECODE FUNCTION : %s" % g_dDecodeFunctions[ sStream [ iIndex ] ])
-    if not isinstance(data, bytes):
+    if not isinstance(data, (bytes, bytearray)):
         raise NotImplementedError("This should never happen")
     return g_dDecodeFunctions[data[0]](data, 0)
 
 
+class IncrementalDecoder(object):
+    """Assembles an encoded message of known size from the chunks read on the wire.
+
+    The chunks are copied once into a buffer allocated upfront for the whole message,
+    which is then decoded in place::
+
+      decoder = IncrementalDecoder(msgSize)
+      while not decoder.isComplete():
+        leftOver = decoder.feed(readChunk())
+      obj, length = decoder.decode()
+    """
+
+    def __init__(self, size):
+        """c'tor
+
+        :param int size: size in bytes of the encoded message
+        """
+        self.size = size
+        self.received = 0
+        self.__buffer = bytearray(size)
+        self.__view = memoryview(self.__buffer)
+
+    def isComplete(self):
+        """Whether the whole message was received"""
+        return self.received >= self.size
+
+    def missing(self):
+        """Number of bytes still expected"""
+        return self.size - self.received
+
+    def feed(self, chunk):
+        """Add a chunk of data to the message
+
+        :param bytes chunk: data read from the wire
+
+        :return: the part of the chunk that goes beyond the end of the message (bytes)
+        """
+        toCopy = min(len(chunk), self.size - self.received)
+        self.__view[self.received : self.received + toCopy] = memoryview(chunk)[:toCopy]
+        self.received += toCopy
+        return chunk[toCopy:]
+
+    def getData(self):
+        """Returns the buffer holding the encoded message
+
+        :return: bytearray
+        """
+        return self.__buffer
+
+    def decode(self):
+        """Decode the message once complete
+
+        :return: the decoded object, encoded object length
+        """
+        if not self.isComplete():
+            raise ValueError("Message incomplete: %s bytes missing" % self.missing())
+        return decode(self.__buffer)
+
+
 if __name__ == "__main__":
     gObject = {2: "3", True: (3, None), 2.0 * 10 ** 20: 2.0 * 10 ** -10}
     print("Initial: %s" % gObject)
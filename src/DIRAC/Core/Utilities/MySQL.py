@@ -1,18 +1,17 @@
 """ DIRAC Basic MySQL Class
     It provides access to the basic MySQL methods in a multithread-safe mode
-    keeping used connections in a python Queue for further reuse.
+    keeping used connections in a bounded pool (one per DB) for further reuse.
 
     These are the coded methods:
 
 
-    __init__( host, user, passwd, name, [maxConnsInQueue=10] )
+    __init__( host, user, passwd, name, [port=3306], [debug=False], [maxConnections=100] )
 
-    Initializes the Queue and tries to connect to the DB server,
+    Initializes the connection pool and tries to connect to the DB server,
     using the _connect method.
-    "maxConnsInQueue" defines the size of the Queue of open connections
-    that are kept for reuse. It also defined the maximum number of open
-    connections available from the object.
-    maxConnsInQueue = 0 means unlimited and it is not supported.
+    "maxConnections" defines the maximum number of open connections to the DB,
+    shared by all the MySQL objects of the process connecting to the same DB.
+    When they are all in use, threads wait for one to be released.
 
 
     _except( methodName, exception, errorMessage )
@@ -29,24 +28,27 @@
     Returns S_OK or S_ERROR.
 
 
-    _query( cmd, [conn] )
+    _query( cmd, [conn], [args] )
 
     Executes SQL command "cmd".
-    Gets a connection from the Queue (or open a new one if none is available),
-    the used connection is  back into the Queue.
-    If a connection to the the DB is passed as second argument this connection
-    is used and is not  in the Queue.
+    Gets a connection from the pool (or open a new one if none is available),
+    the used connection is put back into the pool, unless the thread holds it.
     Returns S_OK with fetchall() out in Value or S_ERROR upon failure.
 
 
-    _update( cmd, [conn] )
+    _update( cmd, [conn], [args] )
 
     Executes SQL command "cmd" and issue a commit
-    Gets a connection from the Queue (or open a new one if none is available),
-    the used connection is  back into the Queue.
-    If a connection to the the DB is passed as second argument this connection
-    is used and is not  in the Queue
+    Gets a connection from the pool (or open a new one if none is available),
+    the used connection is put back into the pool, unless the thread holds it.
     Returns S_OK with number of updated registers in Value or S_ERROR upon failure.
+    For both, if "args" is given, the values in it are passed as parameters of the
+    command, to replace its %s placeholders (see _bindValues).
+
+
+    _updateMany( cmd, argsList, [conn] )
+
+    Executes SQL command "cmd" once for each parameters sequence of "argsList" (executemany).
 
 
     _createTables( tableDict )
@@ -56,10 +58,17 @@
 
     _getConnection()
 
-    Gets a connection from the Queue (or open a new one if none is available)
+    Gets the connection of the current thread from the pool (or open a new one if none is available)
     Returns S_OK with connection in Value or S_ERROR
-    the calling method is responsible for closing this connection once it is no
-    longer needed.
+    The connection stays with the calling thread until it dies.
+    With sticky=False, the connection must instead be handed back with _releaseConnection()
+    once it is no longer needed.
+
+
+    getConnectionPoolStats()
+
+    Returns S_OK with the usage counters of the connection pool: size, checkout wait time,
+    number of pings and of reconnections...
 
 
 
@@ -90,6 +99,14 @@
       String type values will be appropriately escaped.
 
 
+    insertFieldsBulk( self, tableName, fields, rows, chunkSize = 1000, conn = None ):
+
+      Insert the rows (tuples of values) in "tableName" assigning their values to the
+      fields "fields", with multi-row INSERT statements of at most chunkSize rows.
+      Values are passed to MySQL as parameters of the statements. The statements are
+      executed in a single transaction: either all the rows are inserted or none.
+
+
     updateFields( self, tableName, updateFields = None, updateValues = None,
                   condDict = None,
                   limit = False, conn = None,
@@ -167,6 +184,14 @@ __RCSID__ = "$Id$"
 
 MAXCONNECTRETRY = 10
 RETRY_SLEEP_DURATION = 5
+# Maximum number of connections opened to one database by a process
+MAXCONNECTIONS = 100
+# A connection not used for that many seconds is pinged before being used again
+PING_INTERVAL = 30
+# Maximum time to wait for a free connection when the pool is full
+CHECKOUT_TIMEOUT = 60
+# Errors meaning that the connection to the server is lost: server gone away, lost connection...
+CONNECTION_LOST_ERRORS = (2006, 2013, 2055)
 
 
 def _checkFields(inFields, inValues):
@@ -206,28 +231,84 @@ def _quotedList(fieldList=None):
     return ", ".join(quotedFields)
 
 
+class _Lease(object):
+    """
+    A connection checked out by a thread
+    """
+
+    __slots__ = ("conn", "lastUsed", "refCount", "sticky", "inTransaction")
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.lastUsed = time.time()
+        # Number of scoped checkouts (_query, _update...) currently using the connection
+        self.refCount = 0
+        # Connection given away by _getConnection: it stays with the thread until it dies
+        self.sticky = False
+        # A transaction is open: the connection is pinned to the thread until commit/rollback
+        self.inTransaction = False
+
+    def isBusy(self):
+        return self.refCount > 0 or self.inTransaction
+
+
 class ConnectionPool(object):
     """
-    Management of connections per thread
+    Bounded pool of connections to one database
+
+    Threads check connections out and back in:
+
+    * scoped checkouts, used by the MySQL methods themselves, are checked back in
+      as soon as the query is executed, so that handler threads share few connections
+    * connections returned by MySQL._getConnection stay with the thread that asked for it,
+      until the thread dies: the thread may still hold the connection object
+    * a transaction pins the connection to its thread until commit or rollback
+
+    A connection is only pinged when it was not used for longer than pingInterval, so a connection
+    found broken while executing a statement must be discarded (see :py:meth:`discard`).
+    A connection lost in the middle of a transaction is never replaced: the transaction fails.
+    When all maxConnections connections are checked out, the connections of the dead threads
+    are reclaimed, and threads wait at most checkoutTimeout seconds for one to be checked in.
     """
 
-    def __init__(self, host, user, passwd, port=3306, graceTime=600):
+    def __init__(
+        self,
+        host,
+        user,
+        passwd,
+        port=3306,
+        dbName="",
+        graceTime=600,
+        maxConnections=MAXCONNECTIONS,
+        pingInterval=PING_INTERVAL,
+        checkoutTimeout=CHECKOUT_TIMEOUT,
+    ):
         self.__host = host
         self.__user = user
         self.__passwd = passwd
         self.__port = port
+        self.__dbName = dbName
         self.__graceTime = graceTime
-        self.__spares = collections.deque()
-        self.__maxSpares = 10
-        self.__lastClean = 0
+        self.__maxConnections = max(1, maxConnections)
+        self.__pingInterval = pingInterval
+        self.__checkoutTimeout = checkoutTimeout
+        self.__lock = threading.Condition()
+        # Checked in connections, as (connection, last used time), most recently used last
+        self.__idle = collections.deque()
         self.__assigned = {}
+        # Number of open connections, idle or assigned, including the ones being opened
+        self.__size = 0
+        self.__lastClean = 0
+        self.__stats = collections.Counter()
 
     @property
     def __thid(self):
         return threading.current_thread()
 
     def __newConn(self):
-        conn = MySQLdb.connect(host=self.__host, port=self.__port, user=self.__user, passwd=self.__passwd)
+        conn = MySQLdb.connect(
+            host=self.__host, port=self.__port, user=self.__user, passwd=self.__passwd, db=self.__dbName
+        )
 
         self.__execute(conn, "SET AUTOCOMMIT=1")
         return conn
@@ -239,131 +320,258 @@ class ConnectionPool(object):
         cursor.close()
         return res
 
-    def get(self, dbName, retries=10):
-        retries = max(0, min(MAXCONNECTRETRY, retries))
-        self.clean()
-        return self.__getWithRetry(dbName, retries, retries)
+    def __connect(self, retries):
+        """Open a new connection, retrying with increasing sleep times"""
+        for attempt in range(retries + 1):
+            if attempt:
+                time.sleep(RETRY_SLEEP_DURATION * attempt)
+            try:
+                return S_OK(self.__newConn())
+            except MySQLdb.MySQLError as excp:
+                error = excp
+        return S_ERROR(DErrno.EMYSQL, "Could not connect: %s" % error)
 
-    def __getWithRetry(self, dbName, totalRetries, retriesLeft):
-        sleepTime = RETRY_SLEEP_DURATION * (totalRetries - retriesLeft)
-        if sleepTime > 0:
-            time.sleep(sleepTime)
+    def __close(self, conn):
         try:
-            conn, lastName, thid = self.__innerGet()
-        except MySQLdb.MySQLError as excp:
-            if retriesLeft > 0:
-                return self.__getWithRetry(dbName, totalRetries, retriesLeft - 1)
-            return S_ERROR(DErrno.EMYSQL, "Could not connect: %s" % excp)
+            conn.close()
+        except MySQLdb.ProgrammingError as exc:
+            gLogger.warn("ProgrammingError exception while closing MySQL connection: %s" % exc)
+        except Exception as exc:
+            gLogger.warn("Exception while closing MySQL connection: %s" % exc)
 
-        if not self.__ping(conn):
-            try:
-                self.__assigned.pop(thid)
-            except KeyError:
-                pass
-            if retriesLeft > 0:
-                return self.__getWithRetry(dbName, totalRetries, retriesLeft)
-            return S_ERROR(DErrno.EMYSQL, "Could not connect")
-
-        if lastName != dbName:
-            try:
-                conn.select_db(dbName)
-            except MySQLdb.MySQLError as excp:
-                if retriesLeft > 0:
-                    return self.__getWithRetry(dbName, totalRetries, retriesLeft - 1)
-                return S_ERROR(DErrno.EMYSQL, "Could not select db %s: %s" % (dbName, excp))
-            try:
-                self.__assigned[thid][1] = dbName
-            except KeyError:
-                if retriesLeft > 0:
-                    return self.__getWithRetry(dbName, totalRetries, retriesLeft - 1)
-                return S_ERROR(DErrno.EMYSQL, "Could not connect")
-        return S_OK(conn)
-
-    def __ping(self, conn):
+    def __isAlive(self, conn, lastUsed, now):
+        """Ping the connection if it was not used for a while"""
+        if not getattr(conn, "open", True):
+            # Closed by the client
+            return False
+        if now - lastUsed < self.__pingInterval:
+            return True
+        self.__stats["Pings"] += 1
         try:
-            conn.ping(True)
+            conn.ping()
             return True
         except Exception:
             return False
 
-    def __innerGet(self):
-        thid = self.__thid
-        now = time.time()
-        if thid in self.__assigned:
-            data = self.__assigned[thid]
-            conn = data[0]
-            data[2] = now
-            return data[0], data[1], thid
-        # Not cached
-        try:
-            conn, dbName = self.__spares.pop()
-        except IndexError:
-            conn = self.__newConn()
-            dbName = ""
+    def get(self, retries=MAXCONNECTRETRY, sticky=True):
+        """Get the connection of the current thread, checking one out of the pool if needed
 
-        self.__assigned[thid] = [conn, dbName, now]
-        return conn, dbName, thid
+        :param int retries: number of attempts to open a new connection
+        :param bool sticky: if True, the connection stays assigned to the thread (see class doc),
+                            otherwise it must be handed back with :py:meth:`release`
 
-    def __pop(self, thid):
-        try:
-            data = self.__assigned.pop(thid)
-            if len(self.__spares) < self.__maxSpares:
-                self.__spares.append((data[0], data[1]))
+        :return: S_OK(connection)/S_ERROR
+        """
+        retries = max(0, min(MAXCONNECTRETRY, retries))
+        now = time.time()
+        if now - self.__lastClean > self.__graceTime / 10.0:
+            self.clean(now)
+
+        thid = self.__thid
+        lease = self.__assigned.get(thid)
+        if lease and not self.__isAlive(lease.conn, lease.lastUsed, now):
+            if lease.inTransaction:
+                # What was done in the transaction is lost with the connection
+                self.discard()
+                return S_ERROR(DErrno.EMYSQL, "Connection lost in the middle of a transaction")
+            # The connection was dropped by the server: replace it
+            self.__stats["Reconnects"] += 1
+            self.__close(lease.conn)
+            result = self.__connect(retries)
+            if not result["OK"]:
+                self.__checkin(thid, discard=True)
+                return result
+            lease.conn = result["Value"]
+        elif not lease:
+            result = self.__checkout(retries)
+            if not result["OK"]:
+                return result
+            lease = _Lease(result["Value"])
+            with self.__lock:
+                self.__assigned[thid] = lease
+
+        lease.lastUsed = now
+        if sticky:
+            lease.sticky = True
+        else:
+            lease.refCount += 1
+        return S_OK(lease.conn)
+
+    def release(self):
+        """Hand back a connection obtained with get(sticky=False)
+
+        The connection goes back to the pool unless it is still used
+        by the thread (sticky, in a transaction or nested checkout)
+        """
+        thid = self.__thid
+        lease = self.__assigned.get(thid)
+        if not lease:
+            return
+        lease.refCount = max(0, lease.refCount - 1)
+        if not lease.sticky and not lease.isBusy():
+            self.__checkin(thid)
+
+    def discard(self):
+        """Discard the connection of the current thread, found broken while executing a statement.
+        The connection is closed, and the thread gets a new one at the next checkout.
+
+        :return: True if the statement can be executed again with a new connection,
+                 False if a transaction was open on the broken connection
+        """
+        thid = self.__thid
+        lease = self.__assigned.get(thid)
+        if not lease:
+            return False
+        self.__stats["Reconnects"] += 1
+        self.__close(lease.conn)
+        self.__checkin(thid, discard=True)
+        return not lease.inTransaction
+
+    def __checkout(self, retries):
+        """Take an idle connection, or open a new one if the pool is not full,
+        or wait for a connection to be checked in
+        """
+        start = time.time()
+        conn = None
+        with self.__lock:
+            self.__stats["Checkouts"] += 1
+            while True:
+                if self.__idle:
+                    conn, lastUsed = self.__idle.pop()
+                    break
+                if self.__size < self.__maxConnections:
+                    # Reserve the slot, the connection is opened outside of the lock
+                    self.__size += 1
+                    break
+                # Maybe some threads died holding connections
+                self.__reclaim(time.time(), self.__checkoutTimeout / 2.0)
+                if self.__idle or self.__size < self.__maxConnections:
+                    continue
+                remaining = self.__checkoutTimeout - (time.time() - start)
+                if remaining <= 0:
+                    self.__stats["CheckoutTimeouts"] += 1
+                    return S_ERROR(
+                        DErrno.EMYSQL,
+                        "No free connection to %s after %s seconds (%s in use)"
+                        % (self.__dbName, self.__checkoutTimeout, self.__size),
+                    )
+                # Wake up regularly, as kept connections get reclaimable without notification
+                self.__lock.wait(min(remaining, 1))
+            waitTime = time.time() - start
+            self.__stats["CheckoutWaitTime"] += waitTime
+            self.__stats["MaxCheckoutWaitTime"] = max(self.__stats["MaxCheckoutWaitTime"], waitTime)
+
+        if conn is not None:
+            if self.__isAlive(conn, lastUsed, time.time()):
+                return S_OK(conn)
+            self.__stats["Reconnects"] += 1
+            self.__close(conn)
+
+        # The slot is ours, open a connection in it
+        result = self.__connect(retries)
+        if not result["OK"]:
+            with self.__lock:
+                self.__size -= 1
+                self.__lock.notify()
+        return result
+
+    def __checkin(self, thid, discard=False):
+        """Give back the connection of a thread to the pool"""
+        with self.__lock:
+            lease = self.__assigned.pop(thid, None)
+            if not lease:
+                return
+            if discard:
+                self.__size -= 1
             else:
-                try:
-                    data[0].close()
-                except MySQLdb.ProgrammingError as exc:
-                    gLogger.warn("ProgrammingError exception while closing MySQL connection: %s" % exc)
-                except Exception as exc:
-                    gLogger.warn("Exception while closing MySQL connection: %s" % exc)
-        except KeyError:
-            pass
+                self.__idle.append((lease.conn, lease.lastUsed))
+            self.__lock.notify()
+
+    def __reclaim(self, now, idleTime):
+        """Check in the connections of dead threads, and the connections checked out without being kept
+        by their thread (not sticky) which were not used for idleTime. To be called with the lock held.
+        """
+        for thid, lease in list(self.__assigned.items()):
+            if not thid.is_alive() or (not lease.sticky and not lease.isBusy() and now - lease.lastUsed > idleTime):
+                del self.__assigned[thid]
+                self.__idle.append((lease.conn, lease.lastUsed))
+                self.__lock.notify()
 
     def clean(self, now=False):
+        """Reclaim the connections of dead or idle threads, and close the connections idle for more than graceTime"""
         if not now:
             now = time.time()
         self.__lastClean = now
-        for thid in list(self.__assigned):
-            if not thid.is_alive():
-                self.__pop(thid)
-            try:
-                data = self.__assigned[thid]
-            except KeyError:
-                continue
-            if now - data[2] > self.__graceTime:
-                self.__pop(thid)
+        toClose = []
+        with self.__lock:
+            self.__reclaim(now, self.__graceTime)
+            while self.__idle and now - self.__idle[0][1] > self.__graceTime:
+                toClose.append(self.__idle.popleft()[0])
+                self.__size -= 1
+        for conn in toClose:
+            self.__close(conn)
+
+    def getStats(self):
+        """Counters of the pool usage
+
+        :return: dict with keys Size, InUse, Idle, MaxConnections, Checkouts, CheckoutWaitTime,
+                 MaxCheckoutWaitTime, CheckoutTimeouts, Pings, Reconnects
+        """
+        with self.__lock:
+            stats = dict.fromkeys(
+                ("Checkouts", "CheckoutWaitTime", "MaxCheckoutWaitTime", "CheckoutTimeouts", "Pings", "Reconnects"), 0
+            )
+            stats.update(self.__stats)
+            stats.update(
+                {
+                    "Size": self.__size,
+                    "InUse": len(self.__assigned),
+                    "Idle": len(self.__idle),
+                    "MaxConnections": self.__maxConnections,
+                }
+            )
+        return stats
 
-    def transactionStart(self, dbName):
-        result = self.get(dbName)
-        if not result["OK"]:
-            return result
-        conn = result["Value"]
-        try:
-            return S_OK(self.__execute(conn, "START TRANSACTION WITH CONSISTENT SNAPSHOT"))
-        except MySQLdb.MySQLError as excp:
-            return S_ERROR(DErrno.EMYSQL, "Could not begin transaction: %s" % excp)
+    def inTransaction(self):
+        """Whether a transaction is open on the connection of the current thread"""
+        lease = self.__assigned.get(self.__thid)
+        return bool(lease and lease.inTransaction)
 
-    def transactionCommit(self, dbName):
-        result = self.get(dbName)
+    def transactionStart(self):
+        result = self.get(sticky=False)
         if not result["OK"]:
             return result
         conn = result["Value"]
         try:
-            result = self.__execute(conn, "COMMIT")
-            return S_OK(result)
+            result = S_OK(self.__execute(conn, "START TRANSACTION WITH CONSISTENT SNAPSHOT"))
+            self.__assigned[self.__thid].inTransaction = True
         except MySQLdb.MySQLError as excp:
-            return S_ERROR(DErrno.EMYSQL, "Could not commit transaction: %s" % excp)
-
-    def transactionRollback(self, dbName):
-        result = self.get(dbName)
+            result = S_ERROR(DErrno.EMYSQL, "Could not begin transaction: %s" % excp)
+        self.release()
+        return result
+
+    def __transactionEnd(self, cmd):
+        lease = self.__assigned.get(self.__thid)
+        if cmd == "COMMIT" and not (lease and lease.inTransaction):
+            # The connection was lost, and the statements of the transaction with it
+            return S_ERROR(DErrno.EMYSQL, "Could not commit transaction: no transaction open on the connection")
+        result = self.get(sticky=False)
         if not result["OK"]:
             return result
         conn = result["Value"]
         try:
-            result = self.__execute(conn, "ROLLBACK")
-            return S_OK(result)
+            result = S_OK(self.__execute(conn, cmd))
         except MySQLdb.MySQLError as excp:
-            return S_ERROR(DErrno.EMYSQL, "Could not rollback transaction: %s" % excp)
+            result = S_ERROR(DErrno.EMYSQL, "Could not %s transaction: %s" % (cmd.lower(), excp))
+        self.__assigned[self.__thid].inTransaction = False
+        self.release()
+        return result
+
+    def transactionCommit(self):
+        return self.__transactionEnd("COMMIT")
+
+    def transactionRollback(self):
+        return self.__transactionEnd("ROLLBACK")
 
 
 class MySQL(object):
@@ -375,11 +583,22 @@ class MySQL(object):
 
     __connectionPools = {}
 
-    def __init__(self, hostName="localhost", userName="dirac", passwd="dirac", dbName="", port=3306, debug=False):
+    def __init__(
+        self,
+        hostName="localhost",
+        userName="dirac",
+        passwd="dirac",
+        dbName="",
+        port=3306,
+        debug=False,
+        maxConnections=MAXCONNECTIONS,
+    ):
         """
         set MySQL connection parameters and try to connect
 
         :param debug: unused
+        :param int maxConnections: size of the connection pool to the DB,
+                                   shared by all the instances connecting to the same DB
         """
         global gInstancesCount
         gInstancesCount += 1
@@ -399,9 +618,9 @@ class MySQL(object):
         self.__passwd = str(passwd)
         self.__dbName = str(dbName)
         self.__port = port
-        cKey = (self.__hostName, self.__userName, self.__passwd, self.__port)
+        cKey = (self.__hostName, self.__userName, self.__passwd, self.__port, self.__dbName)
         if cKey not in MySQL.__connectionPools:
-            MySQL.__connectionPools[cKey] = ConnectionPool(*cKey)
+            MySQL.__connectionPools[cKey] = ConnectionPool(*cKey, maxConnections=maxConnections)
         self.__connectionPool = MySQL.__connectionPools[cKey]
 
         self.__initialized = True
@@ -451,10 +670,13 @@ class MySQL(object):
         It also includes quotation marks " around the given string
         """
         if connection is None:
-            retDict = self._getConnection()
+            retDict = self._getConnection(sticky=False)
             if not retDict["OK"]:
                 return retDict
-            connection = retDict["Value"]
+            try:
+                return self.__escapeString(myString, connection=retDict["Value"])
+            finally:
+                self._releaseConnection()
 
         if isinstance(myString, bytes):
             myString = myString.decode()
@@ -463,30 +685,48 @@ class MySQL(object):
         except ValueError:
             return S_ERROR(DErrno.EMYSQL, "Cannot escape value!")
 
-        timeUnits = ["MICROSECOND", "SECOND", "MINUTE", "HOUR", "DAY", "WEEK", "MONTH", "QUARTER", "YEAR"]
-
         try:
             # Check datetime functions first
-            if myString.strip() == "UTC_TIMESTAMP()":
+            retDict = self.__isTimeFunction(myString)
+            if not retDict["OK"]:
+                return retDict
+            if retDict["Value"]:
                 return S_OK(myString)
 
-            for func in ["TIMESTAMPDIFF", "TIMESTAMPADD"]:
-                if myString.strip().startswith("%s(" % func) and myString.strip().endswith(")"):
-                    args = myString.strip()[:-1].replace("%s(" % func, "").strip().split(",")
-                    arg1, arg2, arg3 = [x.strip() for x in args]
-                    if arg1 in timeUnits:
-                        if self.__isDateTime(arg2) or arg2.isalnum():
-                            if self.__isDateTime(arg3) or arg3.isalnum():
-                                return S_OK(myString)
-                    # self.log.debug('__escape_string: Could not escape string', '"%s"' % myString)
-                    return S_ERROR(DErrno.EMYSQL, "__escape_string: Could not escape string")
-
             escape_string = connection.escape_string(myString.encode()).decode()
             # self.log.debug('__escape_string: returns', '"%s"' % escape_string)
             return S_OK('"%s"' % escape_string)
         except Exception as x:
             return self._except("__escape_string", x, "Could not escape string", myString)
 
+    def __isTimeFunction(self, myString):
+        """
+        Check if a string is one of the time functions that are passed to MySQL without escaping:
+        UTC_TIMESTAMP(), TIMESTAMPDIFF( unit, t1, t2 ) or TIMESTAMPADD( unit, n, t )
+
+        :return: S_OK(bool), S_ERROR if the arguments of TIMESTAMPDIFF/TIMESTAMPADD are not valid
+        """
+        timeUnits = ["MICROSECOND", "SECOND", "MINUTE", "HOUR", "DAY", "WEEK", "MONTH", "QUARTER", "YEAR"]
+
+        if myString.strip() == "UTC_TIMESTAMP()":
+            return S_OK(True)
+
+        for func in ["TIMESTAMPDIFF", "TIMESTAMPADD"]:
+            if myString.strip().startswith("%s(" % func) and myString.strip().endswith(")"):
+                args = myString.strip()[:-1].replace("%s(" % func, "").strip().split(",")
+                try:
+                    arg1, arg2, arg3 = [x.strip() for x in args]
+                except ValueError:
+                    return S_ERROR(DErrno.EMYSQL, "__escape_string: Could not escape string")
+                if arg1 in timeUnits:
+                    if self.__isDateTime(arg2) or arg2.isalnum():
+                        if self.__isDateTime(arg3) or arg3.isalnum():
+                            return S_OK(True)
+                # self.log.debug('__escape_string: Could not escape string', '"%s"' % myString)
+                return S_ERROR(DErrno.EMYSQL, "__escape_string: Could not escape string")
+
+        return S_OK(False)
+
     def __checkTable(self, tableName, force=False):
         """Check if a table exists by issuing 'SHOW TABLES'
 
@@ -528,16 +768,23 @@ class MySQL(object):
         Escapes all strings in the list of values provided
         """
         # self.log.debug('_escapeValues:', inValues)
-        retDict = self._getConnection()
+        if not inValues:
+            return S_OK([])
+
+        retDict = self._getConnection(sticky=False)
         if not retDict["OK"]:
             return retDict
-        connection = retDict["Value"]
+        try:
+            return self.__escapeValues(inValues, retDict["Value"])
+        finally:
+            self._releaseConnection()
 
+    def __escapeValues(self, inValues, connection):
+        """
+        Escapes all strings in the list of values provided, using the given connection
+        """
         inEscapeValues = []
 
-        if not inValues:
-            return S_OK(inEscapeValues)
-
         for value in inValues:
             if isinstance(value, str):
                 retDict = self.__escapeString(value, connection=connection)
@@ -563,6 +810,43 @@ class MySQL(object):
                 inEscapeValues.append(retDict["Value"])
         return S_OK(inEscapeValues)
 
+    def _bindValues(self, inValues=None):
+        """
+        Prepare values to be passed as parameters of a query instead of being escaped into it.
+
+        The values are sent to MySQL the same way _escapeValues would write them:
+        as strings, except for the time functions (UTC_TIMESTAMP()...) which are
+        kept in the statement, and lists/tuples which become lists of parameters.
+
+        :param list inValues: values to bind
+
+        :return: S_OK( ( list of placeholders to put in the statement, list of parameters ) )
+        """
+        placeholders = []
+        parameters = []
+        for value in inValues or []:
+            if isinstance(value, (tuple, list)):
+                values = [val.decode() if isinstance(val, bytes) else str(val) for val in value]
+                placeholders.append("(" + ", ".join(["%s"] * len(values)) + ")")
+                parameters.extend(values)
+                continue
+            if isinstance(value, bool):
+                placeholders.append("%s")
+                parameters.append(int(value))
+                continue
+            if isinstance(value, bytes):
+                value = value.decode()
+            value = str(value)
+            retDict = self.__isTimeFunction(value)
+            if not retDict["OK"]:
+                return retDict
+            if retDict["Value"]:
+                placeholders.append(value)
+            else:
+                placeholders.append("%s")
+                parameters.append(value)
+        return S_OK((placeholders, parameters))
+
     def _safeCmd(self, command):
         """Just replaces password, if visible, with *********"""
         return command.replace(self.__passwd, "**********")
@@ -583,17 +867,62 @@ class MySQL(object):
             return S_OK()
 
         # Test the connection to the DB
-        retDict = self._getConnection()
+        retDict = self._getConnection(sticky=False)
         if not retDict["OK"]:
             return retDict
+        self._releaseConnection()
         self._connected = True
         return S_OK()
 
-    def _query(self, cmd, conn=None, debug=False):
+    def __isConnectionLost(self, x):
+        """Tell if an exception raised while executing a statement means that the connection is lost"""
+        if isinstance(x, MySQLdb.InterfaceError):
+            return True
+        return isinstance(x, MySQLdb.OperationalError) and bool(x.args) and x.args[0] in CONNECTION_LOST_ERRORS
+
+    def __execute(self, methodName, cmd, execute, retry=False):
+        """Execute a statement with a connection checked out of the pool.
+        If the connection is found lost, it is discarded. With retry, the statement is then executed once more
+        with a new connection, unless a transaction was open on it.
+
+        :param str methodName: name of the calling method, for the error messages
+        :param str cmd: statement, for the error messages
+        :param callable execute: function executing the statement with a cursor, returning S_OK/S_ERROR
+        :param bool retry: if the statement can be executed twice: the connection may be lost after
+                           the statement was executed by the server
+
+        :return: S_OK/S_ERROR
+        """
+        for attempt in range(2 if retry else 1):
+            retDict = self._getConnection(sticky=False)
+            if not retDict["OK"]:
+                return retDict
+            connection = retDict["Value"]
+
+            cursor = None
+            try:
+                cursor = connection.cursor()
+                retDict = execute(cursor)
+            except Exception as x:
+                if self.__isConnectionLost(x) and self.__connectionPool.discard() and retry and not attempt:
+                    self.log.warn("Connection lost, executing again", "%s: %s" % (methodName, x))
+                    continue
+                retDict = self._except(methodName, x, "Execution failed.", cmd)
+            finally:
+                try:
+                    cursor.close()
+                except Exception:
+                    pass
+                self._releaseConnection()
+            return retDict
+
+    def _query(self, cmd, conn=None, debug=False, args=None):
         """
         execute MySQL query command
 
         :param debug: unused
+        :param args: parameters of the query, to be used for the %s placeholders in cmd
+                     (see _bindValues). Literal % in cmd must then be doubled.
 
         return S_OK structure with fetchall result as tuple
         it returns an empty tuple if no matching rows are found
@@ -602,41 +931,19 @@ class MySQL(object):
 
         self.log.debug("_query: %s" % self._safeCmd(cmd))
 
-        retDict = self._getConnection()
-        if not retDict["OK"]:
-            return retDict
-        connection = retDict["Value"]
-
-        try:
-            cursor = connection.cursor()
-            if cursor.execute(cmd):
-                res = cursor.fetchall()
-            else:
-                res = ()
-
-            # Log the result limiting it to just 10 records
-            # if len(res) <= 10:
-            #  self.log.debug('_query: returns', res)
-            # else:
-            #  self.log.debug('_query: Total %d records returned' % len(res))
-            #  self.log.debug('_query: %s ...' % str(res[:10]))
-
-            retDict = S_OK(res)
-        except Exception as x:
-            # self.log.debug('_query: %s' % self._safeCmd(cmd))
-            retDict = self._except("_query", x, "Execution failed.", cmd)
-
-        try:
-            cursor.close()
-        except Exception:
-            pass
+        def execute(cursor):
+            if cursor.execute(cmd, args):
+                return S_OK(cursor.fetchall())
+            return S_OK(())
 
-        return retDict
+        return self.__execute("_query", cmd, execute, retry=True)
 
-    def _update(self, cmd, conn=None, debug=False):
+    def _update(self, cmd, conn=None, debug=False, args=None):
         """execute MySQL update command
 
         :param debug: unused
+        :param args: parameters of the statement, to be used for the %s placeholders in cmd
+                     (see _bindValues). Literal % in cmd must then be doubled.
 
         return S_OK with number of updated registers upon success
         return S_ERROR upon error
@@ -644,26 +951,29 @@ class MySQL(object):
 
         self.log.debug("_update: %s" % self._safeCmd(cmd))
 
-        retDict = self._getConnection()
-        if not retDict["OK"]:
-            return retDict
-        connection = retDict["Value"]
-
-        try:
-            cursor = connection.cursor()
-            res = cursor.execute(cmd)
-            retDict = S_OK(res)
+        def execute(cursor):
+            retDict = S_OK(cursor.execute(cmd, args))
             if cursor.lastrowid:
                 retDict["lastRowId"] = cursor.lastrowid
-        except Exception as x:
-            retDict = self._except("_update", x, "Execution failed.", cmd)
+            return retDict
 
-        try:
-            cursor.close()
-        except Exception:
-            pass
+        return self.__execute("_update", cmd, execute)
 
-        return retDict
+    def _updateMany(self, cmd, argsList, conn=None):
+        """execute a MySQL update command once per set of parameters, with a single executemany call.
+        For an INSERT ... VALUES statement with only %s placeholders as values,
+        the rows are sent in multi-row INSERTs.
+
+        :param str cmd: statement with %s placeholders
+        :param list argsList: list of parameter sequences
+
+        return S_OK with number of updated registers upon success
+        return S_ERROR upon error
+        """
+
+        self.log.debug("_updateMany: %s (%d sets of parameters)" % (self._safeCmd(cmd), len(argsList)))
+
+        return self.__execute("_updateMany", cmd, lambda cursor: S_OK(cursor.executemany(cmd, argsList)))
 
     def _transaction(self, cmdList, conn=None):
         """dummy transaction support
@@ -678,13 +988,19 @@ class MySQL(object):
             return S_ERROR(DErrno.EMYSQL, "_transaction: wrong type (%s) for cmdList" % type(cmdList))
 
         # # get connection
-        connection = conn
-        if not connection:
-            retDict = self._getConnection()
-            if not retDict["OK"]:
-                return retDict
-            connection = retDict["Value"]
+        if conn:
+            return self.__transaction(cmdList, conn)
+        retDict = self._getConnection(sticky=False)
+        if not retDict["OK"]:
+            return retDict
+        try:
+            return self.__transaction(cmdList, retDict["Value"])
+        finally:
+            # # put back connection to the pool
+            self._releaseConnection()
 
+    def __transaction(self, cmdList, connection):
+        """execute the commands of a _transaction with the given connection"""
         # # list with cmds and their results
         cmdRet = []
         try:
@@ -694,10 +1010,14 @@ class MySQL(object):
             connection.commit()
         except Exception as error:
             self.logger.exception(error)
-            # # rollback, put back connection to the pool
+            if self.__isConnectionLost(error):
+                # # nothing to rollback on a lost connection
+                self.__connectionPool.discard()
+                return S_ERROR(DErrno.EMYSQL, error)
+            # # rollback
             connection.rollback()
             return S_ERROR(DErrno.EMYSQL, error)
-        # # close cursor, put back connection to the pool
+        # # close cursor
         cursor.close()
         return S_OK(cmdRet)
 
@@ -914,14 +1234,18 @@ class MySQL(object):
         """
         return str(param[0])
 
-    def _getConnection(self, retries=MAXCONNECTRETRY):
-        """Return  a new connection to the DB,
+    def _getConnection(self, retries=MAXCONNECTRETRY, sticky=True):
+        """Return the connection to the DB of the current thread
 
-        Try the Queue, if it is empty add a newConnection to the Queue and retry
-        it will retry MAXCONNECTRETRY to open a new connection and will return
+        The connection is checked out of the pool, and a new one is opened if there is none available.
+        It will retry MAXCONNECTRETRY to open a new connection and will return
         an error if it fails.
 
         :param int retries: Number of time it will retry to open a connection
+        :param bool sticky: if True (default), the connection stays with the current thread until
+                            it dies. Otherwise, the connection must be handed back with _releaseConnection
+                            as soon as it is not used anymore: it is then kept by the thread, and its
+                            statements all executed with it, until then.
         """
         # self.log.debug('_getConnection:')
 
@@ -930,7 +1254,18 @@ class MySQL(object):
             gLogger.error(error)
             return S_ERROR(DErrno.EMYSQL, error)
 
-        return self.__connectionPool.get(self.__dbName, retries)
+        return self.__connectionPool.get(retries, sticky=sticky)
+
+    def _releaseConnection(self):
+        """Hand back to the pool the connection obtained with _getConnection(sticky=False)"""
+        self.__connectionPool.release()
+
+    def getConnectionPoolStats(self):
+        """Usage counters of the pool of connections to this DB
+
+        :return: S_OK(dict) see ConnectionPool.getStats
+        """
+        return S_OK(self.__connectionPool.getStats())
 
     ########################################################################################
     #
@@ -939,13 +1274,13 @@ class MySQL(object):
     ########################################################################################
 
     def transactionStart(self):
-        return self.__connectionPool.transactionStart(self.__dbName)
+        return self.__connectionPool.transactionStart()
 
     def transactionCommit(self):
-        return self.__connectionPool.transactionCommit(self.__dbName)
+        return self.__connectionPool.transactionCommit()
 
     def transactionRollback(self):
-        return self.__connectionPool.transactionRollback(self.__dbName)
+        return self.__connectionPool.transactionRollback()
 
     ########################################################################################
     #
@@ -1402,11 +1737,11 @@ class MySQL(object):
                 # self.log.debug('updateFields:', error)
                 return S_ERROR(DErrno.EMYSQL, error)
 
-        updateValues = self._escapeValues(updateValues)
-        if not updateValues["OK"]:
-            # self.log.debug('updateFields:', updateValues['Message'])
-            return updateValues
-        updateValues = updateValues["Value"]
+        retDict = self._bindValues(updateValues)
+        if not retDict["OK"]:
+            # self.log.debug('updateFields:', retDict['Message'])
+            return retDict
+        placeholders, parameters = retDict["Value"]
 
         # self.log.debug('updateFields:', 'updating fields %s from table %s.' % (', '.join(updateFields), table))
 
@@ -1425,10 +1760,13 @@ class MySQL(object):
             return S_ERROR(DErrno.EMYSQL, x)
 
         updateString = ",".join(
-            ["%s = %s" % (_quotedList([updateFields[k]]), updateValues[k]) for k in range(len(updateFields))]
+            ["%s = %s" % (_quotedList([updateFields[k]]), placeholders[k]) for k in range(len(updateFields))]
         )
 
-        return self._update("UPDATE %s SET %s %s" % (table, updateString, condition), conn)
+        # The condition is already escaped: protect its % from the parameters substitution
+        return self._update(
+            "UPDATE %s SET %s %s" % (table, updateString, condition.replace("%", "%%")), conn, args=parameters
+        )
 
     #############################################################################
     def insertFields(self, tableName, inFields=None, inValues=None, conn=None, inDict=None):
@@ -1473,20 +1811,86 @@ class MySQL(object):
 
         inFieldString = "(  %s )" % inFieldString
 
-        retDict = self._escapeValues(inValues)
+        retDict = self._bindValues(inValues)
         if not retDict["OK"]:
             # self.log.debug('insertFields:', retDict['Message'])
             return retDict
-        inValueString = ", ".join(retDict["Value"])
-        inValueString = "(  %s )" % inValueString
+        placeholders, parameters = retDict["Value"]
+        inValueString = "(  %s )" % ", ".join(placeholders)
 
         # self.log.debug('insertFields:', 'inserting %s into table %s'
         #               % (inFieldString, table))
 
-        return self._update("INSERT INTO %s %s VALUES %s" % (table, inFieldString, inValueString), conn)
+        return self._update(
+            "INSERT INTO %s %s VALUES %s" % (table, inFieldString, inValueString), conn, args=parameters
+        )
+
+    def insertFieldsBulk(self, tableName, fields, rows, chunkSize=1000, conn=None):
+        """
+        Insert many rows in "tableName", assigning to the "fields" the values of each row.
+        The rows are sent in multi-row INSERT statements of at most chunkSize rows,
+        with the values passed as parameters instead of being escaped one by one.
+        Time functions (UTC_TIMESTAMP()...) are accepted as values, as for insertFields.
+
+        :param str tableName: table name
+        :param list fields: names of the fields
+        :param list rows: list of values tuples, in the order of the fields
+        :param int chunkSize: maximum number of rows per statement
+
+        When several statements are needed, they are executed in a transaction, so that either all the rows
+        or none of them are inserted. If a transaction is already open, it is used, and it is then up to
+        the caller to roll it back in case of error.
+
+        :return: S_OK( number of inserted rows )
+        """
+        table = _quotedList([tableName])
+        if not table:
+            return S_ERROR(DErrno.EMYSQL, "Invalid tableName argument")
+        inFieldString = _quotedList(fields)
+        if inFieldString is None:
+            return S_ERROR(DErrno.EMYSQL, "Invalid fields arguments")
+
+        # Rows with time functions in different columns need different statements
+        statements = collections.OrderedDict()
+        for row in rows:
+            if len(row) != len(fields):
+                return S_ERROR(DErrno.EMYSQL, "Mismatch between fields and values.")
+            retDict = self._bindValues(row)
+            if not retDict["OK"]:
+                return retDict
+            placeholders, parameters = retDict["Value"]
+            statements.setdefault(tuple(placeholders), []).append(parameters)
+
+        # executemany only batches statements made of %s placeholders only,
+        # so the multi-row statements are built here
+        chunkSize = max(1, chunkSize)
+        nStatements = sum((len(argsList) + chunkSize - 1) // chunkSize for argsList in statements.values())
+        ownTransaction = nStatements > 1 and not self.__connectionPool.inTransaction()
+        if ownTransaction:
+            retDict = self.transactionStart()
+            if not retDict["OK"]:
+                return retDict
+        inserted = 0
+        for placeholders, argsList in statements.items():
+            rowString = "( %s )" % ", ".join(placeholders)
+            for index in range(0, len(argsList), chunkSize):
+                chunk = argsList[index : index + chunkSize]
+                cmd = "INSERT INTO %s ( %s ) VALUES %s" % (table, inFieldString, ", ".join([rowString] * len(chunk)))
+                retDict = self._update(cmd, conn, args=[parameter for parameters in chunk for parameter in parameters])
+                if not retDict["OK"]:
+                    if ownTransaction:
+                        # None of the rows of the previous statements stay in the table
+                        self.transactionRollback()
+                    return retDict
+                inserted += retDict["Value"]
+        if ownTransaction:
+            retDict = self.transactionCommit()
+            if not retDict["OK"]:
+                return retDict
+        return S_OK(inserted)
 
     def executeStoredProcedure(self, packageName, parameters, outputIds):
-        conDict = self._getConnection()
+        conDict = self._getConnection(sticky=False)
         if not conDict["OK"]:
             return conDict
 
@@ -1508,11 +1912,12 @@ class MySQL(object):
             cursor.close()
         except Exception:
             pass
+        self._releaseConnection()
         return retDict
 
     # For the procedures that execute a select without storing the result
     def executeStoredProcedureWithCursor(self, packageName, parameters):
-        conDict = self._getConnection()
+        conDict = self._getConnection(sticky=False)
         if not conDict["OK"]:
             return conDict
 
@@ -1534,5 +1939,6 @@ class MySQL(object):
             cursor.close()
         except Exception:
             pass
+        self._releaseConnection()
 
         return retDict
@@ -21,6 +21,9 @@ set a timeout.
        ( returncode, stdout, stderr ) the tuple will also be available upon
        timeout error or buffer overflow error.
 
+       The outputs are captured by :py:class:`OutputCapture`: they can be streamed to files
+       and, instead of failing beyond the buffer limit, only their head and tail can be kept.
+
      - pythonCall( iTimeOut, function, \\*stArgs, \\*\\*stKeyArgs )
        calls function with given arguments within a timeout Wrapper
        should be used to wrap third party python functions
@@ -31,6 +34,7 @@ from __future__ import absolute_import
 from __future__ import print_function
 
 from multiprocessing import Process, Manager
+import functools
 import threading
 import time
 import os
@@ -57,6 +61,11 @@ __RCSID__ = "$Id$"
 
 USE_WATCHDOG = False
 
+# Maximum number of bytes read at once from the outputs of the commands
+READ_SIZE = 1048576
+# Longest time spent reading the outputs of a command before checking its timeout
+READ_TIME = 1
+
 
 class Watchdog(object):
     """
@@ -147,23 +156,123 @@ class Watchdog(object):
         return ret
 
 
+class OutputCapture(object):
+    """
+    .. class:: OutputCapture
+
+    Capture of an output of a command, received in chunks of bytes. The output is kept in a bytearray,
+    and decoded once at the end. The lines given to the callback are cut from the new data only,
+    and taken out of the buffer.
+
+    With headTailSize, the output kept is bounded: only its first and last headTailSize bytes are returned,
+    and it is trimmed to them whenever it gets bigger than 3 times headTailSize.
+    With an output file, the output is written to it as it is received, and only kept in memory
+    for the callback, or the head and tail.
+    """
+
+    def __init__(self, headTailSize=0, outputFile=None, lineCallback=None):
+        """c'tor
+
+        :param int headTailSize: size of the head and of the tail kept, 0 to keep all the output
+        :param str outputFile: path of the file the output is appended to, opened when there is output
+        :param callable lineCallback: function called with each line of the output
+        """
+        self.headTailSize = headTailSize
+        self.outputFile = outputFile
+        self.outputFD = None
+        self.lineCallback = lineCallback
+        self.keep = outputFile is None or headTailSize > 0
+        self.data = bytearray()
+        self.head = None
+        self.skippedBytes = 0
+        self.totalBytes = 0
+        # Position in data from which to look for the end of a line
+        self.__lineSearchStart = 0
+
+    def __len__(self):
+        """Number of bytes kept in memory"""
+        return len(self.data) + (len(self.head) if self.head is not None else 0)
+
+    def write(self, chunk):
+        """Add a chunk of the output"""
+        self.totalBytes += len(chunk)
+        if self.outputFile is not None:
+            if self.outputFD is None:
+                self.outputFD = open(self.outputFile, "ab")
+            self.outputFD.write(chunk)
+        if not self.keep and not self.lineCallback:
+            return
+        self.data += chunk
+        if self.lineCallback:
+            lineStart = 0
+            lineEnd = self.data.find(b"\n", self.__lineSearchStart)
+            while lineEnd > -1:
+                self.lineCallback(self.data[lineStart:lineEnd].decode("utf-8", "replace"))
+                lineStart = lineEnd + 1
+                lineEnd = self.data.find(b"\n", lineStart)
+            # Each line processed is taken out of the buffer to prevent the limit from killing us
+            if lineStart:
+                del self.data[:lineStart]
+            self.__lineSearchStart = len(self.data)
+        if self.headTailSize and len(self.data) > 3 * self.headTailSize:
+            # Trimming once in a while, so that the data is copied only once on average
+            self.__trim()
+
+    def __trim(self):
+        """Keep only the head and the tail of the data"""
+        tailStart = len(self.data) - self.headTailSize
+        if self.head is None:
+            self.head = bytes(self.data[: self.headTailSize])
+            self.skippedBytes += tailStart - self.headTailSize
+        else:
+            self.skippedBytes += tailStart
+        self.data = self.data[tailStart:]
+        self.__lineSearchStart = 0
+
+    def close(self):
+        """Close the output file, if any"""
+        if self.outputFD is not None:
+            self.outputFD.close()
+            self.outputFD = None
+
+    def getValue(self):
+        """Get the output kept, decoded
+
+        :return: str
+        """
+        if not self.keep:
+            return ""
+        if self.headTailSize and len(self.data) > (2 if self.head is None else 1) * self.headTailSize:
+            self.__trim()
+        if self.head is None:
+            return self.data.decode("utf-8", "replace")
+        return "%s\n[... %d bytes skipped ...]\n%s" % (
+            self.head.decode("utf-8", "replace"),
+            self.skippedBytes,
+            self.data.decode("utf-8", "replace"),
+        )
+
+
 class Subprocess(object):
     """
     .. class:: Subprocess
 
     """
 
-    def __init__(self, timeout=False, bufferLimit=52428800):
+    def __init__(self, timeout=False, bufferLimit=52428800, headTailSize=0):
         """c'tor
 
         :param int timeout: timeout in seconds
         :param int bufferLimit: buffer size, default 5MB
+        :param int headTailSize: if set, only the first and last headTailSize bytes of the outputs
+                                 of the system calls are kept, instead of failing beyond bufferLimit
         """
         self.log = gLogger.getSubLogger("Subprocess")
         self.timeout = False
         try:
             self.changeTimeout(timeout)
             self.bufferLimit = int(bufferLimit)  # 5MB limit for data
+            self.headTailSize = int(headTailSize)
         except Exception as x:
             self.log.exception("Failed initialisation of Subprocess object")
             raise x
@@ -172,7 +281,7 @@ class Subprocess(object):
         self.childPID = 0
         self.childKilled = False
         self.callback = None
-        self.bufferList = []
+        self.captures = []
         self.cmdSeq = []
 
     def changeTimeout(self, timeout):
@@ -185,29 +294,29 @@ class Subprocess(object):
             self.timeout = False
         # self.log.debug( 'Timeout set to', timeout )
 
-    def __readFromFD(self, fd, baseLength=0):
+    def __readFromFD(self, fd):
         """read from file descriptior :fd:
 
         :param fd: file descriptior
-        :param int baseLength: ???
+        :return: S_OK(bytes)
         """
-        dataString = ""
-        redBuf = " "
+        data = bytearray()
+        redBuf = b" "
         while len(redBuf) > 0:
-            redBuf = os.read(fd, 8192).decode()
-            dataString += redBuf
-            if len(dataString) + baseLength > self.bufferLimit:
+            redBuf = os.read(fd, READ_SIZE)
+            data += redBuf
+            if len(data) > self.bufferLimit:
                 self.log.error(
                     "Maximum output buffer length reached",
-                    "First and last data in buffer: \n%s \n....\n %s " % (dataString[:100], dataString[-100:]),
+                    "First and last data in buffer: \n%r \n....\n %r " % (bytes(data[:100]), bytes(data[-100:])),
                 )
                 retDict = S_ERROR(
                     "Reached maximum allowed length (%d bytes) " "for called function return value" % self.bufferLimit
                 )
-                retDict["Value"] = dataString
+                retDict["Value"] = bytes(data)
                 return retDict
 
-        return S_OK(dataString)
+        return S_OK(bytes(data))
 
     def __executePythonFunction(self, function, writePipe, *stArgs, **stKeyArgs):
         """
@@ -350,7 +459,7 @@ class Subprocess(object):
                         dataStub = retDict["Value"]
                         if not dataStub:
                             return S_ERROR("Error decoding data coming from call")
-                        retObj, stubLen = DEncode.decode(dataStub.encode())
+                        retObj, stubLen = DEncode.decode(dataStub)
                         if stubLen == len(dataStub):
                             return retObj
                         return S_ERROR("Error decoding data coming from call")
@@ -366,68 +475,60 @@ class Subprocess(object):
         :return: S_ERROR with additional 'Value' tuple ( existStatus, stdoutBuf, stderrBuf )
         """
         retDict = S_ERROR(message)
-        retDict["Value"] = (exitStatus, self.bufferList[0][0], self.bufferList[1][0])
+        retDict["Value"] = (exitStatus, self.captures[0].getValue(), self.captures[1].getValue())
         return retDict
 
-    def __readFromFile(self, fd, baseLength):
-        """read from file descriptor :fd: and save it to the dedicated buffer"""
+    def __readFromFile(self, fd, capture):
+        """read from file descriptor :fd: and save it to the dedicated capture
+
+        It returns after READ_TIME seconds at most, for the caller to check the timeout:
+        the output of a command writing continuously is never exhausted, and the
+        capture does not grow with a callback, a head and tail limit or an output file.
+        """
         try:
-            dataString = ""
             fn = fd.fileno()
 
             sel = selectors.DefaultSelector()
             sel.register(fd, selectors.EVENT_READ)
-            while True:
-                if not sel.select(timeout=1):
+            readEnd = time.time() + READ_TIME
+            while time.time() < readEnd:
+                if not sel.select(timeout=readEnd - time.time()):
                     break
-                if isinstance(fn, int):
-                    nB = os.read(fn, self.bufferLimit)
-                else:
-                    nB = fd.read(1)
+                nB = os.read(fn, READ_SIZE)
                 if not nB:
                     break
-                try:
-                    dataString += nB.decode()
-                except UnicodeDecodeError as e:
-                    self.log.warn("Unicode decode error in readFromFile", "(%r): %r" % (e, dataString))
-                    dataString += nB.decode("utf-8", "replace")
-                # break out of potential infinite loop, indicated by dataString growing beyond reason
-                if len(dataString) + baseLength > self.bufferLimit:
-                    self.log.error("DataString is getting too long (%s): %s " % (len(dataString), dataString[-10000:]))
+                capture.write(nB)
+                # break out of potential infinite loop, indicated by the buffer growing beyond reason
+                if len(capture) > self.bufferLimit:
                     break
         except Exception as x:
             self.log.exception("SUBPROCESS: readFromFile exception")
-            try:
-                self.log.error("Error reading", "type(nB) =%s" % type(nB))
-                self.log.error("Error reading", "nB =%s" % str(nB))
-            except Exception:
-                pass
             return S_ERROR("Can not read from output: %s" % str(x))
-        if len(dataString) + baseLength > self.bufferLimit:
+        if len(capture) > self.bufferLimit:
             self.log.error("Maximum output buffer length reached")
-            retDict = S_ERROR(
+            return S_ERROR(
                 "Reached maximum allowed length (%d bytes) for called " "function return value" % self.bufferLimit
             )
-            retDict["Value"] = dataString
-            return retDict
 
-        return S_OK(dataString)
+        return S_OK()
 
     def __readFromSystemCommandOutput(self, fd, bufferIndex):
         """read stdout from file descriptor :fd:"""
-        retDict = self.__readFromFile(fd, len(self.bufferList[bufferIndex][0]))
+        retDict = self.__readFromFile(fd, self.captures[bufferIndex])
         if retDict["OK"]:
-            self.bufferList[bufferIndex][0] += retDict["Value"]
-            if self.callback is not None:
-                while self.__callLineCallback(bufferIndex):
-                    pass
             return S_OK()
         else:  # buffer size limit reached killing process (see comment on __readFromFile)
             exitStatus = self.killChild()
             return self.__generateSystemCommandError(exitStatus, "%s for '%s' call" % (retDict["Message"], self.cmdSeq))
 
-    def systemCall(self, cmdSeq, callbackFunction=None, shell=False, env=None):
-        """system call (no shell) - execute :cmdSeq:"""
+    def systemCall(self, cmdSeq, callbackFunction=None, shell=False, env=None, outputFiles=None):
+        """system call (no shell) - execute :cmdSeq:
+
+        :param callable callbackFunction: function called with ( pipeId, line ) for each line of the outputs
+        :param tuple outputFiles: paths of the files the stdout and the stderr are appended to,
+                                  as they are produced. They are then not kept in memory,
+                                  but for their head and tail with headTailSize. None for no file.
+        """
 
         if shell:
             self.log.verbose("shellCall:", cmdSeq)
@@ -462,8 +563,11 @@ class Subprocess(object):
             retDict["Value"] = (-1, "", str(x))
             return retDict
 
+        self.captures = []
         try:
-            self.bufferList = [["", 0], ["", 0]]
+            for bufferIndex, outputFile in enumerate(outputFiles or (None, None)):
+                lineCallback = functools.partial(self.__callLineCallback, bufferIndex) if self.callback else None
+                self.captures.append(OutputCapture(self.headTailSize, outputFile or None, lineCallback))
             initialTime = time.time()
 
             exitStatus = self.__poll(self.child.pid)
@@ -489,13 +593,15 @@ class Subprocess(object):
 
             if exitStatus >= 256:
                 exitStatus = int(exitStatus / 256)
-            return S_OK((exitStatus, self.bufferList[0][0], self.bufferList[1][0]))
+            return S_OK((exitStatus, self.captures[0].getValue(), self.captures[1].getValue()))
         finally:
             try:
                 self.child.stdout.close()
                 self.child.stderr.close()
             except Exception:
                 pass
+            for capture in self.captures:
+                capture.close()
 
     def getChildPID(self):
         """child pid getter"""
@@ -523,67 +629,60 @@ class Subprocess(object):
                 return retDict
         return S_OK()
 
-    def __callLineCallback(self, bufferIndex):
+    def __callLineCallback(self, bufferIndex, line):
         """line callback execution"""
-        nextLineIndex = self.bufferList[bufferIndex][0][self.bufferList[bufferIndex][1] :].find("\n")
-        if nextLineIndex > -1:
-            try:
-                self.callback(
-                    bufferIndex,
-                    self.bufferList[bufferIndex][0][
-                        self.bufferList[bufferIndex][1] : self.bufferList[bufferIndex][1] + nextLineIndex
-                    ],
-                )
-                # Each line processed is taken out of the buffer to prevent the limit from killing us
-                nL = self.bufferList[bufferIndex][1] + nextLineIndex + 1
-                self.bufferList[bufferIndex][0] = self.bufferList[bufferIndex][0][nL:]
-                self.bufferList[bufferIndex][1] = 0
-            except Exception:
-                self.log.exception("Exception while calling callback function", "%s" % self.callback.__name__)
-                self.log.showStack()
-                return False
-
-            return True
-        return False
+        try:
+            self.callback(bufferIndex, line)
+        except Exception:
+            self.log.exception("Exception while calling callback function", "%s" % self.callback.__name__)
+            self.log.showStack()
 
 
-def systemCall(timeout, cmdSeq, callbackFunction=None, env=None, bufferLimit=52428800):
+def systemCall(
+    timeout, cmdSeq, callbackFunction=None, env=None, bufferLimit=52428800, headTailSize=0, outputFiles=None
+):
     """
     Use SubprocessExecutor class to execute cmdSeq (it can be a string or a sequence)
     with a timeout wrapper, it is executed directly without calling a shell
+
+    See :py:class:`Subprocess` for headTailSize and :py:meth:`Subprocess.systemCall` for outputFiles
     """
     if timeout > 0 and USE_WATCHDOG:
-        spObject = Subprocess(timeout=timeout, bufferLimit=bufferLimit)
+        spObject = Subprocess(timeout=timeout, bufferLimit=bufferLimit, headTailSize=headTailSize)
         sysCall = Watchdog(
             spObject.systemCall,
             args=(cmdSeq,),
-            kwargs={"callbackFunction": callbackFunction, "env": env, "shell": False},
+            kwargs={"callbackFunction": callbackFunction, "env": env, "shell": False, "outputFiles": outputFiles},
         )
         spObject.log.verbose("Subprocess Watchdog timeout set to %d" % timeout)
         result = sysCall(timeout + 1)
     else:
-        spObject = Subprocess(timeout, bufferLimit=bufferLimit)
-        result = spObject.systemCall(cmdSeq, callbackFunction=callbackFunction, env=env, shell=False)
+        spObject = Subprocess(timeout, bufferLimit=bufferLimit, headTailSize=headTailSize)
+        result = spObject.systemCall(
+            cmdSeq, callbackFunction=callbackFunction, env=env, shell=False, outputFiles=outputFiles
+        )
     return result
 
 
-def shellCall(timeout, cmdSeq, callbackFunction=None, env=None, bufferLimit=52428800):
+def shellCall(timeout, cmdSeq, callbackFunction=None, env=None, bufferLimit=52428800, headTailSize=0, outputFiles=None):
     """
     Use SubprocessExecutor class to execute cmdSeq (it can be a string or a sequence)
     with a timeout wrapper, cmdSeq it is invoque by /bin/sh
     """
     if timeout > 0 and USE_WATCHDOG:
-        spObject = Subprocess(timeout=timeout, bufferLimit=bufferLimit)
+        spObject = Subprocess(timeout=timeout, bufferLimit=bufferLimit, headTailSize=headTailSize)
         shCall = Watchdog(
             spObject.systemCall,
             args=(cmdSeq,),
-            kwargs={"callbackFunction": callbackFunction, "env": env, "shell": True},
+            kwargs={"callbackFunction": callbackFunction, "env": env, "shell": True, "outputFiles": outputFiles},
         )
         spObject.log.verbose("Subprocess Watchdog timeout set to %d" % timeout)
         result = shCall(timeout + 1)
     else:
-        spObject = Subprocess(timeout, bufferLimit=bufferLimit)
-        result = spObject.systemCall(cmdSeq, callbackFunction=callbackFunction, env=env, shell=True)
+        spObject = Subprocess(timeout, bufferLimit=bufferLimit, headTailSize=headTailSize)
+        result = spObject.systemCall(
+            cmdSeq, callbackFunction=callbackFunction, env=env, shell=True, outputFiles=outputFiles
+        )
     return result
 
 
@@ -16,6 +16,7 @@ import datetime
 import sys
 
 from DIRAC.Core.Utilities.DEncode import encode as disetEncode, decode as disetDecode, g_dEncodeFunctions
+from DIRAC.Core.Utilities.DEncode import IncrementalDecoder, ZERO_COPY_THRESHOLD
 from DIRAC.Core.Utilities.JEncode import encode as jsonEncode, decode as jsonDecode, JSerializable
 from DIRAC.Core.Utilities.MixedEncode import encode as mixEncode, decode as mixDecode
 
@@ -353,3 +354,52 @@ def test_nestedSerializable(data):
     subObj = Serializable(instAttr=data)
     objData = Serializable(instAttr=subObj)
     agnosticTestFunction(jsonTuple, objData)
+
+
+def test_disetWireFormat():
+    """The encoded stream must stay readable by the older DIRAC clients and services"""
+
+    data = {"a": [1, 2.5, None, True], "b": ("x", datetime.date(2021, 3, 4)), 3: {}}
+    assert disetEncode(data) == b"ds1:ali1ef2.5enb1es1:bts1:xzdti2021ei3ei4eeei3edee"
+
+
+@mark.parametrize("size", [0, 10, ZERO_COPY_THRESHOLD, ZERO_COPY_THRESHOLD + 1, 10 * ZERO_COPY_THRESHOLD])
+def test_disetLongStrings(size):
+    """Strings are decoded the same way whatever their size"""
+
+    data = ["é" * size, {"k" * size: "v" * size}, "x" * size]
+    agnosticTestFunction(disetTuple, data)
+
+
+@mark.parametrize("chunkSize", [1, 7, 4096, 10 ** 6])
+def test_incrementalDecoder(chunkSize):
+    """Feed an encoded message chunk by chunk to the IncrementalDecoder"""
+
+    data = {"Successful": {"/lfn/%s" % i: ["SE-%s" % i, i, None] for i in range(200)}, "Failed": {}}
+    encodedData = disetEncode(data)
+    trailer = b"next message"
+    stream = encodedData + trailer
+
+    decoder = IncrementalDecoder(len(encodedData))
+    leftOver = b""
+    for index in range(0, len(stream), chunkSize):
+        assert not decoder.isComplete()
+        leftOver = decoder.feed(stream[index : index + chunkSize])
+        if decoder.isComplete():
+            leftOver += stream[index + chunkSize :]
+            break
+
+    assert decoder.missing() == 0
+    assert leftOver == trailer
+    assert decoder.decode() == (data, len(encodedData))
+
+
+def test_incrementalDecoderIncomplete():
+    """Decoding a partial message is an error"""
+
+    encodedData = disetEncode([1, 2, 3])
+    decoder = IncrementalDecoder(len(encodedData))
+    decoder.feed(encodedData[:-1])
+    assert decoder.missing() == 1
+    with raises(ValueError):
+        decoder.decode()
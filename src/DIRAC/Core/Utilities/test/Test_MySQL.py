@@ -0,0 +1,136 @@
+""" Unit tests of the pool of connections of the MySQL class, with the connections mocked
+"""
+import threading
+
+import MySQLdb
+import pytest
+from mock import MagicMock
+
+from DIRAC.Core.Utilities import MySQL as MySQLModule
+from DIRAC.Core.Utilities.MySQL import ConnectionPool, MySQL
+
+
+@pytest.fixture
+def connect(mocker):
+    """MySQLdb.connect returning a new mocked connection at each call"""
+    return mocker.patch.object(MySQLModule.MySQLdb, "connect", side_effect=lambda **kwargs: MagicMock())
+
+
+def test_lostTransaction(connect):
+    """A connection lost in the middle of a transaction is not replaced, the transaction fails"""
+    pool = ConnectionPool("host", "user", "passwd", dbName="db", pingInterval=0)
+    assert pool.transactionStart()["OK"]
+    result = pool.get(sticky=False)
+    assert result["OK"]
+    conn = result["Value"]
+    pool.release()
+
+    conn.ping.side_effect = MySQLdb.OperationalError(2006, "MySQL server has gone away")
+    assert not pool.get(sticky=False)["OK"]
+    assert not pool.transactionCommit()["OK"]
+    conn.close.assert_called_once_with()
+    assert connect.call_count == 1
+    stats = pool.getStats()
+    assert stats["Size"] == 0
+    assert stats["InUse"] == 0
+
+
+def test_stickyConnectionNotReclaimed(connect):
+    """The connection kept by a living thread is not given to another one, even when not used"""
+    pool = ConnectionPool("host", "user", "passwd", dbName="db", maxConnections=1, checkoutTimeout=0.5)
+    gotConnection = threading.Event()
+    done = threading.Event()
+    connections = []
+
+    def keepConnection():
+        connections.append(pool.get()["Value"])
+        gotConnection.set()
+        done.wait(10)
+
+    thread = threading.Thread(target=keepConnection)
+    thread.start()
+    assert gotConnection.wait(10)
+    assert not pool.get(sticky=False)["OK"]
+
+    done.set()
+    thread.join()
+    result = pool.get(sticky=False)
+    assert result["OK"]
+    assert result["Value"] is connections[0]
+    pool.release()
+    assert connect.call_count == 1
+
+
+def test_lostConnectionRetry(connect):
+    """Only the queries are executed again when the connection is lost while executing them"""
+    failures = [MySQLdb.OperationalError(2013, "Lost connection to MySQL server during query")] * 2
+
+    def execute(cmd, args=None):
+        if not cmd.startswith("SET") and failures:
+            raise failures.pop()
+        return 1
+
+    def newConnection(**kwargs):
+        conn = MagicMock()
+        conn.cursor.return_value.execute.side_effect = execute
+        conn.cursor.return_value.fetchall.return_value = ((1,),)
+        return conn
+
+    connect.side_effect = newConnection
+    mysqlDB = MySQL(dbName="Test_MySQL_lostConnectionRetry")
+    assert connect.call_count == 1
+
+    # The server may have executed the statement before the connection was lost
+    result = mysqlDB._update("INSERT INTO Test (Value) VALUES (1)")
+    assert not result["OK"]
+    assert connect.call_count == 1
+
+    result = mysqlDB._query("SELECT 1")
+    assert result["OK"], result["Message"]
+    assert result["Value"] == ((1,),)
+    assert connect.call_count == 3
+    assert not failures
+
+
+def test_insertFieldsBulkTransaction(connect):
+    """The chunks of a bulk insert are all inserted, or none of them"""
+    statements = []
+
+    def execute(cmd, args=None):
+        statements.append(cmd.split()[0])
+        if cmd.startswith("INSERT") and "3" in args:
+            raise MySQLdb.IntegrityError(1062, "Duplicate entry")
+        return len(args) // 2 if args else 0
+
+    def newConnection(**kwargs):
+        conn = MagicMock()
+        conn.cursor.return_value.execute.side_effect = execute
+        conn.cursor.return_value.lastrowid = 0
+        return conn
+
+    connect.side_effect = newConnection
+    mysqlDB = MySQL(dbName="Test_MySQL_insertFieldsBulkTransaction")
+
+    del statements[:]
+    result = mysqlDB.insertFieldsBulk("Test", ["ID", "Value"], [(i, i) for i in range(3)], chunkSize=2)
+    assert result["OK"], result["Message"]
+    assert result["Value"] == 3
+    assert statements == ["START", "INSERT", "INSERT", "COMMIT"]
+
+    del statements[:]
+    result = mysqlDB.insertFieldsBulk("Test", ["ID", "Value"], [(i, i) for i in range(5)], chunkSize=2)
+    assert not result["OK"]
+    assert statements == ["START", "INSERT", "INSERT", "ROLLBACK"]
+
+    # A single statement needs no transaction
+    del statements[:]
+    assert mysqlDB.insertFieldsBulk("Test", ["ID", "Value"], [(0, 0)])["OK"]
+    assert statements == ["INSERT"]
+
+    # The transaction of the caller is used
+    assert mysqlDB.transactionStart()["OK"]
+    del statements[:]
+    assert mysqlDB.insertFieldsBulk("Test", ["ID", "Value"], [(i, i) for i in range(3)], chunkSize=2)["OK"]
+    assert statements == ["INSERT", "INSERT"]
+    assert mysqlDB.transactionCommit()["OK"]
+    assert connect.call_count == 1
@@ -21,13 +21,21 @@ __RCSID__ = "$Id$"
 from os.path import dirname, join
 
 # imports
+import re
 import time
 import pytest
 
 from subprocess import Popen
 
 # SUT
-from DIRAC.Core.Utilities.Subprocess import systemCall, shellCall, pythonCall, getChildrenPIDs, Subprocess
+from DIRAC.Core.Utilities.Subprocess import (
+    systemCall,
+    shellCall,
+    pythonCall,
+    getChildrenPIDs,
+    Subprocess,
+    OutputCapture,
+)
 
 # Mark this entire module as slow
 pytestmark = pytest.mark.slow
@@ -78,3 +86,66 @@ def test_decodingCommandOutput():
     retVal = sp.systemCall(r"""python -c 'import os; os.fdopen(2, "wb").write(b"\xdf")'""", shell=True)
     assert retVal["OK"]
     assert retVal["Value"] == (0, "", u"\ufffd")
+
+
+def test_outputCapture():
+    lines = []
+    capture = OutputCapture(lineCallback=lines.append)
+    for chunk in (b"first li", b"ne\nsecond line\nthi", b"rd \xc3", b"\xa9\n", b"last"):
+        capture.write(chunk)
+    assert lines == ["first line", "second line", u"third \xe9"]
+    # The lines processed are taken out of the buffer
+    assert capture.getValue() == "last"
+    assert capture.totalBytes == 36
+
+    capture = OutputCapture(headTailSize=10)
+    for i in range(1000):
+        capture.write(b"%05d\n" % i)
+    assert len(capture) <= 40
+    head, skipped, tail = re.match(
+        r"(.*)\n\[\.\.\. (\d+) bytes skipped \.\.\.\]\n(.*)", capture.getValue(), re.S
+    ).groups()
+    assert head == "00000\n0000"
+    assert tail == "998\n00999\n"
+    assert len(head) + int(skipped) + len(tail) == 6000
+
+
+def test_outputLimits(tmp_path):
+    cmd = "seq 1 100000"
+    retVal = shellCall(10, cmd, bufferLimit=1000)
+    assert not retVal["OK"]
+
+    retVal = shellCall(10, cmd, bufferLimit=1000, headTailSize=100)
+    assert retVal["OK"]
+    assert retVal["Value"][1].startswith("1\n2\n3\n")
+    assert retVal["Value"][1].endswith("99999\n100000\n")
+
+    lines = []
+    outputFile = str(tmp_path / "std.out")
+    retVal = shellCall(
+        10, cmd + "; echo -n end", callbackFunction=lambda _, line: lines.append(line), outputFiles=(outputFile, None)
+    )
+    assert retVal["OK"]
+    assert retVal["Value"] == (0, "", "")
+    assert len(lines) == 100000
+    with open(outputFile) as fd:
+        assert fd.read() == "\n".join(str(i) for i in range(1, 100001)) + "\nend"
+
+
+@pytest.mark.parametrize(
+    "kwargs",
+    [
+        {"callbackFunction": lambda _, line: None},
+        {"headTailSize": 1000},
+        {"outputFiles": ("std.out", None)},
+    ],
+)
+def test_timeoutEndlessOutput(tmp_path, kwargs):
+    # The output of the command never ends, and is not accumulated in memory
+    if "outputFiles" in kwargs:
+        kwargs = {"outputFiles": (str(tmp_path / "std.out"), None)}
+    start = time.time()
+    retVal = systemCall(3, ["yes"], **kwargs)
+    assert not retVal["OK"]
+    assert "Timeout" in retVal["Message"]
+    assert time.time() - start < 10
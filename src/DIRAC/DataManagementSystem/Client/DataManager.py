@@ -312,12 +312,13 @@ class DataManager(object):
         allFiles = []
         while len(activeDirs) > 0:
             currentDir = activeDirs[0]
-            # We only need the metadata (verbose) if a limit date is given
-            res = returnSingleResult(self.fileCatalog.listDirectory(currentDir, verbose=(days != 0)))
             activeDirs.remove(currentDir)
-            if not res["OK"]:
-                log.debug("Error retrieving directory contents", "%s %s" % (currentDir, res["Message"]))
-            else:
+            # The directory is listed page by page, the first one containing the subdirectories
+            # We only need the metadata (verbose) if a limit date is given
+            for res in self.fileCatalog.iterDirectory(currentDir, verbose=(days != 0)):
+                if not res["OK"]:
+                    log.debug("Error retrieving directory contents", "%s %s" % (currentDir, res["Message"]))
+                    break
                 dirContents = res["Value"]
                 subdirs = dirContents["SubDirs"]
                 files = dirContents["Files"]
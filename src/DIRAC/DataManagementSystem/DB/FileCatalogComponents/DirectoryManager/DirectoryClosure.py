@@ -43,6 +43,12 @@ class DirectoryClosure(DirectoryTreeBase):
         """
 
         dpath = os.path.normpath(path)
+        cached = self.db.dirIDCache.get(dpath)
+        if cached:
+            res = S_OK(cached[0])
+            res["Level"] = cached[1]
+            return res
+
         result = self.db.executeStoredProcedure("ps_find_dir", (dpath, "ret1", "ret2"), outputIds=[1, 2])
         if not result["OK"]:
             return result
@@ -50,6 +56,8 @@ class DirectoryClosure(DirectoryTreeBase):
         if not result["Value"]:
             return S_OK(0)
 
+        if result["Value"][0]:
+            self.db.dirIDCache.set(dpath, tuple(result["Value"][:2]))
         res = S_OK(result["Value"][0])
         res["Level"] = result["Value"][1]
         return res
@@ -63,9 +71,18 @@ class DirectoryClosure(DirectoryTreeBase):
         """
 
         dirDict = {}
-        if not paths:
+        uncachedPaths = []
+        for path in paths:
+            dpath = os.path.normpath(path)
+            # ps_find_dirs does not give the level of the directories, only findDir fills the cache
+            cached = self.db.dirIDCache.get(dpath)
+            if cached:
+                dirDict[dpath] = cached[0]
+            else:
+                uncachedPaths.append(dpath)
+        if not uncachedPaths:
             return S_OK(dirDict)
-        dpaths = stringListToString([os.path.normpath(path) for path in paths])
+        dpaths = stringListToString(uncachedPaths)
         result = self.db.executeStoredProcedureWithCursor("ps_find_dirs", (dpaths,))
         if not result["OK"]:
             return result
@@ -377,6 +394,11 @@ class DirectoryClosure(DirectoryTreeBase):
 
             dirId = result["Value"][0][0]
 
+            if path != "/":
+                result = self.db.dmeta.inheritMetadata(dirId, parentDir)
+                if not result["OK"]:
+                    return result
+
             result = S_OK(dirId)
             result["NewDirectory"] = True
             return result
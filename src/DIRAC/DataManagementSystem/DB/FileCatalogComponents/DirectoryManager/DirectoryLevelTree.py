@@ -34,7 +34,14 @@ class DirectoryLevelTree(DirectoryTreeBase):
     def findDir(self, path, connection=False):
         """Find directory ID for the given path"""
 
-        dpath = self.db._escapeString(os.path.normpath(path))
+        normPath = os.path.normpath(path)
+        cached = self.db.dirIDCache.get(normPath)
+        if cached:
+            res = S_OK(cached[0])
+            res["Level"] = cached[1]
+            return res
+
+        dpath = self.db._escapeString(normPath)
         if not dpath["OK"]:
             return dpath
         dpath = dpath["Value"]
@@ -46,26 +53,35 @@ class DirectoryLevelTree(DirectoryTreeBase):
         if not result["Value"]:
             return S_OK("")
 
+        self.db.dirIDCache.set(normPath, result["Value"][0])
         res = S_OK(result["Value"][0][0])
         res["Level"] = result["Value"][0][1]
         return res
 
     def findDirs(self, paths, connection=False):
         """Find DirIDs for the given path list"""
+        dirDict = {}
         dpathList = []
         for path in paths:
-            dpath = self.db._escapeString(os.path.normpath(path))
+            normPath = os.path.normpath(path)
+            cached = self.db.dirIDCache.get(normPath)
+            if cached:
+                dirDict[normPath] = cached[0]
+                continue
+            dpath = self.db._escapeString(normPath)
             if not dpath["OK"]:
                 return dpath
             dpathList.append(dpath["Value"])
+        if not dpathList:
+            return S_OK(dirDict)
         dpaths = ",".join(dpathList)
-        req = "SELECT DirName,DirID from FC_DirectoryLevelTree WHERE DirName in (%s)" % dpaths
+        req = "SELECT DirName,DirID,Level from FC_DirectoryLevelTree WHERE DirName in (%s)" % dpaths
         result = self.db._query(req, connection)
         if not result["OK"]:
             return result
-        dirDict = {}
-        for dirName, dirID in result["Value"]:
+        for dirName, dirID, level in result["Value"]:
             dirDict[dirName] = dirID
+            self.db.dirIDCache.set(dirName, (dirID, level))
 
         return S_OK(dirDict)
 
@@ -148,8 +164,17 @@ class DirectoryLevelTree(DirectoryTreeBase):
                 names.append("LPATH%d" % i)
                 values.append(epathList[i - 1])
 
-        result = self.db._getConnection()
-        conn = result["Value"]
+        # The statements of the insertion must all be executed with the same connection
+        result = self.db._getConnection(sticky=False)
+        if not result["OK"]:
+            return result
+        try:
+            return self.__insertDir(path, level, parentDirID, names, values, result["Value"])
+        finally:
+            self.db._releaseConnection()
+
+    def __insertDir(self, path, level, parentDirID, names, values, conn):
+        """Insert a new directory entry, and update its path number"""
         # result = self.db._query("LOCK TABLES FC_DirectoryLevelTree WRITE; ",conn)
         result = self.db.insertFields("FC_DirectoryLevelTree", names, values, conn)
         if not result["OK"]:
@@ -513,13 +538,20 @@ class DirectoryLevelTree(DirectoryTreeBase):
             if not result["OK"]:
                 continue
 
-            connection = self._getConnection()
-            result = self.db._query("LOCK TABLES FC_DirectoryLevelTree WRITE", connection)
+            # The tables must be unlocked with the connection which locked them
+            result = self.db._getConnection(sticky=False)
             if not result["OK"]:
-                resUnlock = self.db._query("UNLOCK TABLES", connection)
                 return result
-            result = self.__rebuildLevelIndexes(parentID, connection)
-            resUnlock = self.db._query("UNLOCK TABLES", connection)
+            connection = result["Value"]
+            try:
+                result = self.db._query("LOCK TABLES FC_DirectoryLevelTree WRITE", connection)
+                if not result["OK"]:
+                    resUnlock = self.db._query("UNLOCK TABLES", connection)
+                    return result
+                result = self.__rebuildLevelIndexes(parentID, connection)
+                resUnlock = self.db._query("UNLOCK TABLES", connection)
+            finally:
+                self.db._releaseConnection()
 
         return S_OK()
 
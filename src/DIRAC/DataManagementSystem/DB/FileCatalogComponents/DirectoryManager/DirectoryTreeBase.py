@@ -124,6 +124,10 @@ class DirectoryTreeBase(object):
         if not dirDict:
             self.removeDir(path)
             return S_ERROR("Failed to create directory %s" % path)
+        if path != "/":
+            result = self.db.dmeta.inheritMetadata(dirID, os.path.dirname(path))
+            if not result["OK"]:
+                return result
         return S_OK(dirID)
 
     #####################################################################
@@ -630,8 +634,12 @@ class DirectoryTreeBase(object):
 
         return S_OK({"DirLFNDict": dirLfnDict, "IDLFNDict": idLfnDict})
 
-    def _getDirectoryContents(self, path, details=False):
-        """Get contents of a given directory"""
+    def _getDirectoryContents(self, path, details=False, pageSize=0):
+        """Get contents of a given directory
+
+        :param int pageSize: if given, only the first page of files is returned, with the cursor
+                             of the next page in the "Cursor" key (see listDirectoryPaged)
+        """
         result = self.findDir(path)
         if not result["OK"]:
             return result
@@ -658,15 +666,23 @@ class DirectoryTreeBase(object):
                     directories[dirName] = result["Value"]
             else:
                 directories[dirName] = True
-        result = self.db.fileManager.getFilesInDirectory(directoryID, verbose=details)
-        if not result["OK"]:
-            return result
-        files = result["Value"]
+        if pageSize:
+            result = self.db.fileManager.getFilesInDirectoryPaged(directoryID, 0, pageSize, verbose=details)
+            if not result["OK"]:
+                return result
+            files, cursor = result["Value"]
+        else:
+            result = self.db.fileManager.getFilesInDirectory(directoryID, verbose=details)
+            if not result["OK"]:
+                return result
+            files = result["Value"]
         result = self.db.datasetManager.getDatasetsInDirectory(directoryID, verbose=details)
         if not result["OK"]:
             return result
         datasets = result["Value"]
         pathDict = {"Files": files, "SubDirs": directories, "Links": links, "Datasets": datasets}
+        if pageSize:
+            pathDict["Cursor"] = cursor
 
         return S_OK(pathDict)
 
@@ -683,6 +699,55 @@ class DirectoryTreeBase(object):
 
         return S_OK({"Successful": successful, "Failed": failed})
 
+    def listDirectoryPaged(self, path, cursor=0, pageSize=1000, verbose=False):
+        """Get one page of the listing of a directory. The first page also contains the subdirectories,
+        links and datasets, the following ones only the files.
+
+        :param str path: directory path
+        :param int cursor: cursor returned with the previous page, 0 for the first page
+        :param int pageSize: maximum number of files in the page
+        :param bool verbose: if True, give the details of the entries
+
+        :return: S_OK(dict) with the keys of the listDirectory results plus "Cursor",
+                 the cursor of the next page, None after the last page
+        """
+        if not cursor:
+            return self._getDirectoryContents(path, details=verbose, pageSize=pageSize)
+        result = self.findDir(path)
+        if not result["OK"]:
+            return result
+        directoryID = result["Value"]
+        if not directoryID:
+            return S_ERROR("Directory not found")
+        result = self.db.fileManager.getFilesInDirectoryPaged(directoryID, cursor, pageSize, verbose=verbose)
+        if not result["OK"]:
+            return result
+        files, nextCursor = result["Value"]
+        return S_OK({"Files": files, "SubDirs": {}, "Links": {}, "Datasets": {}, "Cursor": nextCursor})
+
+    def getDirectoryReplicasPaged(self, path, cursor=0, pageSize=1000, allStatus=False):
+        """Get the replicas of one page of the files of a directory
+
+        :param str path: directory path
+        :param int cursor: cursor returned with the previous page, 0 for the first page
+        :param int pageSize: maximum number of files in the page
+        :param bool allStatus: whether all replicas and file status are considered
+
+        :return: S_OK(dict) with the keys "Replicas", the getDirectoryReplicas result for the page,
+                 and "Cursor", the cursor of the next page, None after the last page
+        """
+        result = self.findDir(path)
+        if not result["OK"]:
+            return result
+        directoryID = result["Value"]
+        if not directoryID:
+            return S_ERROR("Directory not found")
+        result = self.db.fileManager.getDirectoryReplicasPaged(directoryID, cursor, pageSize, allStatus=allStatus)
+        if not result["OK"]:
+            return result
+        replicas, nextCursor = result["Value"]
+        return S_OK({"Replicas": replicas, "Cursor": nextCursor})
+
     def getDirectoryReplicas(self, lfns, allStatus=False):
         """Get replicas for files in the given directories"""
         successful = {}
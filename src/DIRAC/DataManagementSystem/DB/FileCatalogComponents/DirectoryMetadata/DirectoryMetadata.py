@@ -52,17 +52,7 @@ class DirectoryMetadata(object):
                 "Attempt to add an existing metadata with different type: %s/%s" % (pType, result["Value"][pName])
             )
 
-        valueType = pType
-        if pType.lower()[:3] == "int":
-            valueType = "INT"
-        elif pType.lower() == "string":
-            valueType = "VARCHAR(128)"
-        elif pType.lower() == "float":
-            valueType = "FLOAT"
-        elif pType.lower() == "date":
-            valueType = "DATETIME"
-        elif pType == "MetaSet":
-            valueType = "VARCHAR(64)"
+        valueType = self.__getMetaValueType(pType)
 
         req = "CREATE TABLE FC_Meta_%s ( DirID INTEGER NOT NULL, Value %s, PRIMARY KEY (DirID), INDEX (Value) )" % (
             pName,
@@ -72,6 +62,11 @@ class DirectoryMetadata(object):
         if not result["OK"]:
             return result
 
+        if self.db.materializedDirMeta:
+            result = self.__createEffectiveMetaTable(pName, valueType)
+            if not result["OK"]:
+                return result
+
         result = self.db.insertFields("FC_MetaFields", ["MetaName", "MetaType"], [pName, pType])
         if not result["OK"]:
             return result
@@ -81,8 +76,34 @@ class DirectoryMetadata(object):
         if not result["OK"]:
             return result
 
+        if self.db.materializedDirMeta:
+            result = self.__rebuildEffectiveMetadata(pName)
+            if not result["OK"]:
+                return result
+
         return S_OK("Added new metadata: %d" % metadataID)
 
+    @staticmethod
+    def __getMetaValueType(pType):
+        """Get the MySQL type of the values of a metadata field
+
+        :param str pType: metadata type as given by the user
+
+        :return: str
+        """
+        valueType = pType
+        if pType.lower()[:3] == "int":
+            valueType = "INT"
+        elif pType.lower() == "string":
+            valueType = "VARCHAR(128)"
+        elif pType.lower() == "float":
+            valueType = "FLOAT"
+        elif pType.lower() == "date":
+            valueType = "DATETIME"
+        elif pType == "MetaSet":
+            valueType = "VARCHAR(64)"
+        return valueType
+
     def deleteMetadataField(self, pName, credDict):
         """Remove metadata field
 
@@ -97,6 +118,10 @@ class DirectoryMetadata(object):
         error = ""
         if not result["OK"]:
             error = result["Message"]
+        req = "DROP TABLE IF EXISTS FC_MetaEff_%s" % pName
+        result = self.db._update(req)
+        if not result["OK"]:
+            error = "; ".join([msg for msg in (error, result["Message"]) if msg])
         req = "DELETE FROM FC_MetaFields WHERE MetaName='%s'" % pName
         result = self.db._update(req)
         if not result["OK"]:
@@ -251,6 +276,10 @@ class DirectoryMetadata(object):
                         return result
                 else:
                     return result
+            if self.db.materializedDirMeta:
+                result = self.__materializeMetadata(metaName, dirID, metaValue)
+                if not result["OK"]:
+                    return result
 
         return S_OK()
 
@@ -281,8 +310,10 @@ class DirectoryMetadata(object):
                 # Indexed meta case
                 req = "DELETE FROM FC_Meta_%s WHERE DirID=%d" % (meta, dirID)
                 result = self.db._update(req)
+                if result["OK"] and self.db.materializedDirMeta:
+                    result = self.__unmaterializeMetadata(meta, dirID)
                 if not result["OK"]:
-                    failedMeta[meta] = result["Value"]
+                    failedMeta[meta] = result["Message"]
             else:
                 # Meta parameter case
                 req = "DELETE FROM FC_DirMeta WHERE MetaKey='%s' AND DirID=%d" % (meta, dirID)
@@ -471,6 +502,178 @@ class DirectoryMetadata(object):
         result = self.db._update(req)
         return result
 
+    ############################################################################################
+    #
+    # Effective metadata: the metadata of each directory, its own or inherited from its parents,
+    # materialized in the FC_MetaEff_<name> tables when MaterializedDirectoryMetadata is set.
+    # SourceID is the directory where the metadata is defined.
+    #
+
+    def initializeEffectiveMetadata(self):
+        """Create and fill the effective metadata tables missing for the defined metadata fields
+
+        :return: S_OK/S_ERROR
+        """
+        result = self.db._query("SHOW TABLES")
+        if not result["OK"]:
+            return result
+        tables = set(row[0] for row in result["Value"])
+
+        result = self._getMetadataFields({})
+        if not result["OK"]:
+            return result
+        for metaName, metaType in result["Value"].items():
+            if "FC_MetaEff_%s" % metaName in tables:
+                continue
+            result = self.__createEffectiveMetaTable(metaName, self.__getMetaValueType(metaType))
+            if not result["OK"]:
+                return result
+            result = self.__rebuildEffectiveMetadata(metaName)
+            if not result["OK"]:
+                return result
+        return S_OK()
+
+    def inheritMetadata(self, dirID, parentPath):
+        """Give to a new directory the effective metadata of its parent
+
+        :param int dirID: ID of the new directory
+        :param str parentPath: path of the parent directory
+
+        :return: S_OK/S_ERROR
+        """
+        if not self.db.materializedDirMeta:
+            return S_OK()
+        result = self.db.dtree.findDir(parentPath)
+        if not result["OK"]:
+            return result
+        parentID = result["Value"]
+        if not parentID or int(parentID) == int(dirID):
+            return S_OK()
+
+        result = self._getMetadataFields({})
+        if not result["OK"]:
+            return result
+        for metaName in result["Value"]:
+            req = "INSERT INTO FC_MetaEff_%s (DirID,Value,SourceID) SELECT %d,Value,SourceID FROM FC_MetaEff_%s " % (
+                metaName,
+                int(dirID),
+                metaName,
+            )
+            req += "WHERE DirID=%d" % int(parentID)
+            result = self.db._update(req)
+            if not result["OK"]:
+                return result
+        return S_OK()
+
+    def __createEffectiveMetaTable(self, metaName, valueType):
+        """Create the effective metadata table of a metadata field
+
+        :param str metaName: metadata name
+        :param str valueType: MySQL type of the values
+
+        :return: S_OK/S_ERROR
+        """
+        req = "CREATE TABLE FC_MetaEff_%s ( DirID INTEGER NOT NULL, Value %s, SourceID INTEGER NOT NULL, " % (
+            metaName,
+            valueType,
+        )
+        req += "PRIMARY KEY (DirID), INDEX (Value), INDEX (SourceID) )"
+        return self.db._update(req)
+
+    def __rebuildEffectiveMetadata(self, metaName):
+        """Fill the effective metadata table of a metadata field from the directories defining it
+
+        :param str metaName: metadata name
+
+        :return: S_OK/S_ERROR
+        """
+        result = self.db._update("DELETE FROM FC_MetaEff_%s" % metaName)
+        if not result["OK"]:
+            return result
+        result = self.db._query("SELECT DirID,Value FROM FC_Meta_%s" % metaName)
+        if not result["OK"]:
+            return result
+        metaValues = dict(result["Value"])
+        if not metaValues:
+            return S_OK()
+
+        result = self.db.dtree.getDirectoryPaths(list(metaValues))
+        if not result["OK"]:
+            return result
+        # Parents first, so that the subdirectories defining the metadata take over for their subtrees
+        for dirID in sorted(metaValues, key=lambda dirID: result["Value"][dirID].rstrip("/").count("/")):
+            res = self.__materializeMetadata(metaName, dirID, metaValues[dirID])
+            if not res["OK"]:
+                return res
+        return S_OK()
+
+    def __materializeMetadata(self, metaName, dirID, metaValue):
+        """Set the effective value of a metadata for a directory defining it and its subdirectories,
+        except those inheriting it from a closer directory
+
+        :param str metaName: metadata name
+        :param int dirID: directory ID
+        :param metaValue: metadata value
+
+        :return: S_OK/S_ERROR
+        """
+        result = self.db.dtree.getPathIDsByID(dirID)
+        if not result["OK"]:
+            return result
+        pathString = ",".join([str(x) for x in result["Value"]])
+        result = self.db.dtree.getSubdirectoriesByID(dirID, requestString=True, includeParent=True)
+        if not result["OK"]:
+            return result
+        subdirSelection = result["Value"]
+        result = self.db._escapeString(str(metaValue))
+        if not result["OK"]:
+            return result
+        value = result["Value"]
+
+        # The directories already inheriting the metadata from a subdirectory are kept as they are
+        req = "INSERT INTO FC_MetaEff_%s (DirID,Value,SourceID) SELECT S.*,%s,%d FROM ( %s ) AS S " % (
+            metaName,
+            value,
+            dirID,
+            subdirSelection,
+        )
+        req += "ON DUPLICATE KEY UPDATE Value=IF(SourceID IN (%s),%s,Value), " % (pathString, value)
+        req += "SourceID=IF(SourceID IN (%s),%d,SourceID)" % (pathString, dirID)
+        return self.db._update(req)
+
+    def __unmaterializeMetadata(self, metaName, dirID):
+        """Update the effective metadata after the removal of a metadata defined by a directory:
+        its subtree inherits it again from a parent directory, if any
+
+        :param str metaName: metadata name
+        :param int dirID: directory ID
+
+        :return: S_OK/S_ERROR
+        """
+        result = self.db.dtree.getPathIDsByID(dirID)
+        if not result["OK"]:
+            return result
+        parentIDs = [int(x) for x in result["Value"] if int(x) != int(dirID)]
+        sourceID = None
+        if parentIDs:
+            req = "SELECT DirID FROM FC_Meta_%s WHERE DirID IN (%s)" % (metaName, ",".join(str(x) for x in parentIDs))
+            result = self.db._query(req)
+            if not result["OK"]:
+                return result
+            definingIDs = [int(row[0]) for row in result["Value"]]
+            if definingIDs:
+                sourceID = max(definingIDs, key=parentIDs.index)
+
+        if sourceID is None:
+            req = "DELETE FROM FC_MetaEff_%s WHERE SourceID=%d" % (metaName, dirID)
+        else:
+            req = "UPDATE FC_MetaEff_%s AS E, FC_Meta_%s AS M SET E.Value=M.Value, E.SourceID=M.DirID " % (
+                metaName,
+                metaName,
+            )
+            req += "WHERE E.SourceID=%d AND M.DirID=%d" % (dirID, sourceID)
+        return self.db._update(req)
+
     ############################################################################################
     #
     # Find directories corresponding to the metadata
@@ -667,19 +870,16 @@ class DirectoryMetadata(object):
         else:
             return S_OK(result["Value"][0][0])
 
-    @queryTime
-    def findDirIDsByMetadata(self, queryDict, path, credDict):
-        """Find Directories satisfying the given metadata and being subdirectories of
-        the given path
+    def __getQueryMetadataForPath(self, queryDict, path, credDict):
+        """Expand the metadata query and remove from it the metadata already satisfied
+        by the given path or its parents
 
         :param dict queryDict: dictionary containing query data
         :param str path: starting directory path
         :param dict credDict: client credential dictionary
 
-        :return: S_OK/S_ERROR, Value list of selected directory IDs
+        :return: S_OK/S_ERROR, Value tuple (metadata query left, ID of the path directory or 0 for the root)
         """
-
-        pathDirList = []
         pathDirID = 0
         pathString = "0"
         if path != "/":
@@ -707,7 +907,106 @@ class DirectoryMetadata(object):
                 # given metadata, no need to check it further
                 del finalMetaDict[meta]
 
-        if finalMetaDict:
+        return S_OK((finalMetaDict, pathDirID))
+
+    def __buildEffectiveMetadataQuery(self, metaDict, pathDirID):
+        """Build the query selecting the directories conforming to all the given metadata,
+        inherited or their own, with one SQL statement joining the effective metadata tables.
+        At least one metadata of the query must not be 'Missing'
+
+        :param dict metaDict: metadata query, with the metaSets expanded
+        :param int pathDirID: ID of the directory to search into, 0 for the whole catalog
+
+        :return: S_OK/S_ERROR, Value SQL statement returning the directory IDs
+        """
+        selectedMeta = sorted(meta for meta in metaDict if metaDict[meta] != "Missing")
+        missingMeta = sorted(meta for meta in metaDict if metaDict[meta] == "Missing")
+        tables = []
+        conditions = []
+        for index, meta in enumerate(selectedMeta):
+            alias = "E%d" % index
+            if index:
+                tables.append("JOIN FC_MetaEff_%s AS %s ON %s.DirID=E0.DirID" % (meta, alias, alias))
+            else:
+                tables.append("FC_MetaEff_%s AS E0" % meta)
+            result = self.__createMetaSelection(metaDict[meta], "%s." % alias)
+            if not result["OK"]:
+                return result
+            if result["Value"]:
+                conditions.append(result["Value"])
+        for index, meta in enumerate(missingMeta):
+            alias = "X%d" % index
+            tables.append("LEFT JOIN FC_MetaEff_%s AS %s ON %s.DirID=E0.DirID" % (meta, alias, alias))
+            conditions.append("%s.DirID IS NULL" % alias)
+        if pathDirID:
+            result = self.db.dtree.getSubdirectoriesByID(pathDirID, includeParent=True, requestString=True)
+            if not result["OK"]:
+                return result
+            conditions.append("E0.DirID IN ( %s )" % result["Value"])
+
+        req = "SELECT E0.DirID FROM %s" % " ".join(tables)
+        if conditions:
+            req += " WHERE %s" % " AND ".join(conditions)
+        return S_OK(req)
+
+    def __findDirIDsByEffectiveMetadata(self, metaDict, path, pathDirID):
+        """Find the directories conforming to all the given metadata in the effective metadata tables
+
+        :param dict metaDict: metadata query, with the metaSets expanded
+        :param str path: directory path to search into
+        :param int pathDirID: ID of the directory to search into, 0 for the root
+
+        :return: S_OK/S_ERROR, Value list of directory IDs
+        """
+        if all(value == "Missing" for value in metaDict.values()):
+            # Nothing to select on, take the directories out of the effective metadata tables
+            result = self.db.dtree.findDir(path)
+            if not result["OK"]:
+                return result
+            if not result["Value"]:
+                return S_ERROR("Path not found: %s" % path)
+            result = self.db.dtree.getSubdirectoriesByID(int(result["Value"]), includeParent=True)
+            if not result["OK"]:
+                return result
+            dirIDs = set(result["Value"])
+            req = " UNION ".join("SELECT DirID FROM FC_MetaEff_%s" % meta for meta in sorted(metaDict))
+            result = self.db._query(req)
+            if not result["OK"]:
+                return result
+            return S_OK(list(dirIDs - set(row[0] for row in result["Value"])))
+
+        result = self.__buildEffectiveMetadataQuery(metaDict, pathDirID)
+        if not result["OK"]:
+            return result
+        result = self.db._query(result["Value"])
+        if not result["OK"]:
+            return result
+        return S_OK([row[0] for row in result["Value"]])
+
+    @queryTime
+    def findDirIDsByMetadata(self, queryDict, path, credDict):
+        """Find Directories satisfying the given metadata and being subdirectories of
+        the given path
+
+        :param dict queryDict: dictionary containing query data
+        :param str path: starting directory path
+        :param dict credDict: client credential dictionary
+
+        :return: S_OK/S_ERROR, Value list of selected directory IDs
+        """
+
+        pathDirList = []
+        result = self.__getQueryMetadataForPath(queryDict, path, credDict)
+        if not result["OK"]:
+            return result
+        finalMetaDict, pathDirID = result["Value"]
+
+        if finalMetaDict and self.db.materializedDirMeta:
+            result = self.__findDirIDsByEffectiveMetadata(finalMetaDict, path, pathDirID)
+            if not result["OK"]:
+                return result
+            dirList = result["Value"]
+        elif finalMetaDict:
             pathSelection = ""
             if pathDirID:
                 result = self.db.dtree.getSubdirectoriesByID(pathDirID, includeParent=True, requestString=True)
@@ -829,6 +1128,9 @@ class DirectoryMetadata(object):
 
         :return: S_OK/S_ERROR, Value list file IDs in selected directories
         """
+        if self.db.materializedDirMeta:
+            return self.__findFileIDsByEffectiveMetadata(metaDict, path, credDict, startItem, maxItems)
+
         result = self.findDirIDsByMetadata(metaDict, path, credDict)
         if not result["OK"]:
             return result
@@ -836,6 +1138,56 @@ class DirectoryMetadata(object):
         dirList = result["Value"]
         return self.db.dtree.getFileIDsInDirectoryWithLimits(dirList, credDict, startItem, maxItems)
 
+    def __findFileIDsByEffectiveMetadata(self, metaDict, path, credDict, startItem, maxItems):
+        """Get a page of the IDs of the files in the directories satisfying the metadata query,
+        selecting the directories in the same SQL statement, ordered by file ID
+
+        :return: S_OK/S_ERROR, Value list of file IDs, with the TotalRecords number
+        """
+        result = self.__getQueryMetadataForPath(metaDict, path, credDict)
+        if not result["OK"]:
+            return result
+        finalMetaDict, pathDirID = result["Value"]
+
+        if finalMetaDict and all(value == "Missing" for value in finalMetaDict.values()):
+            result = self.findDirIDsByMetadata(metaDict, path, credDict)
+            if not result["OK"]:
+                return result
+            return self.db.dtree.getFileIDsInDirectoryWithLimits(result["Value"], credDict, startItem, maxItems)
+
+        if finalMetaDict:
+            result = self.__buildEffectiveMetadataQuery(finalMetaDict, pathDirID)
+        elif pathDirID:
+            result = self.db.dtree.getSubdirectoriesByID(pathDirID, includeParent=True, requestString=True)
+        else:
+            # No directory selection at all: like for an empty list of directories
+            result = S_OK([])
+            result["TotalRecords"] = 0
+            return result
+        if not result["OK"]:
+            return result
+        dirSelection = result["Value"]
+
+        req = "SELECT COUNT(*) FROM FC_Files WHERE DirID IN ( %s )" % dirSelection
+        result = self.db._query(req)
+        if not result["OK"]:
+            return result
+        totalRecords = result["Value"][0][0]
+        fileIDs = []
+        if totalRecords:
+            req = "SELECT FileID FROM FC_Files WHERE DirID IN ( %s ) ORDER BY FileID LIMIT %d, %d" % (
+                dirSelection,
+                int(startItem),
+                int(maxItems),
+            )
+            result = self.db._query(req)
+            if not result["OK"]:
+                return result
+            fileIDs = [row[0] for row in result["Value"]]
+        result = S_OK(fileIDs)
+        result["TotalRecords"] = totalRecords
+        return result
+
     ################################################################################################
     #
     # Find metadata compatible with other metadata in order to organize dynamically updated metadata selectors
@@ -1011,6 +1363,9 @@ class DirectoryMetadata(object):
         for meta in metaFields:
             req = "DELETE FROM FC_Meta_%s WHERE DirID in ( %s )" % (meta, dirListString)
             result = self.db._query(req)
+            if result["OK"] and self.db.materializedDirMeta:
+                req = "DELETE FROM FC_MetaEff_%s WHERE DirID in ( %s )" % (meta, dirListString)
+                result = self.db._query(req)
             if not result["OK"]:
                 failed[meta] = result["Message"]
             else:
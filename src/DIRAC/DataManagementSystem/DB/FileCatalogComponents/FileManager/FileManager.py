@@ -29,8 +29,17 @@ class FileManager(FileManagerBase):
         """Find file ID if it exists for the given list of LFNs"""
 
         connection = self._getConnection(connection)
-        dirDict = self._getFileDirectories(lfns)
+        successful = {}
+        # The FileIDs do not depend on the file status, they can come from the cache
+        if metadata == ["FileID"] and allStatus:
+            for lfn in lfns:
+                fileID = self.db.fileIDCache.get(lfn)
+                if fileID:
+                    successful[lfn] = {"FileID": fileID}
+        dirDict = self._getFileDirectories([lfn for lfn in lfns if lfn not in successful])
         failed = {}
+        if not dirDict:
+            return S_OK({"Successful": successful, "Failed": failed})
         result = self.db.dtree.findDirs(list(dirDict))
         if not result["OK"]:
             return result
@@ -43,7 +52,6 @@ class FileManager(FileManagerBase):
                     fname = fname.replace("//", "/")
                     failed[fname] = "No such file or directory"
 
-        successful = {}
         for dirPath in directoryIDs:
             fileNames = dirDict[dirPath]
             res = self._getDirectoryFiles(
@@ -60,6 +68,8 @@ class FileManager(FileManagerBase):
                     fname = "%s/%s" % (dirPath, fileName)
                     fname = fname.replace("//", "/")
                     successful[fname] = fileDict
+                    if "FileID" in fileDict:
+                        self.db.fileIDCache.set(fname, fileDict["FileID"])
             for fileName in fileNames:
                 if fileName not in res["Value"]:
                     fname = "%s/%s" % (dirPath, fileName)
@@ -70,9 +80,15 @@ class FileManager(FileManagerBase):
     def _findFileIDs(self, lfns, connection=False):
         """Find lfn <-> FileID correspondence"""
         connection = self._getConnection(connection)
-        dirDict = self._getFileDirectories(lfns)
         failed = {}
         successful = {}
+        for lfn in lfns:
+            fileID = self.db.fileIDCache.get(lfn)
+            if fileID:
+                successful[lfn] = fileID
+        dirDict = self._getFileDirectories([lfn for lfn in lfns if lfn not in successful])
+        if not dirDict:
+            return S_OK({"Successful": successful, "Failed": failed})
         result = self.db.dtree.findDirs(list(dirDict))
         if not result["OK"]:
             return result
@@ -103,6 +119,7 @@ class FileManager(FileManagerBase):
                 fname = "%s/%s" % (directoryPaths[dirID], fileName)
                 fname = fname.replace("//", "/")
                 successful[fname] = fileID
+                self.db.fileIDCache.set(fname, fileID)
 
         for lfn in lfns:
             if lfn not in successful:
@@ -1102,12 +1102,12 @@ class FileManagerBase(object):
         """
         return self._getDirectoryFileIDs(dirID, requestString=requestString)
 
-    def getFilesInDirectory(self, dirID, verbose=False, connection=False):
+    def getFilesInDirectory(self, dirID, verbose=False, connection=False, fileNames=None):
         connection = self._getConnection(connection)
         files = {}
         res = self._getDirectoryFiles(
             dirID,
-            [],
+            fileNames or [],
             [
                 "FileID",
                 "Size",
@@ -1180,6 +1180,84 @@ class FileManagerBase(object):
 
         return S_OK(resultDict)
 
+    def _getDirectoryFilesPage(self, dirID, afterFileID, limit, allStatus=False, connection=False):
+        """Get a page of the files in a directory, in the order of their FileID.
+        The query is served by the DirID index, which also holds the FileID
+
+        :param int dirID: ID of the directory
+        :param int afterFileID: only the files with a larger FileID are considered
+        :param int limit: maximum number of files in the page
+        :param bool allStatus: if False, only the files with a status in visibleFileStatus are considered
+
+        :return: S_OK( ( {fileID: fileName}, cursor ) ), the cursor being the FileID to start the next page from,
+                 or None after the last page
+        """
+        connection = self._getConnection(connection)
+        req = "SELECT FileID,FileName FROM FC_Files WHERE DirID=%d AND FileID>%d" % (dirID, afterFileID)
+        if not allStatus:
+            statusIDs = []
+            for status in self.db.visibleFileStatus:
+                res = self._getStatusInt(status, connection=connection)
+                if res["OK"]:
+                    statusIDs.append(res["Value"])
+            if statusIDs:
+                req += " AND Status IN (%s)" % intListToString(statusIDs)
+        req += " ORDER BY FileID LIMIT %d" % limit
+        res = self.db._query(req, connection)
+        if not res["OK"]:
+            return res
+        rows = res["Value"]
+        cursor = rows[-1][0] if len(rows) == limit else None
+        return S_OK((dict(rows), cursor))
+
+    def getFilesInDirectoryPaged(self, dirID, afterFileID=0, limit=1000, verbose=False, connection=False):
+        """Get a page of the files in the given directory, like getFilesInDirectory
+
+        :param int dirID: ID of the directory
+        :param int afterFileID: FileID after which the page starts, 0 for the first page
+        :param int limit: maximum number of files in the page
+        :param bool verbose: if True, add the replicas of the files
+
+        :return: S_OK( ( files, cursor ) ), the cursor being the afterFileID of the next page,
+                 or None after the last page
+        """
+        connection = self._getConnection(connection)
+        result = self._getDirectoryFilesPage(dirID, afterFileID, limit, connection=connection)
+        if not result["OK"]:
+            return result
+        fileIDNames, cursor = result["Value"]
+        if not fileIDNames:
+            return S_OK(({}, cursor))
+        result = self.getFilesInDirectory(
+            dirID, verbose=verbose, connection=connection, fileNames=list(fileIDNames.values())
+        )
+        if not result["OK"]:
+            return result
+        return S_OK((result["Value"], cursor))
+
+    def getDirectoryReplicasPaged(self, dirID, afterFileID=0, limit=1000, allStatus=False, connection=False):
+        """Get the replicas for a page of the files in the given Directory, like getDirectoryReplicas
+
+        :param int dirID: ID of the directory
+        :param int afterFileID: FileID after which the page starts, 0 for the first page
+        :param int limit: maximum number of files in the page
+        :param bool allStatus: whether all replicas and file status are considered
+
+        :return: S_OK( ( {fileName: {SE: PFN}}, cursor ) ), the cursor being the afterFileID of the next page,
+                 or None after the last page
+        """
+        connection = self._getConnection(connection)
+        result = self._getDirectoryFilesPage(dirID, afterFileID, limit, allStatus=allStatus, connection=connection)
+        if not result["OK"]:
+            return result
+        fileIDNames, cursor = result["Value"]
+        result = self.__getReplicasForIDs(fileIDNames, allStatus, connection)
+        if not result["OK"]:
+            return result
+        # Like in getDirectoryReplicas, the files without replicas are not reported
+        replicas = dict((fileName, seDict) for fileName, seDict in result["Value"].items() if seDict)
+        return S_OK((replicas, cursor))
+
     def _getFileDirectories(self, lfns):
         """For a list of lfn, returns a dictionary with key the directory, and value
         the files in that directory. It does not make any query, just splits the names
@@ -6,6 +6,10 @@ from __future__ import print_function
 
 __RCSID__ = "$Id$"
 
+import collections
+import threading
+import time
+
 import six
 from DIRAC import S_OK, S_ERROR
 from DIRAC.Core.Utilities.List import intListToString
@@ -26,3 +30,86 @@ def getIDSelectString(ids):
         return S_ERROR("Illegal fileID")
 
     return S_OK(idString)
+
+
+class IDCache(object):
+    """Thread safe LRU cache of the IDs (DirID, FileID) of the catalog paths, bounded in memory.
+    The entries also expire after a given lifetime, to limit the effect of the changes done
+    through other instances of the catalog service.
+    """
+
+    # Approximate memory used by an entry in addition to its path
+    ENTRY_OVERHEAD = 200
+
+    def __init__(self, maxSize=0, lifetime=60):
+        """
+        :param int maxSize: maximum memory used by the entries, in bytes. 0 disables the cache
+        :param int lifetime: lifetime of the entries, in seconds
+        """
+        self.maxSize = maxSize
+        self.lifetime = lifetime
+        self.hits = 0
+        self.misses = 0
+        self.size = 0
+        self.__entries = collections.OrderedDict()
+        self.__lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.__entries)
+
+    @property
+    def enabled(self):
+        return self.maxSize > 0
+
+    def get(self, path):
+        """Get the cached value for a path
+
+        :return: the value, or None if it is not cached
+        """
+        if not self.enabled:
+            return None
+        with self.__lock:
+            entry = self.__entries.get(path)
+            if entry is None or entry[1] < time.time():
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.__entries.move_to_end(path)
+            return entry[0]
+
+    def set(self, path, value):
+        """Cache the value for a path, evicting the least recently used entries if needed"""
+        if not self.enabled:
+            return
+        with self.__lock:
+            if path in self.__entries:
+                self.__remove(path)
+            self.__entries[path] = (value, time.time() + self.lifetime)
+            self.size += len(path) + self.ENTRY_OVERHEAD
+            while self.size > self.maxSize and self.__entries:
+                self.__remove(next(iter(self.__entries)))
+
+    def invalidate(self, paths, recursive=False):
+        """Remove the given paths from the cache
+
+        :param paths: list of paths
+        :param bool recursive: if True, also remove all the paths below the given ones
+        """
+        if not self.enabled:
+            return
+        with self.__lock:
+            for path in paths:
+                if path in self.__entries:
+                    self.__remove(path)
+            if recursive:
+                prefixes = tuple(path.rstrip("/") + "/" for path in paths)
+                for path in [path for path in self.__entries if path.startswith(prefixes)]:
+                    self.__remove(path)
+
+    def getCounters(self):
+        """Get the usage counters of the cache"""
+        return {"Hits": self.hits, "Misses": self.misses, "Entries": len(self.__entries), "Size": self.size}
+
+    def __remove(self, path):
+        del self.__entries[path]
+        self.size -= len(path) + self.ENTRY_OVERHEAD
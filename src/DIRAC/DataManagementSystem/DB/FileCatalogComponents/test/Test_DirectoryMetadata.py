@@ -0,0 +1,109 @@
+""" Test of the effective (materialized) directory metadata of the DirectoryMetadata component
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+# pylint: disable=protected-access
+
+import pytest
+from mock import MagicMock
+
+from DIRAC import S_OK
+from DIRAC.DataManagementSystem.DB.FileCatalogComponents.DirectoryMetadata.DirectoryMetadata import (
+    DirectoryMetadata,
+)
+
+
+@pytest.fixture
+def dmeta():
+    """DirectoryMetadata on a mocked database, recording the SQL statements"""
+    db = MagicMock()
+    db.materializedDirMeta = True
+    db.statements = []
+
+    def query(req, *args, **kwargs):
+        db.statements.append(req)
+        if req.startswith("SELECT MetaName,MetaType FROM FC_MetaFields"):
+            return S_OK((("Energy", "INT"), ("Run", "INT")))
+        if req.startswith("SELECT E0.DirID"):
+            return S_OK(((7,), (8,)))
+        if req.startswith("SELECT DirID FROM FC_Meta_Energy WHERE DirID IN"):
+            return S_OK(((2,),))
+        if req.startswith("SELECT COUNT(*) FROM FC_Files"):
+            return S_OK(((3,),))
+        if req.startswith("SELECT FileID FROM FC_Files"):
+            return S_OK(((11,), (12,), (13,)))
+        return S_OK(())
+
+    db._query.side_effect = query
+    db._update.side_effect = query
+    db._escapeString.side_effect = lambda value: S_OK('"%s"' % value)
+    db.fmeta.getFileMetadataFields.return_value = S_OK({})
+    db.dtree.findDir.return_value = S_OK(5)
+    db.dtree.getPathIDs.return_value = S_OK([1, 2, 5])
+    db.dtree.getPathIDsByID.return_value = S_OK([1, 2, 5])
+    db.dtree.getSubdirectoriesByID.return_value = S_OK("SELECT DirID FROM FC_DirectoryLevelTree WHERE SUBTREE")
+    return DirectoryMetadata(database=db)
+
+
+def test_findDirIDsByMetadata(dmeta):
+    result = dmeta.findDirIDsByMetadata({"Energy": {">": 100}, "Run": [1, 2]}, "/vo/data", {})
+    assert result["OK"], result
+    assert result["Value"] == [7, 8]
+    assert result["Selection"] == "Done"
+    selects = [req for req in dmeta.db.statements if req.startswith("SELECT E0.DirID")]
+    # All the metadata in one statement, within the subtree of the path
+    assert selects == [
+        "SELECT E0.DirID FROM FC_MetaEff_Energy AS E0 JOIN FC_MetaEff_Run AS E1 ON E1.DirID=E0.DirID "
+        "WHERE E0.Value>100 AND E1.Value in ('1','2') "
+        "AND E0.DirID IN ( SELECT DirID FROM FC_DirectoryLevelTree WHERE SUBTREE )"
+    ]
+
+
+def test_findDirIDsByMetadata_missing(dmeta):
+    result = dmeta.findDirIDsByMetadata({"Energy": 10, "Run": "Missing"}, "/", {})
+    assert result["OK"], result
+    select = [req for req in dmeta.db.statements if req.startswith("SELECT E0.DirID")][0]
+    assert "LEFT JOIN FC_MetaEff_Run AS X0 ON X0.DirID=E0.DirID" in select
+    assert "X0.DirID IS NULL" in select
+    assert "IN (" not in select
+
+
+def test_findFileIDsByMetadata(dmeta):
+    result = dmeta.findFileIDsByMetadata({"Energy": 10}, "/vo/data", {}, startItem=0, maxItems=3)
+    assert result["OK"], result
+    assert result["Value"] == [11, 12, 13]
+    assert result["TotalRecords"] == 3
+    page = [req for req in dmeta.db.statements if req.startswith("SELECT FileID FROM FC_Files")][0]
+    assert page.startswith("SELECT FileID FROM FC_Files WHERE DirID IN ( SELECT E0.DirID FROM FC_MetaEff_Energy")
+    assert page.endswith("ORDER BY FileID LIMIT 0, 3")
+
+
+def test_setMetadata(dmeta):
+    result = dmeta.setMetadata("/vo/data", {"Run": 42}, {})
+    assert result["OK"], result
+    assert dmeta.db.statements[-1] == (
+        'INSERT INTO FC_MetaEff_Run (DirID,Value,SourceID) SELECT S.*,"42",5 '
+        "FROM ( SELECT DirID FROM FC_DirectoryLevelTree WHERE SUBTREE ) AS S "
+        'ON DUPLICATE KEY UPDATE Value=IF(SourceID IN (1,2,5),"42",Value), SourceID=IF(SourceID IN (1,2,5),5,SourceID)'
+    )
+
+
+def test_removeMetadata(dmeta):
+    # Energy is also defined by the parent directory 2
+    assert dmeta.removeMetadata("/vo/data", ["Energy", "Run"], {})["OK"]
+    assert (
+        "UPDATE FC_MetaEff_Energy AS E, FC_Meta_Energy AS M SET E.Value=M.Value, E.SourceID=M.DirID "
+        "WHERE E.SourceID=5 AND M.DirID=2"
+    ) in dmeta.db.statements
+    assert "DELETE FROM FC_MetaEff_Run WHERE SourceID=5" in dmeta.db.statements
+
+
+def test_inheritMetadata(dmeta):
+    dmeta.db.dtree.findDir.return_value = S_OK(5)
+    assert dmeta.inheritMetadata(9, "/vo/data")["OK"]
+    assert (
+        "INSERT INTO FC_MetaEff_Energy (DirID,Value,SourceID) SELECT 9,Value,SourceID FROM FC_MetaEff_Energy "
+        "WHERE DirID=5"
+    ) in dmeta.db.statements
@@ -0,0 +1,77 @@
+""" Test of the paged listing of the directories, in the FileManager and in the FileCatalogClient
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+# pylint: disable=protected-access
+
+import pytest
+from mock import MagicMock, patch
+
+from DIRAC import S_OK
+from DIRAC.DataManagementSystem.DB.FileCatalogComponents.FileManager.FileManager import FileManager
+from DIRAC.Resources.Catalog.FileCatalogClient import FileCatalogClient
+
+# FileID, FileName of the files in the directory
+DIR_FILES = [(10 + i, "file%d" % i) for i in range(5)]
+
+
+@pytest.fixture
+def fileManager():
+    """FileManager on a mocked database, recording the SQL statements"""
+    db = MagicMock()
+    db.visibleFileStatus = ["AprioriGood"]
+    db.statements = []
+
+    def query(req, *args, **kwargs):
+        db.statements.append(req)
+        if req.startswith("SELECT StatusID FROM FC_Statuses"):
+            return S_OK(((2,),))
+        if req.startswith("SELECT FileID,FileName FROM FC_Files"):
+            afterFileID = int(req.split("FileID>")[1].split()[0])
+            limit = int(req.split("LIMIT ")[1])
+            return S_OK(tuple(row for row in DIR_FILES if row[0] > afterFileID)[:limit])
+        return S_OK(())
+
+    db._query.side_effect = query
+    return FileManager(database=db)
+
+
+def test_getFilesInDirectoryPaged(fileManager):
+    fileManager.getFilesInDirectory = MagicMock(
+        side_effect=lambda dirID, verbose, connection, fileNames: S_OK(dict.fromkeys(fileNames, {}))
+    )
+    result = fileManager.getFilesInDirectoryPaged(3, 0, 2)
+    assert result["OK"], result
+    assert result["Value"] == ({"file0": {}, "file1": {}}, 11)
+    assert fileManager.db.statements[-1] == (
+        "SELECT FileID,FileName FROM FC_Files WHERE DirID=3 AND FileID>0 AND Status IN (2) ORDER BY FileID LIMIT 2"
+    )
+
+    # Last page, shorter than the limit
+    result = fileManager.getFilesInDirectoryPaged(3, 13, 2)
+    assert result["OK"], result
+    assert result["Value"] == ({"file4": {}}, None)
+
+    # No more files
+    result = fileManager.getFilesInDirectoryPaged(3, 14, 2)
+    assert result["OK"], result
+    assert result["Value"] == ({}, None)
+    assert fileManager.getFilesInDirectory.call_count == 2
+
+
+@patch.object(FileCatalogClient, "_getRPC")
+def test_iterDirectory(getRPC):
+    pages = {
+        0: {"Files": {"f1": {}, "f2": {}}, "SubDirs": {"/vo/dir/sub": True}, "Links": {}, "Datasets": {}, "Cursor": 2},
+        2: {"Files": {"f3": {}}, "SubDirs": {}, "Links": {}, "Datasets": {}, "Cursor": None},
+    }
+    getRPC.return_value.listDirectoryPaged.side_effect = lambda path, cursor, pageSize, verbose: S_OK(
+        dict(pages[cursor])
+    )
+    fc = FileCatalogClient()
+    results = list(fc.iterDirectory("/vo/dir", pageSize=2))
+    assert all(result["OK"] for result in results)
+    assert [sorted(result["Value"]["Files"]) for result in results] == [["/vo/dir/f1", "/vo/dir/f2"], ["/vo/dir/f3"]]
+    assert list(results[0]["Value"]["SubDirs"]) == ["/vo/dir/sub"]
@@ -0,0 +1,78 @@
+""" Test of the cache of the DirID and FileID resolutions
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+# pylint: disable=protected-access
+
+from mock import MagicMock
+
+from DIRAC import S_OK
+from DIRAC.DataManagementSystem.DB.FileCatalogComponents.Utilities import IDCache
+from DIRAC.DataManagementSystem.DB.FileCatalogComponents.DirectoryManager.DirectoryLevelTree import DirectoryLevelTree
+from DIRAC.DataManagementSystem.DB.FileCatalogComponents.FileManager.FileManager import FileManager
+
+
+def test_IDCache():
+    cache = IDCache(maxSize=3 * (IDCache.ENTRY_OVERHEAD + 6))
+    assert cache.get("/vo/a") is None
+    for i, path in enumerate(["/vo/a1", "/vo/a2", "/vo/b1"]):
+        cache.set(path, i + 1)
+    assert cache.get("/vo/a1") == 1
+    # The least recently used entry is evicted
+    cache.set("/vo/b2", 4)
+    assert cache.get("/vo/a2") is None
+    assert len(cache) == 3
+    assert cache.size <= cache.maxSize
+    assert cache.getCounters()["Hits"] == 1
+    assert cache.getCounters()["Misses"] == 2
+
+    cache.invalidate(["/vo/b1"])
+    assert cache.get("/vo/b1") is None
+    cache.invalidate(["/vo"], recursive=True)
+    assert len(cache) == 0
+    assert cache.size == 0
+
+    # Expired entries
+    cache.lifetime = -1
+    cache.set("/vo/a1", 1)
+    assert cache.get("/vo/a1") is None
+
+    # Disabled cache
+    cache = IDCache()
+    cache.set("/vo/a1", 1)
+    assert cache.get("/vo/a1") is None
+    assert cache.getCounters()["Misses"] == 0
+
+
+def test_findFileIDs():
+    db = MagicMock()
+    db.dirIDCache = IDCache(maxSize=10000)
+    db.fileIDCache = IDCache(maxSize=10000)
+    db._escapeString.side_effect = lambda value: S_OK('"%s"' % value)
+
+    def query(req, *args, **kwargs):
+        if req.startswith("SELECT DirName,DirID,Level"):
+            return S_OK((("/vo/data", 5, 2),))
+        if req.startswith("SELECT FileName,DirID,FileID"):
+            return S_OK((("f1", 5, 11), ("f2", 5, 12)))
+        return S_OK(())
+
+    db._query.side_effect = query
+    db.dtree = DirectoryLevelTree(database=db)
+    fileManager = FileManager(database=db)
+
+    lfns = ["/vo/data/f1", "/vo/data/f2"]
+    for _ in range(2):
+        result = fileManager._findFileIDs(lfns)
+        assert result["OK"], result
+        assert result["Value"]["Successful"] == {"/vo/data/f1": 11, "/vo/data/f2": 12}
+    # The second resolution is done from the cache
+    assert db._query.call_count == 2
+    assert db.dtree.findDir("/vo/data/")["Value"] == 5
+    assert db._query.call_count == 2
+
+    db.fileIDCache.invalidate(["/vo/data"], recursive=True)
+    assert fileManager._findFileIDs(lfns)["OK"]
+    assert db._query.call_count == 3
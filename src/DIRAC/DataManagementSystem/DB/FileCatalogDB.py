@@ -11,6 +11,7 @@ from DIRAC import gLogger, S_OK, S_ERROR
 from DIRAC.Core.Base.DB import DB
 from DIRAC.Resources.Catalog.Utilities import checkArgumentFormat
 from DIRAC.Core.Utilities.ObjectLoader import ObjectLoader
+from DIRAC.DataManagementSystem.DB.FileCatalogComponents.Utilities import IDCache
 
 #############################################################################
 
@@ -33,6 +34,10 @@ class FileCatalogDB(DB):
         self.dmeta = None
         self.fmeta = None
         self.datasetManager = None
+        self.materializedDirMeta = False
+        # Caches of the path -> DirID and LFN -> FileID resolutions
+        self.dirIDCache = IDCache()
+        self.fileIDCache = IDCache()
 
     def setConfig(self, databaseConfig):
         self.directories = {}
@@ -56,6 +61,12 @@ class FileCatalogDB(DB):
         self.validReplicaStatus = databaseConfig["ValidReplicaStatus"]
         self.visibleFileStatus = databaseConfig["VisibleFileStatus"]
         self.visibleReplicaStatus = databaseConfig["VisibleReplicaStatus"]
+        self.materializedDirMeta = databaseConfig.get("MaterializedDirectoryMetadata", False)
+        # The size of the ID caches is given in MB, shared between the directories and the files
+        cacheSize = int(databaseConfig.get("IDCacheSize", 0) * 1024 * 1024)
+        cacheLifetime = databaseConfig.get("IDCacheLifetime", 60)
+        self.dirIDCache = IDCache(cacheSize // 4, cacheLifetime)
+        self.fileIDCache = IDCache(cacheSize - cacheSize // 4, cacheLifetime)
 
         # Load the configured components
         for compAttribute, componentType in [
@@ -74,6 +85,11 @@ class FileCatalogDB(DB):
                 return result
             self.__setattr__(compAttribute, result["Value"])
 
+        if self.materializedDirMeta:
+            result = self.dmeta.initializeEffectiveMetadata()
+            if not result["OK"]:
+                return result
+
         return S_OK()
 
     def __loadCatalogComponent(self, componentType, componentName):
@@ -477,7 +493,9 @@ class FileCatalogDB(DB):
         if not res["Value"]["Successful"]:
             return S_OK({"Successful": {}, "Failed": failed})
 
+        lfnsToRemove = list(res["Value"]["Successful"])
         res = self.fileManager.removeFile(res["Value"]["Successful"])
+        self.fileIDCache.invalidate(lfnsToRemove)
         if not res["OK"]:
             return res
         failed.update(res["Value"]["Failed"])
@@ -866,7 +884,10 @@ class FileCatalogDB(DB):
         if not res["Value"]["Successful"]:
             return S_OK({"Successful": {}, "Failed": failed})
 
+        dirsToRemove = list(res["Value"]["Successful"])
         res = self.dtree.removeDirectory(res["Value"]["Successful"], credDict)
+        self.dirIDCache.invalidate(dirsToRemove, recursive=True)
+        self.fileIDCache.invalidate(dirsToRemove, recursive=True)
         if not res["OK"]:
             return res
         failed.update(res["Value"]["Failed"])
@@ -919,6 +940,26 @@ class FileCatalogDB(DB):
         successful = res["Value"]["Successful"]
         return S_OK({"Successful": successful, "Failed": failed})
 
+    def listDirectoryPaged(self, path, cursor, pageSize, credDict, verbose=False):
+        """
+        List one page of a directory, the files being listed in the order of their FileID
+
+        :param str path: directory to list
+        :param int cursor: cursor of the page, 0 for the first one
+        :param int pageSize: maximum number of files in the page
+        :param creDict: credential
+
+        :return: S_OK(dict) indexed "Files", "Datasets", "Subdirs" and "Links" like the listDirectory values,
+           plus "Cursor", the cursor of the next page, None after the last page
+        """
+        res = self._checkPathPermissions("listDirectory", path, credDict)
+        if not res["OK"]:
+            return res
+        if res["Value"]["Failed"]:
+            return S_ERROR(list(res["Value"]["Failed"].values())[0])
+        path = list(res["Value"]["Successful"])[0]
+        return self.dtree.listDirectoryPaged(path, cursor=cursor, pageSize=pageSize, verbose=verbose)
+
     def isDirectory(self, lfns, credDict):
         """
         Checks whether a list of LFNS are directories or not
@@ -964,6 +1005,27 @@ class FileCatalogDB(DB):
         successful = res["Value"]["Successful"]
         return S_OK({"Successful": successful, "Failed": failed})
 
+    def getDirectoryReplicasPaged(self, path, cursor, pageSize, allStatus, credDict):
+        """
+        Get the replicas of one page of the files of a directory, in the order of their FileID
+
+        :param str path: directory
+        :param int cursor: cursor of the page, 0 for the first one
+        :param int pageSize: maximum number of files in the page
+        :param bool allStatus: whether all replicas and file status are considered
+        :param creDict: credential
+
+        :return: S_OK(dict) indexed "Replicas" ({fileName: {SE: PFN}}) and "Cursor",
+           the cursor of the next page, None after the last page
+        """
+        res = self._checkPathPermissions("getDirectoryReplicas", path, credDict)
+        if not res["OK"]:
+            return res
+        if res["Value"]["Failed"]:
+            return S_ERROR(list(res["Value"]["Failed"].values())[0])
+        path = list(res["Value"]["Successful"])[0]
+        return self.dtree.getDirectoryReplicasPaged(path, cursor=cursor, pageSize=pageSize, allStatus=allStatus)
+
     def getDirectorySize(self, lfns, longOutput, fromFiles, recursiveSum, credDict):
         """
         Get the sizes of a list of directories
@@ -1144,6 +1206,10 @@ class FileCatalogDB(DB):
         if not res["OK"]:
             return res
         counterDict.update(res["Value"])
+        for cacheName, cache in [("DirID cache", self.dirIDCache), ("FileID cache", self.fileIDCache)]:
+            if cache.enabled:
+                for counter, value in cache.getCounters().items():
+                    counterDict["%s %s" % (cacheName, counter.lower())] = value
         return S_OK(counterDict)
 
     ########################################################################
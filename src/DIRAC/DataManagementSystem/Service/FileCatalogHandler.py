@@ -62,6 +62,9 @@ class FileCatalogHandlerMixin(object):
             "ValidReplicaStatus": ["AprioriGood", "Trash", "Removing", "Probing"],
             "VisibleFileStatus": ["AprioriGood"],
             "VisibleReplicaStatus": ["AprioriGood"],
+            "MaterializedDirectoryMetadata": False,
+            "IDCacheSize": 0,
+            "IDCacheLifetime": 60,
         }
         for configKey in sorted(defaultConfig.keys()):
             defaultValue = defaultConfig[configKey]
@@ -406,6 +409,15 @@ class FileCatalogHandlerMixin(object):
         gMonitor.addMark("ListDirectory", 1)
         return self.fileCatalogDB.listDirectory(lfns, self.getRemoteCredentials(), verbose=verbose)
 
+    types_listDirectoryPaged = [str, int, int, bool]
+
+    def export_listDirectoryPaged(self, path, cursor, pageSize, verbose):
+        """List one page of the contents of a directory"""
+        gMonitor.addMark("ListDirectory", 1)
+        return self.fileCatalogDB.listDirectoryPaged(
+            path, cursor, pageSize, self.getRemoteCredentials(), verbose=verbose
+        )
+
     types_isDirectory = [[list, dict, str]]
 
     def export_isDirectory(self, lfns):
@@ -430,6 +442,14 @@ class FileCatalogHandlerMixin(object):
         """Get replicas for files in the supplied directory"""
         return self.fileCatalogDB.getDirectoryReplicas(lfns, allStatus, self.getRemoteCredentials())
 
+    types_getDirectoryReplicasPaged = [str, int, int, bool]
+
+    def export_getDirectoryReplicasPaged(self, path, cursor, pageSize, allStatus=False):
+        """Get replicas for one page of the files in the supplied directory"""
+        return self.fileCatalogDB.getDirectoryReplicasPaged(
+            path, cursor, pageSize, allStatus, self.getRemoteCredentials()
+        )
+
     ########################################################################
     #
     # Administrative database operations
@@ -114,37 +114,40 @@ def main():
 
     while len(activeDirs) > 0:
         currentDir = activeDirs.pop()
-        res = fc.listDirectory(currentDir, withMetadata, timeout=360)
-        if not res["OK"]:
-            gLogger.error("Error retrieving directory contents", "%s %s" % (currentDir, res["Message"]))
-        elif currentDir in res["Value"]["Failed"]:
-            gLogger.error(
-                "Error retrieving directory contents", "%s %s" % (currentDir, res["Value"]["Failed"][currentDir])
-            )
-        else:
-            dirContents = res["Value"]["Successful"][currentDir]
-            subdirs = dirContents["SubDirs"]
+        subdirs = {}
+        nFiles = 0
+        nMatched = 0
+        # Big directories are listed page by page, the first one containing the subdirectories
+        for res in fc.iterDirectory(currentDir, verbose=withMetadata, timeout=360):
+            if not res["OK"]:
+                gLogger.error("Error retrieving directory contents", "%s %s" % (currentDir, res["Message"]))
+                break
+            dirContents = res["Value"]
+            subdirs.update(dirContents["SubDirs"])
             files = dirContents["Files"]
-            if not subdirs and not files:
+            nFiles += len(files)
+            for filename in sorted(files):
+                fileOK = False
+                if (not withMetadata) or isOlderThan(files[filename]["MetaData"]["CreationDate"], totalDays):
+                    if wildcard is None or fnmatch.fnmatch(filename, wildcard):
+                        fileOK = True
+                if not fileOK:
+                    files.pop(filename)
+            nMatched += len(files)
+            allFiles += sorted(files)
+        else:
+            if not subdirs and not nFiles:
                 emptyDirs.append(currentDir)
                 gLogger.notice("%s: empty directory" % currentDir)
             else:
                 for subdir in sorted(subdirs, reverse=True):
                     if (not withMetadata) or isOlderThan(subdirs[subdir]["CreationDate"], totalDays):
                         activeDirs.append(subdir)
-                for filename in sorted(files):
-                    fileOK = False
-                    if (not withMetadata) or isOlderThan(files[filename]["MetaData"]["CreationDate"], totalDays):
-                        if wildcard is None or fnmatch.fnmatch(filename, wildcard):
-                            fileOK = True
-                    if not fileOK:
-                        files.pop(filename)
-                allFiles += sorted(files)
-
-                if len(files) or len(subdirs):
+
+                if nMatched or len(subdirs):
                     gLogger.notice(
                         "%s: %d files%s, %d sub-directories"
-                        % (currentDir, len(files), " matching" if withMetadata or wildcard else "", len(subdirs))
+                        % (currentDir, nMatched, " matching" if withMetadata or wildcard else "", len(subdirs))
                     )
 
     outputFileName = "%s.lfns" % baseDir.replace("/%s" % vo, "%s" % vo).replace("/", "-")
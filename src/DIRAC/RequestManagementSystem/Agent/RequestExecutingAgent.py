@@ -36,6 +36,7 @@ __RCSID__ = "$Id$"
 import sys
 import time
 import errno
+import collections
 
 # # from DIRAC
 from DIRAC import S_OK, S_ERROR, gConfig
@@ -45,6 +46,8 @@ from DIRAC.ConfigurationSystem.Client import PathFinder
 from DIRAC.Core.Utilities.ProcessPool import ProcessPool
 from DIRAC.RequestManagementSystem.Client.ReqClient import ReqClient
 from DIRAC.RequestManagementSystem.private.RequestTask import RequestTask
+from DIRAC.RequestManagementSystem.private.RequestBatchTask import RequestBatchTask, getBatchKey
+from DIRAC.RequestManagementSystem.Client.Operation import Operation
 
 from DIRAC.MonitoringSystem.Client.MonitoringReporter import MonitoringReporter
 from DIRAC.Core.Utilities.ThreadScheduler import gThreadScheduler
@@ -108,6 +111,10 @@ class RequestExecutingAgent(AgentModule):
     __bulkRequest = 0
     # # Send the monitoring data to ES rather than the Framework/Monitoring
     __rmsMonitoring = False
+    # # Operation types executed in batches across requests
+    __batchOperations = []
+    # # maximal nb of requests in a batch
+    __batchSize = 100
 
     def __init__(self, *args, **kwargs):
         """c'tor"""
@@ -130,6 +137,15 @@ class RequestExecutingAgent(AgentModule):
         self.log.info("Bulk request size = %d" % self.__bulkRequest)
         self.__rmsMonitoring = self.am_getOption("EnableRMSMonitoring", self.__rmsMonitoring)
         self.log.info("Enable ES RMS Monitoring = %s" % self.__rmsMonitoring)
+        self.__batchOperations = self.am_getOption("BatchOperations", self.__batchOperations)
+        self.__batchSize = self.am_getOption("BatchSize", self.__batchSize)
+        if self.__batchOperations:
+            self.log.info(
+                "Batch operations = %s" % ", ".join(self.__batchOperations), "(at most %d requests)" % self.__batchSize
+            )
+        # # request IDs of the batch tasks
+        self.__batches = {}
+        self.__batchCounter = 0
 
         # # keep config path and agent name
         self.agentName = self.am_getModuleParam("fullName")
@@ -324,6 +340,11 @@ class RequestExecutingAgent(AgentModule):
 
                 requestsToExecute = list(getRequests["Value"]["Successful"].values())
 
+                if self.__batchOperations:
+                    batches, requestsToExecute = self.getBatches(requestsToExecute)
+                    for batch in batches:
+                        taskCounter += self.queueBatch(batch)
+
             self.log.info("execute: will execute requests ", "%s" % len(requestsToExecute))
 
             for request in requestsToExecute:
@@ -422,6 +443,109 @@ class RequestExecutingAgent(AgentModule):
         # # clean return
         return S_OK()
 
+    def getBatches(self, requests):
+        """group the requests whose waiting operations can be executed in the same batch
+
+        :param list requests: Request instances
+        :return: tuple (list of batches, list of the requests to be executed one by one)
+        """
+        groups = collections.OrderedDict()
+        singles = []
+        for request in requests:
+            key = getBatchKey(request)
+            if key and key[2] in self.__batchOperations:
+                groups.setdefault(key, []).append(request)
+            else:
+                singles.append(request)
+        batches = []
+        for group in groups.values():
+            if len(group) < 2:
+                singles += group
+                continue
+            # Cut the batches to the maximal size of a batch and of an operation
+            batch = []
+            nFiles = 0
+            for request in group:
+                waitingFiles = len(request.getWaiting()["Value"])
+                if batch and (len(batch) >= self.__batchSize or nFiles + waitingFiles > Operation.MAX_FILES):
+                    batches.append(batch)
+                    batch = []
+                    nFiles = 0
+                batch.append(request)
+                nFiles += waitingFiles
+            if len(batch) > 1:
+                batches.append(batch)
+            else:
+                singles += batch
+        return batches, singles
+
+    def queueBatch(self, requests):
+        """enqueue a RequestBatchTask for a batch of requests into the ProcessPool
+
+        :param list requests: Request instances
+        :return: number of requests enqueued
+        """
+        requestsJSON = []
+        requestIDs = []
+        for request in requests:
+            if not self.cacheRequest(request)["OK"]:
+                continue
+            result = request.toJSON()
+            if not result["OK"]:
+                self.__requestCache.pop(request.RequestID, None)
+                continue
+            requestsJSON.append(result["Value"])
+            requestIDs.append(request.RequestID)
+        if not requestIDs:
+            return 0
+
+        self.__batchCounter += 1
+        taskID = "Batch_%d" % self.__batchCounter
+        operation = requests[0].getWaiting()["Value"]
+        timeOuts = self.timeOuts.get(operation.Type, {})
+        timeOut = timeOuts.get("PerOperation", self.__operationTimeout) + timeOuts.get(
+            "PerFile", self.__fileTimeout
+        ) * sum(len(request.getWaiting()["Value"]) for request in requests)
+        self.log.info(
+            "spawning batch task",
+            "'%s' for %s of %d requests" % (taskID, operation.Type, len(requestIDs)),
+        )
+        enqueue = self.processPool().createAndQueueTask(
+            RequestBatchTask,
+            kwargs={
+                "requestsJSON": requestsJSON,
+                "handlersDict": self.handlersDict,
+                "csPath": self.__configPath,
+                "agentName": self.agentName,
+                "rmsMonitoring": self.__rmsMonitoring,
+            },
+            taskID=taskID,
+            blocking=True,
+            usePoolCallbacks=True,
+            timeOut=timeOut,
+        )
+        if not enqueue["OK"]:
+            self.log.error("Could not enqueue batch task", enqueue["Message"])
+            for requestID in requestIDs:
+                self.putRequest(requestID)
+            return 0
+        self.__batches[taskID] = requestIDs
+        if self.__rmsMonitoring:
+            for requestID in requestIDs:
+                self.rmsMonitoringReporter.addRecord(
+                    {
+                        "timestamp": int(Time.toEpoch()),
+                        "host": Network.getFQDN(),
+                        "objectType": "Request",
+                        "status": "Attempted",
+                        "objectID": requestID,
+                        "nbObject": 1,
+                    }
+                )
+        else:
+            gMonitor.addMark("Processed", len(requestIDs))
+        return len(requestIDs)
+
     def getTimeout(self, request):
         """get timeout for request"""
         timeout = 0
@@ -452,6 +576,12 @@ class RequestExecutingAgent(AgentModule):
         :param str taskID: Request.RequestID
         :param dict taskResult: task result S_OK(Request)/S_ERROR(Message)
         """
+        if taskID in self.__batches:
+            # # batch task: S_OK( { RequestID: S_OK(Request)/S_ERROR } )/S_ERROR(Message)
+            for requestID in self.__batches.pop(taskID):
+                requestResult = taskResult["Value"].get(requestID) if taskResult["OK"] else taskResult
+                self.resultCallback(requestID, requestResult or S_ERROR("No result for the request"))
+            return
         # # clean cache
         res = self.putRequest(taskID, taskResult)
         self.log.info(
@@ -473,7 +603,8 @@ class RequestExecutingAgent(AgentModule):
         :param Exception taskException: Exception instance
         """
         self.log.error("exceptionCallback:", "%s was hit by exception %s" % (taskID, taskException))
-        self.putRequest(taskID)
+        for requestID in self.__batches.pop(taskID, [taskID]):
+            self.putRequest(requestID)
 
     def __rmsMonitoringReporting(self):
         """This method is called by the ThreadScheduler as a periodic task in order to commit the collected data which
@@ -21,13 +21,14 @@ from __future__ import print_function
 
 import six
 import errno
+import json
 import random
 
 import datetime
 
 from sqlalchemy.orm.exc import NoResultFound
 from sqlalchemy.orm import relationship, backref, sessionmaker, joinedload, mapper
-from sqlalchemy.sql import update
+from sqlalchemy.sql import update, select
 from sqlalchemy import (
     create_engine,
     func,
@@ -49,6 +50,7 @@ from DIRAC import S_OK, S_ERROR, gLogger
 from DIRAC.RequestManagementSystem.Client.Request import Request
 from DIRAC.RequestManagementSystem.Client.Operation import Operation
 from DIRAC.RequestManagementSystem.Client.File import File
+from DIRAC.RequestManagementSystem.private.JSONUtils import RMSEncoder
 from DIRAC.ConfigurationSystem.Client.Utilities import getDBParameters
 
 
@@ -186,6 +188,90 @@ mapper(
 )
 
 
+# Columns of the tables, in the order of their JSON serialization (see the _getJSONData methods)
+REQUEST_JSON_ATTRIBUTES = [
+    "RequestID",
+    "RequestName",
+    "OwnerDN",
+    "OwnerGroup",
+    "Status",
+    "Error",
+    "DIRACSetup",
+    "SourceComponent",
+    "JobID",
+    "CreationTime",
+    "SubmitTime",
+    "LastUpdate",
+    "NotBefore",
+]
+OPERATION_JSON_ATTRIBUTES = Operation.ATTRIBUTE_NAMES
+FILE_JSON_ATTRIBUTES = [
+    "FileID",
+    "OperationID",
+    "Status",
+    "LFN",
+    "PFN",
+    "ChecksumType",
+    "Checksum",
+    "GUID",
+    "Attempt",
+    "Size",
+    "Error",
+]
+
+
+def _rowToJSONData(attrNames, row):
+    """Convert a row of a table to the dict serialized by JSON, as the _getJSONData methods do"""
+    return dict(
+        (attrName, value.strftime(Request._datetimeFormat) if isinstance(value, datetime.datetime) else value)
+        for attrName, value in zip(attrNames, row)
+    )
+
+
+def _notifyJSONData(requestData):
+    """Update the status of a request and of its operations, as Request._notify does for the Request objects
+
+    :param dict requestData: request as serialized by JSON, with its operations
+    """
+    waiting = None
+    status = "Waiting"
+    for opData in requestData["Operations"]:
+        opStatus = opData["Status"]
+        # # Failed -> Failed
+        if opStatus == "Failed" and waiting is None:
+            status = "Failed"
+            break
+        # Scheduled -> Scheduled
+        if opStatus == "Scheduled":
+            if waiting is None:
+                waiting = opData
+                status = "Scheduled"
+        # # First operation Queued becomes Waiting if no Waiting/Scheduled before
+        elif opStatus == "Queued":
+            if waiting is None:
+                waiting = opData
+                opData["Status"] = "Waiting"
+                status = "Waiting"
+        # # First operation Waiting is next to execute, others are queued
+        elif opStatus == "Waiting":
+            status = "Waiting"
+            if waiting is None:
+                waiting = opData
+            else:
+                opData["Status"] = "Queued"
+        # # All operations Done -> Done
+        elif opStatus == "Done" and waiting is None:
+            status = "Done"
+            requestData["Error"] = ""
+
+    # # Request.Status setter
+    if status in ("Done", "Failed") and status != requestData["Status"]:
+        requestData["LastUpdate"] = datetime.datetime.utcnow().strftime(Request._datetimeFormat)
+    if status == "Done":
+        requestData["Error"] = ""
+    requestData["Status"] = status
+
+
 ########################################################################
 class RequestDB(object):
     """
@@ -496,6 +582,96 @@ class RequestDB(object):
 
         return S_OK(requestDict)
 
+    def getBulkRequestsJSON(self, numberOfRequest=10, assigned=True):
+        """read as many requests as requested for execution, already serialized to JSON
+
+        The requests are selected as in :py:meth:`getBulkRequests`, but the rows of the Request, Operation
+        and File tables are read with plain SELECTs (the files are streamed) and serialized directly,
+        without building the Request, Operation and File objects. The JSON strings are the same as
+        the ones of :py:meth:`Request.toJSON`.
+
+        :param int numberOfRequest: Number of Request we want (default 10)
+        :param bool assigned: if True, the status of the selected requests are set to assign
+
+        :returns: S_OK( { RequestID : Request JSON string } )
+        """
+        session = self.DBSession()
+        log = self.log.getSubLogger("getBulkRequestJSON" if assigned else "peekBulkRequestJSON")
+
+        requests = {}
+
+        try:
+            now = datetime.datetime.utcnow().replace(microsecond=0)
+            requestIDs = [
+                row[0]
+                for row in session.execute(
+                    select([requestTable.c.RequestID])
+                    .with_for_update()
+                    .where(requestTable.c.Status == "Waiting")
+                    .where(requestTable.c.NotBefore < now)
+                    .order_by(requestTable.c.LastUpdate)
+                    .limit(numberOfRequest)
+                )
+            ]
+            log.debug("Got request ids %s" % requestIDs)
+
+            if requestIDs:
+                for row in session.execute(
+                    select([requestTable.c[attrName] for attrName in REQUEST_JSON_ATTRIBUTES]).where(
+                        requestTable.c.RequestID.in_(requestIDs)
+                    )
+                ):
+                    requestData = _rowToJSONData(REQUEST_JSON_ATTRIBUTES, row)
+                    requestData["Operations"] = []
+                    requests[requestData["RequestID"]] = requestData
+
+                operations = {}
+                for row in session.execute(
+                    select([operationTable.c[attrName] for attrName in OPERATION_JSON_ATTRIBUTES])
+                    .where(operationTable.c.RequestID.in_(requestIDs))
+                    .order_by(operationTable.c.RequestID, operationTable.c.Order)
+                ):
+                    opData = _rowToJSONData(OPERATION_JSON_ATTRIBUTES, row)
+                    opData["Files"] = []
+                    operations[opData["OperationID"]] = opData
+                    requestOperations = requests[opData["RequestID"]]["Operations"]
+                    # The Order of an operation is its index in the request
+                    opData["Order"] = len(requestOperations)
+                    requestOperations.append(opData)
+
+                for row in session.execute(
+                    select([fileTable.c[attrName] for attrName in FILE_JSON_ATTRIBUTES])
+                    .select_from(fileTable.join(operationTable))
+                    .where(operationTable.c.RequestID.in_(requestIDs))
+                    .order_by(fileTable.c.OperationID, fileTable.c.FileID)
+                    .execution_options(stream_results=True)
+                ):
+                    operations[row[1]]["Files"].append(_rowToJSONData(FILE_JSON_ATTRIBUTES, row))
+
+                if assigned:
+                    session.execute(
+                        update(requestTable)
+                        .where(requestTable.c.RequestID.in_(requestIDs))
+                        .values(
+                            {requestTable.c.Status: "Assigned", requestTable.c.LastUpdate: datetime.datetime.utcnow()}
+                        )
+                    )
+            session.commit()
+
+        except Exception as e:
+            session.rollback()
+            log.exception("unexpected exception", lException=e)
+            return S_ERROR("getBulkRequestJSON: unexpected exception : %s" % e)
+        finally:
+            session.close()
+
+        requestsJSON = {}
+        for requestID, requestData in requests.items():
+            _notifyJSONData(requestData)
+            requestsJSON[requestID] = json.dumps(requestData, cls=RMSEncoder)
+        log.debug("Got %s requests" % len(requestsJSON))
+        return S_OK(requestsJSON)
+
     def peekRequest(self, requestID):
         """get request (ro), no update on states
 
@@ -9,9 +9,9 @@ from __future__ import print_function
 from __future__ import absolute_import
 from __future__ import division
 
+import json
 import time
 
-
 from DIRAC.RequestManagementSystem.Client.Request import Request
 from DIRAC.RequestManagementSystem.Client.Operation import Operation
 from DIRAC.RequestManagementSystem.Client.File import File
@@ -88,6 +88,45 @@ def test_stressBulk(reqDB):
         assert delete["OK"], delete
 
 
+def test_bulkJSON(reqDB):
+    """the direct JSON serialization of the bulk requests is the one of the Request objects"""
+
+    reqIDs = []
+    for i in range(BULK_REQUESTS):
+        request = Request({"RequestName": "json-%d" % i})
+        request.SourceComponent = "test"
+        for opType in ("RemoveReplica", "RemoveFile"):
+            op = Operation({"Type": opType, "TargetSE": "CERN-USER", "Arguments": "args"})
+            for j in range(i + 1):
+                op += File({"LFN": "/lhcb/user/c/cibak/foo%d" % j, "Checksum": "123456", "ChecksumType": "ADLER32"})
+            request += op
+        if i % 2:
+            request[0][0].Status = "Done"
+        put = reqDB.putRequest(request)
+        assert put["OK"], put
+        reqIDs.append(put["Value"])
+
+    time.sleep(1)
+
+    peek = reqDB.getBulkRequests(BULK_REQUESTS, False)
+    assert peek["OK"], peek
+    expected = dict((reqID, json.loads(request.toJSON()["Value"])) for reqID, request in peek["Value"].items())
+
+    get = reqDB.getBulkRequestsJSON(BULK_REQUESTS, True)
+    assert get["OK"], get
+    assert dict((reqID, json.loads(reqJSON)) for reqID, reqJSON in get["Value"].items()) == expected
+    assert sorted(expected) == sorted(reqIDs)
+
+    # They are now assigned
+    get = reqDB.getBulkRequestsJSON(BULK_REQUESTS, True)
+    assert get["OK"], get
+    assert get["Value"] == {}
+
+    for reqID in reqIDs:
+        delete = reqDB.deleteRequest(reqID)
+        assert delete["OK"], delete
+
+
 def test_scheduled(reqDB):
     """scheduled request r/w"""
 
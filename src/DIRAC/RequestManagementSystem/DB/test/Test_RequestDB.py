@@ -19,6 +19,7 @@ from DIRAC import gLogger
 from DIRAC.RequestManagementSystem.DB import RequestDB
 
 from DIRAC.RequestManagementSystem.DB.test.RMSTestScenari import (
+    test_bulkJSON,
     test_dirty,
     test_scheduled,
     test_stress,
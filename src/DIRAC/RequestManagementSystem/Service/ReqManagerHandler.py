@@ -207,22 +207,13 @@ class ReqManagerHandlerMixin(object):
         :param numberOfRequest: size of the bulk (default 10)
         :return: S_OK( {Failed : message, Successful : list of Request.toJSON()} )
         """
-        getRequests = cls.__requestDB.getBulkRequests(numberOfRequest=numberOfRequest, assigned=assigned)
+        # The requests are serialized by the DB, without building the Request objects
+        getRequests = cls.__requestDB.getBulkRequestsJSON(numberOfRequest=numberOfRequest, assigned=assigned)
         if not getRequests["OK"]:
             gLogger.error("getRequests: %s" % getRequests["Message"])
             return getRequests
         if getRequests["Value"]:
-            getRequests = getRequests["Value"]
-            toJSONDict = {"Successful": {}, "Failed": {}}
-
-            for rId in getRequests:
-                toJSON = getRequests[rId].toJSON()
-                if not toJSON["OK"]:
-                    gLogger.error(toJSON["Message"])
-                    toJSONDict["Failed"][rId] = toJSON["Message"]
-                else:
-                    toJSONDict["Successful"][rId] = toJSON["Value"]
-            return S_OK(toJSONDict)
+            return S_OK({"Successful": getRequests["Value"], "Failed": {}})
         return S_OK()
 
     types_peekRequest = [six.integer_types]
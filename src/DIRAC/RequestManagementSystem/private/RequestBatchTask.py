@@ -0,0 +1,218 @@
+""" :mod: RequestBatchTask
+
+    ======================
+
+    .. module: RequestBatchTask
+
+    :synopsis: processing of the waiting operations of several requests at once
+
+    Requests of the same owner often have a waiting operation of the same type with the same
+    parameters (e.g. thousands of single file RemoveFile coming from a transformation).
+    The RequestBatchTask merges the files of these operations into a single operation, executes it
+    with the operation handler, so with one bulk call to the catalogs and storages, and sets back
+    the status of each file in its own request.
+
+    Only the waiting operation of the requests is executed: the requests having more operations
+    are put back Waiting and processed by a RequestTask afterward. The batching is only meant for
+    the operation handlers that do not add operations to their request.
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+__RCSID__ = "$Id$"
+
+import collections
+import os
+
+from DIRAC import gLogger, S_OK, S_ERROR, gConfig
+from DIRAC.ConfigurationSystem.Client.ConfigurationData import gConfigurationData
+from DIRAC.Core.Utilities import Time, Network
+from DIRAC.FrameworkSystem.Client.MonitoringClient import gMonitor
+from DIRAC.RequestManagementSystem.Client.Request import Request
+from DIRAC.RequestManagementSystem.private.RequestTask import RequestTask
+
+# # attributes of the waiting operations that must be the same for them to be batched
+BATCH_KEY_ATTRIBUTES = ("Type", "SourceSE", "TargetSE", "Catalog", "Arguments")
+# # attributes of the files copied to the batched operation
+FILE_ATTRIBUTES = ("LFN", "PFN", "ChecksumType", "Checksum", "GUID", "Size", "Attempt")
+
+
+def getBatchKey(request):
+    """get the key grouping the requests that can be executed in the same batch
+
+    :param ~Request.Request request: Request instance
+    :return: tuple key, or None if the request has no waiting operation
+    """
+    operation = request.getWaiting()
+    if not operation["OK"] or not operation["Value"]:
+        return None
+    operation = operation["Value"]
+    return (request.OwnerDN, request.OwnerGroup) + tuple(getattr(operation, attr) for attr in BATCH_KEY_ATTRIBUTES)
+
+
+class RequestBatchTask(RequestTask):
+    """
+    .. class:: RequestBatchTask
+
+    processing task of the waiting operations of a batch of requests
+    """
+
+    def __init__(
+        self, requestsJSON, handlersDict, csPath, agentName, standalone=False, requestClient=None, rmsMonitoring=False
+    ):
+        """c'tor
+
+        :param self: self reference
+        :param list requestsJSON: requests serialized to JSON, all with the same batch key
+        :param dict handlersDict: operation handlers
+        """
+        RequestTask.__init__(
+            self,
+            requestsJSON[0],
+            handlersDict,
+            csPath,
+            agentName,
+            standalone=standalone,
+            requestClient=requestClient,
+            rmsMonitoring=rmsMonitoring,
+        )
+        self.requests = [self.request] + [Request(requestJSON) for requestJSON in requestsJSON[1:]]
+        self.log = gLogger.getSubLogger("pid_%s/Batch_%s" % (os.getpid(), self.request.RequestName))
+
+    def __addOperationRecord(self, pluginName, operations, status):
+        """monitoring of the operations"""
+        if not pluginName:
+            return
+        if self.rmsMonitoring:
+            for operation in operations:
+                self.rmsMonitoringReporter.addRecord(
+                    {
+                        "timestamp": int(Time.toEpoch()),
+                        "host": Network.getFQDN(),
+                        "objectType": "Operation",
+                        "operationType": pluginName,
+                        "objectID": operation.OperationID,
+                        "parentID": operation.RequestID,
+                        "status": status,
+                        "nbObject": 1,
+                    }
+                )
+        else:
+            key = {"Attempted": "Att", "Successful": "OK", "Failed": "Fail"}[status]
+            gMonitor.addMark("%s%s" % (pluginName, key), len(operations))
+
+    def getBatchOperation(self, operations):
+        """build a request with a single operation holding the waiting files of all the operations
+
+        :param list operations: waiting operations of the requests
+        :return: tuple (batch operation, dict {LFN: [files of the operations]})
+        """
+        filesByLFN = collections.OrderedDict()
+        for operation in operations:
+            for opFile in operation:
+                if opFile.Status == "Waiting":
+                    filesByLFN.setdefault(opFile.LFN, []).append(opFile)
+        operationDict = dict((attr, getattr(operations[0], attr)) for attr in BATCH_KEY_ATTRIBUTES)
+        operationDict["Files"] = [
+            dict((attr, getattr(opFiles[0], attr)) for attr in FILE_ATTRIBUTES) for opFiles in filesByLFN.values()
+        ]
+        batchRequest = Request(
+            {
+                "RequestName": "Batch_%s" % self.request.RequestName,
+                "OwnerDN": self.request.OwnerDN,
+                "OwnerGroup": self.request.OwnerGroup,
+                "Operations": [operationDict],
+            }
+        )
+        return batchRequest[0], filesByLFN
+
+    def __call__(self):
+        """batch processing
+
+        :return: S_OK( { RequestID : S_OK(Request)/S_ERROR } )
+        """
+        self.log.debug("about to execute a batch of %d requests" % len(self.requests))
+        if not self.rmsMonitoring:
+            gMonitor.addMark("RequestAtt", len(self.requests))
+
+        # # setup proxy for the owner of the requests
+        setupProxy = self.setupProxy()
+        if not setupProxy["OK"]:
+            for request in self.requests:
+                self.request = request
+                self.setProxyError(setupProxy)
+            return S_OK(dict((request.RequestID, S_OK(request)) for request in self.requests))
+        shifter = setupProxy["Value"]["Shifter"]
+
+        operations = [request.getWaiting()["Value"] for request in self.requests]
+        batchOperation, filesByLFN = self.getBatchOperation(operations)
+        self.log.info(
+            "executing operation",
+            "%s for %d files of %d requests" % (batchOperation.Type, len(batchOperation), len(self.requests)),
+        )
+
+        handler = self.getHandler(batchOperation)
+        if not handler["OK"]:
+            self.log.error("Unable to process operation", "%s: %s" % (batchOperation.Type, handler["Message"]))
+            for operation in operations:
+                operation.Error = handler["Message"]
+            return S_OK(dict((request.RequestID, S_OK(request)) for request in self.requests))
+        handler = handler["Value"]
+        handler.shifter = shifter
+        handler.rmsMonitoring = self.rmsMonitoring
+        pluginName = self.getPluginName(self.handlersDict.get(batchOperation.Type))
+        # Always use server certificates if executed within an agent
+        useServerCertificate = gConfig.useServerCertificate() if self.standalone else True
+
+        self.__addOperationRecord(pluginName, operations, "Attempted")
+        try:
+            # Always use request owner proxy
+            if useServerCertificate:
+                gConfigurationData.setOptionInCFG("/DIRAC/Security/UseServerCertificate", "false")
+            exe = handler()
+        except Exception as error:  # pylint: disable=broad-except
+            self.log.exception("hit by exception:", "%s" % error)
+            exe = S_ERROR(str(error))
+        finally:
+            if useServerCertificate:
+                gConfigurationData.setOptionInCFG("/DIRAC/Security/UseServerCertificate", "true")
+        if not exe["OK"]:
+            self.log.error("unable to process operation", "%s: %s" % (batchOperation.Type, exe["Message"]))
+            for operation in operations:
+                operation.Error = exe["Message"]
+
+        # # fan the status of the files back into their operations
+        for batchFile in batchOperation:
+            opFiles = filesByLFN[batchFile.LFN]
+            attempts = batchFile.Attempt - opFiles[0].Attempt
+            for opFile in opFiles:
+                opFile.Attempt += attempts
+                opFile.Error = batchFile.Error
+                if opFile.Status != batchFile.Status:
+                    opFile.Status = batchFile.Status
+        if batchOperation.Error:
+            for operation in operations:
+                if operation.Status != "Done":
+                    operation.Error = batchOperation.Error
+
+        self.__addOperationRecord(pluginName, [op for op in operations if op.Status == "Done"], "Successful")
+        self.__addOperationRecord(pluginName, [op for op in operations if op.Status == "Failed"], "Failed")
+
+        results = {}
+        for request in self.requests:
+            self.request = request
+            results[request.RequestID] = S_OK(request)
+            if request.Status == "Done":
+                update = self.updateDoneRequest()
+                if not update["OK"]:
+                    results[request.RequestID] = update
+            elif not self.rmsMonitoring and not exe["OK"]:
+                gMonitor.addMark("RequestFail", 1)
+
+        if self.rmsMonitoring:
+            self.rmsMonitoringReporter.commit()
+        else:
+            gMonitor.flush()
+        self.log.verbose("RequestBatchTask exiting")
+        return S_OK(results)
@@ -276,6 +276,81 @@ class RequestTask(object):
             self.log.error("Cannot updateRequest", updateRequest["Message"])
         return updateRequest
 
+    def updateDoneRequest(self):
+        """put back the Done request to the RequestDB, and finalize its job if any"""
+        # # update request to the RequestDB
+        self.log.info("Updating request status:", "%s" % self.request.Status)
+        update = self.updateRequest()
+        if not update["OK"]:
+            self.log.error("Cannot update request status", update["Message"])
+            return update
+        self.log.info("request is done", "%s" % self.request.RequestName)
+        if self.rmsMonitoring:
+            self.rmsMonitoringReporter.addRecord(
+                {
+                    "timestamp": int(Time.toEpoch()),
+                    "host": Network.getFQDN(),
+                    "objectType": "Request",
+                    "objectID": getattr(self.request, "RequestID", 0),
+                    "status": "Successful",
+                    "nbObject": 1,
+                }
+            )
+        else:
+            gMonitor.addMark("RequestOK", 1)
+        # # and there is a job waiting for it? finalize!
+        if self.request.JobID:
+            attempts = 0
+            while True:
+                finalizeRequest = self.requestClient.finalizeRequest(
+                    self.request.RequestID, self.request.JobID  # pylint: disable=no-member
+                )
+                if not finalizeRequest["OK"]:
+                    if not attempts:
+                        self.log.error(
+                            "unable to finalize request, will retry",
+                            "ReqName %s:%s" % (self.request.RequestName, finalizeRequest["Message"]),
+                        )
+                    self.log.debug("Waiting 10 seconds")
+                    attempts += 1
+                    if attempts == 10:
+                        self.log.error("Giving up finalize request")
+                        return S_ERROR("Could not finalize request")
+
+                    time.sleep(10)
+
+                else:
+                    self.log.info(
+                        "request is finalized",
+                        "ReqName %s %s"
+                        % (self.request.RequestName, (" after %d attempts" % attempts) if attempts else ""),
+                    )
+                    break
+        return S_OK()
+
+    def setProxyError(self, setupProxy):
+        """set the request and its operations according to the error setting up the proxy of its owner
+
+        :param dict setupProxy: S_ERROR returned by setupProxy
+        """
+        userSuspended = "User is currently suspended"
+        self.request.Error = setupProxy["Message"]
+        # In case the user does not have proxy
+        if DErrno.cmpError(setupProxy, DErrno.EPROXYFIND):
+            self.log.error("Error setting proxy. Request set to Failed:", setupProxy["Message"])
+            # If user is no longer registered, fail the request
+            for operation in self.request:
+                for opFile in operation:
+                    opFile.Status = "Failed"
+                operation.Status = "Failed"
+        elif userSuspended in setupProxy["Message"]:
+            # If user is suspended, wait for a long time
+            self.request.delayNextExecution(6 * 60)
+            self.request.Error = userSuspended
+            self.log.error("Error setting proxy: " + userSuspended, self.request.OwnerDN)
+        else:
+            self.log.error("Error setting proxy", setupProxy["Message"])
+
     def __call__(self):
         """request processing"""
 
@@ -286,23 +361,7 @@ class RequestTask(object):
         # # setup proxy for request owner
         setupProxy = self.setupProxy()
         if not setupProxy["OK"]:
-            userSuspended = "User is currently suspended"
-            self.request.Error = setupProxy["Message"]
-            # In case the user does not have proxy
-            if DErrno.cmpError(setupProxy, DErrno.EPROXYFIND):
-                self.log.error("Error setting proxy. Request set to Failed:", setupProxy["Message"])
-                # If user is no longer registered, fail the request
-                for operation in self.request:
-                    for opFile in operation:
-                        opFile.Status = "Failed"
-                    operation.Status = "Failed"
-            elif userSuspended in setupProxy["Message"]:
-                # If user is suspended, wait for a long time
-                self.request.delayNextExecution(6 * 60)
-                self.request.Error = userSuspended
-                self.log.error("Error setting proxy: " + userSuspended, self.request.OwnerDN)
-            else:
-                self.log.error("Error setting proxy", setupProxy["Message"])
+            self.setProxyError(setupProxy)
             return S_OK(self.request)
         shifter = setupProxy["Value"]["Shifter"]
 
@@ -490,54 +549,9 @@ class RequestTask(object):
 
         # # request done?
         if self.request.Status == "Done":
-            # # update request to the RequestDB
-            self.log.info("Updating request status:", "%s" % self.request.Status)
-            update = self.updateRequest()
+            update = self.updateDoneRequest()
             if not update["OK"]:
-                self.log.error("Cannot update request status", update["Message"])
                 return update
-            self.log.info("request is done", "%s" % self.request.RequestName)
-            if self.rmsMonitoring:
-                self.rmsMonitoringReporter.addRecord(
-                    {
-                        "timestamp": int(Time.toEpoch()),
-                        "host": Network.getFQDN(),
-                        "objectType": "Request",
-                        "objectID": getattr(self.request, "RequestID", 0),
-                        "status": "Successful",
-                        "nbObject": 1,
-                    }
-                )
-            else:
-                gMonitor.addMark("RequestOK", 1)
-            # # and there is a job waiting for it? finalize!
-            if self.request.JobID:
-                attempts = 0
-                while True:
-                    finalizeRequest = self.requestClient.finalizeRequest(
-                        self.request.RequestID, self.request.JobID  # pylint: disable=no-member
-                    )
-                    if not finalizeRequest["OK"]:
-                        if not attempts:
-                            self.log.error(
-                                "unable to finalize request, will retry",
-                                "ReqName %s:%s" % (self.request.RequestName, finalizeRequest["Message"]),
-                            )
-                        self.log.debug("Waiting 10 seconds")
-                        attempts += 1
-                        if attempts == 10:
-                            self.log.error("Giving up finalize request")
-                            return S_ERROR("Could not finalize request")
-
-                        time.sleep(10)
-
-                    else:
-                        self.log.info(
-                            "request is finalized",
-                            "ReqName %s %s"
-                            % (self.request.RequestName, (" after %d attempts" % attempts) if attempts else ""),
-                        )
-                        break
 
         # Commit all the data to the ES Backend
         if self.rmsMonitoring:
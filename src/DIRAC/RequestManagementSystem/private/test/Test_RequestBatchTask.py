@@ -0,0 +1,100 @@
+""" Test of the execution of the waiting operations of several requests in a batch
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+# pylint: disable=protected-access, redefined-outer-name
+
+import pytest
+from mock import MagicMock
+
+from DIRAC import S_OK
+from DIRAC.RequestManagementSystem.Client.File import File
+from DIRAC.RequestManagementSystem.Client.Operation import Operation
+from DIRAC.RequestManagementSystem.Client.Request import Request
+from DIRAC.RequestManagementSystem.private.RequestBatchTask import RequestBatchTask, getBatchKey
+
+OWNER_DN = "/DC=ch/DC=cern/OU=Organic Units/OU=Users/CN=chaen/CN=705305/CN=Christophe Haen"
+
+
+def makeRequest(requestID, lfns, opTypes=("RemoveFile",), ownerGroup="lhcb_user"):
+    request = Request({"RequestID": requestID, "RequestName": "request_%d" % requestID})
+    request.OwnerDN = OWNER_DN
+    request.OwnerGroup = ownerGroup
+    for opType in opTypes:
+        operation = Operation({"Type": opType, "TargetSE": "CERN-USER" if opType != "RemoveFile" else ""})
+        for lfn in lfns:
+            operation.addFile(File({"LFN": lfn}))
+        request.addOperation(operation)
+    return request
+
+
+def test_getBatchKey():
+    assert getBatchKey(makeRequest(1, ["/a/1"])) == getBatchKey(makeRequest(2, ["/a/2"]))
+    assert getBatchKey(makeRequest(1, ["/a/1"])) != getBatchKey(makeRequest(2, ["/a/2"], ownerGroup="lhcb_prod"))
+    assert getBatchKey(makeRequest(1, ["/a/1"])) != getBatchKey(makeRequest(2, ["/a/2"], ("ReplicateAndRegister",)))
+    assert getBatchKey(makeRequest(1, ["/a/1"], ())) is None
+
+
+@pytest.fixture
+def batchTask(mocker):
+    mocker.patch("DIRAC.RequestManagementSystem.private.RequestTask.gMonitor")
+    mocker.patch("DIRAC.RequestManagementSystem.private.RequestBatchTask.gMonitor")
+    mocker.patch("DIRAC.RequestManagementSystem.private.RequestBatchTask.gConfigurationData")
+    mocker.patch(
+        "DIRAC.RequestManagementSystem.private.RequestTask.Operations",
+        return_value=MagicMock(getSections=MagicMock(return_value=S_OK([]))),
+    )
+    requests = [
+        makeRequest(1, ["/a/1", "/a/2"]),
+        makeRequest(2, ["/a/2", "/a/fail"]),
+        makeRequest(3, ["/a/3"], ("RemoveFile", "ReplicateAndRegister")),
+    ]
+    requestClient = MagicMock()
+    requestClient.putRequest.return_value = S_OK()
+    task = RequestBatchTask(
+        [request.toJSON()["Value"] for request in requests],
+        {"RemoveFile": "DIRAC/DataManagementSystem/Agent/RequestOperations/RemoveFile"},
+        "csPath",
+        "RequestManagement/RequestExecutingAgent",
+        requestClient=requestClient,
+    )
+    task.setupProxy = MagicMock(return_value=S_OK({"Shifter": [], "ProxyFile": "proxy"}))
+    return task
+
+
+def test_batch(batchTask):
+    batchOperations = []
+
+    def getHandler(operation):
+        """handler removing all the files, but one"""
+        batchOperations.append(operation)
+
+        def execute():
+            for opFile in operation:
+                opFile.Attempt += 1
+                opFile.Status = "Failed" if opFile.LFN == "/a/fail" else "Done"
+            return S_OK()
+
+        return S_OK(MagicMock(side_effect=execute))
+
+    batchTask.getHandler = getHandler
+    result = batchTask()
+    assert result["OK"]
+    results = result["Value"]
+    assert sorted(results) == [1, 2, 3]
+
+    # A single operation with the waiting files of the 3 requests, once each
+    assert len(batchOperations) == 1
+    assert [opFile.LFN for opFile in batchOperations[0]] == ["/a/1", "/a/2", "/a/fail", "/a/3"]
+
+    request1, request2, request3 = (results[requestID]["Value"] for requestID in (1, 2, 3))
+    assert request1.Status == "Done"
+    assert [(opFile.Status, opFile.Attempt) for opFile in request2[0]] == [("Done", 1), ("Failed", 1)]
+    assert request2.Status == "Failed"
+    # The next operation of the request is left for a RequestTask
+    assert request3[0].Status == "Done"
+    assert request3.Status == "Waiting"
+    # Only the Done request is put back by the task
+    assert batchTask.requestClient.putRequest.call_count == 1
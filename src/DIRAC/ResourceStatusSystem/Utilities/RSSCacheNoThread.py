@@ -14,8 +14,8 @@ from __future__ import print_function
 __RCSID__ = "$Id$"
 
 import six
-import itertools
 import random
+import time
 
 from DIRAC import gLogger, S_OK, S_ERROR
 from DIRAC.Core.Utilities.DictCache import DictCache
@@ -60,6 +60,16 @@ class Cache(object):
         self.__cacheLock = LockRing()
         self.__cacheLock.getLock(self.__class__.__name__)
 
+    @property
+    def lifeTime(self):
+        """Lifetime of the elements in the cache, in seconds"""
+        return self.__lifeTime
+
+    @property
+    def validSeconds(self):
+        """Time the records returned from the cache must still be valid, in seconds"""
+        return self.__validSeconds
+
     # internal cache object getter
 
     def cacheKeys(self):
@@ -192,6 +202,59 @@ class Cache(object):
         return S_OK(newCache)
 
 
+class RSSCacheIndex(object):
+    """
+    Read only view of the content of the RSS cache, built once per refresh, and indexed
+    for the lookups done by RSSCache.match.
+
+    The keys of the cache are either ( elementName, elementType, statusType, vO ) tuples
+    for the resources, or elementNames for the sites. For the resources, the view of a VO
+    keeps the entries of the VO, and the entries for 'all' VOs when there are none for the VO.
+    The views are computed on the first lookup for each VO, and indexed by
+    ( elementName, elementType ) and by ( elementType, statusType ).
+    """
+
+    def __init__(self, cacheDict, expiry):
+        """
+        :param dict cacheDict: content of the cache
+        :param float expiry: epoch after which the index is no longer valid
+        """
+        self.expiry = expiry
+        self.cacheDict = cacheDict
+        firstKey = next(iter(cacheDict), None)
+        self.isResource = isinstance(firstKey, tuple) and len(firstKey) == 4
+        if self.isResource:
+            self.elementNames = frozenset(key[0] for key in cacheDict)
+            self.elementTypes = frozenset(key[1] for key in cacheDict)
+        else:
+            self.elementNames = frozenset(cacheDict)
+            self.elementTypes = frozenset()
+        self.__views = {}
+
+    def __len__(self):
+        return len(self.cacheDict)
+
+    def getView(self, vO):
+        """Get the indexes of the entries seen by a VO
+
+        :return: ( { ( elementName, elementType ) : { statusType : status } },
+                   { ( elementType, statusType ) : set of elementNames } )
+        """
+        view = self.__views.get(vO)
+        if view is None:
+            byElement = {}
+            byType = {}
+            # The 'all' entries first, so that the ones of the VO replace them
+            for voFilter in ["all"] if vO in (None, "all") else ["all", vO]:
+                for (elementName, elementType, statusType, entryVO), status in self.cacheDict.items():
+                    if entryVO == voFilter:
+                        byElement.setdefault((elementName, elementType), {})[statusType] = status
+                        byType.setdefault((elementType, statusType), set()).add(elementName)
+            # Concurrent lookups may build the same view twice, which is harmless
+            view = self.__views[vO] = (byElement, byType)
+        return view
+
+
 class RSSCache(Cache):
     """
     The RSSCache is an extension of Cache in which the cache keys are pairs of the
@@ -225,6 +288,20 @@ class RSSCache(Cache):
         super(RSSCache, self).__init__(lifeTime, updateFunc)
 
         self.allStatusTypes = RssConfiguration().getConfigStatusType()
+        # Index of the current content of the cache, replaced as a whole at each refresh
+        self.__index = None
+
+    def refreshCache(self):
+        """
+        Purges the cache and gets fresh data from the update function, and indexes it.
+
+        :return: S_OK | S_ERROR. If the first, its content is the new cache.
+        """
+        newCache = super(RSSCache, self).refreshCache()
+        if not newCache["OK"]:
+            return newCache
+        self.__index = RSSCacheIndex(newCache["Value"], time.time() + self.lifeTime - 2 * self.validSeconds)
+        return newCache
 
     def match(self, elementNames, elementType, statusTypes, vO):
         """
@@ -238,6 +315,9 @@ class RSSCache(Cache):
         However, arguments ( elementNames or statusTypes ) can have a None value. If
         that is the case, they are considered wildcards.
 
+        The lookups are done on the index of the cache, without lock, unless the cache
+        has to be refreshed.
+
         :Parameters:
           **elementNames** - [ None, `string`, `list` ]
             name(s) of the elements to be matched
@@ -249,102 +329,52 @@ class RSSCache(Cache):
         :return: S_OK() || S_ERROR()
         """
 
-        self.acquireLock()
-        try:
-            return self._match(elementNames, elementType, statusTypes, vO)
-        finally:
-            # Release lock, no matter what !
-            self.releaseLock()
-
-    # Private methods: NOT THREAD SAFE !!
+        index = self.__getValidIndex()
+        if not index["OK"]:
+            return index
+        return self._match(index["Value"], elementNames, elementType, statusTypes, vO)
 
-    def _match(self, elementNames, elementType, statusTypes, vO):
+    def __getValidIndex(self):
         """
-        Method doing the actual work. It must be wrapped around locks to ensure no
-        disaster happens.
+        Gets the index of the cache, refreshing the cache if it is empty or about to expire.
 
-        :Parameters:
-          **elementNames** - [ None, `string`, `list` ]
-            name(s) of the elements to be matched
-          **elementType** - [ `string` ]
-            type of the elements to be matched
-          **statusTypes** - [ None, `string`, `list` ]
-            name(s) of the statusTypes to be matched
-
-        :return: S_OK() || S_ERROR()
+        :return: S_OK( RSSCacheIndex ) || S_ERROR()
         """
+        index = self.__index
+        if index and index.expiry > time.time():
+            return S_OK(index)
 
-        # Gets the entire cache or a new one if it is empty / invalid
-        validCache = self.__getValidCache()
-        if not validCache["OK"]:
-            return validCache
-        validCache = validCache["Value"]
-
-        # Gets matched keys
-        try:
-            matchKeys = self.__match(validCache, elementNames, elementType, statusTypes, vO)
-        except IndexError:
-            return S_ERROR("RSS cache empty?")
-
-        if not matchKeys["OK"]:
-            return matchKeys
-
-        # Gets objects for matched keys. It will return S_ERROR if the cache value
-        # has expired in between. It has 30 valid seconds, which means something was
-        # extremely slow above.
-        if matchKeys["CheckVO"]:
-            cacheMatches = self.check(matchKeys["Value"], vO)  # add an appropriate VO to the keys
-        else:
-            cacheMatches = self.get(matchKeys["Value"])
-        if not cacheMatches["OK"]:
-            return cacheMatches
-
-        cacheMatches = cacheMatches["Value"]
-        if not cacheMatches:
-            return S_ERROR("Empty cache for: %s, %s" % (elementNames, elementType))
-
-        # We undo the key into <elementName> and <statusType>
+        self.acquireLock()
         try:
-            cacheMatchesDict = self.__getDictFromCacheMatches(cacheMatches)
-        except ValueError:
-            cacheMatchesDict = cacheMatches
-
-        return S_OK(cacheMatchesDict)
-
-    def __getValidCache(self):
-        """
-        Obtains the keys on the cache which are valid. If any, returns the complete
-        valid dictionary. If the list is empty, we assume the cache is invalid or
-        not filled, so we issue a cache refresh and return its data.
-
-        :return: { ( elementName, statusType, vO ) : status, ... }
-        """
+            # Another thread may have refreshed it in the meantime
+            index = self.__index
+            if not index or index.expiry <= time.time():
+                result = self.refreshCache()
+                if not result["OK"]:
+                    return result
+                index = self.__index
+        finally:
+            # Release lock, no matter what !
+            self.releaseLock()
 
-        cacheKeys = self.cacheKeys()
-        # If cache is empty, we refresh it.
-        if not cacheKeys:
-            cache = self.refreshCache()
-        else:
-            cache = self.get(cacheKeys)
+        if not index:
+            return S_ERROR("RSS cache empty?")
+        return S_OK(index)
 
-        return cache
+    # Private methods
 
-    def __match(self, validCache, elementNames, elementType, statusTypes, vO):
+    def _match(self, index, elementNames, elementType, statusTypes, vO):
         """
-        Obtains all keys on the cache ( should not be empty ! ).
-
-        Gets the sets ( no duplicates ) of elementNames and statusTypes. There is a
-        slight distinction. A priori we cannot know which are all the elementNames.
-        So, if elementNames is None, we will consider all elementNames in the cacheKeys.
-        However, if statusTypes is None, we will get the standard list from the
-        ResourceStatus configuration in the CS.
+        Method doing the actual work, on an index of the cache. The work done is
+        proportional to the number of keys requested, not to the size of the cache.
 
-        If the cartesian product of our sets is on the cacheKeys set, we have a
-        positive match.
+        A priori we cannot know which are all the elementNames. So, if elementNames
+        is None, we will consider all elementNames in the cache. However, if statusTypes
+        is None, we will get the standard list from the ResourceStatus configuration in the CS.
 
         :Parameters:
-          **validCache** - `dict`
-            cache dictionary
+          **index** - `RSSCacheIndex`
+            index of the cache
           **elementNames** - [ None, `string`, `list` ]
             name(s) of the elements to be matched
           **elementType** - [ `string` ]
@@ -352,33 +382,16 @@ class RSSCache(Cache):
           **statusTypes** - [ None, `string`, `list` ]
             name(s) of the statusTypes to be matched
 
-        :return: S_OK() with a Vo check marker || S_ERROR()
+        :return: S_OK() with a dict of the form { elementName : { statusType: status, ... }, ... }
+                 for the resources, { elementName : status, ... } for the sites || S_ERROR()
         """
 
-        cacheKeys = list(validCache)
-        # flatten the cache. From our VO perspective we are only want to keep:
-        # 1) keys with vO tuple element equal to our vO,
-        # 2) keys with vO tuple element equal to 'all', but only if no element described in 1) exists.
-        # a resource key is set to have 3 elements to allow a comparison with a cartesian product.
-        checkVo = False
-        if len(cacheKeys[0]) == 4:  # resource
-            checkVo = True
-            flattenedCache = {(key[0], key[1], key[2]): value for key, value in validCache.items() if key[3] == "all"}
-            flattenedCache.update(
-                {(key[0], key[1], key[2]): value for key, value in validCache.items() if key[3] == vO}
-            )
-            validCache = flattenedCache
-        else:  # site, not VO specific in SiteStatus, eventually to be upgraded there to include the VO
-            pass
-
+        allElements = elementNames is None
         if isinstance(elementNames, six.string_types):
             elementNames = [elementNames]
-        elif elementNames is None:
-            if isinstance(cacheKeys[0], (tuple, list)):
-                elementNames = [cacheKey[0] for cacheKey in cacheKeys]
-            else:
-                elementNames = cacheKeys
-        # Remove duplicates, makes Cartesian product faster
+        elif allElements:
+            elementNames = index.elementNames
+        # Remove duplicates
         elementNamesSet = set(elementNames)
 
         if isinstance(elementType, six.string_types):
@@ -387,8 +400,7 @@ class RSSCache(Cache):
             else:
                 elementType = [elementType]
         elif elementType is None:
-            elementType = [cacheKey[1] for cacheKey in cacheKeys]
-        # Remove duplicates, makes Cartesian product faster
+            elementType = index.elementTypes
         elementTypeSet = set(elementType)
 
         if isinstance(statusTypes, six.string_types):
@@ -398,47 +410,55 @@ class RSSCache(Cache):
                 statusTypes = [statusTypes]
         elif statusTypes is None:
             statusTypes = self.allStatusTypes
-        # Remove duplicates, makes Cartesian product faster
         statusTypesSet = set(statusTypes)
 
-        if not elementTypeSet and not statusTypesSet:
-            cartesianProduct = elementNamesSet
-        else:
-            cartesianProduct = set(itertools.product(elementNamesSet, elementTypeSet, statusTypesSet))
-
-        # Some users find funny sending empty lists, which will make the cartesianProduct
+        # Some users find funny sending empty lists, which will make the cartesian product
         # be []. Problem: [] is always subset, no matter what !
-
-        if not cartesianProduct:
+        if not elementNamesSet or (bool(elementTypeSet) != bool(statusTypesSet)):
             self.log.warn("Empty cartesian product")
             return S_ERROR("Empty cartesian product")
 
-        notInCache = list(cartesianProduct.difference(set(validCache)))
-        if notInCache:
+        if not elementTypeSet:
+            # Sites: the keys are the element names
+            if index.isResource:
+                notInCache = list(elementNamesSet)
+            else:
+                notInCache = [elementName for elementName in elementNamesSet if elementName not in index.cacheDict]
+            if notInCache:
+                self.log.warn("Cache misses: %s" % notInCache)
+                return S_ERROR("Cache misses: %s" % notInCache)
+            return S_OK({elementName: index.cacheDict[elementName] for elementName in elementNamesSet})
+
+        if not index.isResource:
+            notInCache = [
+                (elementName, eType, statusType)
+                for elementName in elementNamesSet
+                for eType in elementTypeSet
+                for statusType in statusTypesSet
+            ]
             self.log.warn("Cache misses: %s" % notInCache)
             return S_ERROR("Cache misses: %s" % notInCache)
 
-        result = S_OK(cartesianProduct)
-        result["CheckVO"] = checkVo
-        return result
-
-    @staticmethod
-    def __getDictFromCacheMatches(cacheMatches):
-        """
-        Formats the cacheMatches to a format expected by the RSS helpers clients.
-
-        :Parameters:
-          **cacheMatches** - `dict`
-            cache dictionary of the form { ( elementName, elementType, statusType, vO ) : status, ... }
-
-
-        :return: dict of the form { elementName : { statusType: status, ... }, ... }
-        """
-
+        byElement, byType = index.getView(vO)
+        notInCache = []
+        if allElements:
+            # All the elements: use the ( elementType, statusType ) index to find the missing ones
+            for eType in elementTypeSet:
+                for statusType in statusTypesSet:
+                    for elementName in elementNamesSet.difference(byType.get((eType, statusType), ())):
+                        notInCache.append((elementName, eType, statusType))
         result = {}
+        if not notInCache:
+            for elementName in elementNamesSet:
+                for eType in elementTypeSet:
+                    statuses = byElement.get((elementName, eType), {})
+                    for statusType in statusTypesSet:
+                        if statusType in statuses:
+                            result.setdefault(elementName, {})[statusType] = statuses[statusType]
+                        else:
+                            notInCache.append((elementName, eType, statusType))
+        if notInCache:
+            self.log.warn("Cache misses: %s" % notInCache)
+            return S_ERROR("Cache misses: %s" % notInCache)
 
-        for cacheKey, cacheValue in cacheMatches.items():
-            elementName, _elementType, statusType, vO = cacheKey
-            result.setdefault(elementName, {})[statusType] = cacheValue
-
-        return result
+        return S_OK(result)
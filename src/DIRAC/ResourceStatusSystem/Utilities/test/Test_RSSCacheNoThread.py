@@ -0,0 +1,88 @@
+""" Test of the lookups in the RSS cache
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+# pylint: disable=protected-access
+
+import pytest
+from mock import MagicMock, patch
+
+from DIRAC import S_OK
+from DIRAC.ResourceStatusSystem.Utilities import RSSCacheNoThread
+from DIRAC.ResourceStatusSystem.Utilities.RSSCacheNoThread import RSSCache
+
+RESOURCES = {
+    ("SE1", "StorageElement", "ReadAccess", "all"): "Active",
+    ("SE1", "StorageElement", "WriteAccess", "all"): "Active",
+    ("SE1", "StorageElement", "WriteAccess", "vo1"): "Banned",
+    ("SE2", "StorageElement", "ReadAccess", "all"): "Degraded",
+    ("SE2", "StorageElement", "WriteAccess", "all"): "Active",
+    ("SE3", "StorageElement", "ReadAccess", "vo1"): "Active",
+    ("SE3", "StorageElement", "WriteAccess", "vo1"): "Active",
+}
+
+
+@pytest.fixture
+def rssCache():
+    with patch.object(RSSCacheNoThread, "RssConfiguration") as rssConfiguration:
+        rssConfiguration.return_value.getConfigStatusType.return_value = ["ReadAccess", "WriteAccess"]
+        cache = RSSCache(300, MagicMock(return_value=S_OK(dict(RESOURCES))))
+    return cache
+
+
+def test_match(rssCache):
+    result = rssCache.match("SE1", "StorageElement", "WriteAccess", "vo2")
+    assert result["OK"], result
+    assert result["Value"] == {"SE1": {"WriteAccess": "Active"}}
+    # The entries of the VO replace the ones for all the VOs
+    result = rssCache.match(["SE1", "SE2"], "StorageElement", None, "vo1")
+    assert result["OK"], result
+    assert result["Value"] == {
+        "SE1": {"ReadAccess": "Active", "WriteAccess": "Banned"},
+        "SE2": {"ReadAccess": "Degraded", "WriteAccess": "Active"},
+    }
+    # The cache is only filled once
+    assert rssCache._Cache__updateFunc.call_count == 1
+
+    # All the elements
+    result = rssCache.match(None, "StorageElement", "ReadAccess", "vo1")
+    assert result["OK"], result
+    assert sorted(result["Value"]) == ["SE1", "SE2", "SE3"]
+    # SE3 is only known by vo1
+    result = rssCache.match(None, "StorageElement", "ReadAccess", "vo2")
+    assert not result["OK"]
+    assert "SE3" in result["Message"]
+
+    assert not rssCache.match("SE4", "StorageElement", "ReadAccess", "vo1")["OK"]
+    assert not rssCache.match([], "StorageElement", "ReadAccess", "vo1")["OK"]
+    assert not rssCache.match("SE1", "StorageElement", [], "vo1")["OK"]
+
+
+def test_matchSites():
+    with patch.object(RSSCacheNoThread, "RssConfiguration"):
+        rssCache = RSSCache(300, MagicMock(return_value=S_OK({"Site1": "Active", "Site2": "Banned"})))
+    result = rssCache.match("Site1", "", "", "all")
+    assert result["OK"], result
+    assert result["Value"] == {"Site1": "Active"}
+    result = rssCache.match(None, "", "", "all")
+    assert result["Value"] == {"Site1": "Active", "Site2": "Banned"}
+    assert not rssCache.match("Site3", "", "", "all")["OK"]
+
+
+def test_refresh(rssCache):
+    assert rssCache.match("SE1", "StorageElement", "ReadAccess", "vo1")["OK"]
+    # An expired index is rebuilt from a refreshed cache
+    rssCache._RSSCache__index.expiry = 0
+    rssCache._Cache__updateFunc.return_value = S_OK({("SE1", "StorageElement", "ReadAccess", "all"): "Banned"})
+    result = rssCache.match("SE1", "StorageElement", "ReadAccess", "vo1")
+    assert result["Value"] == {"SE1": {"ReadAccess": "Banned"}}
+    assert rssCache._Cache__updateFunc.call_count == 2
+
+    # An empty cache is refreshed at each lookup
+    rssCache._RSSCache__index.expiry = 0
+    rssCache._Cache__updateFunc.return_value = S_OK({})
+    for _ in range(2):
+        assert not rssCache.match("SE1", "StorageElement", "ReadAccess", "vo1")["OK"]
+    assert rssCache._Cache__updateFunc.call_count == 4
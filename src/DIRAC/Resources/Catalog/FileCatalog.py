@@ -153,6 +153,39 @@ class FileCatalog(object):
         masterNames = [catalogName for catalogName, oCatalog, master in self.writeCatalogs if master]
         return S_OK(masterNames)
 
+    def iterDirectory(self, path, pageSize=1000, verbose=False, timeout=120):
+        """Iterate over the contents of a directory one page at a time, with the first read catalog
+        supporting the paged listing. Otherwise, the whole listDirectory result is given as a single page.
+
+        :param str path: directory to list
+        :param int pageSize: maximum number of files in each page
+        :param bool verbose: if True, give the details of the entries
+
+        :return: generator of S_OK(dict) with the "Files", "SubDirs", "Links" and "Datasets" of the page,
+                 like the listDirectory results. It stops after the first S_ERROR.
+        """
+        for catalogName, oCatalog, _master in self.readCatalogs:
+            if not oCatalog.hasCatalogMethod("listDirectoryPaged"):
+                continue
+            pages = oCatalog.iterDirectory(path, pageSize=pageSize, verbose=verbose, timeout=timeout)
+            result = next(pages)
+            if not result["OK"]:
+                self.log.debug("Failed paged listing", "%s in %s: %s" % (path, catalogName, result["Message"]))
+                continue
+            yield result
+            for result in pages:
+                yield result
+            return
+
+        result = self.listDirectory(path, verbose, timeout=timeout)
+        if result["OK"]:
+            if path in result["Value"]["Successful"]:
+                result = S_OK(result["Value"]["Successful"][path])
+                result["Value"]["Cursor"] = None
+            else:
+                result = S_ERROR(result["Value"]["Failed"].get(path, "Failed to list %s" % path))
+        yield result
+
     def __getattr__(self, name):
         self.call = name
         if name in self.write_methods:
@@ -28,7 +28,9 @@ class FileCatalogClient(FileCatalogClientBase):
         "getFileSize",
         "isDirectory",
         "getDirectoryReplicas",
+        "getDirectoryReplicasPaged",
         "listDirectory",
+        "listDirectoryPaged",
         "getDirectoryMetadata",
         "getDirectorySize",
         "getDirectoryContents",
@@ -105,6 +107,8 @@ class FileCatalogClient(FileCatalogClientBase):
         "findFilesByMetadataDetailed",
         "findFilesByMetadataWeb",
         "getCompatibleMetadata",
+        "listDirectoryPaged",
+        "getDirectoryReplicasPaged",
         "addMetadataSet",
         "getMetadataSet",
         "getFileUserMetadata",
@@ -241,6 +245,47 @@ class FileCatalogClient(FileCatalogClientBase):
                     entryDict[lfn] = detailsDict
         return result
 
+    def listDirectoryPaged(self, path, cursor=0, pageSize=1000, verbose=False, timeout=120):
+        """List one page of the given directory's contents, see iterDirectory
+
+        :param str path: directory to list
+        :param int cursor: cursor of the page, 0 for the first one
+        :param int pageSize: maximum number of files in the page
+        :param bool verbose: if True, give the details of the entries
+
+        :return: S_OK(dict) with the "Files", "SubDirs", "Links" and "Datasets" of the page, like listDirectory,
+                 and the "Cursor" of the next page, None after the last page
+        """
+        rpcClient = self._getRPC(timeout=timeout)
+        result = rpcClient.listDirectoryPaged(path, cursor, pageSize, verbose)
+        if not result["OK"]:
+            return result
+        # Force returned directory entries to be LFNs
+        for entryType in ["Files", "SubDirs", "Links"]:
+            entryDict = result["Value"][entryType]
+            for fname in list(entryDict):
+                detailsDict = entryDict.pop(fname)
+                entryDict[os.path.join(path, os.path.basename(fname))] = detailsDict
+        return result
+
+    def iterDirectory(self, path, pageSize=1000, verbose=False, timeout=120):
+        """Iterate over the contents of a directory, one page at a time, so that the memory
+        used for huge directories stays bounded. The first page also contains the subdirectories.
+
+        :param str path: directory to list
+        :param int pageSize: maximum number of files in each page
+        :param bool verbose: if True, give the details of the entries
+
+        :return: generator of S_OK(page), see listDirectoryPaged. It stops after the first S_ERROR.
+        """
+        cursor = 0
+        while True:
+            result = self.listDirectoryPaged(path, cursor=cursor, pageSize=pageSize, verbose=verbose, timeout=timeout)
+            yield result
+            if not result["OK"] or result["Value"]["Cursor"] is None:
+                return
+            cursor = result["Value"]["Cursor"]
+
     @checkCatalogArguments
     def getDirectoryMetadata(self, lfns, timeout=120):
         """Get standard directory metadata"""
@@ -292,6 +337,51 @@ class FileCatalogClient(FileCatalogClientBase):
 
         return result
 
+    def getDirectoryReplicasPaged(self, path, cursor=0, pageSize=1000, allStatus=False, timeout=120):
+        """Get the replicas of one page of the files of the given directory, see iterDirectoryReplicas
+
+        :param str path: directory
+        :param int cursor: cursor of the page, 0 for the first one
+        :param int pageSize: maximum number of files in the page
+        :param bool allStatus: whether all replicas and file status are considered
+
+        :return: S_OK(dict) with the "Replicas" of the page, {lfn: {SE: PFN}} like getDirectoryReplicas,
+                 and the "Cursor" of the next page, None after the last page
+        """
+        rpcClient = self._getRPC(timeout=timeout)
+        result = rpcClient.getDirectoryReplicasPaged(path, cursor, pageSize, allStatus)
+        if not result["OK"]:
+            return result
+        replicas = result["Value"]["Replicas"]
+        for fname in list(replicas):
+            detailsDict = replicas.pop(fname)
+            lfn = "%s/%s" % (path.rstrip("/"), os.path.basename(fname))
+            # Add the LFN as value for each SE which does not have a PFN
+            for se in detailsDict:
+                if not detailsDict[se]:
+                    detailsDict[se] = lfn
+            replicas[lfn] = detailsDict
+        return result
+
+    def iterDirectoryReplicas(self, path, pageSize=1000, allStatus=False, timeout=120):
+        """Iterate over the replicas of the files of a directory, one page at a time
+
+        :param str path: directory
+        :param int pageSize: maximum number of files in each page
+        :param bool allStatus: whether all replicas and file status are considered
+
+        :return: generator of S_OK(page), see getDirectoryReplicasPaged. It stops after the first S_ERROR.
+        """
+        cursor = 0
+        while True:
+            result = self.getDirectoryReplicasPaged(
+                path, cursor=cursor, pageSize=pageSize, allStatus=allStatus, timeout=timeout
+            )
+            yield result
+            if not result["OK"] or result["Value"]["Cursor"] is None:
+                return
+            cursor = result["Value"]["Cursor"]
+
     def findFilesByMetadata(self, metaDict, path="/", timeout=120):
         """Find files given the meta data query and the path"""
         rpcClient = self._getRPC(timeout=timeout)
@@ -12,26 +12,31 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 
+import glob
 import time
 import os
 import datetime
-import pickle
+import threading
 import concurrent.futures
 
 from DIRAC import S_OK, S_ERROR
 from DIRAC.ConfigurationSystem.Client.Helpers.Operations import Operations
 from DIRAC.Core.Base.AgentModule import AgentModule
-from DIRAC.Core.Utilities.ThreadSafe import Synchronizer
+from DIRAC.FrameworkSystem.Client.MonitoringClient import gMonitor
 from DIRAC.Core.Utilities.List import breakListIntoChunks, randomize
 from DIRAC.DataManagementSystem.Client.DataManager import DataManager
 from DIRAC.TransformationSystem.Client import TransformationFilesStatus
 from DIRAC.TransformationSystem.Client.TransformationClient import TransformationClient
 from DIRAC.TransformationSystem.Agent.TransformationAgentsUtilities import TransformationAgentsUtilities
+from DIRAC.TransformationSystem.Utilities.ReplicaCache import ReplicaCache
 
 __RCSID__ = "$Id$"
 
 AGENT_NAME = "Transformation/TransformationAgent"
-gSynchro = Synchronizer()
+
+# Stages a transformation goes through, each one with its pool of threads:
+# getting the files, getting their replicas, running the plugin, and creating the tasks
+PIPELINE_STAGES = ("Files", "Replicas", "Plugin", "Tasks")
 
 
 class TransformationAgent(AgentModule, TransformationAgentsUtilities):
@@ -60,8 +65,6 @@ class TransformationAgent(AgentModule, TransformationAgentsUtilities):
         # Validity of the cache
         self.replicaCache = None
         self.replicaCacheValidity = None
-        self.writingCache = False
-        self.removedFromCache = 0
 
         self.noUnusedDelay = 0
         self.unusedFiles = {}
@@ -70,6 +73,14 @@ class TransformationAgent(AgentModule, TransformationAgentsUtilities):
         self.debug = False
         self.pluginTimeout = {}
 
+        # the pipeline
+        self.stagePools = {}
+        self.catalogPool = None
+        self.stageStats = {}
+        self.inFlight = None
+        self.__statsLock = threading.Lock()
+        self.__catalogClients = threading.local()
+
     def initialize(self):
         """standard initialize"""
         # few parameters
@@ -91,24 +102,51 @@ class TransformationAgent(AgentModule, TransformationAgentsUtilities):
         # clients
         self.transfClient = TransformationClient()
 
-        # for caching using a pickle file
+        # for caching using a SQLite file
         self.workDirectory = self.am_getWorkDirectory()
-        self.cacheFile = os.path.join(self.workDirectory, "ReplicaCache.pkl")
+        self.cacheFile = os.path.join(self.workDirectory, "ReplicaCache.sqlite")
         self.controlDirectory = self.am_getControlDirectory()
 
         # remember the offset if any in TS
         self.lastFileOffset = {}
 
         # Validity of the cache
-        self.replicaCache = {}
         self.replicaCacheValidity = self.am_getOption("ReplicaCacheValidity", 2)
+        self.replicaCache = ReplicaCache(self.cacheFile, validity=self.replicaCacheValidity)
+        self.__migrateCache()
 
         self.noUnusedDelay = self.am_getOption("NoUnusedDelay", 6)
 
-        # Instantiating the ThreadPoolExecutor
+        # The transformations are processed by a pipeline of stages: at most maxThreadsInPool transformations
+        # are in the pipeline, the catalog is queried by ReplicaThreads threads and PluginThreads plugins run
+        # at the same time
         maxNumberOfThreads = self.am_getOption("maxThreadsInPool", 15)
-        self.log.info("Multithreaded with %d threads" % maxNumberOfThreads)
-        self.threadPoolExecutor = concurrent.futures.ThreadPoolExecutor(max_workers=maxNumberOfThreads)
+        replicaThreads = self.am_getOption("ReplicaThreads", 5)
+        pluginThreads = self.am_getOption("PluginThreads", 2)
+        self.log.info(
+            "Multithreaded with %d transformations in the pipeline, %d threads for the catalog and %d for the plugins"
+            % (maxNumberOfThreads, replicaThreads, pluginThreads)
+        )
+        self.inFlight = threading.BoundedSemaphore(maxNumberOfThreads)
+        for stage in PIPELINE_STAGES:
+            self.stagePools[stage] = concurrent.futures.ThreadPoolExecutor(
+                max_workers=pluginThreads if stage == "Plugin" else maxNumberOfThreads
+            )
+            gMonitor.registerActivity(
+                "%sStageTime" % stage,
+                "Time spent in the %s stage" % stage,
+                AGENT_NAME,
+                "Seconds",
+                gMonitor.OP_MEAN,
+            )
+            gMonitor.registerActivity(
+                "%sStageWait" % stage,
+                "Time waiting for the %s stage" % stage,
+                AGENT_NAME,
+                "Seconds",
+                gMonitor.OP_MEAN,
+            )
+        self.catalogPool = concurrent.futures.ThreadPoolExecutor(max_workers=replicaThreads)
 
         self.log.info("Will treat the following transformation types: %s" % str(self.transformationTypes))
 
@@ -119,13 +157,17 @@ class TransformationAgent(AgentModule, TransformationAgentsUtilities):
 
         method = "finalize"
         self._logInfo("Wait for threads to get empty before terminating the agent", method=method)
-        self.threadPoolExecutor.shutdown()
+        # Each stage only feeds the next ones: shut them down in order
+        for stage in PIPELINE_STAGES:
+            self.stagePools[stage].shutdown()
+            if stage == "Replicas":
+                self.catalogPool.shutdown()
         self._logInfo("Threads are empty, terminating the agent...", method=method)
-        self.__writeCache()
+        self.replicaCache.close()
         return S_OK()
 
     def execute(self):
-        """Just puts transformations in the queue, and spawns threads if there's work to do."""
+        """Just puts transformations in the pipeline, and waits for them to go through it."""
         # Get the transformations to process
         res = self.getTransformations()
         if not res["OK"]:
@@ -134,6 +176,10 @@ class TransformationAgent(AgentModule, TransformationAgentsUtilities):
         # Process the transformations
         count = 0
         future_to_transID = {}
+        self.stageStats = dict(
+            (stage, {"Processed": 0, "Time": 0.0, "Wait": 0.0, "Queued": 0, "MaxQueued": 0})
+            for stage in PIPELINE_STAGES
+        )
 
         for transDict in res["Value"]:
             transID = int(transDict["TransformationID"])
@@ -153,9 +199,20 @@ class TransformationAgent(AgentModule, TransformationAgentsUtilities):
                         for status, val in movedFiles.items():
                             self._logInfo("\t%d files to status %s" % (val, status), transID=transID)
             count += 1
-            future = self.threadPoolExecutor.submit(self._execute, transDict)
-            future_to_transID[future] = transID
-        self._logInfo("Out of %d transformations, %d put in thread queue" % (len(res["Value"]), count))
+            # Back-pressure: wait for a transformation to leave the pipeline if it is full
+            self.inFlight.acquire()
+            context = {
+                "TransDict": transDict,
+                "TransID": transID,
+                "Future": concurrent.futures.Future(),
+                "StartTime": time.time(),
+            }
+            future_to_transID[context["Future"]] = transID
+            try:
+                self.__submitStage(context, 0)
+            except Exception as x:  # pylint: disable=broad-except
+                self.__leavePipeline(context, None, x)
+        self._logInfo("Out of %d transformations, %d put in the pipeline" % (len(res["Value"]), count))
 
         for future in concurrent.futures.as_completed(future_to_transID):
             transID = future_to_transID[future]
@@ -166,6 +223,22 @@ class TransformationAgent(AgentModule, TransformationAgentsUtilities):
             else:
                 self._logInfo("Processed %d" % transID)
 
+        for stage in PIPELINE_STAGES:
+            stats = self.stageStats[stage]
+            self._logInfo(
+                "%s stage: %d transformations in %.1f seconds (%.2f per transformation), "
+                "%.1f seconds waiting, at most %d queued"
+                % (
+                    stage,
+                    stats["Processed"],
+                    stats["Time"],
+                    stats["Time"] / stats["Processed"] if stats["Processed"] else 0.0,
+                    stats["Wait"],
+                    stats["MaxQueued"],
+                ),
+                method="execute",
+            )
+
         return S_OK()
 
     def getTransformations(self):
@@ -207,48 +280,108 @@ class TransformationAgent(AgentModule, TransformationAgentsUtilities):
 
         return {"TransformationClient": threadTransformationClient, "DataManager": threadDataManager}
 
-    def _execute(self, transDict):
-        """thread - does the real job: processing the transformation to be processed"""
-
-        self._logDebug("Starting _execute")
-
-        # Each thread will have its own clients
-        clients = self._getClients()
-
+    def __submitStage(self, context, index):
+        """Queue a transformation for a stage of the pipeline"""
+        stage = PIPELINE_STAGES[index]
+        context["QueuedTime"] = time.time()
+        with self.__statsLock:
+            stats = self.stageStats[stage]
+            stats["Queued"] += 1
+            stats["MaxQueued"] = max(stats["MaxQueued"], stats["Queued"])
+        self.stagePools[stage].submit(self.__runStage, context, index)
+
+    def __runStage(self, context, index):
+        """thread - runs a stage of the pipeline for a transformation, and passes it to the next stage"""
+        stage = PIPELINE_STAGES[index]
+        transID = context["TransID"]
+        startTime = time.time()
+        res = None
+        error = None
         try:
-            transID = int(transDict["TransformationID"])
-            self._logInfo("Processing transformation %s." % transID, transID=transID)
-            startTime = time.time()
-            res = self.processTransformation(transDict, clients)
+            try:
+                if "Clients" not in context:
+                    # Each transformation has its own clients
+                    context["Clients"] = self._getClients()
+                res = getattr(self, "_%sStage" % stage.lower())(context)
+            except Exception as x:  # pylint: disable=broad-except
+                self._logException("Exception in %s stage" % stage, lException=x, transID=transID)
+                res = S_ERROR("Exception in %s stage: %s" % (stage, repr(x)))
+            elapsed = time.time() - startTime
+            waited = startTime - context["QueuedTime"]
+            with self.__statsLock:
+                stats = self.stageStats[stage]
+                stats["Queued"] -= 1
+                stats["Processed"] += 1
+                stats["Time"] += elapsed
+                stats["Wait"] += waited
+            gMonitor.addMark("%sStageTime" % stage, elapsed)
+            gMonitor.addMark("%sStageWait" % stage, waited)
+
+            if res["OK"] and res["Value"] and index + 1 < len(PIPELINE_STAGES):
+                try:
+                    self.__submitStage(context, index + 1)
+                    # The next stage leaves the pipeline
+                    res = None
+                    return
+                except RuntimeError as x:
+                    # The pool was shut down
+                    res = S_ERROR("Could not queue the %s stage: %s" % (PIPELINE_STAGES[index + 1], repr(x)))
+            # The transformation leaves the pipeline
             if not res["OK"]:
                 self._logInfo("Failed to process transformation:", res["Message"], transID=transID)
+            self._logInfo(
+                "Processed transformation in %.1f seconds" % (time.time() - context["StartTime"]), transID=transID
+            )
         except Exception as x:  # pylint: disable=broad-except
-            self._logException("Exception in plugin", lException=x, transID=transID)
+            error = x
         finally:
-            if not transID:
-                transID = "None"
-            self._logInfo("Processed transformation in %.1f seconds" % (time.time() - startTime), transID=transID)
+            if res is not None or error is not None:
+                self.__leavePipeline(context, res, error)
+
+    def __leavePipeline(self, context, res, error=None):
+        """Free the place of a transformation in the pipeline, and give its result to execute
 
-        self._logDebug("Exiting _execute")
+        :param dict context: context of the transformation
+        :param dict res: result of the last stage of the transformation
+        :param Exception error: exception raised while treating the transformation, instead of the result
+        """
+        try:
+            self.inFlight.release()
+        finally:
+            if error is not None:
+                context["Future"].set_exception(error)
+            else:
+                context["Future"].set_result(res)
 
     def processTransformation(self, transDict, clients):
-        """process a single transformation (in transDict)"""
+        """process a single transformation (in transDict), running all the stages in a row"""
+        context = {"TransDict": transDict, "TransID": transDict["TransformationID"], "Clients": clients}
+        for stage in PIPELINE_STAGES:
+            res = getattr(self, "_%sStage" % stage.lower())(context)
+            if not res["OK"] or not res["Value"]:
+                return res if not res["OK"] else S_OK()
+        return S_OK()
+
+    def _filesStage(self, context):
+        """Get the files of the transformation to be processed
+
+        :return: S_OK(bool) whether the transformation goes to the next stage
+        """
         method = "processTransformation"
-        transID = transDict["TransformationID"]
-        forJobs = transDict["Type"].lower() not in ("replication", "removal")
+        transDict = context["TransDict"]
+        transID = context["TransID"]
+        context["ForJobs"] = forJobs = transDict["Type"].lower() not in ("replication", "removal")
 
         # First get the LFNs associated to the transformation
-        transFiles = self._getTransformationFiles(transDict, clients, replicateOrRemove=not forJobs)
+        transFiles = self._getTransformationFiles(transDict, context["Clients"], replicateOrRemove=not forJobs)
         if not transFiles["OK"]:
             return transFiles
         if not transFiles["Value"]:
-            return S_OK()
+            return S_OK(False)
 
-        if transID not in self.replicaCache:
-            self.__readCache(transID)
         transFiles = transFiles["Value"]
         unusedLfns = [f["LFN"] for f in transFiles]
-        unusedFiles = len(unusedLfns)
+        context["UnusedFiles"] = len(unusedLfns)
 
         plugin = transDict.get("Plugin", "Standard")
         # Limit the number of LFNs to be considered for replication or removal as they are treated individually
@@ -266,39 +399,76 @@ class TransformationAgent(AgentModule, TransformationAgentsUtilities):
                 transFiles = [f for f in transFiles if f["LFN"] in lfnsToProcess]
         else:
             lfnsToProcess = unusedLfns
+        context["TransFiles"] = transFiles
+        context["LfnsToProcess"] = lfnsToProcess
+        return S_OK(True)
 
-        # Check the data is available with replicas
-        res = self.__getDataReplicas(transDict, lfnsToProcess, clients, forJobs=forJobs)
+    def _replicasStage(self, context):
+        """Check the data is available with replicas
+
+        :return: S_OK(True)
+        """
+        res = self.__getDataReplicas(
+            context["TransDict"], context["LfnsToProcess"], context["Clients"], forJobs=context["ForJobs"]
+        )
         if not res["OK"]:
-            self._logError("Failed to get data replicas:", res["Message"], method=method, transID=transID)
+            self._logError(
+                "Failed to get data replicas:",
+                res["Message"],
+                method="processTransformation",
+                transID=context["TransID"],
+            )
             return res
-        dataReplicas = res["Value"]
+        context["DataReplicas"] = res["Value"]
+        return S_OK(True)
+
+    def _pluginStage(self, context):
+        """Run the plugin of the transformation to group the files in tasks
+
+        :return: S_OK(True)
+        """
+        method = "processTransformation"
+        transDict = context["TransDict"]
+        transID = context["TransID"]
 
         # Get the plug-in type and create the plug-in object
+        plugin = transDict.get("Plugin", "Standard")
         self._logInfo("Processing transformation with '%s' plug-in." % plugin, method=method, transID=transID)
-        res = self.__generatePluginObject(plugin, clients)
+        res = self.__generatePluginObject(plugin, context["Clients"])
         if not res["OK"]:
             return res
         oPlugin = res["Value"]
 
         # Get the plug-in and set the required params
         oPlugin.setParameters(transDict)
-        oPlugin.setInputData(dataReplicas)
-        oPlugin.setTransformationFiles(transFiles)
+        oPlugin.setInputData(context["DataReplicas"])
+        oPlugin.setTransformationFiles(context["TransFiles"])
         res = oPlugin.run()
         if not res["OK"]:
             self._logError(
                 "Failed to generate tasks for transformation:", res["Message"], method=method, transID=transID
             )
             return res
-        tasks = res["Value"]
+        context["Tasks"] = res["Value"]
         self.pluginTimeout[transID] = res.get("Timeout", False)
-        # Create the tasks
+        return S_OK(True)
+
+    def _tasksStage(self, context):
+        """Create the tasks generated by the plugin
+
+        :return: S_OK(True)
+        """
+        method = "processTransformation"
+        transDict = context["TransDict"]
+        transID = context["TransID"]
+        transClient = context["Clients"]["TransformationClient"]
+        lfnsToProcess = context["LfnsToProcess"]
+
         allCreated = True
         created = 0
         lfnsInTasks = []
-        for se, lfns in tasks:
-            res = clients["TransformationClient"].addTaskForTransformation(transID, lfns, se)
+        for se, lfns in context["Tasks"]:
+            res = transClient.addTaskForTransformation(transID, lfns, se)
             if not res["OK"]:
                 self._logError(
                     "Failed to add task generated by plug-in:", res["Message"], method=method, transID=transID
@@ -311,7 +481,7 @@ class TransformationAgent(AgentModule, TransformationAgentsUtilities):
             self._logInfo("Successfully created %d tasks for transformation." % created, method=method, transID=transID)
         else:
             self._logInfo("No new tasks created for transformation.", method=method, transID=transID)
-        self.unusedFiles[transID] = unusedFiles - len(lfnsInTasks)
+        self.unusedFiles[transID] = context["UnusedFiles"] - len(lfnsInTasks)
         # If not all files were obtained, move the offset
         lastOffset = self.lastFileOffset.get(transID)
         if lastOffset:
@@ -320,7 +490,7 @@ class TransformationAgent(AgentModule, TransformationAgentsUtilities):
 
         # If this production is to Flush
         if transDict["Status"] == "Flush" and allCreated:
-            res = clients["TransformationClient"].setTransformationParameter(transID, "Status", "Active")
+            res = transClient.setTransformationParameter(transID, "Status", "Active")
             if not res["OK"]:
                 self._logError(
                     "Failed to update transformation status to 'Active':",
@@ -330,7 +500,7 @@ class TransformationAgent(AgentModule, TransformationAgentsUtilities):
                 )
             else:
                 self._logInfo("Updated transformation status to 'Active'.", method=method, transID=transID)
-        return S_OK()
+        return S_OK(True)
 
     ######################################################################
     #
@@ -463,21 +633,11 @@ class TransformationAgent(AgentModule, TransformationAgentsUtilities):
         else:
             # If the cache needs to be cleaned
             self.__cleanCache(transID)
-        startTime = time.time()
-        dataReplicas = {}
         nLfns = len(lfns)
         self._logVerbose("Getting replicas for %d files" % nLfns, method=method, transID=transID)
-        cachedReplicaSets = self.replicaCache.get(transID, {})
-        cachedReplicas = {}
-        # Merge all sets of replicas
-        for replicas in cachedReplicaSets.values():
-            cachedReplicas.update(replicas)
-        self._logInfo("Number of cached replicas: %d" % len(cachedReplicas), method=method, transID=transID)
-        setCached = set(cachedReplicas)
         setLfns = set(lfns)
-        for lfn in setLfns & setCached:
-            dataReplicas[lfn] = cachedReplicas[lfn]
-        newLFNs = setLfns - setCached
+        dataReplicas = self.replicaCache.getReplicas(transID, setLfns)
+        newLFNs = setLfns - set(dataReplicas)
         self._logInfo(
             "ReplicaCache hit for %d out of %d LFNs" % (len(dataReplicas), nLfns), method=method, transID=transID
         )
@@ -485,8 +645,17 @@ class TransformationAgent(AgentModule, TransformationAgentsUtilities):
             startTime = time.time()
             self._logInfo("Getting replicas for %d files from catalog" % len(newLFNs), method=method, transID=transID)
             newReplicas = {}
-            for chunk in breakListIntoChunks(newLFNs, 10000):
-                res = self._getDataReplicasDM(transID, chunk, clients, forJobs=forJobs)
+            # The chunks are looked up concurrently, in the pool of threads querying the catalog
+            futures = dict(
+                (self.catalogPool.submit(self.__getChunkReplicas, transID, chunk, forJobs), chunk)
+                for chunk in breakListIntoChunks(newLFNs, 10000)
+            )
+            for future in concurrent.futures.as_completed(futures):
+                chunk = futures[future]
+                try:
+                    res = future.result()
+                except Exception as x:  # pylint: disable=broad-except
+                    res = S_ERROR(repr(x))
                 if res["OK"]:
                     reps = dict((lfn, ses) for lfn, ses in res["Value"].items() if ses)
                     newReplicas.update(reps)
@@ -506,7 +675,6 @@ class TransformationAgent(AgentModule, TransformationAgentsUtilities):
             )
             dataReplicas.update(newReplicas)
             noReplicas = newLFNs - set(dataReplicas)
-            self.__writeCache(transID)
             if noReplicas:
                 self._logWarn(
                     "Found %d files without replicas (or only in Failover)" % len(noReplicas),
@@ -585,20 +753,38 @@ class TransformationAgent(AgentModule, TransformationAgentsUtilities):
                     )
         return S_OK(dataReplicas)
 
+    def __getChunkReplicas(self, transID, lfns, forJobs):
+        """thread - get the replicas of a chunk of LFNs, with the clients of the catalog thread"""
+        clients = getattr(self.__catalogClients, "clients", None)
+        if clients is None:
+            clients = self.__catalogClients.clients = self._getClients()
+        return self._getDataReplicasDM(transID, lfns, clients, forJobs=forJobs)
+
+    def __migrateCache(self):
+        """Import the pickle files of the former replica cache, one per transformation, and remove them"""
+        method = "__migrateCache"
+        for fileName in glob.glob(os.path.join(self.workDirectory, "ReplicaCache_*.pkl")):
+            try:
+                transID = int(os.path.basename(fileName)[len("ReplicaCache_") : -len(".pkl")])
+                imported = self.replicaCache.migratePickle(transID, fileName)
+                os.remove(fileName)
+                self._logInfo(
+                    "Migrated replica cache file %s (%d files)" % (fileName, imported), method=method, transID=transID
+                )
+            except Exception as x:  # pylint: disable=broad-except
+                self._logException("Failed to migrate replica cache file %s" % fileName, lException=x, method=method)
+
     def __updateCache(self, transID, newReplicas):
         """Add replicas to the cache"""
-        self.replicaCache.setdefault(transID, {})[datetime.datetime.utcnow()] = newReplicas
+        self.replicaCache.addReplicas(transID, newReplicas)
 
     def __clearCacheForTrans(self, transID):
         """Remove all replicas for a transformation"""
-        self.replicaCache.pop(transID, None)
+        self.replicaCache.clear(transID)
 
     def __cleanReplicas(self, transID, lfns):
         """Remove cached replicas that are not in a list"""
-        cachedReplicas = set()
-        for replicas in self.replicaCache.get(transID, {}).values():
-            cachedReplicas.update(replicas)
-        toRemove = cachedReplicas - set(lfns)
+        toRemove = self.replicaCache.getLFNs(transID) - set(lfns)
         if toRemove:
             self._logInfo("Remove %d files from cache" % len(toRemove), method="__cleanReplicas", transID=transID)
             self.__removeFromCache(transID, toRemove)
@@ -606,21 +792,13 @@ class TransformationAgent(AgentModule, TransformationAgentsUtilities):
     def __cleanCache(self, transID):
         """Cleans the cache"""
         try:
-            if transID in self.replicaCache:
-                timeLimit = datetime.datetime.utcnow() - datetime.timedelta(days=self.replicaCacheValidity)
-                for updateTime in set(self.replicaCache[transID]):
-                    nCache = len(self.replicaCache[transID][updateTime])
-                    if updateTime < timeLimit or not nCache:
-                        self._logInfo(
-                            "Clear %s replicas for transformation %s, time %s"
-                            % ("%d cached" % nCache if nCache else "empty cache", str(transID), str(updateTime)),
-                            transID=transID,
-                            method="__cleanCache",
-                        )
-                        del self.replicaCache[transID][updateTime]
-                # Remove empty transformations
-                if not self.replicaCache[transID]:
-                    del self.replicaCache[transID]
+            nCache = self.replicaCache.cleanExpired(transID)
+            if nCache:
+                self._logInfo(
+                    "Clear %d expired cached replicas for transformation %s" % (nCache, str(transID)),
+                    transID=transID,
+                    method="__cleanCache",
+                )
         except Exception as x:
             self._logException("Exception when cleaning replica cache:", lException=x)
 
@@ -628,81 +806,9 @@ class TransformationAgent(AgentModule, TransformationAgentsUtilities):
         removed = self.__removeFromCache(transID, lfns)
         if removed:
             self._logInfo("Removed %d replicas from cache" % removed, method="__removeFilesFromCache", transID=transID)
-            self.__writeCache(transID)
 
     def __removeFromCache(self, transID, lfns):
-        if transID not in self.replicaCache:
-            return
-        removed = 0
-        if self.replicaCache[transID] and lfns:
-            for lfn in lfns:
-                for timeKey in self.replicaCache[transID]:
-                    if self.replicaCache[transID][timeKey].pop(lfn, None):
-                        removed += 1
-        return removed
-
-    def __cacheFile(self, transID):
-        return self.cacheFile.replace(".pkl", "_%s.pkl" % str(transID))
-
-    @gSynchro
-    def __readCache(self, transID):
-        """Reads from the cache"""
-        if transID in self.replicaCache:
-            return
-        try:
-            method = "__readCache"
-            fileName = self.__cacheFile(transID)
-            if not os.path.exists(fileName):
-                self.replicaCache[transID] = {}
-            else:
-                with open(fileName, "rb") as cacheFile:
-                    self.replicaCache[transID] = pickle.load(cacheFile)
-                self._logInfo(
-                    "Successfully loaded replica cache from file %s (%d files)"
-                    % (fileName, self.__filesInCache(transID)),
-                    method=method,
-                    transID=transID,
-                )
-        except Exception as x:
-            self._logException(
-                "Failed to load replica cache from file %s" % fileName, lException=x, method=method, transID=transID
-            )
-            self.replicaCache[transID] = {}
-
-    def __filesInCache(self, transID):
-        cache = self.replicaCache.get(transID, {})
-        return sum(len(lfns) for lfns in cache.values())
-
-    @gSynchro
-    def __writeCache(self, transID=None):
-        """Writes the cache"""
-        method = "__writeCache"
-        try:
-            startTime = time.time()
-            transList = [transID] if transID else set(self.replicaCache)
-            filesInCache = 0
-            nCache = 0
-            for t_id in transList:
-                # Protect the copy of the cache
-                filesInCache += self.__filesInCache(t_id)
-                # write to a temporary file in order to avoid corrupted files
-                cacheFile = self.__cacheFile(t_id)
-                tmpFile = cacheFile + ".tmp"
-                with open(tmpFile, "wb") as fd:
-                    pickle.dump(self.replicaCache.get(t_id, {}), fd)
-                # Now rename the file as it shold
-                os.rename(tmpFile, cacheFile)
-                nCache += 1
-            self._logInfo(
-                "Successfully wrote %d replica cache file(s) (%d files) in %.1f seconds"
-                % (nCache, filesInCache, time.time() - startTime),
-                method=method,
-                transID=transID if transID else None,
-            )
-        except Exception as x:
-            self._logException(
-                "Could not write replica cache file %s" % cacheFile, lException=x, method=method, transID=t_id
-            )
+        return self.replicaCache.removeReplicas(transID, lfns)
 
     def __generatePluginObject(self, plugin, clients):
         """This simply instantiates the TransformationPlugin class with the relevant plugin name"""
@@ -728,11 +834,9 @@ class TransformationAgent(AgentModule, TransformationAgentsUtilities):
         """Standard plugin callback"""
         if invalidateCache:
             try:
-                if transID in self.replicaCache:
+                if self.replicaCache.clear(transID):
                     self._logInfo(
                         "Removed cached replicas for transformation", method="pluginCallBack", transID=transID
                     )
-                    self.replicaCache.pop(transID)
-                    self.__writeCache(transID)
             except Exception:
                 pass
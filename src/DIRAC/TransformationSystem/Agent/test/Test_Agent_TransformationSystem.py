@@ -12,6 +12,7 @@ import datetime
 import pytest
 from mock import MagicMock
 
+from DIRAC import S_OK, S_ERROR
 from DIRAC.TransformationSystem.Client import TransformationFilesStatus
 
 # sut
@@ -250,3 +251,77 @@ def test__getTransformationFiles(mocker, transDict, getTFiles, expected):
     tc_mock.getTransformationFiles.return_value = getTFiles
     res = TransformationAgent()._getTransformationFiles(transDict, {"TransformationClient": tc_mock})
     assert res["OK"] == expected
+
+
+def test_pipeline(mocker, tmp_path):
+    mocker.patch("DIRAC.TransformationSystem.Agent.TransformationAgent.AgentModule", side_effect=mockAM)
+    mocker.patch("DIRAC.TransformationSystem.Agent.TransformationAgent.TransformationClient")
+    mocker.patch("DIRAC.TransformationSystem.Agent.TransformationAgent.gMonitor")
+    agent = TransformationAgent()
+    agent.log = MagicMock()
+    agent.am_getOption = lambda name, defaultValue=None: {
+        "TransformationTypes": ["Replication"],
+        "maxThreadsInPool": 3,
+    }.get(name, defaultValue)
+    agent.am_getWorkDirectory = agent.am_getControlDirectory = lambda: str(tmp_path)
+    assert agent.initialize()["OK"]
+
+    agent.getTransformations = lambda: S_OK([{"TransformationID": transID} for transID in range(1, 11)])
+    agent._getClients = lambda: {}
+    processed = []
+
+    def pluginStage(context):
+        if context["TransID"] == 7:
+            raise RuntimeError("Plugin error")
+        return S_OK(True)
+
+    # Transformations 3, 6 and 9 have no files, 5 has no replicas, the plugin of 7 fails
+    agent._filesStage = lambda context: S_OK(context["TransID"] % 3 != 0)
+    agent._replicasStage = lambda context: S_OK(True) if context["TransID"] != 5 else S_ERROR("No replicas")
+    agent._pluginStage = pluginStage
+    agent._tasksStage = lambda context: processed.append(context["TransID"]) or S_OK(True)
+
+    assert agent.execute()["OK"]
+    assert sorted(processed) == [1, 2, 4, 8, 10]
+    assert dict((stage, stats["Processed"]) for stage, stats in agent.stageStats.items()) == {
+        "Files": 10,
+        "Replicas": 7,
+        "Plugin": 6,
+        "Tasks": 5,
+    }
+    assert all(stats["Queued"] == 0 and stats["MaxQueued"] <= 3 for stats in agent.stageStats.values())
+    # All the transformations left the pipeline
+    assert all(agent.inFlight.acquire(False) for _ in range(3))
+    agent.inFlight = MagicMock()
+    agent.finalize()
+
+
+def test_pipelineFailure(mocker, tmp_path):
+    gMonitor = mocker.patch("DIRAC.TransformationSystem.Agent.TransformationAgent.gMonitor")
+    mocker.patch("DIRAC.TransformationSystem.Agent.TransformationAgent.AgentModule", side_effect=mockAM)
+    mocker.patch("DIRAC.TransformationSystem.Agent.TransformationAgent.TransformationClient")
+    agent = TransformationAgent()
+    agent.log = MagicMock()
+    agent.am_getOption = lambda name, defaultValue=None: {
+        "TransformationTypes": ["Replication"],
+        "maxThreadsInPool": 2,
+    }.get(name, defaultValue)
+    agent.am_getWorkDirectory = agent.am_getControlDirectory = lambda: str(tmp_path)
+    assert agent.initialize()["OK"]
+
+    agent.getTransformations = lambda: S_OK([{"TransformationID": transID} for transID in range(1, 5)])
+    agent._getClients = lambda: {}
+    # Transformations 2 and 4 have no files, the monitoring of the Files stage fails
+    agent._filesStage = lambda context: S_OK(context["TransID"] % 2 != 0)
+
+    def addMark(name, value):
+        if name == "FilesStageWait":
+            raise RuntimeError("Monitoring error")
+
+    gMonitor.addMark.side_effect = addMark
+    # The transformations always leave the pipeline
+    assert agent.execute()["OK"]
+    assert agent.stageStats["Files"]["Processed"] == 4
+    assert all(agent.inFlight.acquire(False) for _ in range(2))
+    agent.inFlight = MagicMock()
+    agent.finalize()
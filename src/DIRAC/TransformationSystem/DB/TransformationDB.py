@@ -763,11 +763,12 @@ class TransformationDB(DB):
             fileIDs.remove(tupleIn[0])
         if not fileIDs:
             return S_OK([])
-        req = "INSERT INTO TransformationFiles (TransformationID,FileID,LastUpdate,InsertedTime) VALUES"
-        for fileID in fileIDs:
-            req = "%s (%d,%d,UTC_TIMESTAMP(),UTC_TIMESTAMP())," % (req, transID, fileID)
-        req = req.rstrip(",")
-        res = self._update(req, connection)
+        res = self.insertFieldsBulk(
+            "TransformationFiles",
+            ["TransformationID", "FileID", "LastUpdate", "InsertedTime"],
+            [(transID, fileID, "UTC_TIMESTAMP()", "UTC_TIMESTAMP()") for fileID in fileIDs],
+            conn=connection,
+        )
         if not res["OK"]:
             return res
         return S_OK(fileIDs)
@@ -0,0 +1,195 @@
+""" Persistent cache of the replicas of the files of the transformations, used by the TransformationAgent
+
+    The replicas are kept in a local SQLite file, one row per transformation and LFN with the time
+    it was obtained from the catalog, so that:
+
+      * only the LFNs being looked up are loaded in memory
+      * adding or removing replicas only writes the corresponding rows
+      * each replica expires on its own, after the validity of the cache
+
+    The cache used to be a pickle file per transformation (see :py:meth:`ReplicaCache.migratePickle`).
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import calendar
+import pickle
+import sqlite3
+import threading
+import time
+
+from DIRAC.Core.Utilities.List import breakListIntoChunks
+
+__RCSID__ = "$Id$"
+
+# Number of LFNs per statement, below the default limit of SQLite on the number of parameters
+CHUNK_SIZE = 500
+
+
+class ReplicaCache(object):
+    """Thread safe replica cache in a SQLite file"""
+
+    def __init__(self, fileName, validity=2):
+        """
+        :param str fileName: path of the SQLite file, created if needed
+        :param float validity: validity of the replicas, in days
+        """
+        self.fileName = fileName
+        self.validity = validity
+        self.__lock = threading.Lock()
+        self.__conn = sqlite3.connect(fileName, timeout=60, isolation_level=None, check_same_thread=False)
+        with self.__lock:
+            # The cache can be rebuilt from the catalog: favour the speed over the durability
+            self.__conn.execute("PRAGMA journal_mode = WAL")
+            self.__conn.execute("PRAGMA synchronous = NORMAL")
+            self.__conn.execute(
+                "CREATE TABLE IF NOT EXISTS Replicas ("
+                "TransformationID INTEGER NOT NULL, LFN TEXT NOT NULL, SEs TEXT NOT NULL, UpdateTime REAL NOT NULL, "
+                "PRIMARY KEY (TransformationID, LFN)) WITHOUT ROWID"
+            )
+
+    def __timeLimit(self):
+        """Update time of the oldest valid replicas"""
+        return time.time() - self.validity * 86400
+
+    def __execute(self, statement, parameters=()):
+        with self.__lock:
+            return self.__conn.execute(statement, parameters).fetchall()
+
+    def __executeMany(self, statements):
+        """Execute a list of (statement, parameters list) in a single transaction
+
+        :return: number of rows changed
+        """
+        with self.__lock:
+            changes = self.__conn.total_changes
+            self.__conn.execute("BEGIN")
+            try:
+                for statement, parametersList in statements:
+                    self.__conn.executemany(statement, parametersList)
+            except Exception:
+                self.__conn.execute("ROLLBACK")
+                raise
+            self.__conn.execute("COMMIT")
+            return self.__conn.total_changes - changes
+
+    def getReplicas(self, transID, lfns):
+        """Get the valid cached replicas of a list of LFNs
+
+        :return: dict {lfn: [SEs]} of the LFNs found in the cache
+        """
+        replicas = {}
+        timeLimit = self.__timeLimit()
+        for chunk in breakListIntoChunks(list(lfns), CHUNK_SIZE):
+            rows = self.__execute(
+                "SELECT LFN, SEs FROM Replicas WHERE TransformationID = ? AND UpdateTime >= ? AND LFN IN (%s)"
+                % ",".join("?" * len(chunk)),
+                [transID, timeLimit] + chunk,
+            )
+            replicas.update((lfn, ses.split(",") if ses else []) for lfn, ses in rows)
+        return replicas
+
+    def getLFNs(self, transID):
+        """Get the LFNs of a transformation in the cache, valid or not
+
+        :return: set of LFNs
+        """
+        return set(row[0] for row in self.__execute("SELECT LFN FROM Replicas WHERE TransformationID = ?", (transID,)))
+
+    def addReplicas(self, transID, replicas, updateTime=None):
+        """Add or refresh the replicas of LFNs
+
+        :param dict replicas: {lfn: [SEs]}
+        :param float updateTime: time the replicas were obtained, by default now
+        """
+        if not replicas:
+            return 0
+        updateTime = time.time() if updateTime is None else updateTime
+        return self.__executeMany(
+            [
+                (
+                    "INSERT OR REPLACE INTO Replicas (TransformationID, LFN, SEs, UpdateTime) VALUES (?, ?, ?, ?)",
+                    [(transID, lfn, ",".join(ses), updateTime) for lfn, ses in replicas.items()],
+                )
+            ]
+        )
+
+    def removeReplicas(self, transID, lfns):
+        """Remove LFNs from the cache
+
+        :return: number of LFNs removed
+        """
+        lfns = list(lfns)
+        if not lfns:
+            return 0
+        return self.__executeMany(
+            [
+                (
+                    "DELETE FROM Replicas WHERE TransformationID = ? AND LFN IN (%s)" % ",".join("?" * len(chunk)),
+                    [[transID] + chunk],
+                )
+                for chunk in breakListIntoChunks(lfns, CHUNK_SIZE)
+            ]
+        )
+
+    def clear(self, transID):
+        """Remove all the replicas of a transformation
+
+        :return: number of LFNs removed
+        """
+        return self.__executeMany([("DELETE FROM Replicas WHERE TransformationID = ?", [(transID,)])])
+
+    def cleanExpired(self, transID=None):
+        """Remove the replicas older than the validity of the cache, for a transformation or all of them
+
+        :return: number of LFNs removed
+        """
+        if transID is None:
+            return self.__executeMany([("DELETE FROM Replicas WHERE UpdateTime < ?", [(self.__timeLimit(),)])])
+        return self.__executeMany(
+            [
+                (
+                    "DELETE FROM Replicas WHERE TransformationID = ? AND UpdateTime < ?",
+                    [(transID, self.__timeLimit())],
+                )
+            ]
+        )
+
+    def countReplicas(self, transID=None):
+        """Number of LFNs in the cache, for a transformation or all of them"""
+        if transID is None:
+            return self.__execute("SELECT COUNT(*) FROM Replicas")[0][0]
+        return self.__execute("SELECT COUNT(*) FROM Replicas WHERE TransformationID = ?", (transID,))[0][0]
+
+    def migratePickle(self, transID, fileName):
+        """Import the replicas of a transformation from a pickle file of the former cache,
+        a dict {updateTime: {lfn: [SEs]}} with naive UTC datetimes as keys.
+        The expired replicas are ignored, the most recent replicas of an LFN are kept.
+
+        :return: number of LFNs imported
+        """
+        with open(fileName, "rb") as cacheFile:
+            cachedReplicaSets = pickle.load(cacheFile)
+        timeLimit = self.__timeLimit()
+        replicas = {}
+        for updateTime in sorted(cachedReplicaSets):
+            epoch = calendar.timegm(updateTime.utctimetuple()) + updateTime.microsecond / 1e6
+            if epoch >= timeLimit:
+                for lfn, ses in cachedReplicaSets[updateTime].items():
+                    replicas[lfn] = (transID, lfn, ",".join(ses), epoch)
+        if not replicas:
+            return 0
+        return self.__executeMany(
+            [
+                (
+                    "INSERT OR REPLACE INTO Replicas (TransformationID, LFN, SEs, UpdateTime) VALUES (?, ?, ?, ?)",
+                    list(replicas.values()),
+                )
+            ]
+        )
+
+    def close(self):
+        """Close the SQLite file"""
+        with self.__lock:
+            self.__conn.close()
@@ -0,0 +1,90 @@
+""" Test of the replica cache of the TransformationAgent
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import datetime
+import pickle
+import time
+
+import pytest
+
+from DIRAC.TransformationSystem.Utilities.ReplicaCache import ReplicaCache
+
+# pylint: disable=redefined-outer-name
+
+
+@pytest.fixture
+def replicaCache(tmp_path):
+    cache = ReplicaCache(str(tmp_path / "ReplicaCache.sqlite"), validity=2)
+    yield cache
+    cache.close()
+
+
+def test_replicas(replicaCache):
+    lfns = ["/lhcb/file%d" % i for i in range(1200)]
+    assert replicaCache.addReplicas(1, dict((lfn, ["SE1", "SE2"]) for lfn in lfns)) == 1200
+    replicaCache.addReplicas(2, {lfns[0]: ["SE3"]})
+
+    replicas = replicaCache.getReplicas(1, lfns + ["/lhcb/unknown"])
+    assert len(replicas) == 1200
+    assert replicas[lfns[0]] == ["SE1", "SE2"]
+    assert replicaCache.getReplicas(2, lfns) == {lfns[0]: ["SE3"]}
+
+    # Refresh a replica
+    replicaCache.addReplicas(1, {lfns[0]: ["SE1"]})
+    assert replicaCache.getReplicas(1, lfns[:1]) == {lfns[0]: ["SE1"]}
+    assert replicaCache.countReplicas(1) == 1200
+
+    assert replicaCache.removeReplicas(1, lfns[:700] + ["/lhcb/unknown"]) == 700
+    assert replicaCache.getLFNs(1) == set(lfns[700:])
+    assert replicaCache.countReplicas() == 501
+
+    assert replicaCache.clear(1) == 500
+    assert replicaCache.getReplicas(1, lfns) == {}
+    assert replicaCache.countReplicas(2) == 1
+
+
+def test_expiry(replicaCache):
+    now = time.time()
+    replicaCache.addReplicas(1, {"/lhcb/old": ["SE1"]}, updateTime=now - 3 * 86400)
+    replicaCache.addReplicas(1, {"/lhcb/new": ["SE1"]}, updateTime=now - 86400)
+    replicaCache.addReplicas(2, {"/lhcb/old": ["SE1"]}, updateTime=now - 3 * 86400)
+
+    # Expired replicas are ignored, even before the cache is cleaned
+    assert replicaCache.getReplicas(1, ["/lhcb/old", "/lhcb/new"]) == {"/lhcb/new": ["SE1"]}
+    assert replicaCache.cleanExpired(1) == 1
+    assert replicaCache.getLFNs(1) == {"/lhcb/new"}
+    assert replicaCache.cleanExpired() == 1
+    assert replicaCache.countReplicas() == 1
+
+
+def test_persistence(tmp_path):
+    fileName = str(tmp_path / "ReplicaCache.sqlite")
+    cache = ReplicaCache(fileName)
+    cache.addReplicas(1, {"/lhcb/file": ["SE1"]})
+    cache.close()
+
+    cache = ReplicaCache(fileName)
+    assert cache.getReplicas(1, ["/lhcb/file"]) == {"/lhcb/file": ["SE1"]}
+    cache.close()
+
+
+def test_migratePickle(replicaCache, tmp_path):
+    now = datetime.datetime.utcnow()
+    cachedReplicaSets = {
+        now - datetime.timedelta(days=3): {"/lhcb/old": ["SE1"]},
+        now - datetime.timedelta(hours=2): {"/lhcb/file1": ["SE1"], "/lhcb/file2": ["SE1"]},
+        now - datetime.timedelta(hours=1): {"/lhcb/file1": ["SE2", "SE3"]},
+    }
+    pklFile = tmp_path / "ReplicaCache_1.pkl"
+    with open(str(pklFile), "wb") as fd:
+        pickle.dump(cachedReplicaSets, fd)
+
+    assert replicaCache.migratePickle(1, str(pklFile)) == 2
+    assert replicaCache.getReplicas(1, ["/lhcb/old", "/lhcb/file1", "/lhcb/file2"]) == {
+        "/lhcb/file1": ["SE2", "SE3"],
+        "/lhcb/file2": ["SE1"],
+    }
+    assert replicaCache.countReplicas() == 2
@@ -19,7 +19,8 @@ If the HeartBeatLoggingInfo table of the JobDB is too large, the information for
 (including for transformation related jobs).
 In vanilla DIRAC the HeartBeatLoggingInfo is only used by the StalledJobAgent. For
 this purpose the options MaxHBJobsAtOnce and RemoveStatusDelayHB/[Done|Killed|Failed] should be set to values larger
-than 0.
+than 0. At the same time, the heart beat samples of these jobs (see the HeartBeatSamples option of the JobDB)
+are reduced to HBSamplesToKeep samples, if larger than 0.
 
 """
 import os
@@ -80,6 +81,7 @@ class JobCleaningAgent(AgentModule):
         self.removeStatusDelayHB[JobStatus.KILLED] = self.am_getOption("RemoveStatusDelayHB/Killed", -1)
         self.removeStatusDelayHB[JobStatus.FAILED] = self.am_getOption("RemoveStatusDelayHB/Failed", -1)
         self.maxHBJobsAtOnce = self.am_getOption("MaxHBJobsAtOnce", 0)
+        self.hbSamplesToKeep = self.am_getOption("HBSamplesToKeep", 0)
 
         return S_OK()
 
@@ -366,4 +368,11 @@ class JobCleaningAgent(AgentModule):
             self.log.error("Failed to delete from HeartBeatLoggingInfo", result["Message"])
         else:
             self.log.info("Deleted HeartBeatLogging info")
+
+        if self.hbSamplesToKeep > 0:
+            result = self.jobDB.downsampleHeartBeatData(status, delTime, self.hbSamplesToKeep, self.maxHBJobsAtOnce)
+            if not result["OK"]:
+                self.log.error("Failed to downsample the heart beat samples", result["Message"])
+            else:
+                self.log.info("Downsampled heart beat samples", "of %d jobs" % result["Value"])
         return
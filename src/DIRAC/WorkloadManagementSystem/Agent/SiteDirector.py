@@ -11,8 +11,10 @@ import os
 import sys
 import random
 import socket
+import threading
+import time
 from collections import defaultdict
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 
 import DIRAC
 from DIRAC import S_OK, gConfig
@@ -41,6 +43,8 @@ from DIRAC.ResourceStatusSystem.Client.ResourceStatus import ResourceStatus
 from DIRAC.ResourceStatusSystem.Client.SiteStatus import SiteStatus
 
 MAX_PILOTS_TO_SUBMIT = 100
+# Number of the slowest queues reported at the end of each cycle
+SLOWEST_QUEUES_REPORTED = 5
 
 
 class SiteDirector(AgentModule):
@@ -67,6 +71,19 @@ class SiteDirector(AgentModule):
         self.failedQueues = defaultdict(int)
         # failedPilotOutput stores the number of times the Site Director failed to get a given pilot output
         self.failedPilotOutput = defaultdict(int)
+        # What happens in the threads of the queues during a cycle, merged at the end of the cycle
+        self.cycleLock = threading.Lock()
+        self.cycleFailedQueues = []
+        self.cycleSubmissions = []
+        # Pilots being submitted for each task queue, not in the PilotAgentsDB yet
+        self.reservedPilots = defaultdict(int)
+        # Pilots put in the PilotAgentsDB during the cycle for each task queue, possibly missed
+        # by the queues counting the waiting pilots meanwhile
+        self.registeredPilots = defaultdict(int)
+        # Futures of the threads of the queues not answering in time in the previous cycles
+        self.hungQueues = {}
+        # Time spent on each queue during the last cycle
+        self.queueTimes = {}
         self.firstPass = True
         self.maxPilotsToSubmit = MAX_PILOTS_TO_SUBMIT
 
@@ -102,6 +119,9 @@ class SiteDirector(AgentModule):
         self.maxQueueLength = 86400 * 3
         # Maximum number of times the Site Director is going to try to get a pilot output before stopping
         self.maxRetryGetPilotOutput = 3
+        # Number of queues treated concurrently, and time after which a queue is not waited for anymore
+        self.submissionThreads = 10
+        self.queueTimeout = 300
 
         self.pilotWaitingFlag = True
         self.pilotLogLevel = "INFO"
@@ -182,6 +202,8 @@ class SiteDirector(AgentModule):
             "AvailableSlotsUpdateCycleFactor", self.availableSlotsUpdateCycleFactor
         )
         self.maxRetryGetPilotOutput = self.am_getOption("MaxRetryGetPilotOutput", self.maxRetryGetPilotOutput)
+        self.submissionThreads = max(1, self.am_getOption("SubmissionThreads", self.submissionThreads))
+        self.queueTimeout = self.am_getOption("QueueTimeout", self.queueTimeout)
 
         # Flags
         self.addPilotsToEmptySites = self.am_getOption("AddPilotsToEmptySites", self.addPilotsToEmptySites)
@@ -331,6 +353,10 @@ class SiteDirector(AgentModule):
     def submitPilots(self):
         """Go through defined computing elements and submit pilots if necessary and possible
 
+        The queues are treated concurrently by SubmissionThreads threads, in two steps:
+        the number of pilots wanted by the matching task queues is first obtained for each queue,
+        then the queues with the largest demand are the first ones to be submitted to.
+
         :return: S_OK/S_ERROR
         """
 
@@ -346,14 +372,15 @@ class SiteDirector(AgentModule):
         self.log.verbose("Queues treated", ",".join(self.queueDict))
 
         self.totalSubmittedPilots = 0
+        self.queueTimes = {}
+        with self.cycleLock:
+            self.registeredPilots.clear()
 
         queueDictItems = list(self.queueDict.items())
         random.shuffle(queueDictItems)
 
+        queueCPUTimes = {}
         for queueName, queueDictionary in queueDictItems:
-            # now submitting to the single queues
-            self.log.verbose("Evaluating queue", queueName)
-
             # are we going to submit pilots to this specific queue?
             if not self._allowedToSubmit(queueName, anySite, jobSites, testSites):
                 continue
@@ -363,92 +390,350 @@ class SiteDirector(AgentModule):
             else:
                 self.log.warn("CPU time limit is not specified, skipping", "queue %s" % queueName)
                 continue
-            if queueCPUTime > self.maxQueueLength:
-                queueCPUTime = self.maxQueueLength
+            queueCPUTimes[queueName] = min(queueCPUTime, self.maxQueueLength)
+
+        # How many pilots the task queues want, for each queue
+        evaluations = self._runPerQueue(self._evaluateQueue, [(queueName, ()) for queueName in queueCPUTimes])
+
+        # The queues with the largest demand go first (sort is stable: equal demands remain shuffled)
+        queuesToSubmit = sorted(
+            (queueName for queueName in evaluations if evaluations[queueName][0]),
+            key=lambda queueName: evaluations[queueName][0],
+            reverse=True,
+        )
+        submissions = self._runPerQueue(
+            self._submitToQueue,
+            [(queueName, (queueCPUTimes[queueName],) + evaluations[queueName]) for queueName in queuesToSubmit],
+        )
+
+        result = S_OK()
+        for queueName, res in submissions.items():
+            if not res["OK"]:
+                result = res
+            else:
+                self.totalSubmittedPilots += res["Value"]
+        self._mergeCycleResults()
+        self._reportQueueTimes()
+
+        # Summary after the cycle over queues
+        self.log.info("Total number of pilots submitted in this cycle", "%d" % self.totalSubmittedPilots)
 
-            ce, ceDict = self._getCE(queueName)
+        return result
 
-            # additionalInfo is normally taskQueueDict
-            pilotsWeMayWantToSubmit, additionalInfo = self._getPilotsWeMayWantToSubmit(ceDict)
-            self.log.debug(
-                "%d pilotsWeMayWantToSubmit are eligible for %s queue" % (pilotsWeMayWantToSubmit, queueName)
+    def _runPerQueue(self, function, queueArgs):
+        """Call function(queue, *args) for each queue, in a pool of SubmissionThreads threads,
+        starting with the first queues of the list
+
+        Threads cannot be interrupted: a queue taking more than QueueTimeout seconds (i.e. a CE not
+        responding) is not waited for and is counted as failed, its thread goes on in the background
+        and the queue is skipped until it is done.
+        If all the threads are taken by such queues, the queues not started yet are left for the next cycle.
+
+        :param function: method called for each queue
+        :param list queueArgs: list of (queue name, tuple of the other arguments)
+
+        :return: dict {queue name: value returned} of the queues done in time
+        """
+        for queue, future in list(self.hungQueues.items()):
+            if future.done():
+                del self.hungQueues[queue]
+        hungQueues = [queue for queue, _ in queueArgs if queue in self.hungQueues]
+        if hungQueues:
+            self.log.warn("Queues still treated since a previous cycle, skipping them", ",".join(hungQueues))
+            queueArgs = [(queue, args) for queue, args in queueArgs if queue not in self.hungQueues]
+        if not queueArgs:
+            return {}
+        startTimes = {}
+
+        def runQueue(queue, args):
+            startTimes[queue] = time.time()
+            try:
+                return function(queue, *args)
+            finally:
+                self.queueTimes[queue] = self.queueTimes.get(queue, 0.0) + time.time() - startTimes[queue]
+
+        maxWorkers = min(self.submissionThreads, len(queueArgs))
+        executor = ThreadPoolExecutor(max_workers=maxWorkers)
+        futures = {}
+        for queue, args in queueArgs:
+            futures[executor.submit(runQueue, queue, args)] = queue
+
+        results = {}
+        pending = set(futures)
+        timedOut = set()
+        while pending:
+            now = time.time()
+            deadlines = [
+                startTimes[futures[future]] + self.queueTimeout for future in pending if futures[future] in startTimes
+            ]
+            done, pending = wait(
+                pending, timeout=max(0.1, min(deadlines) - now) if deadlines else 1, return_when=FIRST_COMPLETED
             )
-            if not pilotsWeMayWantToSubmit:
-                self.log.debug("...so skipping %s" % queueName)
-                continue
+            for future in done:
+                queue = futures[future]
+                try:
+                    results[queue] = future.result()
+                except Exception as e:  # pylint: disable=broad-except
+                    self.log.exception("Exception while treating queue", queue, lException=e)
+                    self._recordQueueFailure(queue)
+
+            now = time.time()
+            for future in list(pending):
+                queue = futures[future]
+                if queue in startTimes and now - startTimes[queue] > self.queueTimeout:
+                    self.log.warn("Queue not answering in time, skipping it", "%s (%ds)" % (queue, self.queueTimeout))
+                    self._recordQueueFailure(queue)
+                    pending.discard(future)
+                    timedOut.add(future)
+                    self.hungQueues[queue] = future
+            if pending and sum(not future.done() for future in timedOut) >= maxWorkers:
+                notStarted = [futures[future] for future in pending if future.cancel()]
+                self.log.warn("All the threads are blocked, queues left for the next cycle", ",".join(notStarted))
+                break
 
-            # Get the number of already waiting pilots for the queue
-            totalWaitingPilots = 0
-            manyWaitingPilotsFlag = False
-            if self.pilotWaitingFlag:
-                tqIDList = list(additionalInfo)
-                result = pilotAgentsDB.countPilots(
-                    {"TaskQueueID": tqIDList, "Status": PilotStatus.PILOT_WAITING_STATES}, None
-                )
-                if not result["OK"]:
-                    self.log.error("Failed to get Number of Waiting pilots", result["Message"])
-                    totalWaitingPilots = 0
-                else:
-                    totalWaitingPilots = result["Value"]
-                    self.log.debug("Waiting Pilots: %s" % totalWaitingPilots)
+        # Do not wait for the queues not answering
+        executor.shutdown(wait=False)
+        return results
+
+    def _evaluateQueue(self, queue):
+        """Get the number of pilots wanted by the task queues matching a queue
+
+        :param str queue: queue name
+
+        :return: tuple (pilotsWeMayWantToSubmit, ce, additionalInfo), additionalInfo being
+                 normally the dict of the matching task queues
+        """
+        self.log.verbose("Evaluating queue", queue)
+
+        ce, ceDict = self._getCE(queue)
+
+        # additionalInfo is normally taskQueueDict
+        pilotsWeMayWantToSubmit, additionalInfo = self._getPilotsWeMayWantToSubmit(ceDict)
+        self.log.debug("%d pilotsWeMayWantToSubmit are eligible for %s queue" % (pilotsWeMayWantToSubmit, queue))
+        if not pilotsWeMayWantToSubmit:
+            self.log.debug("...so skipping %s" % queue)
+        return pilotsWeMayWantToSubmit, ce, additionalInfo
+
+    def _submitToQueue(self, queueName, queueCPUTime, pilotsWeMayWantToSubmit, ce, additionalInfo):
+        """Submit to a queue the pilots needed by the task queues matching it, if there are slots available
+
+        :param str queueName: queue name
+        :param int queueCPUTime: CPU time limit of the queue
+        :param int pilotsWeMayWantToSubmit: number of pilots wanted by the task queues
+        :param ce: computing element object of the queue
+        :param dict additionalInfo: matching task queues
+
+        :return: S_OK(number of pilots submitted)/S_ERROR
+        """
+        # The queues sharing task queues are treated concurrently: the pilots wanted are reserved
+        # for the task queues before being submitted, and counted as waiting by the other queues
+        # until they are in the PilotAgentsDB
+        with self.cycleLock:
+            registeredPilots = {tqID: self.registeredPilots[tqID] for tqID in additionalInfo}
+
+        # Get the number of already waiting pilots for the queue
+        totalWaitingPilots = 0
+        manyWaitingPilotsFlag = False
+        if self.pilotWaitingFlag:
+            tqIDList = list(additionalInfo)
+            result = pilotAgentsDB.countPilots(
+                {"TaskQueueID": tqIDList, "Status": PilotStatus.PILOT_WAITING_STATES}, None
+            )
+            if not result["OK"]:
+                self.log.error("Failed to get Number of Waiting pilots", result["Message"])
+                totalWaitingPilots = 0
+            else:
+                totalWaitingPilots = result["Value"]
+                self.log.debug("Waiting Pilots: %s" % totalWaitingPilots)
+
+        reservation = {}
+        with self.cycleLock:
+            # The pilots being submitted by the other queues, and the ones they registered during the count
+            for tqID in additionalInfo:
+                totalWaitingPilots += self.reservedPilots[tqID]
+                totalWaitingPilots += max(0, self.registeredPilots[tqID] - registeredPilots[tqID])
             if totalWaitingPilots >= pilotsWeMayWantToSubmit:
                 self.log.verbose("Possibly enough pilots already waiting", "(%d)" % totalWaitingPilots)
                 manyWaitingPilotsFlag = True
                 if not self.addPilotsToEmptySites:
-                    continue
+                    return S_OK(0)
+                pilotsToReserve = int(self.maxPilotsToSubmit / 10) + 1
+            else:
+                pilotsToReserve = pilotsWeMayWantToSubmit - totalWaitingPilots
+            self._reservePilots(reservation, additionalInfo, min(self.maxPilotsToSubmit, pilotsToReserve))
 
-            self.log.debug(
-                "%d waiting pilots for the total of %d eligible pilots for %s"
-                % (totalWaitingPilots, pilotsWeMayWantToSubmit, queueName)
+        submittedPilots = 0
+        try:
+            result = self.__submitReservedPilots(
+                queueName,
+                queueCPUTime,
+                pilotsWeMayWantToSubmit,
+                ce,
+                additionalInfo,
+                totalWaitingPilots,
+                manyWaitingPilotsFlag,
+                reservation,
             )
+            if result["OK"]:
+                submittedPilots = result["Value"]
+            return result
+        finally:
+            # The pilots submitted are now in the PilotAgentsDB
+            with self.cycleLock:
+                self._releasePilots(reservation, submittedPilots)
+
+    def __submitReservedPilots(
+        self,
+        queueName,
+        queueCPUTime,
+        pilotsWeMayWantToSubmit,
+        ce,
+        additionalInfo,
+        totalWaitingPilots,
+        manyWaitingPilotsFlag,
+        reservation,
+    ):
+        """Submit the pilots reserved for the task queues matching a queue, if there are slots available
+
+        :return: S_OK(number of pilots submitted)/S_ERROR
+        """
+        self.log.debug(
+            "%d waiting pilots for the total of %d eligible pilots for %s"
+            % (totalWaitingPilots, pilotsWeMayWantToSubmit, queueName)
+        )
 
-            # Get the number of available slots on the target site/queue
-            totalSlots = self.getQueueSlots(queueName, manyWaitingPilotsFlag)
-            if totalSlots <= 0:
-                self.log.debug("%s: No slots available" % queueName)
-                continue
+        # Get the number of available slots on the target site/queue
+        totalSlots = self.getQueueSlots(queueName, manyWaitingPilotsFlag)
+        if totalSlots <= 0:
+            self.log.debug("%s: No slots available" % queueName)
+            return S_OK(0)
 
-            if manyWaitingPilotsFlag:
-                # Throttle submission of extra pilots to empty sites
-                pilotsToSubmit = int(self.maxPilotsToSubmit / 10) + 1
-            else:
-                pilotsToSubmit = max(0, min(totalSlots, pilotsWeMayWantToSubmit - totalWaitingPilots))
-                self.log.info(
-                    "%s: Slots=%d, TQ jobs(pilotsWeMayWantToSubmit)=%d, Pilots: waiting %d, to submit=%d"
-                    % (queueName, totalSlots, pilotsWeMayWantToSubmit, totalWaitingPilots, pilotsToSubmit)
-                )
+        if manyWaitingPilotsFlag:
+            # Throttle submission of extra pilots to empty sites
+            pilotsToSubmit = int(self.maxPilotsToSubmit / 10) + 1
+        else:
+            pilotsToSubmit = max(0, min(totalSlots, pilotsWeMayWantToSubmit - totalWaitingPilots))
+            self.log.info(
+                "%s: Slots=%d, TQ jobs(pilotsWeMayWantToSubmit)=%d, Pilots: waiting %d, to submit=%d"
+                % (queueName, totalSlots, pilotsWeMayWantToSubmit, totalWaitingPilots, pilotsToSubmit)
+            )
 
-            # Limit the number of pilots to submit to MAX_PILOTS_TO_SUBMIT
-            pilotsToSubmit = min(self.maxPilotsToSubmit, pilotsToSubmit)
+        # Limit the number of pilots to submit to MAX_PILOTS_TO_SUBMIT
+        pilotsToSubmit = min(self.maxPilotsToSubmit, pilotsToSubmit)
+        # Free what the other queues can use
+        with self.cycleLock:
+            self._reservePilots(reservation, additionalInfo, pilotsToSubmit)
 
-            # Get the working proxy
-            cpuTime = queueCPUTime + 86400
-            self.log.verbose("Getting pilot proxy", "for %s/%s %d long" % (self.pilotDN, self.pilotGroup, cpuTime))
-            result = gProxyManager.getPilotProxyFromDIRACGroup(self.pilotDN, self.pilotGroup, cpuTime)
-            if not result["OK"]:
-                return result
-            proxy = result["Value"]
-            # Check returned proxy lifetime
-            result = proxy.getRemainingSecs()  # pylint: disable=no-member
-            if not result["OK"]:
-                return result
-            lifetime_secs = result["Value"]
-            ce.setProxy(proxy, lifetime_secs)
+        # Get the working proxy
+        cpuTime = queueCPUTime + 86400
+        self.log.verbose("Getting pilot proxy", "for %s/%s %d long" % (self.pilotDN, self.pilotGroup, cpuTime))
+        result = gProxyManager.getPilotProxyFromDIRACGroup(self.pilotDN, self.pilotGroup, cpuTime)
+        if not result["OK"]:
+            return result
+        proxy = result["Value"]
+        # Check returned proxy lifetime
+        result = proxy.getRemainingSecs()  # pylint: disable=no-member
+        if not result["OK"]:
+            return result
+        lifetime_secs = result["Value"]
+        ce.setProxy(proxy, lifetime_secs)
 
-            # now really submitting
-            res = self._submitPilotsToQueue(pilotsToSubmit, ce, queueName)
-            if not res["OK"]:
-                self.log.info("Failed pilot submission", "Queue: %s" % queueName)
-            else:
-                pilotList, stampDict = res["Value"]
+        # now really submitting
+        res = self._submitPilotsToQueue(pilotsToSubmit, ce, queueName)
+        if not res["OK"]:
+            self.log.info("Failed pilot submission", "Queue: %s" % queueName)
+            return S_OK(0)
+        pilotList, stampDict = res["Value"]
+
+        # updating the pilotAgentsDB... done by default but maybe not strictly necessary
+        self._addPilotTQReference(queueName, additionalInfo, pilotList, stampDict)
+        return S_OK(len(pilotList))
+
+    def _reservePilots(self, reservation, taskQueueDict, numPilots):
+        """Change the number of pilots reserved by a queue for its matching task queues,
+        they go first to the task queues with jobs not covered by reserved pilots.
+        To be called with the cycleLock held.
+
+        :param dict reservation: pilots reserved by the queue per task queue, updated
+        :param dict taskQueueDict: matching task queues
+        :param int numPilots: number of pilots to reserve, 0 to cancel the reservation
+        """
+        for tqID, reserved in reservation.items():
+            self.reservedPilots[tqID] -= reserved
+            if self.reservedPilots[tqID] <= 0:
+                del self.reservedPilots[tqID]
+        reservation.clear()
+        if numPilots <= 0 or not taskQueueDict:
+            return
+        for tqID, tqDict in taskQueueDict.items():
+            reserved = min(numPilots, max(0, tqDict.get("Jobs", 0) - self.reservedPilots[tqID]))
+            if reserved:
+                reservation[tqID] = reserved
+                numPilots -= reserved
+            if not numPilots:
+                break
+        if numPilots:
+            # More pilots than jobs, e.g. for empty sites
+            tqID = next(iter(taskQueueDict))
+            reservation[tqID] = reservation.get(tqID, 0) + numPilots
+        for tqID, reserved in reservation.items():
+            self.reservedPilots[tqID] += reserved
+
+    def _releasePilots(self, reservation, numRegistered):
+        """Cancel the reservation of a queue, once its pilots are in the PilotAgentsDB.
+        To be called with the cycleLock held.
+
+        :param dict reservation: pilots reserved by the queue per task queue, emptied
+        :param int numRegistered: number of pilots put in the PilotAgentsDB
+        """
+        for tqID, reserved in reservation.items():
+            registered = min(reserved, numRegistered)
+            self.registeredPilots[tqID] += registered
+            numRegistered -= registered
+        self._reservePilots(reservation, {}, 0)
+
+    def _recordQueueFailure(self, queue):
+        """Record, from any thread, that a queue failed during this cycle"""
+        with self.cycleLock:
+            self.cycleFailedQueues.append(queue)
+
+    def _recordSubmission(self, queue, numTotal, numSucceeded, status):
+        """Record, from any thread, a pilot submission to be sent to the accounting at the end of the cycle"""
+        if self.sendSubmissionAccounting:
+            with self.cycleLock:
+                self.cycleSubmissions.append((queue, numTotal, numSucceeded, status))
 
-                # updating the pilotAgentsDB... done by default but maybe not strictly necessary
-                self._addPilotTQReference(queueName, additionalInfo, pilotList, stampDict)
+    def _mergeCycleResults(self):
+        """Merge what was recorded by the threads of the queues: the failed queues are paused
+        for a few cycles and the pilot submissions are sent to the accounting.
+        The results of the threads that were not waited for are merged at the next cycle.
+        """
+        with self.cycleLock:
+            failedQueues, self.cycleFailedQueues = self.cycleFailedQueues, []
+            submissions, self.cycleSubmissions = self.cycleSubmissions, []
 
-        # Summary after the cycle over queues
-        self.log.info("Total number of pilots submitted in this cycle", "%d" % self.totalSubmittedPilots)
+        for queue in set(failedQueues):
+            self.failedQueues[queue] += 1
+        for queue, numTotal, numSucceeded, status in submissions:
+            self.sendPilotSubmissionAccounting(
+                self.queueDict[queue]["Site"],
+                self.queueDict[queue]["CEName"],
+                self.queueDict[queue]["QueueName"],
+                numTotal,
+                numSucceeded,
+                status,
+            )
 
-        return S_OK()
+    def _reportQueueTimes(self):
+        """Log the time spent on each queue during the cycle"""
+        for queue, queueTime in self.queueTimes.items():
+            self.log.verbose("Time spent on queue", "%s: %.1fs" % (queue, queueTime))
+        slowestQueues = sorted(self.queueTimes, key=self.queueTimes.get, reverse=True)[:SLOWEST_QUEUES_REPORTED]
+        if slowestQueues:
+            self.log.info(
+                "Slowest queues in this cycle",
+                ", ".join("%s: %.1fs" % (queue, self.queueTimes[queue]) for queue in slowestQueues),
+            )
 
     def _ifAndWhereToSubmit(self):
         """Return a tuple that says if and where to submit pilots:
@@ -706,39 +991,20 @@ class SiteDirector(AgentModule):
 
         if not submitResult["OK"]:
             self.log.error("Failed submission to queue", "Queue %s:\n, %s" % (queue, submitResult["Message"]))
-
-            if self.sendSubmissionAccounting:
-                self.sendPilotSubmissionAccounting(
-                    self.queueDict[queue]["Site"],
-                    self.queueDict[queue]["CEName"],
-                    self.queueDict[queue]["QueueName"],
-                    pilotsToSubmit,
-                    0,
-                    "Failed",
-                )
-
-            self.failedQueues[queue] += 1
+            self._recordSubmission(queue, pilotsToSubmit, 0, "Failed")
+            self._recordQueueFailure(queue)
             return submitResult
 
         # Add pilots to the PilotAgentsDB: assign pilots to TaskQueue proportionally to the task queue priorities
         pilotList = submitResult["Value"]
         self.queueSlots[queue]["AvailableSlots"] -= len(pilotList)
 
-        self.totalSubmittedPilots += len(pilotList)
         self.log.info(
             "Submitted %d pilots to %s@%s"
             % (len(pilotList), self.queueDict[queue]["QueueName"], self.queueDict[queue]["CEName"])
         )
         stampDict = submitResult.get("PilotStampDict", {})
-        if self.sendSubmissionAccounting:
-            self.sendPilotSubmissionAccounting(
-                self.queueDict[queue]["Site"],
-                self.queueDict[queue]["CEName"],
-                self.queueDict[queue]["QueueName"],
-                len(pilotList),
-                len(pilotList),
-                "Succeeded",
-            )
+        self._recordSubmission(queue, len(pilotList), len(pilotList), "Succeeded")
 
         return S_OK((pilotList, stampDict))
 
@@ -839,7 +1105,7 @@ class SiteDirector(AgentModule):
                         self.log.warn(
                             "Failed to check the availability of queue", "%s: \n%s" % (queue, result["Message"])
                         )
-                        self.failedQueues[queue] += 1
+                        self._recordQueueFailure(queue)
                     else:
                         ceInfoDict = result["CEInfoDict"]
                         self.log.info(
@@ -871,7 +1137,7 @@ class SiteDirector(AgentModule):
                             self.log.warn(
                                 "Failed to check PilotAgentsDB", "for queue %s: \n%s" % (queue, result["Message"])
                             )
-                            self.failedQueues[queue] += 1
+                            self._recordQueueFailure(queue)
                         else:
                             for _pilotRef, pilotDict in result["Value"].items():
                                 if pilotDict["Status"] in PilotStatus.PILOT_TRANSIENT_STATES:
@@ -1045,11 +1311,10 @@ class SiteDirector(AgentModule):
         proxy = result["Value"]
 
         # Getting the status of pilots in a queue implies the use of remote CEs and may lead to network latency
-        # Threads aim at overcoming such issues and thus 1 thread per queue is created to
+        # Threads aim at overcoming such issues: the queues are treated concurrently to
         # update the status of pilots in transient states
-        with ThreadPoolExecutor(max_workers=len(self.queueDict)) as executor:
-            for queue in self.queueDict:
-                executor.submit(self._updatePilotStatusPerQueue, queue, proxy)
+        self._runPerQueue(self._updatePilotStatusPerQueue, [(queue, (proxy,)) for queue in self.queueDict])
+        self._mergeCycleResults()
 
         # The pilot can be in Done state set by the job agent check if the output is retrieved
         for queue in self.queueDict:
@@ -1185,7 +1450,7 @@ class SiteDirector(AgentModule):
 
         # If something wrong in the queue, make a pause for the job submission
         if abortedPilots:
-            self.failedQueues[queue] += 1
+            self._recordQueueFailure(queue)
 
     def _updatePilotStatus(self, pilotRefs, pilotDict, pilotCEDict):
         """Really updates the pilots status
@@ -4,6 +4,8 @@
 
 # imports
 import datetime
+import threading
+import time
 import pytest
 from mock import MagicMock
 
@@ -212,3 +214,126 @@ def test__updatePilotStatus(sd, pilotRefs, pilotDict, pilotCEDict, expected):
     """Testing SiteDirector()._updatePilotStatus()"""
     res = sd._updatePilotStatus(pilotRefs, pilotDict, pilotCEDict)
     assert res == expected
+
+
+def test_submitPilots(sd):
+    """Testing SiteDirector().submitPilots(): the queues with the largest demand are submitted to first"""
+    demands = {"q1": 10, "q2": 0, "q3": 30, "q4": 20}
+    sd.queueDict = dict(
+        (queue, {"Site": "Site", "CEName": queue, "QueueName": queue, "ParametersDict": {"CPUTime": 1000}})
+        for queue in demands
+    )
+    sd.submissionThreads = 1
+    sd._ifAndWhereToSubmit = MagicMock(return_value=(True, True, set(), set()))
+    sd._allowedToSubmit = MagicMock(return_value=True)
+    sd._evaluateQueue = MagicMock(side_effect=lambda queue: (demands[queue], MagicMock(), {}))
+    submittedQueues = []
+
+    def submitToQueue(queue, queueCPUTime, pilotsWeMayWantToSubmit, ce, additionalInfo):
+        submittedQueues.append(queue)
+        return {"OK": True, "Value": pilotsWeMayWantToSubmit // 10}
+
+    sd._submitToQueue = submitToQueue
+    assert sd.submitPilots()["OK"]
+    assert submittedQueues == ["q3", "q4", "q1"]
+    assert sd.totalSubmittedPilots == 6
+    assert sorted(sd.queueTimes) == ["q1", "q2", "q3", "q4"]
+
+
+def test__runPerQueue(sd):
+    """Testing SiteDirector()._runPerQueue(): the queues not answering in time are counted as failed"""
+    sd.queueDict = {"fast": {}, "slow": {}, "broken": {}}
+    sd.submissionThreads = 3
+    sd.queueTimeout = 0.5
+
+    answer = threading.Event()
+    treatedQueues = []
+
+    def treatQueue(queue, value):
+        treatedQueues.append(queue)
+        if queue == "slow":
+            answer.wait(10)
+        if queue == "broken":
+            raise RuntimeError("broken queue")
+        return value
+
+    start = time.time()
+    res = sd._runPerQueue(treatQueue, [(queue, (queue.upper(),)) for queue in sd.queueDict])
+    assert time.time() - start < 1.5
+    assert res == {"fast": "FAST"}
+
+    sd._mergeCycleResults()
+    assert dict(sd.failedQueues) == {"slow": 1, "broken": 1}
+
+    # The queue still treated since the previous cycle is skipped
+    treatedQueues[:] = []
+    res = sd._runPerQueue(treatQueue, [(queue, (queue.upper(),)) for queue in ("fast", "slow")])
+    assert res == {"fast": "FAST"}
+    assert treatedQueues == ["fast"]
+
+    answer.set()
+    sd.hungQueues["slow"].result(10)
+    res = sd._runPerQueue(treatQueue, [(queue, (queue.upper(),)) for queue in ("fast", "slow")])
+    assert res == {"fast": "FAST", "slow": "SLOW"}
+    assert not sd.hungQueues
+
+
+def test__submitToQueue_sharedTaskQueues(sd, mocker):
+    """Testing SiteDirector()._submitToQueue(): the pilots being submitted by a queue count for the others"""
+
+    def countPilots(condDict, _older):
+        # The waiting pilots are not counted with the lock held
+        assert not sd.cycleLock.locked()
+        return {"OK": True, "Value": 0}
+
+    countPilotsMock = mocker.patch(
+        "DIRAC.WorkloadManagementSystem.Agent.SiteDirector.pilotAgentsDB.countPilots", side_effect=countPilots
+    )
+    proxy = MagicMock()
+    proxy.getRemainingSecs.return_value = {"OK": True, "Value": 86400}
+    mocker.patch(
+        "DIRAC.WorkloadManagementSystem.Agent.SiteDirector.gProxyManager.getPilotProxyFromDIRACGroup",
+        return_value={"OK": True, "Value": proxy},
+    )
+    sd.pilotWaitingFlag = True
+    sd.addPilotsToEmptySites = False
+    sd.maxPilotsToSubmit = 100
+    sd.getQueueSlots = MagicMock(return_value=100)
+    sd._addPilotTQReference = MagicMock()
+    taskQueueDict = {1: {"Jobs": 10, "Priority": 1}, 2: {"Jobs": 5, "Priority": 1}}
+    submitted = {}
+
+    def submitPilotsToQueue(pilotsToSubmit, ce, queue):
+        submitted[queue] = pilotsToSubmit
+        if queue == "q1":
+            # q2 is treated while the pilots of q1 are not in the PilotAgentsDB yet
+            assert sd.reservedPilots == {1: 10, 2: 2}
+            assert sd._submitToQueue("q2", 1000, 15, MagicMock(), taskQueueDict) == {"OK": True, "Value": 3}
+        return {"OK": True, "Value": (["pilot"] * pilotsToSubmit, {})}
+
+    sd._submitPilotsToQueue = submitPilotsToQueue
+    assert sd._submitToQueue("q1", 1000, 12, MagicMock(), taskQueueDict) == {"OK": True, "Value": 12}
+    assert submitted == {"q1": 12, "q2": 3}
+    assert not sd.reservedPilots
+
+    # All the jobs are covered by the pilots being submitted
+    reservation = {}
+    with sd.cycleLock:
+        sd._reservePilots(reservation, taskQueueDict, 15)
+    assert sd._submitToQueue("q2", 1000, 15, MagicMock(), taskQueueDict) == {"OK": True, "Value": 0}
+    assert submitted == {"q1": 12, "q2": 3}
+    with sd.cycleLock:
+        sd._reservePilots(reservation, taskQueueDict, 0)
+    assert not sd.reservedPilots
+
+    # Pilots registered by another queue while counting the waiting pilots, missed by the count
+    def countPilotsRegistered(condDict, _older):
+        reservation = {}
+        with sd.cycleLock:
+            sd._reservePilots(reservation, taskQueueDict, 4)
+            sd._releasePilots(reservation, 4)
+        return {"OK": True, "Value": 0}
+
+    countPilotsMock.side_effect = countPilotsRegistered
+    assert sd._submitToQueue("q3", 1000, 15, MagicMock(), taskQueueDict) == {"OK": True, "Value": 11}
+    assert submitted["q3"] == 11
@@ -1,7 +1,15 @@
 """ Encapsulate here the logic for limiting the matching of jobs
 
     Utilities and classes here are used by the Matcher
+
+    The counters of the running jobs used to apply the limits are kept in a snapshot shared between
+    all the Limiter instances. It is loaded for all the sites with a single query to the JobDB,
+    refreshed in a background thread every JobScheduling/RunningCountersRefresh seconds,
+    and updated in between for each matched job by updateDelayCounters.
 """
+import threading
+import time
+
 from DIRAC import S_OK, S_ERROR
 from DIRAC import gLogger
 
@@ -19,6 +27,18 @@ class Limiter:
     condCache = DictCache()
     delayMem = {}
 
+    # Running jobs counters of all the sites: { siteName : { attName : { attValue : count } } }
+    runningCounters = {}
+    countersAttributes = set()
+    countersTime = 0
+    countersGeneration = 0
+    countersRefreshing = False
+    # Negative conditions by site: { siteName : { cacheKey : ( timeBucket, generation, negativeCond ) } }
+    siteCondCache = {}
+    siteGenerations = {}
+    countersLock = threading.Lock()
+    refreshLock = threading.Lock()
+
     def __init__(self, jobDB=None, opsHelper=None, pilotRef=None):
         """Constructor"""
         self.__runningLimitSection = "JobScheduling/RunningLimit"
@@ -82,13 +102,29 @@ class Limiter:
         return orCond
 
     def getNegativeCondForSite(self, siteName, gridCE=None):
-        """Generate a negative query based on the limits set on the site"""
+        """Generate a negative query based on the limits set on the site
+
+        The conditions are cached for the current time bucket (of RunningCountersRefresh seconds),
+        as long as the running counters or the delays of the site do not change
+        """
+        checkLimits = self.__opsHelper.getValue("JobScheduling/CheckJobLimits", True)
+        checkDelay = self.__opsHelper.getValue("JobScheduling/CheckMatchingDelay", True)
+        cacheKey = (gridCE, checkLimits, checkDelay)
+        timeBucket = int(time.time() // self.__getCountersRefresh())
+        with self.countersLock:
+            generation = (Limiter.countersGeneration, self.siteGenerations.get(siteName, 0))
+            cached = self.siteCondCache.get(siteName, {}).get(cacheKey)
+        if cached and cached[:2] == (timeBucket, generation):
+            return self.__copyCond(cached[2])
+
         # Check if Limits are imposed onto the site
         negativeCond = {}
-        if self.__opsHelper.getValue("JobScheduling/CheckJobLimits", True):
+        cacheable = True
+        if checkLimits:
             result = self.__getRunningCondition(siteName)
             if not result["OK"]:
                 self.log.error("Issue getting running conditions", result["Message"])
+                cacheable = False
             else:
                 negativeCond = result["Value"]
             self.log.verbose(
@@ -99,11 +135,12 @@ class Limiter:
                 result = self.__getRunningCondition(siteName, gridCE)
                 if not result["OK"]:
                     self.log.error("Issue getting running conditions", result["Message"])
+                    cacheable = False
                 else:
                     negativeCondCE = result["Value"]
                     negativeCond = self.__mergeCond(negativeCond, negativeCondCE)
 
-        if self.__opsHelper.getValue("JobScheduling/CheckMatchingDelay", True):
+        if checkDelay:
             result = self.__getDelayCondition(siteName)
             if result["OK"]:
                 delayCond = result["Value"]
@@ -115,8 +152,20 @@ class Limiter:
         if negativeCond:
             self.log.info("Negative conditions for site", "%s are: %s" % (siteName, str(negativeCond)))
 
+        if cacheable:
+            with self.countersLock:
+                self.siteCondCache.setdefault(siteName, {})[cacheKey] = (
+                    timeBucket,
+                    generation,
+                    self.__copyCond(negativeCond),
+                )
         return negativeCond
 
+    @staticmethod
+    def __copyCond(negCond):
+        """Copy a negative condition dict, the callers may modify it"""
+        return dict((attName, list(attValues)) for attName, attValues in negCond.items())
+
     def __mergeCond(self, negCond, addCond):
         """Merge two negative dicts"""
         # Merge both negative dicts
@@ -159,8 +208,31 @@ class Limiter:
         self.csDictCache.add(section, 300, stuffDict)
         return S_OK(stuffDict)
 
-    def __getRunningCondition(self, siteName, gridCE=None):
-        """Get extra conditions allowing site throttling"""
+    def getRunningHeadroom(self, siteName, gridCE=None):
+        """Number of jobs that can still be matched at a site before reaching its running limits
+
+        :return: dict like { 'JobType' : { 'MCGen' : 12 } }, with the limits of the site and of its CE
+                 which are not reached yet
+        """
+        if not self.__opsHelper.getValue("JobScheduling/CheckJobLimits", True):
+            return {}
+        headroom = {}
+        for ce in [None, gridCE] if gridCE else [None]:
+            result = self.__getRunningHeadroom(siteName, ce)
+            if not result["OK"]:
+                self.log.error("Issue getting running conditions", result["Message"])
+                continue
+            for attName, attHeadroom in result["Value"].items():
+                for attValue, count in attHeadroom.items():
+                    headroom.setdefault(attName, {})
+                    headroom[attName][attValue] = min(count, headroom[attName].get(attValue, count))
+        return {
+            attName: {attValue: count for attValue, count in attHeadroom.items() if count > 0}
+            for attName, attHeadroom in headroom.items()
+        }
+
+    def __getRunningHeadroom(self, siteName, gridCE=None):
+        """Get the number of jobs that can still run for each limited attribute value, 0 or less if reached"""
         if gridCE:
             csSection = "%s/%s/CEs/%s" % (self.__runningLimitSection, siteName, gridCE)
         else:
@@ -172,32 +244,39 @@ class Limiter:
         # limitsDict is something like { 'JobType' : { 'Merge' : 20, 'MCGen' : 1000 } }
         if not limitsDict:
             return S_OK({})
-        # Check if the site exceeding the given limits
-        negCond = {}
+        attNames = []
         for attName in limitsDict:
             if attName not in self.jobDB.jobAttributeNames:
                 self.log.error("Attribute does not exist", "(%s). Check the job limits" % attName)
                 continue
-            cK = "Running:%s:%s" % (siteName, attName)
-            data = self.condCache.get(cK)
-            if not data:
-                result = self.jobDB.getCounters(
-                    "Jobs",
-                    [attName],
-                    {"Site": siteName, "Status": [JobStatus.RUNNING, JobStatus.MATCHED, JobStatus.STALLED]},
-                )
-                if not result["OK"]:
-                    return result
-                data = result["Value"]
-                data = dict([(k[0][attName], k[1]) for k in data])
-                self.condCache.add(cK, 10, data)
-            for attValue in limitsDict[attName]:
-                limit = limitsDict[attName][attValue]
-                running = data.get(attValue, 0)
-                if running >= limit:
+            attNames.append(attName)
+        if not attNames:
+            return S_OK({})
+        result = self.__getRunningCounters(siteName, attNames)
+        if not result["OK"]:
+            return result
+        runningDict = result["Value"]
+        headroom = {}
+        for attName in attNames:
+            data = runningDict[attName]
+            headroom[attName] = {
+                attValue: limit - data.get(attValue, 0) for attValue, limit in limitsDict[attName].items()
+            }
+        return S_OK(headroom)
+
+    def __getRunningCondition(self, siteName, gridCE=None):
+        """Get extra conditions allowing site throttling"""
+        result = self.__getRunningHeadroom(siteName, gridCE)
+        if not result["OK"]:
+            return result
+        # Check if the site exceeding the given limits
+        negCond = {}
+        for attName, attHeadroom in result["Value"].items():
+            for attValue, count in attHeadroom.items():
+                if count <= 0:
                     self.log.verbose(
                         "Job Limit imposed",
-                        "at %s on %s/%s=%d, %d jobs already deployed" % (siteName, attName, attValue, limit, running),
+                        "at %s on %s/%s, %d jobs over the limit" % (siteName, attName, attValue, -count),
                     )
                     if attName not in negCond:
                         negCond[attName] = []
@@ -205,7 +284,82 @@ class Limiter:
         # negCond is something like : {'JobType': ['Merge']}
         return S_OK(negCond)
 
+    def __getCountersRefresh(self):
+        """Seconds after which the running counters are refreshed"""
+        return max(1, self.__opsHelper.getValue("JobScheduling/RunningCountersRefresh", 10))
+
+    def __getRunningCounters(self, siteName, attNames):
+        """Get the counters of the running jobs of a site from the shared snapshot.
+
+        The snapshot is loaded synchronously only the first time an attribute is limited,
+        afterwards it is refreshed in the background when older than RunningCountersRefresh seconds
+
+        :return: S_OK({attName: {attValue: count}})
+        """
+        with self.countersLock:
+            missing = set(attNames) - self.countersAttributes
+            age = time.time() - Limiter.countersTime
+        if missing:
+            result = self.__refreshRunningCounters(missing)
+            if not result["OK"]:
+                return result
+        elif age >= self.__getCountersRefresh():
+            self.__startCountersRefresh()
+        with self.countersLock:
+            siteCounters = Limiter.runningCounters.get(siteName, {})
+            return S_OK(dict((attName, dict(siteCounters.get(attName, {}))) for attName in attNames))
+
+    def __refreshRunningCounters(self, newAttributes=None):
+        """Reload the running jobs counters of all the sites with one query to the JobDB"""
+        with self.refreshLock:
+            with self.countersLock:
+                attNames = sorted(self.countersAttributes | set(newAttributes or []))
+            if not attNames:
+                return S_OK()
+            result = self.jobDB.getCounters(
+                "Jobs",
+                ["Site"] + attNames,
+                {"Status": [JobStatus.RUNNING, JobStatus.MATCHED, JobStatus.STALLED]},
+            )
+            if not result["OK"]:
+                return result
+            counters = {}
+            for attDict, count in result["Value"]:
+                siteCounters = counters.setdefault(attDict["Site"], {})
+                for attName in attNames:
+                    attCounters = siteCounters.setdefault(attName, {})
+                    attCounters[attDict[attName]] = attCounters.get(attDict[attName], 0) + count
+            with self.countersLock:
+                Limiter.runningCounters = counters
+                Limiter.countersTime = time.time()
+                Limiter.countersGeneration += 1
+                self.countersAttributes.update(attNames)
+            return S_OK()
+
+    def __startCountersRefresh(self):
+        """Refresh the running counters in a background thread, unless it is already being done"""
+        with self.countersLock:
+            if Limiter.countersRefreshing:
+                return
+            Limiter.countersRefreshing = True
+        thread = threading.Thread(target=self.__backgroundRefresh, name="LimiterCountersRefresh")
+        thread.daemon = True
+        thread.start()
+
+    def __backgroundRefresh(self):
+        """Body of the refresh thread"""
+        try:
+            result = self.__refreshRunningCounters()
+            if not result["OK"]:
+                self.log.error("Cannot refresh the running jobs counters", result["Message"])
+        finally:
+            with self.countersLock:
+                Limiter.countersRefreshing = False
+
     def updateDelayCounters(self, siteName, jid):
+        """Account for a job matched at a site: add its matching delays and count it as running
+        in the running counters snapshot, until the next refresh
+        """
         # Get the info from the CS
         siteSection = "%s/%s" % (self.__matchingDelaySection, siteName)
         result = self.__extractCSData(siteSection)
@@ -213,26 +367,39 @@ class Limiter:
             return result
         delayDict = result["Value"]
         # limitsDict is something like { 'JobType' : { 'Merge' : 20, 'MCGen' : 1000 } }
-        if not delayDict:
-            return S_OK()
         attNames = []
         for attName in delayDict:
             if attName not in self.jobDB.jobAttributeNames:
                 self.log.error("Attribute does not exist in the JobDB. Please fix it!", "(%s)" % attName)
             else:
                 attNames.append(attName)
-        result = self.jobDB.getJobAttributes(jid, attNames)
+        with self.countersLock:
+            countedNames = list(self.countersAttributes)
+        if not attNames and not countedNames:
+            return S_OK()
+        result = self.jobDB.getJobAttributes(jid, sorted(set(attNames) | set(countedNames)))
         if not result["OK"]:
             self.log.error("Error while retrieving attributes", "coming from %s: %s" % (siteSection, result["Message"]))
             return result
         atts = result["Value"]
+        # Update the running counters
+        with self.countersLock:
+            siteCounters = Limiter.runningCounters.setdefault(siteName, {})
+            for attName in countedNames:
+                if attName in atts:
+                    attCounters = siteCounters.setdefault(attName, {})
+                    attCounters[atts[attName]] = attCounters.get(atts[attName], 0) + 1
+            self.siteGenerations[siteName] = self.siteGenerations.get(siteName, 0) + 1
+        self.condCache.delete("GLOBAL")
+        if not attNames:
+            return S_OK()
         # Create the DictCache if not there
         if siteName not in self.delayMem:
             self.delayMem[siteName] = DictCache()
         # Update the counters
         delayCounter = self.delayMem[siteName]
-        for attName in atts:
-            attValue = atts[attName]
+        for attName in attNames:
+            attValue = atts.get(attName)
             if attValue in delayDict[attName]:
                 delayTime = delayDict[attName][attValue]
                 self.log.notice("Adding delay for %s/%s=%s of %s secs" % (siteName, attName, attValue, delayTime))
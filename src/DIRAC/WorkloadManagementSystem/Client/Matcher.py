@@ -71,21 +71,7 @@ class Matcher:
         startTime = time.time()
 
         resourceDict = self._getResourceDict(resourceDescription, credDict)
-
-        # Make a nice print of the resource matching parameters
-        toPrintDict = dict(resourceDict)
-        if "MaxRAM" in resourceDescription:
-            toPrintDict["MaxRAM"] = resourceDescription["MaxRAM"]
-        if "NumberOfProcessors" in resourceDescription:
-            toPrintDict["NumberOfProcessors"] = resourceDescription["NumberOfProcessors"]
-        toPrintDict["Tag"] = []
-        if "Tag" in resourceDict:
-            for tag in resourceDict["Tag"]:
-                if not tag.endswith("GB") and not tag.endswith("Processors"):
-                    toPrintDict["Tag"].append(tag)
-        if not toPrintDict["Tag"]:
-            toPrintDict.pop("Tag")
-        self.log.info("Resource description for matching", printDict(toPrintDict))
+        self._printResourceDict(resourceDescription, resourceDict)
 
         negativeCond = self.limiter.getNegativeCondForSite(resourceDict["Site"], resourceDict.get("GridCE"))
         result = self.tqDB.matchAndGetJob(resourceDict, negativeCond=negativeCond)
@@ -149,6 +135,127 @@ class Matcher:
 
         return resultDict
 
+    def selectJobs(self, resourceDescription, credDict, maxJobs):
+        """Job selection function to find up to maxJobs jobs matching the resource capacity,
+        for resources that can run several jobs at once (multi-core pilots, HPC allocations...)
+
+        The resource description, the credentials and the negative conditions are processed only once,
+        and the jobs are taken out of the task queues in a single transaction. If fewer jobs than
+        requested can still run before reaching a running limit of the site, they are matched in
+        rounds, the limits reached by the jobs of a round being excluded from the next ones
+
+        :returns: list of dictionaries like the one returned by selectJob (empty if no match)
+        """
+        startTime = time.time()
+
+        resourceDict = self._getResourceDict(resourceDescription, credDict)
+        self._printResourceDict(resourceDescription, resourceDict)
+
+        negativeCond = self.limiter.getNegativeCondForSite(resourceDict["Site"], resourceDict.get("GridCE"))
+        # The jobs are matched in rounds, of at most as many jobs as the running limits still allow
+        headroom = self.limiter.getRunningHeadroom(resourceDict["Site"], resourceDict.get("GridCE"))
+        attNames = ["OwnerDN", "OwnerGroup", "Status"] + sorted(set(headroom) - {"OwnerDN", "OwnerGroup", "Status"})
+        jobsAttributes = {}
+        waitingJobIDs = []
+        matchFound = False
+        while len(waitingJobIDs) < maxJobs:
+            numJobs = maxJobs - len(waitingJobIDs)
+            limits = [count for attHeadroom in headroom.values() for count in attHeadroom.values()]
+            capped = bool(limits) and min(limits) < numJobs
+            if capped:
+                numJobs = min(limits)
+
+            result = self.tqDB.matchAndGetJobs(resourceDict, numJobs, negativeCond=negativeCond)
+            if not result["OK"]:
+                raise RuntimeError(result["Message"])
+            result = result["Value"]
+            if not result["matchFound"]:
+                break
+            matchFound = True
+
+            jobIDs = [jobID for jobID, _tqID in result["jobs"]]
+            resAtt = self.jobDB.getJobsAttributes(jobIDs, attNames)
+            if not resAtt["OK"]:
+                raise RuntimeError("Could not retrieve job attributes")
+            jobsAttributes.update(resAtt["Value"])
+            for jobID in jobIDs:
+                if jobID not in jobsAttributes:
+                    self.log.error("No attributes returned for job", str(jobID))
+                    continue
+                if jobsAttributes[jobID]["Status"] != JobStatus.WAITING:
+                    # As for a single job: make sure it is out of the task queues, and report it
+                    self.log.error("Job matched by the TQ is not in Waiting state", str(jobID))
+                    result = self.tqDB.deleteJob(jobID)
+                    if not result["OK"]:
+                        raise RuntimeError(result["Message"])
+                    continue
+                waitingJobIDs.append(jobID)
+                # Account for the job in the limits, the ones reached exclude the next jobs
+                for attName, attHeadroom in headroom.items():
+                    attValue = jobsAttributes[jobID].get(attName)
+                    if attValue in attHeadroom:
+                        attHeadroom[attValue] -= 1
+                        if attHeadroom[attValue] <= 0:
+                            del attHeadroom[attValue]
+                            if attValue not in negativeCond.setdefault(attName, []):
+                                negativeCond[attName].append(attValue)
+
+            # No limit was hit, or the task queues have no more jobs for the resource
+            if not capped or len(jobIDs) < numJobs:
+                break
+
+        if not matchFound:
+            self.log.info("No match found")
+            return []
+        if not waitingJobIDs:
+            raise RuntimeError("None of the matched jobs is in Waiting state")
+
+        self._reportStatus(resourceDict, waitingJobIDs)
+
+        checkDelay = self.opsHelper.getValue("JobScheduling/CheckMatchingDelay", True)
+        resultList = []
+        for jobID in waitingJobIDs:
+            result = self.jobDB.getJobJDL(jobID)
+            if not result["OK"]:
+                raise RuntimeError("Failed to get the job JDL")
+            resultDict = {"JDL": result["Value"], "JobID": jobID}
+            resOpt = self.jobDB.getJobOptParameters(jobID)
+            if resOpt["OK"]:
+                resultDict.update(resOpt["Value"])
+            resultDict["DN"] = jobsAttributes[jobID]["OwnerDN"]
+            resultDict["Group"] = jobsAttributes[jobID]["OwnerGroup"]
+            resultDict["PilotInfoReportedFlag"] = True
+            resultList.append(resultDict)
+            if checkDelay:
+                self.limiter.updateDelayCounters(resourceDict["Site"], jobID)
+            self._updatePilotJobMapping(resourceDict, jobID)
+
+        pilotInfoReportedFlag = resourceDict.get("PilotInfoReportedFlag", False)
+        if not pilotInfoReportedFlag:
+            self._updatePilotInfo(resourceDict)
+
+        matchTime = time.time() - startTime
+        self.log.verbose("Match time", "[%s] for %s jobs" % (str(matchTime), len(resultList)))
+        gMonitor.addMark("matchTime", matchTime)
+
+        return resultList
+
+    def _printResourceDict(self, resourceDescription, resourceDict):
+        """Make a nice print of the resource matching parameters"""
+        toPrintDict = dict(resourceDict)
+        if "MaxRAM" in resourceDescription:
+            toPrintDict["MaxRAM"] = resourceDescription["MaxRAM"]
+        if "NumberOfProcessors" in resourceDescription:
+            toPrintDict["NumberOfProcessors"] = resourceDescription["NumberOfProcessors"]
+        toPrintDict["Tag"] = []
+        if "Tag" in resourceDict:
+            for tag in resourceDict["Tag"]:
+                if not tag.endswith("GB") and not tag.endswith("Processors"):
+                    toPrintDict["Tag"].append(tag)
+        if not toPrintDict["Tag"]:
+            toPrintDict.pop("Tag")
+        self.log.info("Resource description for matching", printDict(toPrintDict))
+
     def _getResourceDict(self, resourceDescription, credDict):
         """from resourceDescription to resourceDict (just various mods)"""
         resourceDict = self._processResourceDescription(resourceDescription)
@@ -245,9 +352,11 @@ class Matcher:
         return resourceDict
 
     def _reportStatus(self, resourceDict, jobID):
-        """Reports the status of the matched job in jobDB and jobLoggingDB
+        """Reports the status of the matched job(s) in jobDB and jobLoggingDB
 
         Do not fail if errors happen here
+
+        :param jobID: a job ID, or a list of them
         """
         attNames = ["Status", "MinorStatus", "ApplicationStatus", "Site"]
         attValues = ["Matched", "Assigned", "Unknown", resourceDict["Site"]]
@@ -259,13 +368,14 @@ class Matcher:
         else:
             self.log.verbose("Set job attributes for jobID", jobID)
 
-        result = self.jlDB.addLoggingRecord(jobID, status=JobStatus.MATCHED, minorStatus="Assigned", source="Matcher")
-        if not result["OK"]:
-            self.log.error(
-                "Problem reporting job status", "addLoggingRecord, jobID = %s: %s" % (jobID, result["Message"])
-            )
-        else:
-            self.log.verbose("Added logging record for jobID", jobID)
+        for jID in jobID if isinstance(jobID, list) else [jobID]:
+            result = self.jlDB.addLoggingRecord(jID, status=JobStatus.MATCHED, minorStatus="Assigned", source="Matcher")
+            if not result["OK"]:
+                self.log.error(
+                    "Problem reporting job status", "addLoggingRecord, jobID = %s: %s" % (jID, result["Message"])
+                )
+            else:
+                self.log.verbose("Added logging record for jobID", jID)
 
     def _checkMask(self, resourceDict):
         """Check the mask: are we allowed to run normal jobs?
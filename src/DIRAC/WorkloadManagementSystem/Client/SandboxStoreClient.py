@@ -23,6 +23,8 @@ from DIRAC.ConfigurationSystem.Client.Helpers.Registry import getVOForGroup
 class SandboxStoreClient:
 
     __validSandboxTypes = ("Input", "Output")
+    # Number of attempts to resume an interrupted upload
+    __uploadResumeRetries = 3
     __smdb = None
 
     def __init__(self, rpcClient=None, transferClient=None, smdb=False, **kwargs):
@@ -161,7 +163,15 @@ class SandboxStoreClient:
                 bData = fd.read(10240)
 
         transferClient = self.__getTransferClient()
-        result = transferClient.sendFile(tmpFilePath, ["%s.tar.bz2" % oMD5.hexdigest(), assignTo])
+        fileName = "%s.tar.bz2" % oMD5.hexdigest()
+        result = transferClient.sendFile(tmpFilePath, [fileName, assignTo])
+        for _retry in range(self.__uploadResumeRetries):
+            if result["OK"]:
+                break
+            gLogger.warn("Sandbox upload failed", result["Message"])
+            result = self.__resumeUpload(tmpFilePath, fileName, assignTo)
+            if result is None:
+                break
         result["SandboxFileName"] = tmpFilePath
         try:
             if result["OK"]:
@@ -170,6 +180,20 @@ class SandboxStoreClient:
             pass
         return result
 
+    def __resumeUpload(self, filePath, fileName, assignTo):
+        """Resume an interrupted upload from the bytes received by the service
+
+        :return: result of the upload, or None if nothing was kept to resume from
+        """
+        result = self.__getRPCClient().getSandboxUploadOffset(fileName)
+        if not result["OK"] or not result["Value"]:
+            return None
+        offset = result["Value"]
+        gLogger.info("Resuming sandbox upload", "%s from byte %d" % (fileName, offset))
+        with open(filePath, "rb") as fd:
+            fd.seek(offset)
+            return self.__getTransferClient().sendFile(fd.fileno(), [fileName, assignTo, offset])
+
     ##############
     # Download sandbox
 
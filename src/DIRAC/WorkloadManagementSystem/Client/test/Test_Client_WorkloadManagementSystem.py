@@ -10,6 +10,8 @@ from io import BytesIO
 
 from mock import MagicMock
 
+from DIRAC import S_OK
+
 # sut
 from DIRAC.WorkloadManagementSystem.Client.Matcher import Matcher
 from DIRAC.WorkloadManagementSystem.Client.SandboxStoreClient import SandboxStoreClient
@@ -85,6 +87,72 @@ class MatcherTestCase(ClientsTestCase):
 
         self.assertEqual(res, resExpected)
 
+    def test_selectJobs(self):
+
+        resourceDict = {"Setup": "LHCb-Certification", "CPUTime": 1080000, "Site": "DIRAC.Jenkins.ch"}
+        self.matcher._getResourceDict = MagicMock(return_value=resourceDict)
+        self.matcher.limiter = MagicMock()
+        self.matcher.limiter.getNegativeCondForSite.return_value = {}
+        self.matcher.limiter.getRunningHeadroom.return_value = {}
+        self.tqDBMock.matchAndGetJobs.return_value = S_OK(
+            {"matchFound": True, "jobs": [(1, 10), (2, 10), (3, 11)], "tqMatch": resourceDict}
+        )
+        self.jobDBMock.getJobsAttributes.return_value = S_OK(
+            {
+                1: {"OwnerDN": "/my/DN", "OwnerGroup": "prod", "Status": "Waiting"},
+                2: {"OwnerDN": "/my/DN", "OwnerGroup": "prod", "Status": "Killed"},
+                3: {"OwnerDN": "/my/DN", "OwnerGroup": "user", "Status": "Waiting"},
+            }
+        )
+        self.jobDBMock.getJobJDL.return_value = S_OK("[Executable = 'dirac-jobexec';]")
+        self.jobDBMock.getJobOptParameters.return_value = S_OK({})
+
+        res = self.matcher.selectJobs({}, {}, 3)
+        self.tqDBMock.matchAndGetJobs.assert_called_once_with(resourceDict, 3, negativeCond={})
+        self.assertEqual([resultDict["JobID"] for resultDict in res], [1, 3])
+        self.assertEqual(res[1]["Group"], "user")
+        self.jobDBMock.setJobAttributes.assert_called_once()
+        self.assertEqual(self.jlDBMock.addLoggingRecord.call_count, 2)
+        # The killed job is out of the task queues
+        self.tqDBMock.deleteJob.assert_called_once_with(2)
+
+    def test_selectJobs_runningLimit(self):
+
+        resourceDict = {"Setup": "LHCb-Certification", "CPUTime": 1080000, "Site": "DIRAC.Jenkins.ch"}
+        self.matcher._getResourceDict = MagicMock(return_value=resourceDict)
+        self.matcher.limiter = MagicMock()
+        self.matcher.limiter.getNegativeCondForSite.return_value = {"JobType": ["User"]}
+        # A single Merge job can still run at the site
+        self.matcher.limiter.getRunningHeadroom.return_value = {"JobType": {"Merge": 1}}
+        negativeConds = []
+
+        def matchAndGetJobs(_resourceDict, numJobs, negativeCond):
+            negativeConds.append((numJobs, {key: list(value) for key, value in negativeCond.items()}))
+            jobs = [(1, 10)] if len(negativeConds) == 1 else [(2, 11), (3, 11)]
+            return S_OK({"matchFound": True, "jobs": jobs, "tqMatch": resourceDict})
+
+        self.tqDBMock.matchAndGetJobs.side_effect = matchAndGetJobs
+        self.jobDBMock.getJobsAttributes.side_effect = lambda jobIDs, _attNames: S_OK(
+            {
+                jobID: {"OwnerDN": "/my/DN", "OwnerGroup": "prod", "Status": "Waiting", "JobType": "Merge"}
+                for jobID in jobIDs
+            }
+        )
+        self.jobDBMock.getJobJDL.return_value = S_OK("[Executable = 'dirac-jobexec';]")
+        self.jobDBMock.getJobOptParameters.return_value = S_OK({})
+
+        res = self.matcher.selectJobs({}, {}, 3)
+        self.assertEqual([resultDict["JobID"] for resultDict in res], [1, 2, 3])
+        # The first round is capped by the limit, which excludes the Merge jobs from the next one
+        self.assertEqual(negativeConds, [(1, {"JobType": ["User"]}), (2, {"JobType": ["User", "Merge"]})])
+
+    def test_selectJobs_noMatch(self):
+
+        self.matcher._getResourceDict = MagicMock(return_value={"Site": "DIRAC.Jenkins.ch"})
+        self.matcher.limiter = MagicMock()
+        self.tqDBMock.matchAndGetJobs.return_value = S_OK({"matchFound": False, "jobs": [], "tqMatch": {}})
+        self.assertEqual(self.matcher.selectJobs({}, {}, 3), [])
+
 
 #############################################################################
 
@@ -0,0 +1,105 @@
+""" Unit tests for the Limiter and its shared running counters
+"""
+
+# pylint: disable=protected-access,missing-docstring
+
+import time
+
+import pytest
+from mock import MagicMock
+
+from DIRAC import S_OK
+from DIRAC.Core.Utilities.DictCache import DictCache
+from DIRAC.WorkloadManagementSystem.Client.Limiter import Limiter
+
+csData = {
+    "JobScheduling/RunningLimit": {"Site_1": {"JobType": {"MCSimulation": 2, "Merge": 1}}, "Site_2": {}},
+    "JobScheduling/RunningLimit/Site_1": {"JobType": {"MCSimulation": 2, "Merge": 1}},
+    "JobScheduling/MatchingDelay": {"Site_1": {}},
+    "JobScheduling/MatchingDelay/Site_1": {"JobType": {"User": 60}},
+}
+
+runningJobs = [
+    ({"Site": "Site_1", "JobType": "MCSimulation"}, 1),
+    ({"Site": "Site_1", "JobType": "Merge"}, 1),
+    ({"Site": "Site_2", "JobType": "MCSimulation"}, 10),
+]
+
+
+def getSections(section):
+    return S_OK(list(csData.get(section, {})))
+
+
+def getOptionsDict(section):
+    parent, attName = section.rsplit("/", 1)
+    return S_OK(csData[parent][attName])
+
+
+@pytest.fixture
+def limiter():
+    Limiter.csDictCache = DictCache()
+    Limiter.condCache = DictCache()
+    Limiter.delayMem = {}
+    Limiter.runningCounters = {}
+    Limiter.countersAttributes = set()
+    Limiter.countersTime = 0
+    Limiter.countersGeneration = 0
+    Limiter.countersRefreshing = False
+    Limiter.siteCondCache = {}
+    Limiter.siteGenerations = {}
+
+    jobDB = MagicMock()
+    jobDB.jobAttributeNames = ["JobType", "Site", "Status"]
+    jobDB.getCounters.return_value = S_OK(runningJobs)
+    jobDB.getJobAttributes.return_value = S_OK({"JobType": "MCSimulation"})
+    opsHelper = MagicMock()
+    opsHelper.getValue.side_effect = lambda path, default=None: default
+    opsHelper.getSections.side_effect = getSections
+    opsHelper.getOptionsDict.side_effect = getOptionsDict
+    return Limiter(jobDB=jobDB, opsHelper=opsHelper)
+
+
+def test_runningLimits(limiter):
+    assert limiter.getNegativeCondForSite("Site_1") == {"JobType": ["Merge"]}
+    assert limiter.getNegativeCondForSite("Site_2") == {}
+    # One query for all the sites
+    limiter.jobDB.getCounters.assert_called_once()
+    assert limiter.jobDB.getCounters.call_args[0][1] == ["Site", "JobType"]
+    # Cached conditions are copies
+    limiter.getNegativeCondForSite("Site_1")["JobType"].append("User")
+    assert limiter.getNegativeCondForSite("Site_1") == {"JobType": ["Merge"]}
+    limiter.jobDB.getCounters.assert_called_once()
+
+
+def test_runningHeadroom(limiter):
+    # The Merge limit is reached
+    assert limiter.getRunningHeadroom("Site_1") == {"JobType": {"MCSimulation": 1}}
+    assert limiter.getRunningHeadroom("Site_2") == {}
+
+
+def test_updateDelayCounters(limiter):
+    assert limiter.getNegativeCondForSite("Site_1") == {"JobType": ["Merge"]}
+    # A second MCSimulation job is now running at Site_1
+    assert limiter.updateDelayCounters("Site_1", 1)["OK"]
+    assert limiter.getNegativeCondForSite("Site_1") == {"JobType": ["MCSimulation", "Merge"]}
+    limiter.jobDB.getCounters.assert_called_once()
+
+    limiter.jobDB.getJobAttributes.return_value = S_OK({"JobType": "User"})
+    assert limiter.updateDelayCounters("Site_1", 2)["OK"]
+    assert limiter.getNegativeCondForSite("Site_1") == {"JobType": ["MCSimulation", "Merge", "User"]}
+    assert Limiter.runningCounters["Site_1"]["JobType"] == {"MCSimulation": 2, "Merge": 1, "User": 1}
+
+
+def test_backgroundRefresh(limiter):
+    limiter.getNegativeCondForSite("Site_1")
+    # The snapshot is now too old: it is refreshed in the background
+    Limiter.countersTime = 0
+    Limiter.siteCondCache = {}
+    limiter.jobDB.getCounters.return_value = S_OK([({"Site": "Site_1", "JobType": "Merge"}, 0)])
+    limiter.getNegativeCondForSite("Site_1")
+    for _ in range(100):
+        if limiter.jobDB.getCounters.call_count == 2 and not Limiter.countersRefreshing:
+            break
+        time.sleep(0.01)
+    assert limiter.jobDB.getCounters.call_count == 2
+    assert limiter.getNegativeCondForSite("Site_1") == {}
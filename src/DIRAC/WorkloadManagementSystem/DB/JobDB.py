@@ -9,9 +9,15 @@ The following options can be set in ``Systems/WorkloadManagement/<Setup>/Databas
 
 * *MaxRescheduling*:     Set the maximum number of times a job can be rescheduled, default *3*.
 * *CompressJDLs*:        Enable compression of JDLs when they are stored in the database, default *False*.
+* *HeartBeatSamples*:    Number of heart beat samples kept per job in a ring buffer of the HeartBeatSamples table,
+                         instead of one row per value in HeartBeatLoggingInfo, default *0* (no ring buffer),
+                         at most 524287.
 
 """
 import base64
+import datetime
+import math
+import struct
 import zlib
 
 import operator
@@ -54,6 +60,91 @@ def extractJDL(compressedJDL):
     return zlib.decompress(base64.b64decode(compressedJDL)).decode()
 
 
+# Values of the heart beats kept in the samples, the other ones go to HeartBeatLoggingInfo
+HEARTBEAT_SAMPLE_FIELDS = (
+    "LoadAverage",
+    "MemoryUsed",
+    "Vsize",
+    "RSS",
+    "AvailableDiskSpace",
+    "CPUConsumed",
+    "WallClockTime",
+)
+# Cumulative values, of which the last one is kept when the samples are merged
+HEARTBEAT_CUMULATIVE_FIELDS = ("CPUConsumed", "WallClockTime")
+# A sample: epoch of the heart beat, and the values as float, NaN if not sent
+HEARTBEAT_SAMPLE_FORMAT = "<I%df" % len(HEARTBEAT_SAMPLE_FIELDS)
+HEARTBEAT_SAMPLE_SIZE = struct.calcsize(HEARTBEAT_SAMPLE_FORMAT)
+# Number of samples fitting in the MEDIUMBLOB ring buffer of a job
+HEARTBEAT_MAX_SAMPLES = (2 ** 24 - 1) // HEARTBEAT_SAMPLE_SIZE
+
+
+def packHeartBeatSample(beatTime, dynamicDataDict):
+    """Pack the values of a heart beat in a sample
+
+    :param datetime beatTime: UTC time of the heart beat
+    :param dict dynamicDataDict: values of the heart beat
+
+    :return: tuple (sample as bytes, dictionary of the values which are not in the sample)
+    """
+    others = {}
+    values = dict.fromkeys(HEARTBEAT_SAMPLE_FIELDS, math.nan)
+    for key, value in dynamicDataDict.items():
+        try:
+            if key not in values:
+                raise ValueError()
+            values[key] = float(value)
+        except (TypeError, ValueError):
+            others[key] = value
+    epoch = int((beatTime - datetime.datetime(1970, 1, 1)).total_seconds())
+    return struct.pack(HEARTBEAT_SAMPLE_FORMAT, epoch, *(values[key] for key in HEARTBEAT_SAMPLE_FIELDS)), others
+
+
+def unpackHeartBeatSamples(samples):
+    """Unpack the heart beat samples of a job
+
+    :param bytes samples: packed samples
+
+    :return: list of tuples (datetime, dictionary of the values)
+    """
+    result = []
+    for sample in struct.iter_unpack(HEARTBEAT_SAMPLE_FORMAT, bytes(samples)):
+        values = {key: value for key, value in zip(HEARTBEAT_SAMPLE_FIELDS, sample[1:]) if not math.isnan(value)}
+        result.append((datetime.datetime.utcfromtimestamp(sample[0]), values))
+    return result
+
+
+def downsampleHeartBeatSamples(samples, maxSamples):
+    """Merge consecutive heart beat samples, to keep at most maxSamples of them.
+    The merged sample has the time and cumulative values of the last one, and the mean of the other values.
+
+    :param bytes samples: packed samples
+    :param int maxSamples: maximum number of samples to keep
+
+    :return: packed samples
+    """
+    unpacked = list(struct.iter_unpack(HEARTBEAT_SAMPLE_FORMAT, bytes(samples)))
+    if len(unpacked) <= maxSamples:
+        return bytes(samples)
+    groupSize = int(math.ceil(len(unpacked) / maxSamples))
+    cumulative = [key in HEARTBEAT_CUMULATIVE_FIELDS for key in HEARTBEAT_SAMPLE_FIELDS]
+    result = b""
+    # The last samples are kept in full groups
+    for end in range(len(unpacked), 0, -groupSize):
+        group = unpacked[max(0, end - groupSize) : end]
+        merged = [group[-1][0]]
+        for index, isCumulative in enumerate(cumulative, 1):
+            values = [sample[index] for sample in group if not math.isnan(sample[index])]
+            if not values:
+                merged.append(math.nan)
+            elif isCumulative:
+                merged.append(values[-1])
+            else:
+                merged.append(sum(values) / len(values))
+        result = struct.pack(HEARTBEAT_SAMPLE_FORMAT, *merged) + result
+    return result
+
+
 #############################################################################
 
 
@@ -68,6 +159,7 @@ class JobDB(DB):
         # data member to check if __init__ went through without error
         self.__initialized = False
         self.maxRescheduling = self.getCSOption("MaxRescheduling", 3)
+        self.heartBeatSamples = self.getCSOption("HeartBeatSamples", 0)
 
         # loading the function that will be used to determine the platform (it can be VO specific)
         res = ObjectLoader().loadObject("ConfigurationSystem.Client.Helpers.Resources", "getDIRACPlatform")
@@ -87,6 +179,12 @@ class JobDB(DB):
 
         self.jdl2DBParameters = ["JobName", "JobType", "JobGroup"]
 
+        if self.heartBeatSamples > 0:
+            result = self.__initializeHeartBeatSamples()
+            if not result["OK"]:
+                self.log.error("JobDB: heart beat samples disabled", result["Message"])
+                self.heartBeatSamples = 0
+
         self.log.info("MaxReschedule", self.maxRescheduling)
         self.log.info("==================================================")
         self.__initialized = True
@@ -95,6 +193,32 @@ class JobDB(DB):
         """Check if correctly initialised"""
         return self.__initialized
 
+    def __initializeHeartBeatSamples(self):
+        """Create the HeartBeatSamples table, missing in the databases created before it"""
+        if self.heartBeatSamples > HEARTBEAT_MAX_SAMPLES:
+            self.log.warn("HeartBeatSamples is too large", "using %d" % HEARTBEAT_MAX_SAMPLES)
+            self.heartBeatSamples = HEARTBEAT_MAX_SAMPLES
+
+        result = self._query("show tables")
+        if not result["OK"]:
+            return result
+        if "HeartBeatSamples" in [t[0] for t in result["Value"]]:
+            return S_OK()
+
+        # No foreign key: the samples of the deleted jobs are removed with their other data
+        return self._createTables(
+            {
+                "HeartBeatSamples": {
+                    "Fields": {
+                        "JobID": "INT(11) UNSIGNED NOT NULL",
+                        "Samples": "MEDIUMBLOB NOT NULL",
+                        "LastHeartBeatTime": "DATETIME NOT NULL",
+                    },
+                    "PrimaryKey": "JobID",
+                }
+            }
+        )
+
     def __getAttributeNames(self):
         """get Name of Job Attributes defined in DB
         set self.jobAttributeNames to the list of Names
@@ -787,6 +911,32 @@ class JobDB(DB):
         cmd = "REPLACE JobParameters (JobID,Name,Value) VALUES %s" % ", ".join(insertValueList)
         return self._update(cmd)
 
+    #############################################################################
+    def setJobParametersBulk(self, jobsParameters):
+        """Set parameters of several jobs in one statement
+
+        :param dict jobsParameters: list of tuples (name, value) pairs, per JobID
+
+        :return: S_OK/S_ERROR
+        """
+        insertValueList = []
+        for jobID, parameters in jobsParameters.items():
+            for name, value in parameters:
+                ret = self._escapeString(name)
+                if not ret["OK"]:
+                    return ret
+                e_name = ret["Value"]
+                ret = self._escapeString(value)
+                if not ret["OK"]:
+                    return ret
+                e_value = ret["Value"]
+                insertValueList.append("(%d,%s,%s)" % (int(jobID), e_name, e_value))
+
+        if not insertValueList:
+            return S_OK()
+        cmd = "REPLACE JobParameters (JobID,Name,Value) VALUES %s" % ", ".join(insertValueList)
+        return self._update(cmd)
+
     #############################################################################
     def setJobOptParameter(self, jobID, name, value):
         """Set an optimzer parameter specified by name,value pair for the job JobID"""
@@ -1255,17 +1405,14 @@ class JobDB(DB):
         else:
             jobIDList = jobIDs
 
+        tables = ["InputData", "JobParameters", "AtticJobParameters", "HeartBeatLoggingInfo"]
+        # The table may not exist if the samples are not enabled
+        if self.heartBeatSamples:
+            tables.append("HeartBeatSamples")
+        tables += ["OptimizerParameters", "JobCommands", "Jobs", "JobJDLs"]
+
         failedTablesList = []
-        for table in [
-            "InputData",
-            "JobParameters",
-            "AtticJobParameters",
-            "HeartBeatLoggingInfo",
-            "OptimizerParameters",
-            "JobCommands",
-            "Jobs",
-            "JobJDLs",
-        ]:
+        for table in tables:
 
             cmd = "DELETE FROM %s WHERE JobID in (%s)" % (table, ",".join(str(j) for j in jobIDList))
             result = self._update(cmd)
@@ -1930,40 +2077,127 @@ class JobDB(DB):
         if not result["OK"]:
             return S_ERROR("Failed to set the heart beat time: " + result["Message"])
 
-        ok = True
+        if self.heartBeatSamples:
+            # The samples of a deleted job would be left in HeartBeatSamples, which has no foreign key
+            result = self._query("SELECT JobID FROM Jobs WHERE JobID=%s" % e_jobID)
+            if not result["OK"]:
+                return result
+            if not result["Value"]:
+                return S_ERROR("Job %s not found" % jobID)
+
         # Add dynamic data to the job heart beat log
-        # start = time.time()
+        result = self.__storeHeartBeatData({int(jobID): [(Time.dateTime(), dynamicDataDict)]})
+        if not result["OK"]:
+            self.log.warn(result["Message"])
+            return S_ERROR("Failed to store some or all the parameters")
+        return S_OK()
+
+    #####################################################################################
+    def setHeartBeatDataBulk(self, heartBeats):
+        """Add the heart beat data of several jobs to the database,
+        with one statement per table whatever the number of jobs and heart beats.
+
+        Only the heart beat time is set: the status of the jobs is left to the caller,
+        as a job may have reached a final status since its heart beats were sent.
+
+        :param dict heartBeats: list of (datetime, dynamic data dictionary) of the heart beats, per integer JobID
+
+        :return: S_OK(dict) with the status of the existing jobs, whose data was stored, per JobID /S_ERROR
+        """
+        if not heartBeats:
+            return S_OK({})
+
+        # The heart beats of the deleted jobs are ignored
+        result = self._query(
+            "SELECT JobID, Status FROM Jobs WHERE JobID IN (%s)" % ",".join(str(int(jobID)) for jobID in heartBeats)
+        )
+        if not result["OK"]:
+            return result
+        jobStatus = dict(result["Value"])
+        if not jobStatus:
+            return S_OK({})
+        jobIDs = sorted(jobStatus)
+
+        lastTimes = []
+        for jobID in jobIDs:
+            lastTime = max(beatTime for beatTime, _ in heartBeats[jobID])
+            lastTimes.append("WHEN %d THEN '%s'" % (jobID, lastTime.strftime("%Y-%m-%d %H:%M:%S")))
+        req = "UPDATE Jobs SET HeartBeatTime=CASE JobID %s END WHERE JobID IN (%s)" % (
+            " ".join(lastTimes),
+            ",".join(str(jobID) for jobID in jobIDs),
+        )
+        result = self._update(req)
+        if not result["OK"]:
+            return S_ERROR("Failed to set the heart beat time: " + result["Message"])
+
+        result = self.__storeHeartBeatData({jobID: heartBeats[jobID] for jobID in jobIDs})
+        if not result["OK"]:
+            return result
+
+        return S_OK(jobStatus)
+
+    def __storeHeartBeatData(self, heartBeats):
+        """Store the dynamic data of the heart beats: in the ring buffers of HeartBeatSamples if enabled,
+        with one UPSERT whatever the number of jobs, and in HeartBeatLoggingInfo for the values
+        which are not kept in the samples
+
+        :param dict heartBeats: list of (datetime, dynamic data dictionary) of the heart beats, per integer JobID
+
+        :return: S_OK/S_ERROR
+        """
+        sampleList = []
         valueList = []
-        for key, value in dynamicDataDict.items():
-            result = self._escapeString(key)
-            if not result["OK"]:
-                self.log.warn("Failed to escape string ", key)
-                continue
-            e_key = result["Value"]
-            result = self._escapeString(value)
+        for jobID, beats in heartBeats.items():
+            samples = b""
+            for beatTime, dynamicDataDict in beats:
+                if self.heartBeatSamples:
+                    sample, dynamicDataDict = packHeartBeatSample(beatTime, dynamicDataDict)
+                    samples += sample
+                for key, value in dynamicDataDict.items():
+                    result = self._escapeString(key)
+                    if not result["OK"]:
+                        self.log.warn("Failed to escape string ", key)
+                        continue
+                    e_key = result["Value"]
+                    result = self._escapeString(value)
+                    if not result["OK"]:
+                        self.log.warn("Failed to escape string ", value)
+                        continue
+                    e_value = result["Value"]
+                    valueList.append(
+                        "(%d,%s,%s,'%s')" % (jobID, e_key, e_value, beatTime.strftime("%Y-%m-%d %H:%M:%S"))
+                    )
+            if samples:
+                sampleList.append("(%d,X'%s',UTC_TIMESTAMP())" % (jobID, samples.hex()))
+
+        if sampleList:
+            # Appending to the buffer and keeping its end is the ring buffer
+            req = (
+                "INSERT INTO HeartBeatSamples (JobID,Samples,LastHeartBeatTime) VALUES %s "
+                "ON DUPLICATE KEY UPDATE Samples=RIGHT(CONCAT(Samples,VALUES(Samples)),%d), "
+                "LastHeartBeatTime=VALUES(LastHeartBeatTime)"
+                % (",".join(sampleList), self.heartBeatSamples * HEARTBEAT_SAMPLE_SIZE)
+            )
+            result = self._update(req)
             if not result["OK"]:
-                self.log.warn("Failed to escape string ", value)
-                continue
-            e_value = result["Value"]
-            valueList.append("( %s, %s,%s,UTC_TIMESTAMP())" % (e_jobID, e_key, e_value))
+                return S_ERROR("Failed to store the heart beat samples: " + result["Message"])
 
         if valueList:
-
-            valueString = ",".join(valueList)
-            req = "INSERT INTO HeartBeatLoggingInfo (JobID,Name,Value,HeartBeatTime) VALUES "
-            req += valueString
+            # Two heart beats of a job in the same second have the same key: the last value is kept
+            req = "INSERT INTO HeartBeatLoggingInfo (JobID,Name,Value,HeartBeatTime) VALUES %s" % ",".join(valueList)
+            req += " ON DUPLICATE KEY UPDATE Value=VALUES(Value)"
             result = self._update(req)
             if not result["OK"]:
-                ok = False
-                self.log.warn(result["Message"])
+                return S_ERROR("Failed to store the heart beat data: " + result["Message"])
 
-        if ok:
-            return S_OK()
-        return S_ERROR("Failed to store some or all the parameters")
+        return S_OK()
 
     #####################################################################################
     def getHeartBeatData(self, jobID):
-        """Retrieve the job's heart beat data"""
+        """Retrieve the job's heart beat data, from the samples and the logging info
+
+        :return: S_OK(list) of tuples (name, value, time)
+        """
         ret = self._escapeString(jobID)
         if not ret["OK"]:
             return ret
@@ -1974,9 +2208,6 @@ class JobDB(DB):
         if not res["OK"]:
             return res
 
-        if not res["Value"]:
-            return S_OK([])
-
         result = []
         values = res["Value"]
         for row in values:
@@ -1985,8 +2216,60 @@ class JobDB(DB):
                 value = value.decode()
             result.append((str(name), "%.01f" % (float(value.replace('"', ""))), str(heartbeattime)))
 
+        if not self.heartBeatSamples:
+            return S_OK(result)
+        res = self._query("SELECT Samples FROM HeartBeatSamples WHERE JobID=%s" % jobID)
+        if not res["OK"]:
+            return res
+        for (samples,) in res["Value"]:
+            for beatTime, sampleDict in unpackHeartBeatSamples(samples):
+                for name, value in sampleDict.items():
+                    result.append((name, "%.01f" % value, str(beatTime)))
+
         return S_OK(result)
 
+    #####################################################################################
+    def downsampleHeartBeatData(self, status, delTime, maxSamples, maxJobs):
+        """Reduce the number of heart beat samples of the jobs in a given status,
+        not updated since a given time: consecutive samples are merged into one
+
+        :param str status: status of the jobs
+        :param str delTime: timestamp of the age of the jobs
+        :param int maxSamples: number of samples to keep
+        :param int maxJobs: maximum number of jobs to downsample
+
+        :returns: S_OK(int) number of downsampled jobs /S_ERROR
+        """
+        if not self.heartBeatSamples:
+            return S_OK(0)
+
+        ret = self._escapeString(status)
+        if not ret["OK"]:
+            return ret
+        status = ret["Value"]
+
+        ret = self._escapeString(delTime)
+        if not ret["OK"]:
+            return ret
+        delTime = ret["Value"]
+
+        cmd = (
+            "SELECT h.JobID, h.Samples FROM HeartBeatSamples AS h JOIN Jobs AS j ON j.JobID=h.JobID "
+            "WHERE j.Status=%s AND j.LastUpdateTime<%s AND LENGTH(h.Samples)>%d LIMIT %d"
+            % (status, delTime, maxSamples * HEARTBEAT_SAMPLE_SIZE, maxJobs)
+        )
+        result = self._query(cmd)
+        if not result["OK"]:
+            return result
+
+        rows = result["Value"]
+        for jobID, samples in rows:
+            samples = downsampleHeartBeatSamples(samples, maxSamples)
+            result = self._update("UPDATE HeartBeatSamples SET Samples=X'%s' WHERE JobID=%d" % (samples.hex(), jobID))
+            if not result["OK"]:
+                return result
+        return S_OK(len(rows))
+
     #####################################################################################
     def setJobCommand(self, jobID, command, arguments=None):
         """Store a command to be passed to the job together with the
@@ -2042,6 +2325,24 @@ class JobDB(DB):
 
         return S_OK(resultDict)
 
+    #####################################################################################
+    def getJobIDsWithCommand(self, status=JobStatus.RECEIVED):
+        """Get the JobIDs of the jobs having commands to be passed with the next heart beat
+
+        :param str status: status of the commands
+
+        :return: S_OK(set)/S_ERROR
+        """
+        ret = self._escapeString(status)
+        if not ret["OK"]:
+            return ret
+        status = ret["Value"]
+
+        result = self._query("SELECT DISTINCT JobID FROM JobCommands WHERE Status=%s" % status)
+        if not result["OK"]:
+            return result
+        return S_OK(set(row[0] for row in result["Value"]))
+
     #####################################################################################
     def setJobCommandStatus(self, jobID, command, status):
         """Set the command status"""
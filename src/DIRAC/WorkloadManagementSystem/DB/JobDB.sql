@@ -155,6 +155,15 @@ CREATE TABLE `HeartBeatLoggingInfo` (
   FOREIGN KEY (`JobID`) REFERENCES `Jobs`(`JobID`)
 ) ENGINE=InnoDB DEFAULT CHARSET=latin1;
 
+-- ------------------------------------------------------------------------------
+DROP TABLE IF EXISTS `HeartBeatSamples`;
+CREATE TABLE `HeartBeatSamples` (
+  `JobID` INT(11) UNSIGNED NOT NULL,
+  `Samples` MEDIUMBLOB NOT NULL,
+  `LastHeartBeatTime` DATETIME NOT NULL,
+  PRIMARY KEY (`JobID`)
+) ENGINE=InnoDB DEFAULT CHARSET=latin1;
+
 -- ------------------------------------------------------------------------------
 DROP TABLE IF EXISTS `JobCommands`;
 CREATE TABLE `JobCommands` (
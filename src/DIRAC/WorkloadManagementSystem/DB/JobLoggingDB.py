@@ -52,9 +52,58 @@ class JobLoggingDB(DB):
         if application:
             applicationStatus = application
 
-        event = "status/minor/app=%s/%s/%s" % (status, minorStatus, applicationStatus)
-        self.log.info("Adding record for job ", str(jobID) + ": '" + event + "' from " + source)
+        return self.addLoggingRecords(
+            [
+                {
+                    "JobID": jobID,
+                    "Status": status,
+                    "MinorStatus": minorStatus,
+                    "ApplicationStatus": applicationStatus,
+                    "Date": date,
+                    "Source": source,
+                }
+            ]
+        )
+
+    #############################################################################
+    def addLoggingRecords(self, records):
+        """Add several entries to the JobLoggingDB table, in one statement.
+
+        :param list records: dictionaries with the JobID, Status, MinorStatus, ApplicationStatus,
+                             Date and Source of the entries, as for :py:meth:`addLoggingRecord`
+        """
+        if not records:
+            return S_OK()
+
+        values = []
+        for record in records:
+            jobID = record["JobID"]
+            status = record.get("Status", "idem")
+            minorStatus = record.get("MinorStatus", "idem")
+            applicationStatus = record.get("ApplicationStatus", "idem")
+            source = record.get("Source", "Unknown")
+            event = "status/minor/app=%s/%s/%s" % (status, minorStatus, applicationStatus)
+            self.log.info("Adding record for job ", str(jobID) + ": '" + event + "' from " + source)
+            _date, epoc = self.__getRecordTime(record.get("Date"))
+            values.append(
+                "(%d,'%s','%s','%s','%s',%f,'%s')"
+                % (int(jobID), status, minorStatus, applicationStatus[:255], str(_date), epoc, source[:32])
+            )
+
+        cmd = (
+            "INSERT INTO LoggingInfo (JobId, Status, MinorStatus, ApplicationStatus, "
+            + "StatusTime, StatusTimeOrder, StatusSource) VALUES %s" % ",".join(values)
+        )
 
+        return self._update(cmd)
+
+    def __getRecordTime(self, date):
+        """Get the datetime and the ordering number of the time stamp of a record
+
+        :param date: time stamp, as string or datetime, or None for the current time
+
+        :return: tuple (datetime, float)
+        """
         try:
             if not date:
                 # Make the UTC datetime string and float
@@ -71,14 +120,7 @@ class JobLoggingDB(DB):
             self.log.exception("Exception while date evaluation")
             _date = Time.dateTime()
         epoc = time.mktime(_date.timetuple()) + _date.microsecond / 1000000.0 - MAGIC_EPOC_NUMBER
-
-        cmd = (
-            "INSERT INTO LoggingInfo (JobId, Status, MinorStatus, ApplicationStatus, "
-            + "StatusTime, StatusTimeOrder, StatusSource) VALUES (%d,'%s','%s','%s','%s',%f,'%s')"
-            % (int(jobID), status, minorStatus, applicationStatus[:255], str(_date), epoc, source[:32])
-        )
-
-        return self._update(cmd)
+        return _date, epoc
 
     #############################################################################
     def getJobLoggingInfo(self, jobID):
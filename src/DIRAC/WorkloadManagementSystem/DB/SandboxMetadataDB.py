@@ -1,4 +1,8 @@
 """ SandboxMetadataDB class is a front-end to the metadata for sandboxes
+
+    The content of the sandboxes stored by the SandboxStore is kept once per content hash (sb_Contents),
+    and shared by all the sandboxes with that content (sb_SandBoxContents), whoever their owner is.
+    A content is removed once it is no longer referenced by any sandbox.
 """
 from DIRAC import gLogger, S_OK, S_ERROR
 from DIRAC.Core.Base.DB import DB
@@ -15,6 +19,7 @@ class SandboxMetadataDB(DB):
             raise RuntimeError("Can't create tables: %s" % result["Message"])
         self.__assignedSBGraceDays = 0
         self.__unassignedSBGraceDays = 15
+        self.__unusedContentGraceDays = 1
 
     def __initializeDB(self):
         """
@@ -67,6 +72,29 @@ class SandboxMetadataDB(DB):
             "UniqueIndexes": {"Mapping": ["SBId", "EntitySetup", "EntityId", "Type"]},
         }
 
+        self.__tablesDesc["sb_Contents"] = {
+            "Fields": {
+                "ContentId": "INTEGER(10) UNSIGNED AUTO_INCREMENT NOT NULL",
+                "Hash": "CHAR(64) NOT NULL",
+                "Bytes": "BIGINT(20) NOT NULL DEFAULT 0",
+                "SEName": "VARCHAR(64) NOT NULL",
+                "SEPFN": "VARCHAR(512) NOT NULL",
+                "RefCount": "INTEGER(10) UNSIGNED NOT NULL DEFAULT 0",
+                "LastAccessTime": "DATETIME NOT NULL",
+            },
+            "PrimaryKey": "ContentId",
+            "UniqueIndexes": {"Content": ["Hash", "Bytes", "SEName"]},
+        }
+
+        self.__tablesDesc["sb_SandBoxContents"] = {
+            "Fields": {
+                "SBId": "INTEGER(10) UNSIGNED NOT NULL",
+                "ContentId": "INTEGER(10) UNSIGNED NOT NULL",
+            },
+            "PrimaryKey": "SBId",
+            "Indexes": {"ContentIndex": ["ContentId"]},
+        }
+
         for tableName in self.__tablesDesc:
             if tableName not in tablesInDB:
                 tablesToCreate[tableName] = self.__tablesDesc[tableName]
@@ -333,16 +361,114 @@ class SandboxMetadataDB(DB):
 
     def deleteSandboxes(self, SBIdList):
         """
-        Delete sandboxes
+        Delete sandboxes, and release their contents
         """
         sqlSBList = ", ".join([str(sbid) for sbid in SBIdList])
-        for table in ("sb_SandBoxes", "sb_EntityMapping"):
+        # Several of the sandboxes may share the same content
+        sqlCmd = (
+            "UPDATE `sb_Contents` c JOIN ( SELECT ContentId, COUNT(*) AS Refs FROM `sb_SandBoxContents` "
+            "WHERE SBId IN ( %s ) GROUP BY ContentId ) m ON c.ContentId = m.ContentId "
+            "SET c.RefCount = IF( c.RefCount > m.Refs, c.RefCount - m.Refs, 0 ), c.LastAccessTime = UTC_TIMESTAMP()"
+            % sqlSBList
+        )
+        result = self._update(sqlCmd)
+        if not result["OK"]:
+            return result
+        for table in ("sb_SandBoxes", "sb_EntityMapping", "sb_SandBoxContents"):
             sqlCmd = "DELETE FROM `%s` WHERE SBId IN ( %s )" % (table, sqlSBList)
             result = self._update(sqlCmd)
             if not result["OK"]:
                 return result
         return S_OK()
 
+    def __contentCond(self, contentHash, size, SEName):
+        return "Hash = %s AND Bytes = %d AND SEName = %s" % (
+            self._escapeString(contentHash)["Value"],
+            size,
+            self._escapeString(SEName)["Value"],
+        )
+
+    def registerContent(self, contentHash, size, SEName, SEPFN):
+        """
+        Register the content of a sandbox, if it is not there yet. Either way, its unused grace period restarts
+
+        :param str contentHash: hash of the content (sha256)
+        :param int size: size of the content
+        :param str SEName: name of the StorageElement holding the content
+        :param str SEPFN: PFN where the content is stored, if it is not registered yet
+
+        :returns: S_OK with the PFN of the registered content
+        """
+        sqlCmd = "INSERT INTO `sb_Contents` ( Hash, Bytes, SEName, SEPFN, RefCount, LastAccessTime ) VALUES "
+        sqlCmd += "( %s, %d, %s, %s, 0, UTC_TIMESTAMP() ) ON DUPLICATE KEY UPDATE LastAccessTime = UTC_TIMESTAMP()" % (
+            self._escapeString(contentHash)["Value"],
+            size,
+            self._escapeString(SEName)["Value"],
+            self._escapeString(SEPFN)["Value"],
+        )
+        result = self._update(sqlCmd)
+        if not result["OK"]:
+            return result
+        result = self._query("SELECT SEPFN FROM `sb_Contents` WHERE %s" % self.__contentCond(contentHash, size, SEName))
+        if not result["OK"]:
+            return result
+        if not result["Value"]:
+            return S_ERROR("Content %s was removed while being registered" % contentHash)
+        return S_OK(result["Value"][0][0])
+
+    def assignContentToSandbox(self, sbId, contentHash, size, SEName):
+        """
+        Make a sandbox use a registered content, which is then referenced once more
+        """
+        sqlCmd = "INSERT INTO `sb_SandBoxContents` ( SBId, ContentId ) SELECT %d, ContentId FROM `sb_Contents` "
+        sqlCmd += "WHERE %s" % self.__contentCond(contentHash, size, SEName)
+        result = self._update(sqlCmd)
+        if not result["OK"]:
+            if result["Message"].find("Duplicate entry") == -1:
+                return result
+            # The sandbox already uses it
+            return S_OK()
+        if not result["Value"]:
+            return S_ERROR("Content %s is not registered" % contentHash)
+        sqlCmd = "UPDATE `sb_Contents` SET RefCount = RefCount + 1, LastAccessTime = UTC_TIMESTAMP() WHERE %s"
+        return self._update(sqlCmd % self.__contentCond(contentHash, size, SEName))
+
+    def getSandboxContentPFN(self, sbId):
+        """
+        Get where the content of a sandbox is stored
+
+        :returns: S_OK with the PFN of the content, or None for the sandboxes stored at their own PFN
+        """
+        sqlCmd = "SELECT c.SEPFN FROM `sb_Contents` c, `sb_SandBoxContents` m "
+        sqlCmd += "WHERE m.SBId = %d AND c.ContentId = m.ContentId" % sbId
+        result = self._query(sqlCmd)
+        if not result["OK"]:
+            return result
+        if not result["Value"]:
+            return S_OK(None)
+        return S_OK(result["Value"][0][0])
+
+    def getUnusedContents(self):
+        """
+        Get the contents no longer used by any sandbox
+        """
+        sqlCmd = "SELECT ContentId, SEName, SEPFN FROM `sb_Contents` WHERE RefCount = 0 AND "
+        sqlCmd += "TIMESTAMPDIFF( DAY, LastAccessTime, UTC_TIMESTAMP() ) >= %d" % self.__unusedContentGraceDays
+        return self._query(sqlCmd)
+
+    def deleteContent(self, contentId):
+        """
+        Delete a content, if it is still unused
+
+        :returns: S_OK with True if the content was deleted
+        """
+        sqlCmd = "DELETE FROM `sb_Contents` WHERE ContentId = %d AND RefCount = 0 AND " % contentId
+        sqlCmd += "TIMESTAMPDIFF( DAY, LastAccessTime, UTC_TIMESTAMP() ) >= %d" % self.__unusedContentGraceDays
+        result = self._update(sqlCmd)
+        if not result["OK"]:
+            return result
+        return S_OK(result["Value"] > 0)
+
     def getSandboxId(self, SEName, SEPFN, requesterName, requesterGroup, field="SBId", requesterDN=None):
         """
         Get the sandboxId if it exists
@@ -1,7 +1,10 @@
 """ TaskQueueDB class is a front-end to the task queues db
 """
+import heapq
 import random
 import string
+import threading
+import time
 
 from DIRAC import gConfig, S_OK, S_ERROR
 from DIRAC.Core.Base.DB import DB
@@ -32,6 +35,240 @@ def _lowerAndRemovePunctuation(s):
     return s.lower().translate(table)
 
 
+def _isAny(value):
+    """Is the match value a wildcard (ANY) or a list containing one"""
+    if isinstance(value, str):
+        return _lowerAndRemovePunctuation(value) == "any"
+    return any(_lowerAndRemovePunctuation(v) == "any" for v in value)
+
+
+def _toList(value):
+    if isinstance(value, (list, tuple)):
+        return [str(v).strip() for v in value]
+    return [str(value).strip()]
+
+
+class TaskQueueIndex:
+    """In-memory index of the task queue definitions, used to select the candidate
+    task queues for a match request without querying the tq_TQ* tables.
+
+    Every value of every task queue field points to the set of task queues having it,
+    so that a match request is resolved with set operations.
+    It reproduces the semantics of the SQL generated by TaskQueueDB.matchAndGetTaskQueue,
+    and works on the raw match dictionaries, before any escaping.
+    """
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.__loadTime = 0
+        self.__tqs = {}
+        self.__byValue = {}
+        self.__unconstrained = {}
+        self.__reset()
+
+    def __reset(self):
+        self.__tqs = {}
+        self.__byValue = dict((field, {}) for field in singleValueDefFields + multiValueDefFields)
+        self.__unconstrained = dict((field, set()) for field in multiValueDefFields)
+
+    def __contains__(self, tqId):
+        return tqId in self.__tqs
+
+    def __len__(self):
+        return len(self.__tqs)
+
+    def age(self):
+        """Seconds since the index was last loaded from the DB"""
+        return time.time() - self.__loadTime
+
+    def isLoaded(self):
+        return self.__loadTime > 0
+
+    def load(self, tqData):
+        """Replace the content of the index
+
+        :param dict tqData: task queues as returned by TaskQueueDB.retrieveTaskQueues
+        """
+        with self.__lock:
+            self.__reset()
+            for tqId, tqDef in tqData.items():
+                self.__add(tqId, tqDef)
+            self.__loadTime = time.time()
+
+    def add(self, tqId, tqDef):
+        """Add (or replace) one task queue definition"""
+        with self.__lock:
+            self.__remove(tqId)
+            self.__add(tqId, tqDef)
+
+    def remove(self, tqId):
+        """Remove a task queue from the index"""
+        with self.__lock:
+            self.__remove(tqId)
+
+    def setPriority(self, tqIds, priority):
+        """Update the priority of the given task queues"""
+        with self.__lock:
+            for tqId in tqIds:
+                if tqId in self.__tqs:
+                    self.__tqs[tqId]["Priority"] = max(priority, TQ_MIN_SHARE)
+
+    def __add(self, tqId, tqDef):
+        entry = {"Priority": max(float(tqDef.get("Priority", 1)), TQ_MIN_SHARE)}
+        for field in singleValueDefFields:
+            entry[field] = tqDef[field]
+            self.__byValue[field].setdefault(tqDef[field], set()).add(tqId)
+        for field in multiValueDefFields:
+            values = frozenset(v for v in tqDef.get(field, []) if v.strip())
+            entry[field] = values
+            if not values:
+                self.__unconstrained[field].add(tqId)
+            for value in values:
+                self.__byValue[field].setdefault(value, set()).add(tqId)
+        self.__tqs[tqId] = entry
+
+    def __remove(self, tqId):
+        entry = self.__tqs.pop(tqId, None)
+        if not entry:
+            return
+        for field in singleValueDefFields:
+            self.__byValue[field].get(entry[field], set()).discard(tqId)
+        for field in multiValueDefFields:
+            self.__unconstrained[field].discard(tqId)
+            for value in entry[field]:
+                self.__byValue[field].get(value, set()).discard(tqId)
+
+    def __withAnyValue(self, field, values):
+        """TQs having at least one of the given values for field"""
+        result = set()
+        for value in values:
+            result |= self.__byValue[field].get(value, set())
+        return result
+
+    def __withAllValues(self, field, values):
+        """TQs having all the given values for field"""
+        result = None
+        for value in values:
+            tqIds = self.__byValue[field].get(value, set())
+            result = set(tqIds) if result is None else result & tqIds
+            if not result:
+                break
+        return result or set()
+
+    def match(self, tqMatchDict, numQueuesToGet=1, negativeCond=None):
+        """Get the task queues matching the requirements
+
+        :returns: S_OK( [ ( tqId, ownerDN, ownerGroup ) ] ) ordered by priority / S_ERROR
+        """
+        tqMatchDict = dict(tqMatchDict)
+        if "Tag" not in tqMatchDict and "RequiredTag" not in tqMatchDict:
+            tqMatchDict["Tag"] = []
+        tag_fv = []
+        if "Tag" in tqMatchDict:
+            tag_fv = tqMatchDict["Tag"]
+            if isinstance(tag_fv, str):
+                tag_fv = [tag_fv]
+        rtag_fv = tqMatchDict.get("RequiredTag", [])
+        if isinstance(rtag_fv, str):
+            rtag_fv = [rtag_fv]
+        if rtag_fv and not _isAny(rtag_fv) and not set(rtag_fv).issubset(set(tag_fv)):
+            return S_ERROR("Wrong conditions")
+
+        sharingGroups = set()
+        if "OwnerDN" in tqMatchDict and "OwnerGroup" in tqMatchDict:
+            for group in _toList(tqMatchDict["OwnerGroup"]):
+                if Properties.JOB_SHARING in Registry.getPropertiesForGroup(group):
+                    sharingGroups.add(group)
+
+        with self.__lock:
+            candidates = set(self.__tqs)
+
+            for field in ("Setup", "OwnerGroup"):
+                if field in tqMatchDict:
+                    candidates &= self.__withAnyValue(field, _toList(tqMatchDict[field]))
+            if "OwnerDN" in tqMatchDict:
+                # With JobSharing the DN does not matter
+                allowed = self.__withAnyValue("OwnerDN", _toList(tqMatchDict["OwnerDN"]))
+                if sharingGroups:
+                    allowed |= self.__withAnyValue("OwnerGroup", sharingGroups)
+                candidates &= allowed
+
+            if "CPUTime" in tqMatchDict:
+                cpuTime = tqMatchDict["CPUTime"]
+                if isinstance(cpuTime, (list, tuple)):
+                    cpuTime = max(cpuTime)
+                candidates &= self.__withAnyValue(
+                    "CPUTime", [cpu for cpu in self.__byValue["CPUTime"] if cpu <= cpuTime]
+                )
+
+            # Multi value fields provided by the resource
+            for field in multiValueMatchFields:
+                if field == "Tag":
+                    continue
+                fv = tqMatchDict.get(field)
+                if not fv or _isAny(fv):
+                    continue
+                tqField = "%ss" % field
+                values = _toList(fv)
+                candidates &= self.__unconstrained[tqField] | self.__withAnyValue(tqField, values)
+                # The job may have banned the resource
+                if field in bannedJobMatchFields:
+                    candidates -= self.__withAllValues("Banned%s" % tqField, values)
+
+            # All the tags of the TQ have to be provided by the resource
+            if "Tag" in tqMatchDict and not _isAny(tag_fv):
+                tagSet = set(tag_fv)
+                candidates -= self.__withAnyValue("Tags", [tag for tag in self.__byValue["Tags"] if tag not in tagSet])
+
+            # The resource may require some tags
+            if rtag_fv and not _isAny(rtag_fv):
+                candidates &= self.__withAllValues("Tags", set(rtag_fv))
+
+            # The resource may have banned some values
+            for field in multiValueMatchFields:
+                b_fv = tqMatchDict.get("Banned%s" % field)
+                if not b_fv or _isAny(b_fv):
+                    continue
+                candidates -= self.__withAllValues("%ss" % field, _toList(b_fv))
+
+            if negativeCond:
+                if isinstance(negativeCond, dict):
+                    negativeCond = [negativeCond]
+                eligible = set()
+                for condDict in negativeCond:
+                    eligible |= self.__notDictCond(candidates, condDict)
+                candidates = eligible
+
+            # Apply priorities, like ORDER BY RAND() / Priority
+            rand = random.random
+            tqs = self.__tqs
+            matched = [(rand() / tqs[tqId]["Priority"], tqId, tqs[tqId]) for tqId in candidates]
+
+        if numQueuesToGet:
+            matched = heapq.nsmallest(numQueuesToGet, matched)
+        else:
+            matched.sort()
+        return S_OK([(tqId, tq["OwnerDN"], tq["OwnerGroup"]) for _, tqId, tq in matched])
+
+    def __notDictCond(self, candidates, negativeCond):
+        """Candidates eligible according to a negative condition dict, see TaskQueueDB.__generateNotDictSQL:
+        not ( cond1 and cond2 ) = ( not cond1 or not cond 2 )
+        """
+        eligible = set()
+        hasCond = False
+        for field, values in negativeCond.items():
+            if field in multiValueMatchFields:
+                eligible |= candidates - self.__withAnyValue("%ss" % field, _toList(values))
+                hasCond = True
+            elif field in singleValueDefFields:
+                for value in _toList(values):
+                    eligible |= set(tqId for tqId in candidates if str(self.__tqs[tqId][field]) != value)
+                    hasCond = True
+        if not hasCond:
+            return candidates
+        return eligible
+
+
 class TaskQueueDB(DB):
     """MySQL DB of "Task Queues" """
 
@@ -60,6 +297,9 @@ class TaskQueueDB(DB):
         self.__opsHelper = Operations()
         self.__ensureInsertionIsSingle = False
         self.__sharesCorrector = SharesCorrector(self.__opsHelper)
+        self.__tqIndex = None
+        self.__tqIndexLock = threading.Lock()
+        self.__tqIndexLoadLock = threading.Lock()
         result = self.__initializeDB()
         if not result["OK"]:
             raise Exception("Can't create tables: %s" % result["Message"])
@@ -84,6 +324,56 @@ class TaskQueueDB(DB):
     def getValidPilotTypes(self):
         return self.__getCSOption("AllPilotTypes", ["private"])
 
+    def __getTaskQueueIndex(self):
+        """Get the in-memory index of the task queues if it is enabled, reloading it when it is too old
+
+        :returns: TaskQueueIndex or None
+        """
+        if not self.__getCSOption("UseTaskQueueIndex", False):
+            self.__tqIndex = None
+            return None
+        with self.__tqIndexLock:
+            if self.__tqIndex is None:
+                self.__tqIndex = TaskQueueIndex()
+            tqIndex = self.__tqIndex
+        refreshTime = self.__getCSOption("TaskQueueIndexRefresh", 10)
+        if tqIndex.age() < refreshTime:
+            return tqIndex
+        # Only one thread reloads the index, the others go on with the current content
+        if not self.__tqIndexLoadLock.acquire(not tqIndex.isLoaded()):
+            return tqIndex
+        try:
+            if tqIndex.age() >= refreshTime:
+                result = self.retrieveTaskQueues()
+                if not result["OK"]:
+                    self.log.error("Cannot load the task queue index", result["Message"])
+                    return tqIndex if tqIndex.isLoaded() else None
+                tqIndex.load(result["Value"])
+                self.log.verbose("Loaded task queue index", "(%s TQs)" % len(tqIndex))
+        finally:
+            self.__tqIndexLoadLock.release()
+        return tqIndex
+
+    def __indexTaskQueue(self, tqId):
+        """Add or refresh a task queue in the index, if there is one"""
+        tqIndex = self.__tqIndex
+        if tqIndex is None or not tqIndex.isLoaded():
+            return
+        result = self.retrieveTaskQueues([tqId])
+        if not result["OK"]:
+            self.log.warn("Cannot add TQ to the index", "%s: %s" % (tqId, result["Message"]))
+            return
+        if tqId in result["Value"]:
+            tqIndex.add(tqId, result["Value"][tqId])
+
+    def __unindexTaskQueues(self, tqIds):
+        """Remove task queues from the index, if there is one"""
+        tqIndex = self.__tqIndex
+        if tqIndex is None:
+            return
+        for tqId in tqIds:
+            tqIndex.remove(int(tqId))
+
     def __initializeDB(self):
         """
         Create the tables
@@ -316,6 +606,7 @@ class TaskQueueDB(DB):
         result = self._update("DELETE FROM `tq_TaskQueues` WHERE TQId in ( %s )" % ",".join(orphanedTQs), conn=connObj)
         if not result["OK"]:
             return result
+        self.__unindexTaskQueues(orphanedTQs)
         return S_OK()
 
     def __setTaskQueueEnabled(self, tqId, enabled=True, connObj=False):
@@ -389,6 +680,8 @@ class TaskQueueDB(DB):
                 return result
             if newTQ:
                 self.recalculateTQSharesForEntity(tqDefDict["OwnerDN"], tqDefDict["OwnerGroup"], connObj=connObj)
+            if self.__tqIndex is not None and (newTQ or tqId not in self.__tqIndex):
+                self.__indexTaskQueue(tqId)
         finally:
             self.__setTaskQueueEnabled(tqId, True)
         return S_OK()
@@ -523,12 +816,15 @@ ORDER BY COUNT( `tq_Jobs`.JobID ) ASC"
         """
         if negativeCond is None:
             negativeCond = {}
+        # The index works on the values before escaping
+        rawMatchDict = dict(tqMatchDict)
         # Make a copy to avoid modification of original if escaping needs to be done
         tqMatchDict = dict(tqMatchDict)
         retVal = self._checkMatchDefinition(tqMatchDict)
         if not retVal["OK"]:
             self.log.error("TQ match request check failed", retVal["Message"])
             return retVal
+        tqIndex = self.__getTaskQueueIndex()
         retVal = self._getConnection()
         if not retVal["OK"]:
             return S_ERROR("Can't connect to DB: %s" % retVal["Message"])
@@ -542,10 +838,15 @@ WHERE `tq_Jobs`.TQId = %s ORDER BY RAND() / `tq_Jobs`.RealPriority ASC LIMIT 1"
             noJobsFound = False
             if "JobID" in tqMatchDict:
                 # A certain JobID is required by the resource, so all TQ are to be considered
-                retVal = self.matchAndGetTaskQueue(
-                    tqMatchDict, numQueuesToGet=0, skipMatchDictDef=True, connObj=connObj
-                )
+                if tqIndex is not None:
+                    retVal = tqIndex.match(rawMatchDict, numQueuesToGet=0)
+                else:
+                    retVal = self.matchAndGetTaskQueue(
+                        tqMatchDict, numQueuesToGet=0, skipMatchDictDef=True, connObj=connObj
+                    )
                 preJobSQL = "%s AND `tq_Jobs`.JobId = %s " % (preJobSQL, tqMatchDict["JobID"])
+            elif tqIndex is not None:
+                retVal = tqIndex.match(rawMatchDict, numQueuesToGet=numQueuesPerTry, negativeCond=negativeCond)
             else:
                 retVal = self.matchAndGetTaskQueue(
                     tqMatchDict,
@@ -567,6 +868,8 @@ WHERE `tq_Jobs`.TQId = %s ORDER BY RAND() / `tq_Jobs`.RealPriority ASC LIMIT 1"
                     return S_ERROR("Can't retrieve winning priority for matching job: %s" % retVal["Message"])
                 if not retVal["Value"]:
                     noJobsFound = True
+                    # Will be back in the index at the next reload if it gets jobs again
+                    self.__unindexTaskQueues([tqId])
                     continue
                 prio = retVal["Value"][0][0]
                 retVal = self._query("%s %s" % (preJobSQL % (tqId, prio), postJobSQL), conn=connObj)
@@ -595,18 +898,131 @@ WHERE `tq_Jobs`.TQId = %s ORDER BY RAND() / `tq_Jobs`.RealPriority ASC LIMIT 1"
         self.log.info("Could not find a match after %s match retries" % self.__maxMatchRetry)
         return S_ERROR("Could not find a match after %s match retries" % self.__maxMatchRetry)
 
+    def matchAndGetJobs(self, tqMatchDict, maxJobs, numQueuesPerTry=10, negativeCond=None):
+        """Match up to maxJobs jobs based on requirements, and take them out of the task queues
+
+        All the jobs are extracted in a single transaction
+
+        :param dict tqMatchDict: resource description
+        :param int maxJobs: maximum number of jobs to match
+        :returns: S_OK( { "matchFound": bool, "jobs": [ ( jobId, tqId ) ], "tqMatch": dict } ) / S_ERROR
+        """
+        if negativeCond is None:
+            negativeCond = {}
+        if "JobID" in tqMatchDict:
+            # Only one job can be requested by ID
+            retVal = self.matchAndGetJob(tqMatchDict, negativeCond=negativeCond)
+            if not retVal["OK"] or not retVal["Value"]["matchFound"]:
+                return retVal
+            match = retVal["Value"]
+            return S_OK(
+                {"matchFound": True, "jobs": [(match["jobId"], match["taskQueueId"])], "tqMatch": match["tqMatch"]}
+            )
+        # The index works on the values before escaping
+        rawMatchDict = dict(tqMatchDict)
+        # Make a copy to avoid modification of original if escaping needs to be done
+        tqMatchDict = dict(tqMatchDict)
+        retVal = self._checkMatchDefinition(tqMatchDict)
+        if not retVal["OK"]:
+            self.log.error("TQ match request check failed", retVal["Message"])
+            return retVal
+        tqIndex = self.__getTaskQueueIndex()
+
+        retVal = self.transactionStart()
+        if not retVal["OK"]:
+            return S_ERROR("Can't begin transaction for matching jobs: %s" % retVal["Message"])
+        jobTQList = []
+        triedTQs = set()
+        emptyTQs = []
+        for _ in range(self.__maxMatchRetry):
+            if tqIndex is not None:
+                retVal = tqIndex.match(rawMatchDict, numQueuesToGet=numQueuesPerTry, negativeCond=negativeCond)
+            else:
+                retVal = self.matchAndGetTaskQueue(
+                    tqMatchDict, numQueuesToGet=numQueuesPerTry, skipMatchDictDef=True, negativeCond=negativeCond
+                )
+            if not retVal["OK"]:
+                self.transactionRollback()
+                return retVal
+            tqList = [tqTuple for tqTuple in retVal["Value"] if tqTuple[0] not in triedTQs]
+            if not tqList:
+                break
+            for tqId, tqOwnerDN, tqOwnerGroup in tqList:
+                triedTQs.add(tqId)
+                self.log.verbose("Trying to extract jobs from TQ", tqId)
+                retVal = self.__extractJobsFromTaskQueue(tqId, maxJobs - len(jobTQList))
+                if not retVal["OK"]:
+                    self.transactionRollback()
+                    return S_ERROR("Could not take jobs out from the TQ %s: %s" % (tqId, retVal["Message"]))
+                if not retVal["Value"]:
+                    emptyTQs.append(tqId)
+                jobTQList.extend([(jobId, tqId) for jobId in retVal["Value"]])
+                self.__deleteTQWithDelay.add(tqId, 300, (tqId, tqOwnerDN, tqOwnerGroup))
+                if len(jobTQList) >= maxJobs:
+                    break
+            if len(jobTQList) >= maxJobs:
+                break
+        retVal = self.transactionCommit()
+        if not retVal["OK"]:
+            self.transactionRollback()
+            return S_ERROR("Can't commit transaction for matching jobs: %s" % retVal["Message"])
+        # Will be back in the index at the next reload if they get jobs again
+        self.__unindexTaskQueues(emptyTQs)
+
+        if not jobTQList:
+            self.log.info("No TQ matches requirements")
+            return S_OK({"matchFound": False, "jobs": [], "tqMatch": tqMatchDict})
+        self.log.info("Extracted jobs from TQs", "(%s jobs from %s TQs)" % (len(jobTQList), len(triedTQs)))
+        return S_OK({"matchFound": True, "jobs": jobTQList, "tqMatch": tqMatchDict})
+
+    def __extractJobsFromTaskQueue(self, tqId, numJobs):
+        """Take out of a task queue up to numJobs jobs, chosen randomly according to their priority.
+        It has to be called within a transaction: the jobs are locked before being deleted, so that
+        concurrent matches can't get them
+
+        :returns: S_OK( [ jobIds ] ) / S_ERROR
+        """
+        retVal = self._query(
+            "SELECT JobId FROM `tq_Jobs` WHERE TQId = %s ORDER BY RAND() / RealPriority ASC LIMIT %s" % (tqId, numJobs)
+        )
+        if not retVal["OK"]:
+            return retVal
+        jobIds = [row[0] for row in retVal["Value"]]
+        if not jobIds:
+            return S_OK([])
+        retVal = self._query(
+            "SELECT JobId FROM `tq_Jobs` WHERE JobId IN ( %s ) FOR UPDATE" % ", ".join(str(j) for j in jobIds)
+        )
+        if not retVal["OK"]:
+            return retVal
+        jobIds = [row[0] for row in retVal["Value"]]
+        if not jobIds:
+            return S_OK([])
+        retVal = self._update("DELETE FROM `tq_Jobs` WHERE JobId IN ( %s )" % ", ".join(str(j) for j in jobIds))
+        if not retVal["OK"]:
+            return retVal
+        return S_OK(jobIds)
+
     def matchAndGetTaskQueue(
         self, tqMatchDict, numQueuesToGet=1, skipMatchDictDef=False, negativeCond=None, connObj=False
     ):
-        """Get a queue that matches the requirements"""
+        """Get a queue that matches the requirements
+
+        If the task queue index is enabled and the match dict is not already escaped,
+        the matching is done in memory instead of in the DB
+        """
         if negativeCond is None:
             negativeCond = {}
         # Make a copy to avoid modification of original if escaping needs to be done
         tqMatchDict = dict(tqMatchDict)
         if not skipMatchDictDef:
+            rawMatchDict = dict(tqMatchDict)
             retVal = self._checkMatchDefinition(tqMatchDict)
             if not retVal["OK"]:
                 return retVal
+            tqIndex = self.__getTaskQueueIndex()
+            if tqIndex is not None:
+                return tqIndex.match(rawMatchDict, numQueuesToGet=numQueuesToGet, negativeCond=negativeCond)
         retVal = self.__generateTQMatchSQL(tqMatchDict, numQueuesToGet=numQueuesToGet, negativeCond=negativeCond)
         if not retVal["OK"]:
             return retVal
@@ -1032,6 +1448,7 @@ WHERE j.JobId = %s AND t.TQId = j.TQId"
             retVal = self._update("DELETE FROM `tq_TaskQueues` WHERE TQId = %s" % tqId, conn=connObj)
             if not retVal["OK"]:
                 return retVal
+            self.__unindexTaskQueues([tqId])
             self.recalculateTQSharesForEntity(tqOwnerDN, tqOwnerGroup, connObj=connObj)
             self.log.info("Deleted empty and enabled TQ", tqId)
             return S_OK()
@@ -1068,6 +1485,7 @@ WHERE j.JobId = %s AND t.TQId = j.TQId"
             retVal = self._update("DELETE FROM `tq_TQTo%s` WHERE TQId = %s" % (field, tqId), conn=connObj)
             if not retVal["OK"]:
                 return retVal
+        self.__unindexTaskQueues([tqId])
         if delTQ > 0:
             self.recalculateTQSharesForEntity(tqOwnerDN, tqOwnerGroup, connObj=connObj)
             return S_OK(True)
@@ -1319,6 +1737,8 @@ FROM `tq_TaskQueues` t, `tq_Jobs` j WHERE "
             tqList = ", ".join([str(tqId) for tqId in prioDict[prio]])
             updateSQL = "UPDATE `tq_TaskQueues` SET Priority=%.4f WHERE TQId in ( %s )" % (prio, tqList)
             self._update(updateSQL, conn=connObj)
+            if self.__tqIndex is not None:
+                self.__tqIndex.setPriority(prioDict[prio], prio)
         return S_OK()
 
     @staticmethod
@@ -2,6 +2,7 @@
 
 # pylint: disable=protected-access, missing-docstring
 
+import datetime
 import unittest
 
 from mock import MagicMock, patch
@@ -17,6 +18,7 @@ class JobDBTest(unittest.TestCase):
             self.log = MagicMock()
             self.logger = MagicMock()
             self._connected = True
+            self.heartBeatSamples = 0
 
         from DIRAC.WorkloadManagementSystem.DB.JobDB import JobDB
 
@@ -34,3 +36,103 @@ class JobDBTest(unittest.TestCase):
         print(result)
         self.assertTrue(result["OK"])
         self.assertEqual(result["Value"], ["/vo/user/lfn1", "/vo/user/lfn2"])
+
+    def test_setHeartBeatDataBulk(self):
+        self.jobDB._query.return_value = S_OK(((1, "Running"),))
+        self.jobDB._update = MagicMock(return_value=S_OK())
+        self.jobDB._escapeString.side_effect = lambda value: S_OK("'%s'" % value)
+        first, second = datetime.datetime(2022, 1, 1, 10), datetime.datetime(2022, 1, 1, 10, 1)
+        # The job 2 does not exist
+        heartBeats = {1: [(first, {"LoadAverage": 1.5}), (second, {"LoadAverage": 2.0})], 2: [(first, {"RSS": 10})]}
+        result = self.jobDB.setHeartBeatDataBulk(heartBeats)
+        self.assertTrue(result["OK"])
+        self.assertEqual(result["Value"], {1: "Running"})
+        self.assertEqual(self.jobDB._update.call_count, 2)
+        # The status is left untouched
+        self.assertEqual(
+            self.jobDB._update.call_args_list[0][0][0],
+            "UPDATE Jobs SET HeartBeatTime=CASE JobID WHEN 1 THEN '2022-01-01 10:01:00' END WHERE JobID IN (1)",
+        )
+        self.assertEqual(
+            self.jobDB._update.call_args_list[1][0][0],
+            "INSERT INTO HeartBeatLoggingInfo (JobID,Name,Value,HeartBeatTime) VALUES "
+            "(1,'LoadAverage','1.5','2022-01-01 10:00:00'),(1,'LoadAverage','2.0','2022-01-01 10:01:00')"
+            " ON DUPLICATE KEY UPDATE Value=VALUES(Value)",
+        )
+
+    def test_heartBeatSamples(self):
+        from DIRAC.WorkloadManagementSystem.DB.JobDB import (
+            packHeartBeatSample,
+            unpackHeartBeatSamples,
+            downsampleHeartBeatSamples,
+            HEARTBEAT_SAMPLE_SIZE,
+        )
+
+        start = datetime.datetime(2022, 1, 1, 10)
+        samples = b""
+        for i in range(10):
+            sample, others = packHeartBeatSample(
+                start + datetime.timedelta(minutes=i), {"LoadAverage": i, "CPUConsumed": 10 * i, "Custom": "x"}
+            )
+            self.assertEqual(others, {"Custom": "x"})
+            samples += sample
+        self.assertEqual(len(samples), 10 * HEARTBEAT_SAMPLE_SIZE)
+        unpacked = unpackHeartBeatSamples(samples)
+        self.assertEqual(
+            unpacked[3], (start + datetime.timedelta(minutes=3), {"LoadAverage": 3.0, "CPUConsumed": 30.0})
+        )
+
+        # Groups of 3 samples from the end: the mean load, the last CPU and time
+        downsampled = unpackHeartBeatSamples(downsampleHeartBeatSamples(samples, 4))
+        self.assertEqual(len(downsampled), 4)
+        self.assertEqual(
+            downsampled[-1], (start + datetime.timedelta(minutes=9), {"LoadAverage": 8.0, "CPUConsumed": 90.0})
+        )
+        self.assertEqual(downsampled[0], (start, {"LoadAverage": 0.0, "CPUConsumed": 0.0}))
+
+    def test_setHeartBeatData_samples(self):
+        self.jobDB.heartBeatSamples = 100
+        self.jobDB._query.return_value = S_OK(((1,),))
+        self.jobDB._update = MagicMock(return_value=S_OK())
+        self.jobDB._escapeString.side_effect = lambda value: S_OK("'%s'" % value)
+        result = self.jobDB.setHeartBeatData(1, {"LoadAverage": 1.5, "Custom": "x"})
+        self.assertTrue(result["OK"])
+        # The update of the job, the sample and the other values
+        self.assertEqual(self.jobDB._update.call_count, 3)
+        upsert = self.jobDB._update.call_args_list[1][0][0]
+        self.assertTrue(
+            upsert.startswith("INSERT INTO HeartBeatSamples (JobID,Samples,LastHeartBeatTime) VALUES (1,X'")
+        )
+        self.assertTrue(
+            upsert.endswith(
+                "ON DUPLICATE KEY UPDATE Samples=RIGHT(CONCAT(Samples,VALUES(Samples)),3200), "
+                "LastHeartBeatTime=VALUES(LastHeartBeatTime)"
+            )
+        )
+        self.assertIn("(1,'Custom','x',", self.jobDB._update.call_args_list[2][0][0])
+
+        # Nothing is stored for a deleted job
+        self.jobDB._query.return_value = S_OK(())
+        self.jobDB._update.reset_mock()
+        result = self.jobDB.setHeartBeatData(2, {"LoadAverage": 1.5})
+        self.assertFalse(result["OK"])
+        self.assertEqual(self.jobDB._update.call_count, 1)
+
+    def test_initializeHeartBeatSamples(self):
+        from DIRAC.WorkloadManagementSystem.DB.JobDB import HEARTBEAT_MAX_SAMPLES
+
+        self.jobDB.heartBeatSamples = 10 ** 6
+        self.jobDB._query.return_value = S_OK((("Jobs",),))
+        self.jobDB._createTables = MagicMock(return_value=S_OK())
+        self.assertTrue(self.jobDB._JobDB__initializeHeartBeatSamples()["OK"])
+        # The ring buffer must fit in a MEDIUMBLOB
+        self.assertEqual(self.jobDB.heartBeatSamples, HEARTBEAT_MAX_SAMPLES)
+        tables = self.jobDB._createTables.call_args[0][0]
+        self.assertEqual(tables["HeartBeatSamples"]["Fields"]["Samples"], "MEDIUMBLOB NOT NULL")
+        self.assertNotIn("ForeignKeys", tables["HeartBeatSamples"])
+
+        # Already there
+        self.jobDB._createTables.reset_mock()
+        self.jobDB._query.return_value = S_OK((("Jobs",), ("HeartBeatSamples",)))
+        self.assertTrue(self.jobDB._JobDB__initializeHeartBeatSamples()["OK"])
+        self.jobDB._createTables.assert_not_called()
@@ -0,0 +1,117 @@
+""" Unit tests for the in-memory TaskQueueIndex of the TaskQueueDB module """
+
+# pylint: disable=missing-docstring
+
+import pytest
+
+from DIRAC.WorkloadManagementSystem.DB.TaskQueueDB import TaskQueueIndex
+
+MODULE_NAME = "DIRAC.WorkloadManagementSystem.DB.TaskQueueDB"
+
+tqData = {
+    1: {"OwnerDN": "/dn1", "OwnerGroup": "prod", "Setup": "aSetup", "CPUTime": 3600, "Priority": 1.0, "Jobs": 3},
+    2: {
+        "OwnerDN": "/dn2",
+        "OwnerGroup": "prod",
+        "Setup": "aSetup",
+        "CPUTime": 86400,
+        "Priority": 2.0,
+        "Jobs": 1,
+        "Sites": ["Site_1", "Site_2"],
+    },
+    3: {
+        "OwnerDN": "/dn1",
+        "OwnerGroup": "user",
+        "Setup": "aSetup",
+        "CPUTime": 3600,
+        "Priority": 1.0,
+        "Jobs": 5,
+        "Tags": ["MultiProcessor"],
+        "BannedSites": ["Site_3"],
+    },
+    4: {
+        "OwnerDN": "/dn1",
+        "OwnerGroup": "user",
+        "Setup": "anotherSetup",
+        "CPUTime": 3600,
+        "Priority": 1.0,
+        "Jobs": 1,
+        "Platforms": ["centos7"],
+    },
+}
+
+
+@pytest.fixture
+def tqIndex(mocker):
+    mocker.patch(MODULE_NAME + ".Registry.getPropertiesForGroup", return_value=[])
+    index = TaskQueueIndex()
+    index.load(tqData)
+    return index
+
+
+def _match(tqIndex, matchDict, negativeCond=None):
+    result = tqIndex.match(matchDict, numQueuesToGet=0, negativeCond=negativeCond)
+    assert result["OK"], result
+    return sorted(tqTuple[0] for tqTuple in result["Value"])
+
+
+@pytest.mark.parametrize(
+    "matchDict, negativeCond, expected",
+    [
+        ({"Setup": "aSetup", "CPUTime": 5000}, None, [1]),
+        ({"Setup": "aSetup", "CPUTime": 100000}, None, [1, 2]),
+        ({"Setup": "aSetup", "CPUTime": 100000, "Tag": "ANY"}, None, [1, 2, 3]),
+        ({"Setup": "aSetup", "CPUTime": 100000, "Site": "Site_1"}, None, [1, 2]),
+        ({"Setup": "aSetup", "CPUTime": 100000, "Site": "Site_3", "Tag": ["MultiProcessor"]}, None, [1]),
+        ({"Setup": "aSetup", "CPUTime": 100000, "Tag": ["MultiProcessor"], "RequiredTag": "MultiProcessor"}, None, [3]),
+        ({"Setup": "aSetup", "CPUTime": 100000, "Tag": "ANY", "BannedSite": ["Site_1"]}, None, [1, 3]),
+        ({"Setup": ["aSetup", "anotherSetup"], "CPUTime": 100000, "Platform": "centos7"}, None, [1, 2, 4]),
+        (
+            {"Setup": "aSetup", "CPUTime": 100000, "Tag": "ANY", "OwnerDN": "/dn1", "OwnerGroup": ["prod", "user"]},
+            None,
+            [1, 3],
+        ),
+        ({"Setup": "aSetup", "CPUTime": 100000, "Tag": "ANY"}, {"Site": ["Site_1", "Site_2"]}, [1, 3]),
+        ({"Setup": "aSetup", "CPUTime": 100000, "Tag": "ANY"}, {"OwnerGroup": ["prod"]}, [3]),
+        (
+            {"Setup": "aSetup", "CPUTime": 100000, "Tag": "ANY"},
+            [{"OwnerGroup": ["prod"]}, {"Site": "Site_3"}],
+            [1, 2, 3],
+        ),
+    ],
+)
+def test_match(tqIndex, matchDict, negativeCond, expected):
+    assert _match(tqIndex, matchDict, negativeCond) == expected
+
+
+def test_jobSharing(tqIndex, mocker):
+    mocker.patch(MODULE_NAME + ".Registry.getPropertiesForGroup", return_value=["JobSharing"])
+    matchDict = {"Setup": "aSetup", "CPUTime": 100000, "OwnerDN": "/dn1", "OwnerGroup": "prod"}
+    assert _match(tqIndex, matchDict) == [1, 2]
+
+
+def test_wrongConditions(tqIndex):
+    result = tqIndex.match({"Setup": "aSetup", "CPUTime": 100000, "RequiredTag": "GPU"})
+    assert not result["OK"]
+
+
+def test_updates(tqIndex):
+    matchDict = {"Setup": "aSetup", "CPUTime": 100000, "Site": "Site_1"}
+    tqIndex.remove(2)
+    assert 2 not in tqIndex
+    assert _match(tqIndex, matchDict) == [1]
+    tqIndex.add(5, dict(tqData[2]))
+    assert _match(tqIndex, matchDict) == [1, 5]
+    tqIndex.remove(42)
+    assert len(tqIndex) == 4
+
+
+def test_priorities(tqIndex):
+    matchDict = {"Setup": "aSetup", "CPUTime": 100000}
+    tqIndex.setPriority([1], 10 ** 6)
+    tqIndex.setPriority([2], 10 ** -5)
+    # With such priorities the first TQ always comes first
+    for _ in range(20):
+        result = tqIndex.match(matchDict, numQueuesToGet=1)
+        assert result["OK"]
+        assert result["Value"] == [(1, "/dn1", "prod")]
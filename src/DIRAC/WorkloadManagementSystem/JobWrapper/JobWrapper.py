@@ -1447,7 +1447,13 @@ class ExecutionThread(threading.Thread):
         start = time.time()
         initialStat = os.times()
         log.verbose("Cmd called", cmd)
-        output = spObject.systemCall(cmd, env=self.exeEnv, callbackFunction=self.sendOutput, shell=True)
+        output = spObject.systemCall(
+            cmd,
+            env=self.exeEnv,
+            callbackFunction=self.sendOutput,
+            shell=True,
+            outputFiles=(self.stdout, self.stderr),
+        )
         log.verbose("Output of system call within execution thread: %s" % output)
         EXECUTION_RESULT["Thread"] = output
         timing = time.time() - start
@@ -1466,12 +1472,9 @@ class ExecutionThread(threading.Thread):
 
     #############################################################################
     def sendOutput(self, stdid, line):
-        if stdid == 0 and self.stdout:
-            with open(self.stdout, "a+") as outputFile:
-                print(line, file=outputFile)
-        elif stdid == 1 and self.stderr:
-            with open(self.stderr, "a+") as errorFile:
-                print(line, file=errorFile)
+        """Keep the last lines of the payload output, which is written to the stdout and stderr files
+        by the Subprocess as it is produced
+        """
         self.outputLines.append(line)
         size = len(self.outputLines)
         if size > self.maxPeekLines:
@@ -5,12 +5,18 @@
 
     setJobStatus()
 
+    The heart beats are buffered and written in bulk every HeartBeatFlushPeriod seconds
+    (0 to write each of them at once). The commands for the jobs (e.g. kill) are still
+    returned with the reply to the heart beat, and the jobs found not to exist at a flush
+    get an error from then on.
 """
+import threading
 import time
 
 from DIRAC import S_OK, S_ERROR
 from DIRAC.Core.DISET.RequestHandler import RequestHandler
 from DIRAC.Core.Utilities import Time
+from DIRAC.Core.Utilities.ThreadScheduler import gThreadScheduler
 from DIRAC.Core.Utilities.DEncode import ignoreEncodeWarning
 from DIRAC.Core.Utilities.ObjectLoader import ObjectLoader
 from DIRAC.ConfigurationSystem.Client.Helpers.Operations import Operations
@@ -18,6 +24,15 @@ from DIRAC.WorkloadManagementSystem.Client import JobStatus
 
 
 class JobStateUpdateHandlerMixin:
+
+    # Heart beats waiting to be written: dynamic data of the heart beats and static data, per JobID
+    __heartBeats = {}
+    __heartBeatLock = threading.Lock()
+    # JobIDs of the jobs with commands waiting for their next heart beat
+    __jobsWithCommands = set()
+    # Time of the last heart beat of the jobs found not to exist when flushing, per JobID
+    __missingJobs = {}
+
     @classmethod
     def initializeHandler(cls, svcInfoDict):
         """
@@ -49,6 +64,11 @@ class JobStateUpdateHandlerMixin:
                 cls.elasticJobParametersDB = result["Value"]()
             except RuntimeError as excp:
                 return S_ERROR("Can't connect to DB: %s" % excp)
+
+        cls.heartBeatFlushPeriod = cls.srv_getCSOption("HeartBeatFlushPeriod", 10)
+        if cls.heartBeatFlushPeriod:
+            cls.__refreshJobsWithCommands()
+            gThreadScheduler.addPeriodicTask(cls.heartBeatFlushPeriod, cls.__flushHeartBeats)
         return S_OK()
 
     ###########################################################################
@@ -256,18 +276,23 @@ class JobStateUpdateHandlerMixin:
             if not result["OK"]:
                 return result
 
-        # Update the JobLoggingDB records
+        # Update the JobLoggingDB records, in one go
+        records = []
         for date in dates:
             sDict = statusDict[date]
-            status = sDict.get("Status", "idem")
-            minor = sDict.get("MinorStatus", "idem")
-            application = sDict.get("ApplicationStatus", "idem")
-            source = sDict.get("Source", "Unknown")
-            result = cls.jobLoggingDB.addLoggingRecord(
-                jobID, status=status, minorStatus=minor, applicationStatus=application, date=date, source=source
+            records.append(
+                {
+                    "JobID": jobID,
+                    "Status": sDict.get("Status", "idem"),
+                    "MinorStatus": sDict.get("MinorStatus", "idem"),
+                    "ApplicationStatus": sDict.get("ApplicationStatus", "idem"),
+                    "Date": date,
+                    "Source": sDict.get("Source", "Unknown"),
+                }
             )
-            if not result["OK"]:
-                return result
+        result = cls.jobLoggingDB.addLoggingRecords(records)
+        if not result["OK"]:
+            return result
 
         return S_OK()
 
@@ -388,6 +413,8 @@ class JobStateUpdateHandlerMixin:
     @classmethod
     def export_sendHeartBeat(cls, jobID, dynamicData, staticData):
         """Send a heart beat sign of life for a job jobID"""
+        if cls.heartBeatFlushPeriod:
+            return cls.__bufferHeartBeat(int(jobID), dynamicData, staticData)
 
         result = cls.jobDB.setHeartBeatData(int(jobID), dynamicData)
         if not result["OK"]:
@@ -417,17 +444,101 @@ class JobStateUpdateHandlerMixin:
             if not result["OK"]:
                 cls.log.warn("Failed to restore the job status to Running")
 
+        return cls.__getJobCommands(int(jobID))
+
+    @classmethod
+    def __getJobCommands(cls, jobID):
+        """Get the commands to send to the job with the reply to its heart beat, marking them as sent"""
         jobMessageDict = {}
-        result = cls.jobDB.getJobCommand(int(jobID))
+        result = cls.jobDB.getJobCommand(jobID)
         if result["OK"]:
             jobMessageDict = result["Value"]
 
         if jobMessageDict:
             for key, _value in jobMessageDict.items():
-                result = cls.jobDB.setJobCommandStatus(int(jobID), key, "Sent")
+                result = cls.jobDB.setJobCommandStatus(jobID, key, "Sent")
 
         return S_OK(jobMessageDict)
 
+    @classmethod
+    def __bufferHeartBeat(cls, jobID, dynamicData, staticData):
+        """Keep the heart beat until the next flush, and return the commands for the job.
+        The database is only queried for the commands if the job had some at the last flush.
+        """
+        with cls.__heartBeatLock:
+            if jobID in cls.__missingJobs:
+                cls.__missingJobs[jobID] = time.time()
+                return S_ERROR("Job %d not found" % jobID)
+            jobHeartBeats = cls.__heartBeats.setdefault(jobID, ([], {}))
+            jobHeartBeats[0].append((Time.dateTime(), dynamicData))
+            jobHeartBeats[1].update(staticData)
+
+        if jobID not in cls.__jobsWithCommands:
+            return S_OK({})
+        return cls.__getJobCommands(jobID)
+
+    @classmethod
+    def __refreshJobsWithCommands(cls):
+        """Refresh the list of jobs having commands waiting for their next heart beat"""
+        result = cls.jobDB.getJobIDsWithCommand()
+        if not result["OK"]:
+            cls.log.error("Failed to get the jobs with commands", result["Message"])
+            return
+        cls.__jobsWithCommands = result["Value"]
+
+    @classmethod
+    def __flushHeartBeats(cls):
+        """Write the buffered heart beats, with a few bulk statements"""
+        with cls.__heartBeatLock:
+            heartBeats = cls.__heartBeats
+            cls.__heartBeats = {}
+
+        if heartBeats:
+            result = cls.jobDB.setHeartBeatDataBulk({jobID: beats[0] for jobID, beats in heartBeats.items()})
+            if not result["OK"]:
+                cls.log.error("Failed to set the heart beat data", result["Message"])
+                # Kept for the next flush, before the heart beats received since
+                with cls.__heartBeatLock:
+                    for jobID, (beats, staticData) in heartBeats.items():
+                        newBeats, newStaticData = cls.__heartBeats.get(jobID, ([], {}))
+                        staticData.update(newStaticData)
+                        cls.__heartBeats[jobID] = (beats + newBeats, staticData)
+                return
+            jobStatus = result["Value"]
+            now = time.time()
+            with cls.__heartBeatLock:
+                for jobID in set(heartBeats) - set(jobStatus):
+                    cls.__missingJobs[jobID] = now
+                # Forget the deleted jobs which stopped sending heart beats
+                for jobID, lastTime in list(cls.__missingJobs.items()):
+                    if now - lastTime > 86400:
+                        del cls.__missingJobs[jobID]
+
+            # Restore the Running status if necessary, the jobs may have reached a final status since
+            for jobID, status in jobStatus.items():
+                if status in (JobStatus.STALLED, JobStatus.MATCHED):
+                    result = cls.jobDB.setJobAttribute(
+                        jobID=jobID, attrName="Status", attrValue=JobStatus.RUNNING, update=True
+                    )
+                    if not result["OK"]:
+                        cls.log.warn("Failed to restore the job status to Running", "for job %d" % jobID)
+
+            # Only the existing jobs are left
+            staticData = {jobID: list(heartBeats[jobID][1].items()) for jobID in jobStatus}
+            if cls.elasticJobParametersDB:
+                for jobID, parameters in staticData.items():
+                    if parameters:
+                        result = cls.elasticJobParametersDB.setJobParameters(jobID, parameters)
+                        if not result["OK"]:
+                            cls.log.error("Failed to add Job Parameters to ElasticSearch", result["Message"])
+            else:
+                result = cls.jobDB.setJobParametersBulk(staticData)
+                if not result["OK"]:
+                    cls.log.error("Failed to add Job Parameters to MySQL", result["Message"])
+            cls.log.verbose("Heart beats flushed", "for %d jobs" % len(heartBeats))
+
+        cls.__refreshJobsWithCommands()
+
 
 class JobStateUpdateHandler(JobStateUpdateHandlerMixin, RequestHandler):
     pass
@@ -90,6 +90,44 @@ class MatcherHandlerMixin:
         # FIXME: This is correctly interpreted by the JobAgent, but DErrno should be used instead
         return S_ERROR("No match found")
 
+    ##############################################################################
+    types_requestJobs = [[str, dict], int]
+
+    def export_requestJobs(self, resourceDescription, maxJobs):
+        """Serve up to maxJobs jobs to the request of an agent that can run several of them,
+        with the same logic as requestJob. The number of jobs is capped by the MaxJobsPerRequest option
+        """
+
+        resourceDescription["Setup"] = self.serviceInfoDict["clientSetup"]
+        credDict = self.getRemoteCredentials()
+        pilotRef = resourceDescription.get("PilotReference", "Unknown")
+        maxJobs = max(1, min(maxJobs, self.srv_getCSOption("MaxJobsPerRequest", 100)))
+
+        try:
+            opsHelper = Operations(group=credDict["group"])
+            matcher = Matcher(
+                pilotAgentsDB=self.pilotAgentsDB,
+                jobDB=self.jobDB,
+                tqDB=self.taskQueueDB,
+                jlDB=self.jobLoggingDB,
+                opsHelper=opsHelper,
+                pilotRef=pilotRef,
+            )
+            result = matcher.selectJobs(resourceDescription, credDict, maxJobs)
+        except RuntimeError as rte:
+            self.log.error("Error requesting jobs for pilot", "[%s] %s" % (pilotRef, rte))
+            return S_ERROR("Error requesting job")
+        except PilotVersionError as pve:
+            self.log.warn("Pilot version error for pilot", "[%s] %s" % (pilotRef, pve))
+            return S_ERROR("Error requesting job")
+
+        # result can be empty, meaning that no job matched
+        if result:
+            gMonitor.addMark("matchesDone")
+            gMonitor.addMark("matchesOK", len(result))
+            return S_OK(result)
+        return S_ERROR("No match found")
+
     ##############################################################################
     types_getActiveTaskQueues = []
 
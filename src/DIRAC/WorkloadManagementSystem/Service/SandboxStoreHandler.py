@@ -1,6 +1,15 @@
 """ SandboxHandler is the implementation of the Sandbox service
     in the DISET framework
+
+    The sandboxes are received in a partial file, and hashed while they are received. An interrupted
+    upload can be resumed from what was received (see :py:meth:`SandboxStoreHandler.export_getSandboxUploadOffset`).
+
+    With the local backend, the content of the sandboxes is stored once per content hash, whoever uploads it:
+    the sandboxes of the users are registered at their own PFN, served from the shared content.
+    The content is always received: a client cannot claim a sandbox of someone else only knowing its hash.
 """
+import fcntl
+import hashlib
 import os
 import time
 import threading
@@ -20,6 +29,100 @@ from DIRAC.RequestManagementSystem.Client.File import File
 from DIRAC.Resources.Storage.StorageElement import StorageElement
 
 
+class SandboxUpload(object):
+    """Sandbox being received in a partial file, hashed while it is written
+
+    The partial file is locked while it is open: a sandbox cannot be uploaded twice at the same time
+    """
+
+    def __init__(self, filePath):
+        """
+        :param str filePath: path of the partial file
+        """
+        self.filePath = filePath
+        self.size = 0
+        self.md5 = hashlib.md5()
+        self.sha256 = hashlib.sha256()
+        self.__fd = None
+
+    def open(self, offset=0):
+        """Open and lock the partial file, to receive the sandbox from the beginning or to resume its upload
+
+        :param int offset: number of bytes already received, kept in the partial file
+
+        :return: S_OK/S_ERROR
+        """
+        if offset and (not os.path.isfile(self.filePath) or os.path.getsize(self.filePath) < offset):
+            return S_ERROR("Cannot resume the upload: less than %d bytes were received" % offset)
+        try:
+            mkDir(os.path.dirname(self.filePath))
+            # Not truncated before being locked
+            self.__fd = os.fdopen(os.open(self.filePath, os.O_RDWR | os.O_CREAT, 0o666), "r+b")
+            try:
+                fcntl.flock(self.__fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                self.close()
+                return S_ERROR("The sandbox is already being uploaded")
+            if os.fstat(self.__fd.fileno()).st_size < offset:
+                self.close()
+                return S_ERROR("Cannot resume the upload: less than %d bytes were received" % offset)
+            # The hashes of what was already received
+            while self.size < offset:
+                data = self.__fd.read(min(1048576, offset - self.size))
+                self.__update(data)
+            self.__fd.truncate(offset)
+        except (IOError, OSError) as e:
+            self.close()
+            gLogger.error("Cannot open the partial sandbox file", "%s: %s" % (self.filePath, repr(e)))
+            return S_ERROR("Cannot open the partial sandbox file")
+        return S_OK()
+
+    def __update(self, data):
+        self.md5.update(data)
+        self.sha256.update(data)
+        self.size += len(data)
+
+    def write(self, data):
+        """Write the data received, hashing it"""
+        self.__update(data)
+        self.__fd.write(data)
+
+    def verify(self):
+        """Check that the partial file holds what was received, before it is stored
+
+        :return: S_OK/S_ERROR
+        """
+        try:
+            self.__fd.flush()
+            if os.fstat(self.__fd.fileno()).st_size != self.size:
+                return S_ERROR("Size of the received sandbox does not match")
+            self.__fd.seek(0)
+            sha256 = hashlib.sha256()
+            for data in iter(lambda: self.__fd.read(1048576), b""):
+                sha256.update(data)
+        except (IOError, OSError) as e:
+            gLogger.error("Cannot read the partial sandbox file", "%s: %s" % (self.filePath, repr(e)))
+            return S_ERROR("Cannot read the partial sandbox file")
+        if sha256.hexdigest() != self.sha256.hexdigest():
+            return S_ERROR("Hash of the received sandbox does not match")
+        return S_OK()
+
+    def close(self):
+        """Close the partial file, keeping what was received, and release its lock"""
+        if self.__fd:
+            self.__fd.close()
+            self.__fd = None
+
+    def remove(self):
+        """Remove the partial file"""
+        # Still locked, not to remove the file of another upload
+        try:
+            os.unlink(self.filePath)
+        except OSError as e:
+            gLogger.warn("Could not unlink file %s: %s" % (self.filePath, repr(e).replace(",)", ")")))
+        self.close()
+
+
 class SandboxStoreHandler(RequestHandler):
 
     __purgeCount = -1
@@ -70,23 +173,51 @@ class SandboxStoreHandler(RequestHandler):
         pathItems.extend([md5[0:3], md5[3:6], md5])
         return os.path.join(*pathItems)
 
+    def __getUploadPath(self, sbPath):
+        """Path of the partial file of a sandbox being uploaded"""
+        return self.__sbToHDPath("/Uploads%s.part" % sbPath)
+
+    types_getSandboxUploadOffset = [str]
+
+    def export_getSandboxUploadOffset(self, fileId):
+        """
+        Get the number of bytes received of an interrupted upload, to resume it from there
+
+        :param str fileId: file name of the sandbox, as given to transfer_fromClient
+
+        :returns: S_OK with the number of bytes received
+        """
+        uploadPath = self.__getUploadPath(self.__getSandboxPath(fileId))
+        if not os.path.isfile(uploadPath):
+            return S_OK(0)
+        return S_OK(os.path.getsize(uploadPath))
+
     def transfer_fromClient(self, fileId, token, fileSize, fileHelper):
         """
         Receive a file as a sandbox
+
+        fileId is the file name of the sandbox (<md5>.tar.bz2), or a tuple (file name, assignTo),
+        or (file name, assignTo, offset) to resume an upload from offset.
         """
 
         if self.__maxUploadBytes and fileSize > self.__maxUploadBytes:
             fileHelper.markAsTransferred()
             return S_ERROR("Sandbox is too big. Please upload it to a grid storage element")
 
+        offset = 0
         if isinstance(fileId, (list, tuple)):
             if len(fileId) > 1:
                 assignTo = fileId[1]
+                if len(fileId) > 2:
+                    offset = fileId[2]
                 fileId = fileId[0]
             else:
                 return S_ERROR("File identified tuple has to have length greater than 1")
         else:
             assignTo = {}
+        if not isinstance(offset, int) or offset < 0:
+            fileHelper.markAsTransferred()
+            return S_ERROR("Invalid offset to resume the upload: %s" % (offset,))
 
         extPos = fileId.find(".tar")
         if extPos > -1:
@@ -95,7 +226,7 @@ class SandboxStoreHandler(RequestHandler):
         else:
             extension = ""
             aHash = fileId
-        gLogger.info("Upload requested for %s [%s]" % (aHash, extension))
+        gLogger.info("Upload requested for %s [%s]" % (aHash, extension), "from byte %d" % offset if offset else "")
 
         credDict = self.getRemoteCredentials()
         sbPath = self.__getSandboxPath("%s.%s" % (aHash, extension))
@@ -116,30 +247,48 @@ class SandboxStoreHandler(RequestHandler):
                 return result
             return S_OK(sbURL)
 
-        if self.__useLocalStorage:
-            hdPath = self.__sbToHDPath(sbPath)
-        else:
-            hdPath = False
-        # Write to local file
-        result = self.__networkToFile(fileHelper, hdPath)
+        # Receive the sandbox in the partial file, hashing it on the fly
+        upload = SandboxUpload(self.__getUploadPath(sbPath))
+        result = upload.open(offset)
         if not result["OK"]:
-            gLogger.error("Error while receiving sandbox file", "%s" % result["Message"])
+            fileHelper.markAsTransferred()
             return result
-        hdPath = result["Value"]
-        gLogger.info("Wrote sandbox to file %s" % hdPath)
-        # Check hash!
-        if fileHelper.getHash() != aHash:
-            self.__secureUnlinkFile(hdPath)
-            gLogger.error("Hashes don't match! Client defined hash is different with received data hash!")
-            return S_ERROR("Hashes don't match!")
-        # If using remote storage, copy there!
-        if not self.__useLocalStorage:
-            gLogger.info("Uploading sandbox to external storage")
-            result = self.__copyToExternalSE(hdPath, sbPath)
-            self.__secureUnlinkFile(hdPath)
+        # The partial file stays locked until it is stored
+        try:
+            maxFileSize = max(self.__maxUploadBytes - offset, 1) if self.__maxUploadBytes else 0
+            result = fileHelper.networkToDataSink(upload, maxFileSize=maxFileSize)
+            if not result["OK"]:
+                gLogger.error("Error while receiving sandbox file", "%s" % result["Message"])
+                # What was received is kept for the upload to be resumed, unless it is corrupted
+                if fileHelper.errorInTransmission():
+                    upload.remove()
+                return result
+            gLogger.info("Received sandbox", "%s (%d bytes)" % (upload.filePath, upload.size))
+            # Check hash!
+            if upload.md5.hexdigest() != aHash:
+                upload.remove()
+                gLogger.error("Hashes don't match! Client defined hash is different with received data hash!")
+                return S_ERROR("Hashes don't match!")
+            result = upload.verify()
             if not result["OK"]:
+                upload.remove()
+                gLogger.error("Partial sandbox file is corrupted", "%s: %s" % (upload.filePath, result["Message"]))
                 return result
-            sbPath = result["Value"][1]
+            contentHash = upload.sha256.hexdigest()
+            if self.__useLocalStorage:
+                result = self.__storeContent(upload, contentHash, extension)
+                if not result["OK"]:
+                    return result
+            else:
+                # If using remote storage, copy there!
+                gLogger.info("Uploading sandbox to external storage")
+                result = self.__copyToExternalSE(upload.filePath, sbPath)
+                upload.remove()
+                if not result["OK"]:
+                    return result
+                sbPath = result["Value"][1]
+        finally:
+            upload.close()
         # Register!
         gLogger.info("Registering sandbox in the DB with", "SB:%s|%s" % (self.__seNameToUse, sbPath))
         result = self.sandboxDB.registerAndGetSandbox(
@@ -148,11 +297,16 @@ class SandboxStoreHandler(RequestHandler):
             credDict["group"],
             self.__seNameToUse,
             sbPath,
-            fileHelper.getTransferedBytes(),
+            upload.size,
         )
         if not result["OK"]:
-            self.__secureUnlinkFile(hdPath)
             return result
+        sbId, newSandbox = result["Value"]
+        if self.__useLocalStorage and newSandbox:
+            result = self.sandboxDB.assignContentToSandbox(sbId, contentHash, upload.size, self.__seNameToUse)
+            if not result["OK"]:
+                self.sandboxDB.deleteSandboxes([sbId])
+                return result
 
         sbURL = "SB:%s|%s" % (self.__seNameToUse, sbPath)
         assignTo = dict([(key, [(sbURL, assignTo[key])]) for key in assignTo])
@@ -161,6 +315,33 @@ class SandboxStoreHandler(RequestHandler):
             return result
         return S_OK(sbURL)
 
+    def __storeContent(self, upload, contentHash, extension):
+        """Store a sandbox received with the local backend at the location of its content,
+        unless this content is already stored
+
+        :return: S_OK with the PFN of the content
+        """
+        contentPFN = "/SandBox/Contents/%s/%s/%s.%s" % (contentHash[0:2], contentHash[2:4], contentHash, extension)
+        result = self.sandboxDB.registerContent(contentHash, upload.size, self.__seNameToUse, contentPFN)
+        if not result["OK"]:
+            upload.remove()
+            return result
+        contentPFN = result["Value"]
+        hdPath = self.__sbToHDPath(contentPFN)
+        if os.path.isfile(hdPath):
+            gLogger.info("Sandbox content already stored", contentPFN)
+            upload.remove()
+            return S_OK(contentPFN)
+        mkDir(os.path.dirname(hdPath))
+        try:
+            os.rename(upload.filePath, hdPath)
+        except OSError as e:
+            upload.remove()
+            errMsg = "Cannot move sandbox to its final path"
+            gLogger.error(errMsg, repr(e).replace(",)", ")"))
+            return S_ERROR(errMsg)
+        return S_OK(contentPFN)
+
     def transfer_bulkFromClient(self, fileId, token, _fileSize, fileHelper):
         """Receive files packed into a tar archive by the fileHelper logic.
         token is used for access rights confirmation.
@@ -405,6 +586,12 @@ class SandboxStoreHandler(RequestHandler):
             return result
         sbId = result["Value"]
         self.sandboxDB.accessedSandboxById(sbId)
+        # The content of the sandbox may be shared with other sandboxes
+        result = self.sandboxDB.getSandboxContentPFN(sbId)
+        if not result["OK"]:
+            return result
+        if result["Value"]:
+            filePath = result["Value"]
         # If it's a local file
         hdPath = self.__sbToHDPath(filePath)
         if not os.path.isfile(hdPath):
@@ -446,9 +633,45 @@ class SandboxStoreHandler(RequestHandler):
                 gLogger.info("Purging", "%d out of %d" % (i, len(sbList)))
             self.__purgeSandbox(sbId, SEName, SEPFN)
 
+        # Contents no longer used by any sandbox
+        result = self.sandboxDB.getUnusedContents()
+        if not result["OK"]:
+            gLogger.error("Error while retrieving sandbox contents to purge", result["Message"])
+        else:
+            gLogger.info("Got sandbox contents to purge", "(%d)" % len(result["Value"]))
+            for contentId, SEName, SEPFN in result["Value"]:
+                result = self.sandboxDB.deleteContent(contentId)
+                if not result["OK"]:
+                    gLogger.error("Cannot delete sandbox content from DB", result["Message"])
+                elif result["Value"]:
+                    result = self.__deleteSandboxFromBackend(SEName, SEPFN)
+                    if not result["OK"]:
+                        gLogger.error("Cannot delete sandbox content from backend", result["Message"])
+
+        self.__purgePartialUploads()
+
         SandboxStoreHandler.__purgeWorking = False
         return S_OK()
 
+    def __purgePartialUploads(self):
+        """Remove the partial files of the uploads that were not resumed"""
+        graceTime = self.getCSOption("PartialUploadGraceDays", 2) * 86400
+        uploadsDir = self.__sbToHDPath("/Uploads")
+        for dirPath, _dirNames, fileNames in os.walk(uploadsDir, topdown=False):
+            for fileName in fileNames:
+                filePath = os.path.join(dirPath, fileName)
+                try:
+                    if time.time() - os.path.getmtime(filePath) > graceTime:
+                        gLogger.info("Purging partial upload", filePath)
+                        os.unlink(filePath)
+                except OSError as e:
+                    gLogger.error("Cannot purge partial upload", "%s : %s" % (filePath, repr(e).replace(",)", ")")))
+            if dirPath != uploadsDir and not os.listdir(dirPath):
+                try:
+                    os.rmdir(dirPath)
+                except OSError:
+                    pass
+
     def __purgeSandbox(self, sbId, SEName, SEPFN):
         result = self.__deleteSandboxFromBackend(SEName, SEPFN)
         if not result["OK"]:
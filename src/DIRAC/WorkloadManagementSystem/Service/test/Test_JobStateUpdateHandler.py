@@ -0,0 +1,73 @@
+""" Test of the buffering of the heart beats in the JobStateUpdateHandler
+"""
+# pylint: disable=protected-access
+
+from mock import MagicMock
+
+from DIRAC import S_OK, S_ERROR
+from DIRAC.WorkloadManagementSystem.Service.JobStateUpdateHandler import JobStateUpdateHandlerMixin
+
+
+class Handler(JobStateUpdateHandlerMixin):
+    log = MagicMock()
+    heartBeatFlushPeriod = 10
+    elasticJobParametersDB = None
+
+
+def test_heartBeats():
+    Handler.jobDB = MagicMock()
+    # The job 1 is stalled, the job 3 was deleted
+    Handler.jobDB.setHeartBeatDataBulk.side_effect = lambda heartBeats: S_OK(
+        {jobID: "Stalled" for jobID in heartBeats if jobID != 3}
+    )
+    Handler.jobDB.getJobIDsWithCommand.return_value = S_OK({2})
+    Handler.jobDB.getJobCommand.return_value = S_OK({"Kill": ""})
+
+    assert Handler.export_sendHeartBeat(1, {"LoadAverage": 1.5}, {"CPUNormalizationFactor": 10})["Value"] == {}
+    assert Handler.export_sendHeartBeat("1", {"LoadAverage": 2.0}, {})["Value"] == {}
+    assert Handler.export_sendHeartBeat(3, {"LoadAverage": 1.0}, {})["OK"]
+    # Nothing written yet
+    Handler.jobDB.setHeartBeatData.assert_not_called()
+    Handler.jobDB.getJobCommand.assert_not_called()
+
+    Handler._JobStateUpdateHandlerMixin__flushHeartBeats()
+    heartBeats = Handler.jobDB.setHeartBeatDataBulk.call_args[0][0]
+    assert sorted(heartBeats) == [1, 3]
+    assert [data for _, data in heartBeats[1]] == [{"LoadAverage": 1.5}, {"LoadAverage": 2.0}]
+    Handler.jobDB.setJobParametersBulk.assert_called_once_with({1: [("CPUNormalizationFactor", 10)]})
+    Handler.jobDB.setJobAttribute.assert_called_once_with(jobID=1, attrName="Status", attrValue="Running", update=True)
+
+    # The deleted job is told so
+    result = Handler.export_sendHeartBeat(3, {"LoadAverage": 1.0}, {})
+    assert not result["OK"]
+    assert result["Message"] == "Job 3 not found"
+
+    # The job 2 has a command waiting
+    assert Handler.export_sendHeartBeat(2, {}, {})["Value"] == {"Kill": ""}
+    Handler.jobDB.setJobCommandStatus.assert_called_once_with(2, "Kill", "Sent")
+
+
+def test_heartBeatsFlushFailure():
+    class FailingHandler(Handler):
+        _JobStateUpdateHandlerMixin__heartBeats = {}
+        _JobStateUpdateHandlerMixin__missingJobs = {}
+        _JobStateUpdateHandlerMixin__jobsWithCommands = set()
+        jobDB = MagicMock()
+
+    FailingHandler.jobDB.setHeartBeatDataBulk.return_value = S_ERROR("DB unavailable")
+    FailingHandler.export_sendHeartBeat(1, {"LoadAverage": 1.5}, {"CPUNormalizationFactor": 10, "Memory": 1})
+    FailingHandler._JobStateUpdateHandlerMixin__flushHeartBeats()
+    FailingHandler.jobDB.setJobParametersBulk.assert_not_called()
+    FailingHandler.jobDB.setJobAttribute.assert_not_called()
+
+    # The heart beats are kept for the next flush, before the ones received since
+    FailingHandler.export_sendHeartBeat(1, {"LoadAverage": 2.0}, {"Memory": 2})
+    FailingHandler.export_sendHeartBeat(2, {"LoadAverage": 1.0}, {})
+    FailingHandler.jobDB.setHeartBeatDataBulk.return_value = S_OK({1: "Running", 2: "Running"})
+    FailingHandler._JobStateUpdateHandlerMixin__flushHeartBeats()
+    heartBeats = FailingHandler.jobDB.setHeartBeatDataBulk.call_args[0][0]
+    assert sorted(heartBeats) == [1, 2]
+    assert [data for _, data in heartBeats[1]] == [{"LoadAverage": 1.5}, {"LoadAverage": 2.0}]
+    FailingHandler.jobDB.setJobParametersBulk.assert_called_once_with(
+        {1: [("CPUNormalizationFactor", 10), ("Memory", 2)], 2: []}
+    )
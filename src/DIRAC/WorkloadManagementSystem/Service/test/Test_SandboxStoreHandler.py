@@ -0,0 +1,87 @@
+""" Test of the reception of the sandboxes in the SandboxStoreHandler
+"""
+import hashlib
+import os
+
+from DIRAC.WorkloadManagementSystem.Service.SandboxStoreHandler import SandboxUpload
+
+DATA = os.urandom(3 * 1048576 + 123)
+
+
+def test_upload(tmp_path):
+    filePath = str(tmp_path / "Uploads" / "sb.tar.bz2.part")
+    upload = SandboxUpload(filePath)
+    assert upload.open()["OK"]
+    for i in range(0, len(DATA), 100000):
+        upload.write(DATA[i : i + 100000])
+    upload.close()
+
+    assert upload.size == len(DATA)
+    assert upload.md5.hexdigest() == hashlib.md5(DATA).hexdigest()
+    assert upload.sha256.hexdigest() == hashlib.sha256(DATA).hexdigest()
+    with open(filePath, "rb") as fd:
+        assert fd.read() == DATA
+
+    upload.remove()
+    assert not os.path.exists(filePath)
+
+
+def test_resume(tmp_path):
+    filePath = str(tmp_path / "sb.tar.bz2.part")
+    offset = 2 * 1048576 + 17
+    # An interrupted upload, having received more than what the client knows of
+    with open(filePath, "wb") as fd:
+        fd.write(DATA[: offset + 1000])
+
+    upload = SandboxUpload(filePath)
+    assert upload.open(offset)["OK"]
+    assert upload.size == offset
+    upload.write(DATA[offset:])
+    upload.close()
+
+    assert upload.size == len(DATA)
+    assert upload.md5.hexdigest() == hashlib.md5(DATA).hexdigest()
+    assert upload.sha256.hexdigest() == hashlib.sha256(DATA).hexdigest()
+    with open(filePath, "rb") as fd:
+        assert fd.read() == DATA
+
+    # Cannot resume beyond what was received
+    assert not SandboxUpload(filePath).open(len(DATA) + 1)["OK"]
+    assert not SandboxUpload(str(tmp_path / "unknown.part")).open(10)["OK"]
+
+
+def test_concurrentUpload(tmp_path):
+    filePath = str(tmp_path / "sb.tar.bz2.part")
+    upload = SandboxUpload(filePath)
+    assert upload.open()["OK"]
+    upload.write(DATA)
+
+    # The partial file of an upload in progress is neither truncated nor written by another one
+    assert not SandboxUpload(filePath).open()["OK"]
+    assert upload.verify()["OK"]
+    upload.close()
+    with open(filePath, "rb") as fd:
+        assert fd.read() == DATA
+
+    other = SandboxUpload(filePath)
+    assert other.open()["OK"]
+    other.close()
+    assert os.path.getsize(filePath) == 0
+
+
+def test_verify(tmp_path):
+    filePath = str(tmp_path / "sb.tar.bz2.part")
+    upload = SandboxUpload(filePath)
+    assert upload.open()["OK"]
+    upload.write(DATA)
+    assert upload.verify()["OK"]
+
+    # Modified behind the back of the upload
+    with open(filePath, "r+b") as fd:
+        fd.write(b"corrupted")
+    assert not upload.verify()["OK"]
+    with open(filePath, "ab") as fd:
+        fd.write(b"more")
+    assert not upload.verify()["OK"]
+    upload.remove()
+    assert not os.path.exists(filePath)
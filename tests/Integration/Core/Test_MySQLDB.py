@@ -5,6 +5,7 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 
+import threading
 import time
 import pytest
 
@@ -298,3 +299,101 @@ def test_deleteEntries(name, fields, requiredFields, values, table, cond, expect
     result = mysqlDB.getCounters(name, fields, {})
     assert result["OK"], result["Message"]
     assert result["Value"] == []
+
+
+def test_connectionPool():
+    """Queries from many threads share a bounded number of connections"""
+    mysqlDB = setupDB()
+
+    def runQueries():
+        for _ in range(20):
+            result = mysqlDB._query("SELECT 1")
+            assert result["OK"], result["Message"]
+
+    threads = [threading.Thread(target=runQueries) for _ in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    result = mysqlDB.getConnectionPoolStats()
+    assert result["OK"], result["Message"]
+    stats = result["Value"]
+    assert stats["Size"] <= stats["MaxConnections"]
+    # Connections are checked back in once the queries are done
+    assert stats["InUse"] == 0
+    assert stats["Idle"] == stats["Size"]
+    assert stats["Checkouts"] >= 1
+
+
+def test_transactionPinsConnection():
+    """A transaction keeps the same connection until it is committed"""
+    mysqlDB = setupDB()
+
+    result = mysqlDB.transactionStart()
+    assert result["OK"], result["Message"]
+    assert mysqlDB.getConnectionPoolStats()["Value"]["InUse"] == 1
+
+    result = mysqlDB._query("SELECT CONNECTION_ID()")
+    assert result["OK"], result["Message"]
+    connectionID = result["Value"][0][0]
+    result = mysqlDB._query("SELECT CONNECTION_ID()")
+    assert result["OK"], result["Message"]
+    assert result["Value"][0][0] == connectionID
+
+    result = mysqlDB.transactionCommit()
+    assert result["OK"], result["Message"]
+    assert mysqlDB.getConnectionPoolStats()["Value"]["InUse"] == 0
+
+
+def test_closedConnection():
+    """A connection closed or killed while kept by the thread is replaced"""
+    mysqlDB = setupDB()
+
+    result = mysqlDB._getConnection()
+    assert result["OK"], result["Message"]
+    result["Value"].close()
+    result = mysqlDB._query("SELECT 1")
+    assert result["OK"], result["Message"]
+
+    result = mysqlDB._query("SELECT CONNECTION_ID()")
+    assert result["OK"], result["Message"]
+    connectionID = result["Value"][0][0]
+    # Killing its own connection
+    mysqlDB._update("KILL %d" % connectionID)
+    result = mysqlDB._query("SELECT CONNECTION_ID()")
+    assert result["OK"], result["Message"]
+    assert result["Value"][0][0] != connectionID
+
+
+def test_insertFieldsBulk():
+    """Insert rows in chunks, with and without time functions"""
+    mysqlDB = setupDB()
+    result = mysqlDB._createTables(table, force=True)
+    assert result["OK"], result["Message"]
+
+    rows = [("name%d" % i, "Surn'%d" % i, i, "UTC_TIMESTAMP()") for i in range(25)]
+    rows += [("name%d" % i, 'Surn"%d' % i, i, "2021-01-01 10:00:00") for i in range(25, 30)]
+    result = mysqlDB.insertFieldsBulk(name, allFields, rows, chunkSize=10)
+    assert result["OK"], result["Message"]
+    assert result["Value"] == 30
+
+    result = mysqlDB.getFields(name, ["Surname"], {"Count": [3, 27]}, orderAttribute="Count")
+    assert result["OK"], result["Message"]
+    assert result["Value"] == (("Surn'3",), ('Surn"27',))
+
+    result = mysqlDB.insertFieldsBulk(name, allFields, [("name", "Surname", 1)])
+    assert not result["OK"]
+
+
+def test_percentInValues():
+    """Values and conditions with % are not mistaken for parameters placeholders"""
+    mysqlDB = setupDBCreateTableInsertFields(table, reqFields, [["100%", "%s", 1]])
+
+    result = mysqlDB.updateFields(name, ["Surname"], ["50%"], condDict={"Name": "100%"})
+    assert result["OK"], result["Message"]
+    assert result["Value"] == 1
+
+    result = mysqlDB.getFields(name, ["Name", "Surname"])
+    assert result["OK"], result["Message"]
+    assert result["Value"] == (("100%", "50%"),)
@@ -17,6 +17,7 @@ from pytest import fixture
 
 from DIRAC.RequestManagementSystem.DB.RequestDB import RequestDB
 from DIRAC.RequestManagementSystem.DB.test.RMSTestScenari import (
+    test_bulkJSON,
     test_dirty,
     test_scheduled,
     test_stress,
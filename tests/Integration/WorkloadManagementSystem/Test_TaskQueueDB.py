@@ -20,7 +20,7 @@ from DIRAC.Core.Base.Script import parseCommandLine
 
 parseCommandLine()
 
-from DIRAC.WorkloadManagementSystem.DB.TaskQueueDB import TaskQueueDB
+from DIRAC.WorkloadManagementSystem.DB.TaskQueueDB import TaskQueueDB, TaskQueueIndex
 
 
 gLogger.setLevel("DEBUG")
@@ -1169,6 +1169,91 @@ def test_ComplexMatching():
         assert result["OK"] is True
 
 
+def test_TaskQueueIndex():
+    """the in-memory index has to give the same task queues as the SQL matching"""
+    tqDefs = [
+        {"Sites": ["Site_1", "Site_2"], "Platforms": ["centos7"]},
+        {"Sites": ["Site_1"], "Platforms": ["slc6", "centos7"], "Tags": ["MultiProcessor"]},
+        {"BannedSites": ["Site_2"], "Tags": ["MultiProcessor", "GPU"]},
+        {"GridCEs": ["ce1.site1"], "JobTypes": ["User"]},
+        {"CPUTime": 500000},
+        {},
+    ]
+    tqIds = []
+    for jobId, tqDef in enumerate(tqDefs, start=1):
+        tqDefDict = {"OwnerDN": "/my/DN", "OwnerGroup": "prod", "Setup": "aSetup", "CPUTime": 5000}
+        tqDefDict.update(tqDef)
+        result = tqDB.insertJob(jobId, tqDefDict, 10)
+        assert result["OK"] is True
+        result = tqDB.getTaskQueueForJobs([jobId])
+        assert result["OK"] is True
+        tqIds.append(result["Value"][jobId])
+
+    result = tqDB.retrieveTaskQueues()
+    assert result["OK"] is True
+    tqIndex = TaskQueueIndex()
+    tqIndex.load(result["Value"])
+
+    matchDicts = [
+        ({"Setup": "aSetup", "CPUTime": 9999999}, None),
+        ({"Setup": "aSetup", "CPUTime": 10000}, None),
+        ({"Setup": "aSetup", "CPUTime": 9999999, "Site": "Site_2", "Tag": "ANY"}, None),
+        ({"Setup": "aSetup", "CPUTime": 9999999, "Site": ["Site_1", "Site_3"], "Platform": "slc6"}, None),
+        ({"Setup": "aSetup", "CPUTime": 9999999, "Tag": ["MultiProcessor", "GPU"], "RequiredTag": "GPU"}, None),
+        ({"Setup": "aSetup", "CPUTime": 9999999, "GridCE": "ce1.site1", "JobType": ["User", "Test"]}, None),
+        ({"Setup": "aSetup", "CPUTime": 9999999, "BannedSite": ["Site_1"], "Tag": "ANY"}, None),
+        ({"Setup": "aSetup", "CPUTime": 9999999, "OwnerGroup": "prod", "OwnerDN": "/my/DN"}, None),
+        ({"Setup": "aSetup", "CPUTime": 9999999, "Tag": "ANY"}, {"Site": ["Site_1"]}),
+        ({"Setup": "aSetup", "CPUTime": 9999999, "Tag": "ANY"}, [{"JobType": "User"}, {"Site": "Site_2"}]),
+        ({"Setup": "anotherSetup", "CPUTime": 9999999}, None),
+    ]
+    for matchDict, negativeCond in matchDicts:
+        result = tqDB.matchAndGetTaskQueue(matchDict, numQueuesToGet=0, negativeCond=negativeCond)
+        assert result["OK"] is True
+        fromSQL = set(int(x[0]) for x in result["Value"])
+        result = tqIndex.match(matchDict, numQueuesToGet=0, negativeCond=negativeCond)
+        assert result["OK"] is True
+        assert set(x[0] for x in result["Value"]) == fromSQL, matchDict
+
+    for jobId in range(1, len(tqDefs) + 1):
+        result = tqDB.deleteJob(jobId)
+        assert result["OK"] is True
+
+    for tqId in tqIds:
+        result = tqDB.deleteTaskQueueIfEmpty(tqId)
+        assert result["OK"] is True
+
+
+def test_matchAndGetJobs():
+    """matching several jobs at once"""
+    tqDefDict = {"OwnerDN": "/my/DN", "OwnerGroup": "myGroup", "Setup": "aSetup", "CPUTime": 50000}
+    for jobId in (201, 202, 203):
+        result = tqDB.insertJob(jobId, tqDefDict, 10)
+        assert result["OK"] is True
+    result = tqDB.getTaskQueueForJobs([201])
+    tq = result["Value"][201]
+
+    result = tqDB.matchAndGetJobs({"Setup": "aSetup", "CPUTime": 300000}, 2)
+    assert result["OK"] is True
+    assert result["Value"]["matchFound"] is True
+    jobs = result["Value"]["jobs"]
+    assert len(jobs) == 2
+    assert set(tqId for _, tqId in jobs) == {tq}
+
+    # Only one is left
+    result = tqDB.matchAndGetJobs({"Setup": "aSetup", "CPUTime": 300000}, 2)
+    assert result["OK"] is True
+    assert len(result["Value"]["jobs"]) == 1
+    assert set(jobId for jobId, _ in jobs + result["Value"]["jobs"]) == {201, 202, 203}
+
+    result = tqDB.matchAndGetJobs({"Setup": "aSetup", "CPUTime": 300000}, 2)
+    assert result["OK"] is True
+    assert result["Value"]["matchFound"] is False
+
+    result = tqDB.deleteTaskQueueIfEmpty(tq)
+    assert result["OK"] is True
+
+
 def test_TQ():
     """test of various functions"""
     tqDefDict = {"OwnerDN": "/my/DN", "OwnerGroup": "myGroup", "Setup": "aSetup", "CPUTime": 50000}
@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+""" Benchmark of the ingestion of accounting records in the AccountingDB
+
+    Records like the pilot ones, coming from a few users, sites and CEs, are inserted in a
+    dedicated type and the number of records per second is measured with:
+
+      * record:     insertRecordDirectly for each record, one bucket upsert per record,
+                    as the records used to be loaded from the in table
+      * aggregated: insertRecordsDirectly for bundles of records, the records falling in the same
+                    buckets being summed in memory and written with one multi-row upsert per bundle
+
+    The AccountingDB section of the local configuration is used. The benchmark type and its
+    tables are deleted at the end.
+
+    Usage::
+
+      python benchmark_ingest.py [--records N] [--bundle B] [--keys K]
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import argparse
+import random
+import time
+
+from DIRAC.Core.Base.Script import parseCommandLine
+
+TYPE_NAME = "Benchmark_Ingest"
+KEY_FIELDS = [("User", "VARCHAR(64)"), ("Site", "VARCHAR(64)"), ("GridCE", "VARCHAR(128)"), ("Status", "VARCHAR(32)")]
+VALUE_FIELDS = [("Jobs", "INT UNSIGNED"), ("CPUTime", "BIGINT UNSIGNED")]
+BUCKETS_LENGTH = [(86400 * 8, 900), (86400 * 35, 3600), (86400 * 400, 86400)]
+
+
+def generateRecords(recordsNumber, keysNumber):
+    """Records of the last hour, with keysNumber different values per key"""
+    now = int(time.time())
+    records = []
+    for _ in range(recordsNumber):
+        endTime = now - random.randint(0, 3600)
+        startTime = endTime - random.randint(0, 600)
+        keyValues = ["%s%d" % (name, random.randint(1, keysNumber)) for name, _ in KEY_FIELDS]
+        records.append((startTime, endTime, keyValues + [1, random.randint(0, 100000)]))
+    return records
+
+
+def run(acDB, mode, records, bundleSize):
+    """Insert the records in a new type, return the elapsed time"""
+    result = acDB.registerType(TYPE_NAME, KEY_FIELDS, VALUE_FIELDS, list(BUCKETS_LENGTH))
+    if not result["OK"]:
+        raise RuntimeError(result["Message"])
+    try:
+        start = time.time()
+        if mode == "record":
+            for startTime, endTime, valuesList in records:
+                result = acDB.insertRecordDirectly(TYPE_NAME, startTime, endTime, list(valuesList))
+                if not result["OK"]:
+                    raise RuntimeError(result["Message"])
+        else:
+            for index in range(0, len(records), bundleSize):
+                result = acDB.insertRecordsDirectly(TYPE_NAME, records[index : index + bundleSize])
+                if not result["OK"]:
+                    raise RuntimeError(result["Message"])
+        return time.time() - start
+    finally:
+        acDB.deleteType(TYPE_NAME)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--records", type=int, default=10000, help="number of records to insert")
+    parser.add_argument("--bundle", type=int, default=100, help="records per bundle (RecordsPerSlot)")
+    parser.add_argument("--keys", type=int, default=5, help="different values per key field")
+    args, _ = parser.parse_known_args()
+    parseCommandLine()
+
+    from DIRAC.AccountingSystem.DB.AccountingDB import AccountingDB
+
+    acDB = AccountingDB()
+    records = generateRecords(args.records, args.keys)
+    print("%-12s %10s %10s %12s %18s" % ("mode", "records", "bundle", "time (s)", "records per second"))
+    for mode in ("record", "aggregated"):
+        elapsed = run(acDB, mode, records, args.bundle)
+        print(
+            "%-12s %10d %10d %12.2f %18.0f"
+            % (mode, len(records), args.bundle if mode == "aggregated" else 1, elapsed, len(records) / elapsed)
+        )
+
+
+if __name__ == "__main__":
+    main()
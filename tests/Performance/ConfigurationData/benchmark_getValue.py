@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+""" Benchmark of the configuration lookups under concurrency
+
+    Several threads read options of a synthetic configuration through ConfigurationData.extractOptionFromCFG
+    (what gConfig.getValue ends up calling) and the throughput of the lookups is measured with:
+
+      * snapshot: the lookups in the merged configuration, served from the flat snapshot without locking
+      * walk:     the lookups in a copy of the merged configuration, going through the nested CFG sections
+                  inside the danger zones, like all the lookups used to be done
+
+    Usage::
+
+      python benchmark_getValue.py [--threads 32] [--lookups 20000] [--sections 200]
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import argparse
+import random
+import threading
+import time
+
+from DIRAC.ConfigurationSystem.private.ConfigurationData import ConfigurationData
+
+
+def makeConfiguration(sections):
+    """A configuration shaped like the Systems and Resources sections of a big installation"""
+    lines = ["DIRAC", "{", "  Setup = Production", "}", "Systems", "{"]
+    paths = ["/DIRAC/Setup"]
+    for system in range(sections):
+        lines += ["  System%d" % system, "  {", "    Production", "    {", "      Services", "      {"]
+        for service in range(5):
+            lines += ["        Service%d" % service, "        {"]
+            for option in range(10):
+                lines.append("          Option%d = value%d" % (option, option))
+                paths.append("/Systems/System%d/Production/Services/Service%d/Option%d" % (system, service, option))
+            lines.append("        }")
+        lines += ["      }", "    }", "  }"]
+    lines.append("}")
+    return "\n".join(lines), paths
+
+
+def run(confData, cfg, paths, threadsNumber, lookups):
+    """Run the lookups in parallel, return the number of lookups per second"""
+    start = threading.Event()
+
+    def worker():
+        selected = [random.choice(paths) for _ in range(lookups)]
+        start.wait()
+        for path in selected:
+            if confData.extractOptionFromCFG(path, cfg) is None:
+                raise RuntimeError("Option %s not found" % path)
+
+    threads = [threading.Thread(target=worker) for _ in range(threadsNumber)]
+    for thread in threads:
+        thread.start()
+    startTime = time.time()
+    start.set()
+    for thread in threads:
+        thread.join()
+    return threadsNumber * lookups / (time.time() - startTime)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, default=32, help="number of reading threads")
+    parser.add_argument("--lookups", type=int, default=20000, help="lookups per thread")
+    parser.add_argument("--sections", type=int, default=200, help="number of synthetic systems")
+    args = parser.parse_args()
+
+    confData = ConfigurationData(loadDefaultCFG=False)
+    cfgData, paths = makeConfiguration(args.sections)
+    start = time.time()
+    confData.loadRemoteCFGFromMem(cfgData)
+    print("Loaded %d options in %.3f s" % (len(paths), time.time() - start))
+
+    print("%-10s %8s %18s" % ("lookup", "threads", "lookups per second"))
+    for name, cfg in (("snapshot", confData.mergedCFG), ("walk", confData.mergedCFG.clone())):
+        rate = run(confData, cfg, paths, args.threads, args.lookups)
+        print("%-10s %8d %18.0f" % (name, args.threads, rate))
+
+
+if __name__ == "__main__":
+    main()
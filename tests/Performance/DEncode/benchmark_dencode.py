@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+""" Benchmark of the DEncode serialization on payloads shaped like the biggest RPC answers
+    (bulk getReplicas, getJobParameters, getTransformationFiles).
+
+    It measures encoding and decoding times of the current DEncode module, and compares them
+    with the JSON encoding and, optionally, with a reference implementation of DEncode
+    (for example the version of a previous release), checking that both produce the same stream.
+
+    Usage::
+
+      python benchmark_dencode.py [--size N] [--repeat R] [--reference path/to/DEncode.py]
+
+    A reference implementation can be extracted from git with::
+
+      git show v7r2:src/DIRAC/Core/Utilities/DEncode.py > /tmp/DEncode_ref.py
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import argparse
+import datetime
+import importlib.util
+import timeit
+
+from DIRAC.Core.Utilities import DEncode, JEncode
+
+
+def replicasPayload(size):
+    """Answer of a bulk getReplicas"""
+    successful = {}
+    for i in range(size):
+        lfn = "/lhcb/MC/2018/ALLSTREAMS.DST/00012345/%04d/00012345_%08d_7.AllStreams.dst" % (i // 1000, i)
+        successful[lfn] = {
+            "CERN-DST-EOS": "root://eoslhcb.cern.ch//eos/lhcb/grid/prod%s" % lfn,
+            "GRIDKA-DST": "srm://gridka-dcache.fzk.de:8443/srm/managerv2?SFN=/pnfs/gridka.de/lhcb%s" % lfn,
+        }
+    return {"OK": True, "Value": {"Successful": successful, "Failed": {}}}
+
+
+def jobParametersPayload(size):
+    """Answer of a bulk getJobParameters"""
+    parameters = {}
+    for jobID in range(size):
+        parameters[jobID] = {
+            "CPUNormalizationFactor": "12.3",
+            "LocalAccount": "lhcb%03d" % (jobID % 100),
+            "TotalCPUTime(s)": 12345.5 + jobID,
+            "MemoryUsed(kb)": jobID * 1024,
+            "PilotAgent": "v10r2",
+            "JobWrapperPID": str(jobID),
+        }
+    return {"OK": True, "Value": parameters}
+
+
+def transformationFilesPayload(size):
+    """Answer of getTransformationFiles"""
+    now = datetime.datetime.utcnow().replace(microsecond=0)
+    files = []
+    for i in range(size):
+        files.append(
+            {
+                "TransformationID": 12345,
+                "FileID": i,
+                "LFN": "/lhcb/LHCb/Collision18/RAW/%08d.raw" % i,
+                "Status": "Unused",
+                "TaskID": None,
+                "TargetSE": "Unknown",
+                "UsedSE": "Unknown",
+                "ErrorCount": 0,
+                "LastUpdate": now,
+                "InsertedTime": now,
+            }
+        )
+    return {"OK": True, "Value": files}
+
+
+PAYLOADS = (
+    ("getReplicas", replicasPayload),
+    ("getJobParameters", jobParametersPayload),
+    ("getTransformationFiles", transformationFilesPayload),
+)
+
+
+def loadReference(path):
+    """Load a DEncode implementation from a file"""
+    spec = importlib.util.spec_from_file_location("DEncodeReference", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def timeIt(func, repeat):
+    """Best time of a function call out of `repeat`"""
+    return min(timeit.repeat(func, number=1, repeat=repeat))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=50000, help="number of entries per payload")
+    parser.add_argument("--repeat", type=int, default=5, help="number of measurements, the best is kept")
+    parser.add_argument("--reference", help="path to a reference DEncode.py to compare with")
+    args = parser.parse_args()
+
+    codecs = [("DEncode", DEncode.encode, DEncode.decode)]
+    if args.reference:
+        reference = loadReference(args.reference)
+        codecs.append(("reference", reference.encode, reference.decode))
+    codecs.append(("JEncode", JEncode.encode, JEncode.decode))
+
+    print("%-24s %-10s %12s %12s %12s %10s" % ("Payload", "Codec", "Size (B)", "Encode (s)", "Decode (s)", "MB/s dec"))
+    for payloadName, payloadFunc in PAYLOADS:
+        payload = payloadFunc(args.size)
+        encodedStreams = {}
+        for codecName, encode, decode in codecs:
+            try:
+                encodedData = encode(payload)
+            except TypeError as e:
+                print("%-24s %-10s cannot encode: %s" % (payloadName, codecName, e))
+                continue
+            encodedStreams[codecName] = encodedData
+            encodeTime = timeIt(lambda: encode(payload), args.repeat)
+            decodeTime = timeIt(lambda: decode(encodedData), args.repeat)
+            print(
+                "%-24s %-10s %12d %12.4f %12.4f %10.1f"
+                % (
+                    payloadName,
+                    codecName,
+                    len(encodedData),
+                    encodeTime,
+                    decodeTime,
+                    len(encodedData) / decodeTime / 1e6,
+                )
+            )
+        if "reference" in encodedStreams and encodedStreams["reference"] != encodedStreams["DEncode"]:
+            print("WARNING: DEncode and the reference implementation produce different streams for %s" % payloadName)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+""" Micro-benchmark of the insertion paths of DIRAC.Core.Utilities.MySQL
+
+    It measures the number of rows per second inserted in a test table by:
+
+      * escape:  one INSERT per row, with the values escaped into the statement (_escapeValues)
+      * insert:  one insertFields call per row, with the values passed as parameters
+      * bulk:    insertFieldsBulk, multi-row INSERTs through executemany
+
+    The DB connection parameters are taken from /Systems/Databases in the local configuration,
+    like for the integration tests. The test table is dropped at the end.
+
+    Usage::
+
+      python benchmark_insert.py [--rows N] [--chunkSize C] [--dbName AccountingDB]
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import argparse
+import time
+
+from DIRAC import gConfig
+from DIRAC.Core.Utilities.MySQL import MySQL
+
+TABLE = "BenchmarkInsert"
+FIELDS = ["LFN", "Size", "Checksum", "Status", "InsertedTime"]
+
+
+def getDB(dbName):
+    """Instantiate a MySQL object from the local configuration"""
+    host = gConfig.getValue("/Systems/Databases/Host", "mysql")
+    user = gConfig.getValue("/Systems/Databases/User", "Dirac")
+    password = gConfig.getValue("/Systems/Databases/Password", "Dirac")
+    port = gConfig.getValue("/Systems/Databases/Port", 3306)
+    return MySQL(host, user, password, dbName, port)
+
+
+def createTable(db):
+    result = db._createTables(
+        {
+            TABLE: {
+                "Fields": {
+                    "FileID": "INTEGER NOT NULL AUTO_INCREMENT",
+                    "LFN": "VARCHAR(255) NOT NULL",
+                    "Size": "BIGINT",
+                    "Checksum": "VARCHAR(32)",
+                    "Status": "VARCHAR(32)",
+                    "InsertedTime": "DATETIME",
+                },
+                "PrimaryKey": "FileID",
+            }
+        },
+        force=True,
+    )
+    if not result["OK"]:
+        raise RuntimeError(result["Message"])
+
+
+def makeRows(nRows):
+    return [
+        ("/vo/data/2021/RAW/%08d.raw" % i, 3000000000 + i, "%08x" % i, "New", "UTC_TIMESTAMP()") for i in range(nRows)
+    ]
+
+
+def insertEscaped(db, rows, _chunkSize):
+    for row in rows:
+        result = db._escapeValues(row)
+        if not result["OK"]:
+            raise RuntimeError(result["Message"])
+        result = db._update(
+            "INSERT INTO `%s` (%s) VALUES (%s)" % (TABLE, ", ".join(FIELDS), ", ".join(result["Value"]))
+        )
+        if not result["OK"]:
+            raise RuntimeError(result["Message"])
+
+
+def insertFields(db, rows, _chunkSize):
+    for row in rows:
+        result = db.insertFields(TABLE, FIELDS, list(row))
+        if not result["OK"]:
+            raise RuntimeError(result["Message"])
+
+
+def insertBulk(db, rows, chunkSize):
+    result = db.insertFieldsBulk(TABLE, FIELDS, rows, chunkSize=chunkSize)
+    if not result["OK"]:
+        raise RuntimeError(result["Message"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10000, help="number of rows to insert")
+    parser.add_argument("--chunkSize", type=int, default=1000, help="rows per statement for the bulk insertion")
+    parser.add_argument("--dbName", default="AccountingDB", help="database in which to create the test table")
+    args = parser.parse_args()
+
+    db = getDB(args.dbName)
+    rows = makeRows(args.rows)
+
+    print("%-8s %10s %10s %12s" % ("Path", "Rows", "Time (s)", "Rows/s"))
+    for name, method in (("escape", insertEscaped), ("insert", insertFields), ("bulk", insertBulk)):
+        createTable(db)
+        start = time.time()
+        method(db, rows, args.chunkSize)
+        elapsed = time.time() - start
+        print("%-8s %10d %10.3f %12.0f" % (name, len(rows), elapsed, len(rows) / elapsed))
+
+    db._update("DROP TABLE `%s`" % TABLE)
+
+
+if __name__ == "__main__":
+    main()
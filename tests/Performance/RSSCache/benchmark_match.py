@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+""" Micro-benchmark of the lookups in the RSS cache (RSSCacheNoThread.RSSCache.match)
+
+    A cache like the one of the ResourceStatus client is filled with the statuses of
+    storage elements, for several status types and, for some of them, for specific VOs.
+    The lookups done by StorageElement.status() or DataManager are then timed with:
+
+      * indexed: the index built at the refresh of the cache is used
+      * rebuilt: the index is rebuilt for each lookup, costing a pass over the whole cache,
+                 like the flattened copy of the cache that used to be built for each lookup
+
+    No configuration is needed.
+
+    Usage::
+
+      python benchmark_match.py [--elements 3334] [--vos 4] [--lookups 2000]
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import argparse
+import random
+import time
+
+from DIRAC import S_OK
+from DIRAC.ResourceStatusSystem.Utilities.RSSCacheNoThread import RSSCache, RSSCacheIndex
+
+STATUS_TYPES = ["ReadAccess", "WriteAccess", "CheckAccess", "RemoveAccess"]
+STATUSES = ["Active", "Active", "Active", "Degraded", "Banned"]
+
+
+def generateCache(elementsNumber, vosNumber):
+    """Statuses for all the VOs, and for one specific VO for half of the elements"""
+    cache = {}
+    for i in range(elementsNumber):
+        elementName = "SE-%05d" % i
+        for statusType in STATUS_TYPES:
+            cache[(elementName, "StorageElement", statusType, "all")] = random.choice(STATUSES)
+            if i % 2:
+                vO = "vo%d" % (i % vosNumber)
+                cache[(elementName, "StorageElement", statusType, vO)] = random.choice(STATUSES)
+    return cache
+
+
+def run(rssCache, lookups, vosNumber, rebuild):
+    """Time the lookups, return the number of lookups per second for each kind of lookup"""
+    elementNames = sorted({key[0] for key in rssCache._RSSCache__index.cacheDict})
+    kinds = {
+        "one SE, one status type": lambda: (random.choice(elementNames), "ReadAccess"),
+        "one SE, all status types": lambda: (random.choice(elementNames), None),
+        "10 SEs, one status type": lambda: (random.sample(elementNames, 10), "WriteAccess"),
+    }
+    # The views of the VOs are built by the first lookups after a refresh
+    for vO in range(vosNumber):
+        rssCache.match(elementNames[0], "StorageElement", None, "vo%d" % vO)
+    rates = {}
+    for kind, getArgs in kinds.items():
+        start = time.time()
+        for _ in range(lookups):
+            if rebuild:
+                index = rssCache._RSSCache__index
+                rssCache._RSSCache__index = RSSCacheIndex(index.cacheDict, index.expiry)
+            names, statusTypes = getArgs()
+            result = rssCache.match(names, "StorageElement", statusTypes, "vo%d" % random.randrange(vosNumber))
+            if not result["OK"]:
+                raise RuntimeError(result["Message"])
+        rates[kind] = lookups / (time.time() - start)
+    return rates
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--elements", type=int, default=3334, help="number of storage elements")
+    parser.add_argument("--vos", type=int, default=4, help="number of VOs")
+    parser.add_argument("--lookups", type=int, default=2000, help="lookups per kind of lookup")
+    args = parser.parse_args()
+
+    cache = generateCache(args.elements, args.vos)
+    rssCache = RSSCache(3600, lambda: S_OK(cache))
+    rssCache.allStatusTypes = STATUS_TYPES
+    start = time.time()
+    result = rssCache.refreshCache()
+    if not result["OK"]:
+        raise RuntimeError(result["Message"])
+    print("%d entries in the cache, refreshed in %.3f s\n" % (len(cache), time.time() - start))
+
+    print("%-28s %-8s %16s" % ("lookup", "mode", "lookups per second"))
+    for mode in ("indexed", "rebuilt"):
+        lookups = args.lookups if mode == "indexed" else max(1, args.lookups // 20)
+        for kind, rate in run(rssCache, lookups, args.vos, mode == "rebuilt").items():
+            print("%-28s %-8s %16.0f" % (kind, mode, rate))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+""" Benchmark of the fetch of the bulk requests from the RequestDB
+
+    Requests with a few operations of many files are inserted, and read back for execution
+    (without assigning them) with:
+
+      * orm:    getBulkRequests, building the Request, Operation and File objects,
+                then Request.toJSON, as ReqManager.getBulkRequests used to do
+      * direct: getBulkRequestsJSON, serializing the rows of the tables directly
+
+    The RequestDB section of the local configuration is used. The benchmark requests are
+    deleted at the end.
+
+    Usage::
+
+      python benchmark_fetch.py [--requests N] [--operations O] [--files F] [--loops L]
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import argparse
+import time
+
+from DIRAC.Core.Base.Script import parseCommandLine
+
+
+def insertRequests(reqDB, requestsNumber, operationsNumber, filesNumber):
+    """Insert the requests, return their IDs"""
+    from DIRAC.RequestManagementSystem.Client.Request import Request
+    from DIRAC.RequestManagementSystem.Client.Operation import Operation
+    from DIRAC.RequestManagementSystem.Client.File import File
+
+    reqIDs = []
+    for i in range(requestsNumber):
+        request = Request({"RequestName": "benchmark_fetch_%d_%d" % (time.time(), i)})
+        for j in range(operationsNumber):
+            operation = Operation({"Type": "ReplicateAndRegister", "TargetSE": "SE-%d" % j})
+            for k in range(filesNumber):
+                operation.addFile(
+                    File(
+                        {
+                            "LFN": "/benchmark/fetch/%d/%d/file_%d" % (i, j, k),
+                            "Checksum": "%08x" % k,
+                            "ChecksumType": "ADLER32",
+                            "Size": k,
+                        }
+                    )
+                )
+            request.addOperation(operation)
+        result = reqDB.putRequest(request)
+        if not result["OK"]:
+            raise RuntimeError(result["Message"])
+        reqIDs.append(result["Value"])
+    return reqIDs
+
+
+def fetch(reqDB, mode, requestsNumber):
+    """Fetch the requests serialized to JSON, return the elapsed time"""
+    start = time.time()
+    if mode == "orm":
+        result = reqDB.getBulkRequests(requestsNumber, False)
+        if not result["OK"]:
+            raise RuntimeError(result["Message"])
+        requests = dict((reqID, request.toJSON()["Value"]) for reqID, request in result["Value"].items())
+    else:
+        result = reqDB.getBulkRequestsJSON(requestsNumber, False)
+        if not result["OK"]:
+            raise RuntimeError(result["Message"])
+        requests = result["Value"]
+    if len(requests) < requestsNumber:
+        raise RuntimeError("Got %d requests instead of %d" % (len(requests), requestsNumber))
+    return time.time() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=10, help="number of requests fetched at once")
+    parser.add_argument("--operations", type=int, default=2, help="operations per request")
+    parser.add_argument("--files", type=int, default=10000, help="files per operation")
+    parser.add_argument("--loops", type=int, default=5, help="number of fetches per mode")
+    args, _ = parser.parse_known_args()
+    parseCommandLine()
+
+    from DIRAC.RequestManagementSystem.DB.RequestDB import RequestDB
+
+    reqDB = RequestDB()
+    reqIDs = insertRequests(reqDB, args.requests, args.operations, args.files)
+    # NotBefore is set to now at insertion, and only the requests before now are fetched
+    time.sleep(1)
+    filesNumber = args.requests * args.operations * args.files
+    try:
+        print("%-8s %10s %10s %12s %16s" % ("mode", "requests", "files", "time (s)", "files per second"))
+        for mode in ("orm", "direct"):
+            elapsed = min(fetch(reqDB, mode, args.requests) for _ in range(args.loops))
+            print("%-8s %10d %10d %12.3f %16.0f" % (mode, args.requests, filesNumber, elapsed, filesNumber / elapsed))
+    finally:
+        for reqID in reqIDs:
+            reqDB.deleteRequest(reqID)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+""" Benchmark of the capture of the outputs of the commands run by Subprocess.systemCall
+
+    A command writes a given amount of lines to its stdout (1 GB by default), captured with:
+
+      * capture:  the whole output kept in memory (bufferLimit above the output size)
+      * callback: each line given to a callback, as the JobWrapper and the ComputingElements do
+      * headtail: only the first and last 10 MB of the output kept
+      * stream:   the output appended to a file, and the lines given to a callback,
+                  as the ExecutionThread of the JobWrapper does
+
+    Each mode runs in its own process, whose peak memory is reported. The modes can also be
+    run with a reference implementation of Subprocess (for example the version of a previous
+    release), which does not support headtail and stream.
+
+    Usage::
+
+      python benchmark_output.py [--size MB] [--lineLength L] [--modes capture,callback] [--reference path]
+
+    A reference implementation can be extracted from git with::
+
+      git show v7r2:src/DIRAC/Core/Utilities/Subprocess.py > /tmp/Subprocess_ref.py
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import argparse
+import importlib.util
+import multiprocessing
+import os
+import resource
+import tempfile
+import time
+
+MODES = ("capture", "callback", "headtail", "stream")
+
+
+def loadReference(path):
+    """Load a Subprocess implementation from a file"""
+    spec = importlib.util.spec_from_file_location("SubprocessReference", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def runMode(mode, size, lineLength, reference, results):
+    """Run the command in a mode, put (elapsed time, bytes kept, lines, peak memory in MB) in results"""
+    if reference:
+        subprocessModule = loadReference(reference)
+    else:
+        from DIRAC.Core.Utilities import Subprocess as subprocessModule
+
+    lines = [0]
+
+    def callback(_pipeId, _line):
+        lines[0] += 1
+
+    cmd = "yes %s | head -c %d" % ("x" * (lineLength - 1), size)
+    kwargs = {"bufferLimit": size + 1048576}
+    if mode == "headtail":
+        kwargs = {"headTailSize": 10485760}
+    spObject = subprocessModule.Subprocess(**kwargs)
+
+    outputFile = None
+    start = time.time()
+    if mode == "capture":
+        result = spObject.systemCall(cmd, shell=True)
+    elif mode == "callback":
+        result = spObject.systemCall(cmd, shell=True, callbackFunction=callback)
+    elif mode == "headtail":
+        result = spObject.systemCall(cmd, shell=True)
+    else:
+        fd, outputFile = tempfile.mkstemp(prefix="benchmark_output.")
+        os.close(fd)
+        result = spObject.systemCall(cmd, shell=True, callbackFunction=callback, outputFiles=(outputFile, None))
+    elapsed = time.time() - start
+    if outputFile:
+        os.unlink(outputFile)
+    if not result["OK"]:
+        results.put(result["Message"])
+        return
+    peakMemory = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+    results.put((elapsed, len(result["Value"][1]), lines[0], peakMemory))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=1024, help="size of the output, in MB")
+    parser.add_argument("--lineLength", type=int, default=100, help="length of the lines of the output")
+    parser.add_argument("--modes", default=",".join(MODES), help="comma separated list of modes")
+    parser.add_argument("--reference", help="path to a reference Subprocess.py to compare with")
+    args = parser.parse_args()
+
+    size = args.size * 1048576
+    modes = args.modes.split(",")
+    implementations = [("Subprocess", None)]
+    if args.reference:
+        implementations.append(("reference", args.reference))
+
+    print(
+        "%-12s %-10s %10s %12s %12s %10s %10s %12s"
+        % ("Impl", "Mode", "Size (MB)", "Time (s)", "Kept (MB)", "Lines", "MB/s", "Peak (MB)")
+    )
+    for implName, reference in implementations:
+        for mode in modes:
+            if reference and mode in ("headtail", "stream"):
+                continue
+            results = multiprocessing.Queue()
+            process = multiprocessing.Process(target=runMode, args=(mode, size, args.lineLength, reference, results))
+            process.start()
+            result = results.get()
+            process.join()
+            if isinstance(result, str):
+                print("%-12s %-10s failed: %s" % (implName, mode, result))
+                continue
+            elapsed, keptBytes, lines, peakMemory = result
+            print(
+                "%-12s %-10s %10d %12.2f %12.1f %10d %10.1f %12.0f"
+                % (implName, mode, args.size, elapsed, keptBytes / 1048576.0, lines, args.size / elapsed, peakMemory)
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+#!/usr/bin/env python
+""" Benchmark of the task queue selection of the TaskQueueDB matching
+
+    It replays a list of match requests (the resource descriptions given to TaskQueueDB.matchAndGetJob
+    by the Matcher, with their negative conditions) and measures the time to select the candidate
+    task queues with:
+
+      * index: the in-memory TaskQueueIndex
+      * sql:   the SQL generated by TaskQueueDB.matchAndGetTaskQueue (only with --db)
+
+    With --db the task queues are those of the TaskQueueDB defined in the local configuration
+    (like for the integration tests),
+    and the results of both selections are compared. Otherwise a synthetic set of task queues is used.
+
+    The requests file is a JSON list, whose elements are either a match dict, or a dict
+    {"tqMatchDict": {...}, "negativeCond": {...}}. Without it, synthetic requests are generated.
+
+    Usage::
+
+      python benchmark_match.py [--requests requests.json] [--tqs N] [--requestsNumber N] [--db]
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import argparse
+import json
+import random
+import time
+
+from DIRAC.WorkloadManagementSystem.DB.TaskQueueDB import TaskQueueIndex
+
+SITES = ["LCG.Site%02d.org" % i for i in range(60)]
+PLATFORMS = ["x86_64-slc6", "x86_64-centos7", "x86_64-el9"]
+TAGS = ["MultiProcessor", "8Processors", "GPU", "WholeNode"]
+GROUPS = ["prod", "user", "mc", "data"]
+CPU_SEGMENTS = [360, 1800, 3600, 21600, 43200, 86400, 172800]
+
+
+def makeTaskQueues(number):
+    """Synthetic task queues, shaped like the ones of a big VO"""
+    tqData = {}
+    for tqId in range(1, number + 1):
+        tqDef = {
+            "OwnerDN": "/DC=org/CN=user%03d" % random.randint(0, 300),
+            "OwnerGroup": random.choice(GROUPS),
+            "Setup": "Production",
+            "CPUTime": random.choice(CPU_SEGMENTS),
+            "Priority": random.uniform(0.001, 100),
+            "Jobs": random.randint(1, 5000),
+        }
+        if random.random() < 0.6:
+            tqDef["Sites"] = random.sample(SITES, random.randint(1, 10))
+        if random.random() < 0.1:
+            tqDef["BannedSites"] = random.sample(SITES, random.randint(1, 3))
+        if random.random() < 0.5:
+            tqDef["Platforms"] = random.sample(PLATFORMS, random.randint(1, 2))
+        if random.random() < 0.2:
+            tqDef["Tags"] = random.sample(TAGS, random.randint(1, 2))
+        tqData[tqId] = tqDef
+    return tqData
+
+
+def makeRequests(number):
+    """Synthetic match requests, like those of the pilots"""
+    requests = []
+    for _ in range(number):
+        tqMatchDict = {
+            "Setup": "Production",
+            "CPUTime": random.randint(3600, 200000),
+            "Site": random.choice(SITES),
+            "Platform": random.sample(PLATFORMS, 2),
+            "Tag": random.sample(TAGS, random.randint(0, 2)),
+            "OwnerGroup": GROUPS,
+        }
+        negativeCond = {}
+        if random.random() < 0.3:
+            negativeCond = {"JobType": ["MCSimulation"]}
+        requests.append({"tqMatchDict": tqMatchDict, "negativeCond": negativeCond})
+    return requests
+
+
+def loadRequests(fileName):
+    with open(fileName) as fd:
+        data = json.load(fd)
+    requests = []
+    for entry in data:
+        if "tqMatchDict" in entry:
+            requests.append({"tqMatchDict": entry["tqMatchDict"], "negativeCond": entry.get("negativeCond", {})})
+        else:
+            requests.append({"tqMatchDict": entry, "negativeCond": {}})
+    return requests
+
+
+def replay(matchFunction, requests, numQueuesToGet):
+    results = []
+    start = time.time()
+    for request in requests:
+        result = matchFunction(
+            request["tqMatchDict"], numQueuesToGet=numQueuesToGet, negativeCond=request["negativeCond"]
+        )
+        results.append(set(tqTuple[0] for tqTuple in result["Value"]) if result["OK"] else None)
+    return time.time() - start, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", help="JSON file with the match requests to replay")
+    parser.add_argument("--requestsNumber", type=int, default=10000, help="number of synthetic requests")
+    parser.add_argument("--tqs", type=int, default=2000, help="number of synthetic task queues")
+    parser.add_argument("--numQueuesPerTry", type=int, default=10, help="task queues selected by request")
+    parser.add_argument("--db", action="store_true", help="use the TaskQueueDB and compare with the SQL matching")
+    args = parser.parse_args()
+
+    requests = loadRequests(args.requests) if args.requests else makeRequests(args.requestsNumber)
+
+    tqDB = None
+    if args.db:
+        from DIRAC.WorkloadManagementSystem.DB.TaskQueueDB import TaskQueueDB
+
+        tqDB = TaskQueueDB()
+        result = tqDB.retrieveTaskQueues()
+        if not result["OK"]:
+            raise RuntimeError(result["Message"])
+        tqData = result["Value"]
+    else:
+        tqData = makeTaskQueues(args.tqs)
+
+    tqIndex = TaskQueueIndex()
+    start = time.time()
+    tqIndex.load(tqData)
+    print("Loaded %d task queues in the index in %.3f s" % (len(tqIndex), time.time() - start))
+
+    print("%-8s %10s %12s %14s" % ("path", "requests", "total (s)", "per match (ms)"))
+    elapsed, indexResults = replay(tqIndex.match, requests, args.numQueuesPerTry)
+    print("%-8s %10d %12.3f %14.4f" % ("index", len(requests), elapsed, 1000 * elapsed / len(requests)))
+
+    if tqDB:
+        elapsed, sqlResults = replay(tqDB.matchAndGetTaskQueue, requests, args.numQueuesPerTry)
+        print("%-8s %10d %12.3f %14.4f" % ("sql", len(requests), elapsed, 1000 * elapsed / len(requests)))
+        # Compare the full candidate sets, the limited ones are randomized
+        _, indexResults = replay(tqIndex.match, requests, 0)
+        _, sqlResults = replay(tqDB.matchAndGetTaskQueue, requests, 0)
+        different = sum(1 for fromIndex, fromSQL in zip(indexResults, sqlResults) if fromIndex != fromSQL)
+        print("Requests with different candidate task queues: %d" % different)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+""" Benchmark of the latency of the calls to a Tornado service
+
+    The ping method of a running Tornado service is called a number of times, from several threads,
+    and the latency and throughput of the calls are measured with:
+
+      * pooled: the calls go through the persistent sessions of the TornadoBaseClient,
+                reusing the connections and their TLS handshake
+      * fresh:  a new connection, and TLS handshake, for each call, like all the calls used to be done
+
+    It needs a DIRAC configuration and valid credentials, for example:
+
+    Usage::
+
+      python benchmark_latency.py https://localhost:8443/Framework/Tornado [--calls 200] [--threads 4]
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import argparse
+import threading
+import time
+
+from DIRAC.Core.Base.Script import parseCommandLine
+
+
+def run(url, callsNumber, threadsNumber):
+    """Call ping in parallel, return the list of latencies and the elapsed time"""
+    from DIRAC.Core.Tornado.Client.TornadoClient import TornadoClient
+
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+
+    def worker():
+        client = TornadoClient(url)
+        for _ in range(callsNumber):
+            start = time.time()
+            result = client.ping()
+            elapsed = time.time() - start
+            with lock:
+                if result["OK"]:
+                    latencies.append(elapsed)
+                else:
+                    errors.append(result["Message"])
+
+    threads = [threading.Thread(target=worker) for _ in range(threadsNumber)]
+    start = time.time()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if errors:
+        print("%d errors, first one: %s" % (len(errors), errors[0]))
+    return sorted(latencies), time.time() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("url", help="URL of the Tornado service")
+    parser.add_argument("--calls", type=int, default=200, help="calls per thread")
+    parser.add_argument("--threads", type=int, default=4, help="number of calling threads")
+    args, _ = parser.parse_known_args()
+    parseCommandLine()
+
+    from DIRAC.Core.Tornado.Client.private.TornadoBaseClient import TornadoBaseClient
+
+    print(
+        "%-8s %8s %12s %12s %12s %16s"
+        % ("session", "threads", "median (ms)", "p95 (ms)", "max (ms)", "calls per second")
+    )
+    for name, maxSessions in (("pooled", TornadoBaseClient.sessionPool.maxSessions), ("fresh", 0)):
+        TornadoBaseClient.sessionPool.clear()
+        TornadoBaseClient.sessionPool.maxSessions = maxSessions
+        latencies, elapsed = run(args.url, args.calls, args.threads)
+        if not latencies:
+            continue
+        print(
+            "%-8s %8d %12.1f %12.1f %12.1f %16.0f"
+            % (
+                name,
+                args.threads,
+                1000 * latencies[len(latencies) // 2],
+                1000 * latencies[int(len(latencies) * 0.95)],
+                1000 * latencies[-1],
+                len(latencies) / elapsed,
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()